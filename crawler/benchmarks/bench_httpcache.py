@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+HTTP cache storage benchmark
+Compares Scrapy's FilesystemCacheStorage with extensions.httpcache.SqliteCacheStorage
+on store time, hit latency and disk footprint, using recorded Miyuki product
+pages as response bodies.
+
+Usage (from the crawler directory):
+    python -m benchmarks.bench_httpcache --responses 5000
+"""
+
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+from scrapy import Request, Spider
+from scrapy.extensions.httpcache import FilesystemCacheStorage
+from scrapy.http import HtmlResponse
+from scrapy.utils.test import get_crawler
+
+from extensions.httpcache import SqliteCacheStorage
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGES_DIR = Path(__file__).parent / 'corpus' / 'miyuki_directory' / 'parse_product_detail'
+BASE_URL = 'https://www.miyuki-beads.co.jp/directory/product/'
+
+
+class CachedSpider(Spider):
+    name = 'bench_httpcache'
+
+
+def load_pages(pages_dir: Path) -> List[bytes]:
+    """Read every recorded .html page in a directory"""
+    pages = [path.read_bytes() for path in sorted(pages_dir.glob('*.html'))]
+    if not pages:
+        raise FileNotFoundError(f"No recorded pages (*.html) in {pages_dir}")
+    return pages
+
+
+def build_responses(pages: List[bytes], count: int) -> List[Tuple[Request, HtmlResponse]]:
+    """Request/response pairs for ``count`` distinct product URLs
+
+    Each body is a recorded page with the product code swapped in, so pages
+    differ the way real product pages do rather than compressing to nothing.
+    """
+    pairs = []
+    for i in range(count):
+        code = f"DB{i:05d}"
+        url = f"{BASE_URL}{code.lower()}/"
+        body = pages[i % len(pages)].replace(b'DB0001', code.encode()).replace(b'db0001', code.lower().encode())
+        response = HtmlResponse(
+            url=url, body=body, status=200,
+            headers={'Content-Type': 'text/html; charset=UTF-8', 'Server': 'nginx', 'Vary': 'Accept-Encoding'},
+        )
+        pairs.append((Request(url), response))
+    return pairs
+
+
+def disk_usage(path: Path) -> Tuple[int, int]:
+    """(allocated bytes, number of files) under a directory"""
+    total_bytes = files = 0
+    for root, _, names in os.walk(path):
+        for name in names:
+            stat = os.stat(os.path.join(root, name))
+            total_bytes += stat.st_blocks * 512
+            files += 1
+    return total_bytes, files
+
+
+def _time(label: str, storage_cls, pairs: List[Tuple[Request, HtmlResponse]], lookups: int) -> Tuple[float, float, int]:
+    """Store every response and time random cache hits, returning (store ms, hit ms, disk bytes)"""
+    with tempfile.TemporaryDirectory(prefix='bench-httpcache-') as cachedir:
+        crawler = get_crawler(CachedSpider, {'HTTPCACHE_DIR': cachedir, 'HTTPCACHE_EXPIRATION_SECS': 0})
+        spider = CachedSpider.from_crawler(crawler)
+        storage = storage_cls(crawler.settings)
+        storage.open_spider(spider)
+
+        started_at = time.perf_counter()
+        for request, response in pairs:
+            storage.store_response(spider, request, response)
+        store_ms = (time.perf_counter() - started_at) / len(pairs) * 1000
+
+        sample = random.Random(0).choices(pairs, k=lookups)
+        started_at = time.perf_counter()
+        for request, _ in sample:
+            if storage.retrieve_response(spider, request) is None:
+                raise RuntimeError(f"{label}: cache miss for {request.url}")
+        hit_ms = (time.perf_counter() - started_at) / lookups * 1000
+
+        storage.close_spider(spider)
+        disk_bytes, files = disk_usage(Path(cachedir))
+
+    logger.info(f"{label:<24} {store_ms:7.3f} ms/store  {hit_ms:7.3f} ms/hit  "
+                f"{disk_bytes / 1024 / 1024:8.2f} MiB on disk in {files} file(s)")
+    return store_ms, hit_ms, disk_bytes
+
+
+def main() -> int:
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    logging.getLogger('scrapy').setLevel(logging.WARNING)  # crawler setup chatter
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pages-dir', type=Path, default=DEFAULT_PAGES_DIR, help="Directory of recorded detail pages")
+    parser.add_argument('--responses', type=int, default=2000, help="Distinct responses to cache")
+    parser.add_argument('--lookups', type=int, default=5000, help="Random cache hits to time")
+    args = parser.parse_args()
+
+    pairs = build_responses(load_pages(args.pages_dir), args.responses)
+    raw_bytes = sum(len(response.body) for _, response in pairs)
+    logger.info(f"Caching {len(pairs)} responses ({raw_bytes / 1024 / 1024:.2f} MiB of bodies), {args.lookups} lookups")
+
+    fs_store, fs_hit, fs_disk = _time("FilesystemCacheStorage", FilesystemCacheStorage, pairs, args.lookups)
+    sql_store, sql_hit, sql_disk = _time("SqliteCacheStorage", SqliteCacheStorage, pairs, args.lookups)
+    logger.info(f"SQLite vs filesystem: {fs_hit / sql_hit:.2f}x hit speed, {fs_store / sql_store:.2f}x store speed, "
+                f"{fs_disk / sql_disk:.2f}x smaller on disk")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
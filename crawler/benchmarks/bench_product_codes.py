@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Product code normalization microbenchmark
+Times parsers.product_codes against the per-spider regex loops it replaced on
+synthetic product names, and fails when throughput drops below a floor.
+
+Usage (from the crawler directory):
+    python -m benchmarks.bench_product_codes --count 1000000 --min-rate 500000
+"""
+
+import argparse
+import logging
+import random
+import re
+import sys
+import time
+from typing import Callable, List, Optional
+
+from parsers.product_codes import normalize_names
+
+logger = logging.getLogger(__name__)
+
+COLORS = ['Red', 'Opaque White', 'Silver Lined Crystal', 'Matte Black', 'Gold Luster', 'Transparent Blue AB']
+PREFIXES = ['DB', 'DBS', 'DBM', 'DBL']
+
+
+def generate_names(count: int, seed: int = 42) -> List[str]:
+    """Build a reproducible mix of Delica names in both sites' styles plus non-Delica noise"""
+    rng = random.Random(seed)
+    names = []
+    for _ in range(count):
+        roll = rng.random()
+        prefix = rng.choice(PREFIXES)
+        number = rng.randint(1, 2500)
+        color = rng.choice(COLORS)
+        if roll < 0.45:
+            names.append(f"Miyuki Delica {prefix}-{number}, {color}")  # Fire Mountain Gems style
+        elif roll < 0.9:
+            suffix = rng.choice(['', '', 'B', 'C'])
+            names.append(f"{prefix}{number:04d}{suffix} {color}")  # Miyuki directory style
+        else:
+            names.append(f"Seed Bead 11/0 {color}")
+    return names
+
+
+def _legacy_fire_mountain_gems(product_name: str) -> Optional[str]:
+    """The loop FireMountainGemsSpider used before the shared module"""
+    for pattern in [r'DB-?(\d+)', r'DBS-?(\d+)', r'DBM-?(\d+)', r'DBL-?(\d+)']:
+        match = re.search(pattern, product_name)
+        if match:
+            full_match = match.group(0)
+            prefix_match = re.search(r'DB-|DBS-|DBM-|DBL-', full_match)
+            if prefix_match:
+                return f"{prefix_match.group(0)}{match.group(1)}"
+            return full_match
+    return None
+
+
+def _legacy_miyuki(product_name: str) -> Optional[str]:
+    """The loop MiyukiDirectoryCrawler used before the shared module"""
+    for pattern in [r'(DB)(\d+)([A-Z]?)', r'(DBS)(\d+)([A-Z]?)', r'(DBM)(\d+)([A-Z]?)', r'(DBL)(\d+)([A-Z]?)']:
+        match = re.search(pattern, product_name)
+        if match:
+            prefix, number, suffix = match.groups()
+            if suffix:
+                return f"{prefix}-{number.zfill(4)}-{suffix}"
+            return f"{prefix}-{number.zfill(4)}"
+    return None
+
+
+def _time(label: str, func: Callable[[List[str]], object], names: List[str]) -> float:
+    """Run func over the names once and log its throughput"""
+    started_at = time.perf_counter()
+    func(names)
+    elapsed = time.perf_counter() - started_at
+    rate = len(names) / elapsed
+    logger.info(f"{label:<28} {elapsed:8.3f}s  {rate:>12,.0f} names/s")
+    return rate
+
+
+def main() -> int:
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--count', type=int, default=1_000_000, help="Synthetic names to normalize")
+    parser.add_argument('--min-rate', type=float, default=0, help="Fail if the batch API is slower than this (names/s)")
+    parser.add_argument('--skip-legacy', action='store_true', help="Only time the shared module")
+    args = parser.parse_args()
+
+    names = generate_names(args.count)
+    logger.info(f"Normalizing {len(names):,} synthetic product names")
+
+    if not args.skip_legacy:
+        _time("legacy FireMountainGems", lambda batch: [_legacy_fire_mountain_gems(n) for n in batch], names)
+        _time("legacy MiyukiDirectory", lambda batch: [_legacy_miyuki(n) for n in batch], names)
+    rate = _time("parsers.normalize_names", normalize_names, names)
+
+    if args.min_rate and rate < args.min_rate:
+        logger.error(f"Throughput regression: {rate:,.0f} names/s is below the {args.min_rate:,.0f} names/s floor")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
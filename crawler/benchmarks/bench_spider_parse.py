@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Spider parse throughput benchmark
+Replays the recorded page corpus through each spider's callbacks offline and
+reports pages/sec, items/sec and CPU time per callback, failing when a callback
+got slower than the stored baseline by more than the threshold.
+
+Usage (from the crawler directory):
+    python -m benchmarks.bench_spider_parse                    # compare with the baseline
+    python -m benchmarks.bench_spider_parse --update-baseline  # after an intended change
+
+Baselines are CPU timings, so they are only comparable on the machine that
+recorded them; re-record with --update-baseline when switching machines.
+Record new pages with python -m benchmarks.record_corpus.
+"""
+
+import argparse
+import json
+import logging
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Type
+
+from scrapy import Request, Spider
+
+from benchmarks.recorded_pages import CORPUS_DIR, RecordedPage, load_recorded_pages
+from spiders.fire_mountain_gems_view import FireMountainGemsSpider
+from spiders.miyuki_directory_crawler import MiyukiDirectoryCrawler
+
+logger = logging.getLogger(__name__)
+
+SPIDERS: Dict[str, Type[Spider]] = {
+    MiyukiDirectoryCrawler.name: MiyukiDirectoryCrawler,
+    FireMountainGemsSpider.name: FireMountainGemsSpider,
+}
+DEFAULT_BASELINE = Path(__file__).parent / 'baselines' / 'spider_parse.json'
+
+
+def _time(spider_cls: Type[Spider], callback: str, pages: List[RecordedPage], iterations: int) -> Dict[str, float]:
+    """Run one callback over its recorded pages, returning throughput and output counts
+
+    Every pass builds fresh responses, so HTML parsing is included as in a real
+    crawl. CPU time (process_time) is what regressions are judged on, as wall
+    time is noisier on shared machines.
+    """
+    spider = spider_cls()
+    parse = getattr(spider, callback)
+    items = requests = 0
+
+    for page in pages:  # warm up selector and regex caches
+        for _ in parse(page.response()):
+            pass
+
+    cpu_started_at = time.process_time()
+    started_at = time.perf_counter()
+    for _ in range(iterations):
+        for page in pages:
+            for result in parse(page.response()):
+                if isinstance(result, Request):
+                    requests += 1
+                else:
+                    items += 1
+    elapsed = time.perf_counter() - started_at
+    cpu_elapsed = time.process_time() - cpu_started_at
+
+    page_count = iterations * len(pages)
+    result = {
+        'pages_per_sec': page_count / elapsed,
+        'items_per_sec': items / elapsed,
+        'cpu_ms_per_page': cpu_elapsed / page_count * 1000,
+        'items_per_page': items / page_count,
+        'requests_per_page': requests / page_count,
+    }
+    return {name: round(value, 4) for name, value in result.items()}
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], threshold: float) -> List[str]:
+    """Describe every callback that regressed against the baseline"""
+    failures = []
+    for key, result in results.items():
+        expected = baseline.get(key)
+        if not expected:
+            logger.info(f"{key}: no baseline recorded, skipping comparison")
+            continue
+        slowdown = result['cpu_ms_per_page'] / expected['cpu_ms_per_page'] - 1
+        if slowdown > threshold:
+            failures.append(f"{key}: {result['cpu_ms_per_page']:.3f} ms CPU/page vs baseline "
+                            f"{expected['cpu_ms_per_page']:.3f} ({slowdown:+.0%}, limit {threshold:+.0%})")
+        # A faster parser that yields different output is not an improvement
+        for count in ('items_per_page', 'requests_per_page'):
+            if abs(result[count] - expected[count]) > 1e-9:
+                failures.append(f"{key}: {count} changed from {expected[count]:g} to {result[count]:g}")
+    return failures
+
+
+def main() -> int:
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--corpus-dir', type=Path, default=CORPUS_DIR, help="Recorded page corpus")
+    parser.add_argument('--spider', choices=sorted(SPIDERS), action='append', help="Only benchmark these spiders")
+    parser.add_argument('--iterations', type=int, default=50, help="Passes over each callback's recorded pages")
+    parser.add_argument('--baseline', type=Path, default=DEFAULT_BASELINE, help="Baseline JSON to compare with")
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help="Allowed CPU time increase per page before failing (default: %(default)s = 25%%)")
+    parser.add_argument('--update-baseline', action='store_true', help="Write these results as the new baseline")
+    args = parser.parse_args()
+
+    # The spiders log every bead at INFO; keep that out of the timings and the report
+    logging.getLogger('spiders').setLevel(logging.WARNING)
+
+    results: Dict[str, Dict[str, float]] = {}
+    for spider_name in args.spider or sorted(SPIDERS):
+        recorded = load_recorded_pages(args.corpus_dir, spider_name)
+        if not recorded:
+            logger.warning(f"No recorded pages for {spider_name} in {args.corpus_dir}")
+            continue
+        for callback, pages in recorded.items():
+            key = f"{spider_name}/{callback}"
+            result = _time(SPIDERS[spider_name], callback, pages, args.iterations)
+            results[key] = result
+            logger.info(f"{key:<40} {len(pages):3d} page(s)  {result['pages_per_sec']:9.1f} pages/s  "
+                        f"{result['items_per_sec']:9.1f} items/s  {result['requests_per_page']:5.1f} requests/page  "
+                        f"{result['cpu_ms_per_page']:8.3f} ms CPU/page")
+
+    if args.update_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(results, indent=2, sort_keys=True) + '\n')
+        logger.info(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        logger.warning(f"No baseline at {args.baseline} - run with --update-baseline to record one")
+        return 0
+    failures = compare(results, json.loads(args.baseline.read_text()), args.threshold)
+    for failure in failures:
+        logger.error(f"REGRESSION {failure}")
+    if not failures:
+        logger.info(f"No regressions beyond {args.threshold:.0%} against {args.baseline}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Record pages for the spider parse benchmark
+Fetches listing pages from a spider's start URL, runs the spider's own parse
+callback on them to find pagination and detail requests, and saves the
+responses under benchmarks/corpus/<spider>/<callback>/ with their URL and meta.
+
+Usage (from the crawler directory):
+    python -m benchmarks.record_corpus miyuki_directory --pages 2 --details 5
+"""
+
+import argparse
+import json
+import logging
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict
+from urllib.parse import urlparse
+
+import requests
+from scrapy import Request
+from scrapy.http import HtmlResponse
+from scrapy.utils.project import get_project_settings
+
+from benchmarks.bench_spider_parse import SPIDERS
+from benchmarks.recorded_pages import CORPUS_DIR, save_recorded_page
+
+logger = logging.getLogger(__name__)
+
+
+def _page_name(url: str) -> str:
+    """File-system friendly name from the last path segment of a URL"""
+    segment = urlparse(url).path.rstrip('/').rsplit('/', 1)[-1] or 'index'
+    return re.sub(r'[^A-Za-z0-9_-]+', '-', segment).strip('-').lower()
+
+
+def _serializable_meta(meta: Dict[str, Any]) -> Dict[str, Any]:
+    """The part of a request's meta that can be stored in the JSON sidecar"""
+    kept = {}
+    for key, value in meta.items():
+        try:
+            json.dumps(value)
+        except TypeError:
+            continue
+        kept[key] = value
+    return kept
+
+
+def record(spider_name: str, corpus_dir: Path, pages: int, details: int, delay: float):
+    settings = get_project_settings()
+    spider = SPIDERS[spider_name]()
+    session = requests.Session()
+    session.headers['User-Agent'] = settings.get('USER_AGENT')
+
+    listing = Request(spider.start_urls[0], meta={})
+    detail_requests = []
+    for page_number in range(1, pages + 1):
+        body = session.get(listing.url, timeout=30).content
+        save_recorded_page(corpus_dir, spider_name, 'parse', f"page-{page_number}",
+                           listing.url, _serializable_meta(listing.meta), body)
+        logger.info(f"Recorded listing {listing.url}")
+
+        next_listing = None
+        response = HtmlResponse(url=listing.url, body=body, encoding='utf-8', request=listing)
+        for result in spider.parse(response):
+            if not isinstance(result, Request):
+                continue
+            if getattr(result.callback, '__name__', None) == 'parse':
+                # The first page schedules every listing page at once; record them in order
+                next_listing = next_listing or result
+            elif len(detail_requests) < details:
+                detail_requests.append(result)
+        if not next_listing:
+            break
+        listing = next_listing
+        time.sleep(delay)
+
+    for request in detail_requests:
+        time.sleep(delay)
+        body = session.get(request.url, timeout=30).content
+        save_recorded_page(corpus_dir, spider_name, request.callback.__name__, _page_name(request.url),
+                           request.url, _serializable_meta(request.meta), body)
+        logger.info(f"Recorded {request.callback.__name__} page {request.url}")
+
+
+def main() -> int:
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    logging.getLogger('spiders').setLevel(logging.WARNING)
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('spider', choices=sorted(SPIDERS), help="Spider whose pages to record")
+    parser.add_argument('--corpus-dir', type=Path, default=CORPUS_DIR, help="Recorded page corpus")
+    parser.add_argument('--pages', type=int, default=2, help="Listing pages to record")
+    parser.add_argument('--details', type=int, default=5, help="Detail pages to record from those listings")
+    parser.add_argument('--delay', type=float, default=None,
+                        help="Seconds between fetches (default: the project's DOWNLOAD_DELAY)")
+    args = parser.parse_args()
+
+    delay = args.delay if args.delay is not None else get_project_settings().getfloat('DOWNLOAD_DELAY')
+    record(args.spider, args.corpus_dir, args.pages, args.details, delay)
+    logger.info("Re-record the baseline with python -m benchmarks.bench_spider_parse --update-baseline")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,54 @@
+"""
+Recorded page corpus
+Pages live in ``benchmarks/corpus/<spider>/<callback>/<name>.html``, each with a
+``<name>.json`` sidecar holding the URL it was fetched from and the request meta
+the callback expects (e.g. ``bead_data`` for detail pages)
+"""
+
+import json
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple
+
+from scrapy import Request
+from scrapy.http import HtmlResponse
+
+CORPUS_DIR = Path(__file__).parent / 'corpus'
+
+
+class RecordedPage(NamedTuple):
+    """One recorded response and the request that fetched it"""
+    name: str
+    url: str
+    meta: Dict[str, Any]
+    body: bytes
+
+    def response(self) -> HtmlResponse:
+        """Build a fresh response, as Scrapy would hand it to the callback"""
+        request = Request(self.url, meta=json.loads(json.dumps(self.meta)))  # meta is mutated by callbacks
+        return HtmlResponse(url=self.url, body=self.body, encoding='utf-8', request=request)
+
+
+def load_recorded_pages(corpus_dir: Path, spider_name: str) -> Dict[str, List[RecordedPage]]:
+    """Recorded pages of one spider, grouped by callback name"""
+    pages: Dict[str, List[RecordedPage]] = {}
+    for callback_dir in sorted(path for path in (corpus_dir / spider_name).glob('*') if path.is_dir()):
+        for html_path in sorted(callback_dir.glob('*.html')):
+            sidecar = html_path.with_suffix('.json')
+            if not sidecar.exists():
+                raise FileNotFoundError(f"Recorded page {html_path} has no {sidecar.name} with its URL and meta")
+            request = json.loads(sidecar.read_text())
+            pages.setdefault(callback_dir.name, []).append(
+                RecordedPage(html_path.stem, request['url'], request.get('meta', {}), html_path.read_bytes())
+            )
+    return pages
+
+
+def save_recorded_page(corpus_dir: Path, spider_name: str, callback: str, name: str,
+                       url: str, meta: Dict[str, Any], body: bytes) -> Path:
+    """Write a page and its sidecar into the corpus, returning the page path"""
+    callback_dir = corpus_dir / spider_name / callback
+    callback_dir.mkdir(parents=True, exist_ok=True)
+    html_path = callback_dir / f"{name}.html"
+    html_path.write_bytes(body)
+    html_path.with_suffix('.json').write_text(json.dumps({'url': url, 'meta': meta}, indent=2) + '\n')
+    return html_path
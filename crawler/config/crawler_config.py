@@ -5,13 +5,13 @@ Configuration settings for the crawler
 import os
 from typing import Dict, Any
 
-# Database Configuration
+# Database Configuration (DB_* first, then the DATABASE_* variables the Rails app reads)
 DATABASE_CONFIG = {
-    'host': os.getenv('DB_HOST', 'localhost'),
-    'port': os.getenv('DB_PORT', '5432'),
+    'host': os.getenv('DB_HOST') or os.getenv('DATABASE_HOST', 'localhost'),
+    'port': os.getenv('DB_PORT') or os.getenv('DATABASE_PORT', '5432'),
     'name': os.getenv('DB_NAME', 'pattern_maker_development'),
-    'user': os.getenv('DB_USER', 'postgres'),
-    'password': os.getenv('DB_PASSWORD', '')
+    'user': os.getenv('DB_USER') or os.getenv('DATABASE_USERNAME', 'postgres'),
+    'password': os.getenv('DB_PASSWORD') or os.getenv('DATABASE_PASSWORD', '')
 }
 
 # API Configuration
@@ -27,6 +27,16 @@ CRAWLER_CONFIG = {
     'user_agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
 }
 
+# Importer Configuration
+IMPORT_CONFIG = {
+    'batch_size': int(os.getenv('IMPORT_BATCH_SIZE', '1000')),  # Rows per streamed insert batch
+    'backend': os.getenv('IMPORT_BACKEND', 'values'),  # Loader backend: 'values' or 'copy'
+    'mode': os.getenv('IMPORT_MODE', 'insert'),  # 'insert' skips existing beads, 'upsert' refreshes changed ones
+    'read_chunk_size': 64 * 1024,  # Bytes read per chunk when streaming a JSON array feed
+    # Feed sources (source_url hosts) by authority, for beads several sites list: the manufacturer first
+    'source_precedence': ['miyuki-beads.co.jp', 'firemountaingems.com']
+}
+
 # Spider Configuration
 SPIDER_CONFIG = {
     'allowed_domains': ['firemountaingems.com'],
@@ -63,12 +73,24 @@ def get_database_url() -> str:
     config = DATABASE_CONFIG
     return f"postgresql://{config['user']}:{config['password']}@{config['host']}:{config['port']}/{config['name']}"
 
+def get_connection_kwargs() -> Dict[str, Any]:
+    """Build psycopg2.connect() keyword arguments from configuration"""
+    config = DATABASE_CONFIG
+    return {
+        'host': config['host'],
+        'port': int(config['port']),
+        'dbname': config['name'],
+        'user': config['user'],
+        'password': config['password']
+    }
+
 def get_config() -> Dict[str, Any]:
     """Get all configuration settings"""
     return {
         'database': DATABASE_CONFIG,
         'api': API_CONFIG,
         'crawler': CRAWLER_CONFIG,
+        'import': IMPORT_CONFIG,
         'spider': SPIDER_CONFIG,
         'logging': LOGGING_CONFIG
     } 
\ No newline at end of file
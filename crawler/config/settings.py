@@ -18,38 +18,122 @@ CONCURRENT_REQUESTS = 16
 CONCURRENT_REQUESTS_PER_DOMAIN = 8
 
 # Configure delays (be respectful to servers)
-DOWNLOAD_DELAY = 0.5
-RANDOMIZE_DOWNLOAD_DELAY = 0.5  # 0.25 to 0.75 * DOWNLOAD_DELAY
+# A slot with a delay sends one request per delay whatever its concurrency, so there is
+# no fixed delay: the adaptive controller below adds one when a site pushes back
+DOWNLOAD_DELAY = 0
+RANDOMIZE_DOWNLOAD_DELAY = 0.5  # Backoff delays vary between 0.5 and 1.5 times their value
 
-# Enable AutoThrottle for automatic delay adjustment
-AUTOTHROTTLE_ENABLED = True
-AUTOTHROTTLE_START_DELAY = 0.5
-AUTOTHROTTLE_MAX_DELAY = 3.0
-AUTOTHROTTLE_TARGET_CONCURRENCY = 2.0
-AUTOTHROTTLE_DEBUG = False  # Enable to see throttling stats
+# Adaptive per-slot concurrency (extensions/adaptive_concurrency.py) replaces AutoThrottle:
+# concurrency grows while a site stays fast and error free, DOWNLOAD_DELAY is the delay floor
+AUTOTHROTTLE_ENABLED = False
+ADAPTIVE_CONCURRENCY_ENABLED = True
+ADAPTIVE_CONCURRENCY_START = 2  # Concurrency of a new download slot
+ADAPTIVE_CONCURRENCY_MIN = 1
+ADAPTIVE_CONCURRENCY_MAX = 8  # Per slot; CONCURRENT_REQUESTS still caps the total
+ADAPTIVE_CONCURRENCY_INCREASE = 1.0  # Added per round of healthy responses
+ADAPTIVE_CONCURRENCY_BACKOFF = 0.5  # Concurrency multiplier on 429/5xx and download errors
+ADAPTIVE_CONCURRENCY_BACKOFF_HTTP_CODES = [429, 500, 502, 503, 504]
+ADAPTIVE_CONCURRENCY_LATENCY_TOLERANCE = 2.0  # Stop growing when latency exceeds this multiple of the best seen
+ADAPTIVE_CONCURRENCY_MAX_DELAY = 10.0  # Delay backoff ceiling once concurrency is at its minimum
+ADAPTIVE_CONCURRENCY_MAX_RETRY_AFTER = 300.0  # Longest Retry-After pause honored
+
+# Per-spider settings used by run_all_crawlers.py, which runs every spider in one process:
+# each spider's own concurrency budget (the adaptive controller still works within it), plus
+# whatever that spider's own runner sets, so both ways of running it behave the same
+# (site rules such as robots.txt and cookies live in the spider's custom_settings)
+CRAWL_BUDGETS = {
+    'fire_mountain_gems': {'CONCURRENT_REQUESTS': 8, 'ADAPTIVE_CONCURRENCY_MAX': 8},
+    'miyuki_directory': {
+        'CONCURRENT_REQUESTS': 16,
+        'ADAPTIVE_CONCURRENCY_MAX': 8,
+        'POSTGRES_PIPELINE_ENABLED': True,  # run_miyuki_directory_crawler.py loads beads while crawling by default
+    },
+}
 
 # Memory usage optimization
 MEMUSAGE_ENABLED = True
 MEMUSAGE_LIMIT_MB = 2048  # 2GB limit
 MEMUSAGE_WARNING_MB = 1536  # Warning at 1.5GB
 
+# Bead feed output (compact NDJSON, written in batches)
+BEAD_FEED_FLUSH_ITEMS = 500  # Flush after this many records...
+BEAD_FEED_FLUSH_BYTES = 1024 * 1024  # ...or this many buffered bytes...
+BEAD_FEED_FLUSH_SECONDS = 5.0  # ...or when this long has passed since the last flush
+BEAD_FEED_COMPRESSION = os.getenv('BEAD_FEED_COMPRESSION') or None  # None, 'gzip' or 'zstd'
+BEAD_FEED_S3_UPLOAD_ENABLED = True  # Stream the feed to S3 during the crawl when AWS_* env vars are set
+BEAD_FEED_S3_PART_SIZE = 8 * 1024 * 1024  # Multipart part size (S3 minimum is 5MB)
+BEAD_FEED_S3_MAX_RETRIES = 3  # Retries per failed part
+BEAD_FEED_S3_UPLOAD_THREADS = 2  # Parts uploaded concurrently
+BEAD_FEED_S3_MAX_PENDING_PARTS = 4  # Parts buffered for upload before scraped items are held (off the reactor thread) until S3 catches up
+BEAD_FEED_DELTA_ENABLED = True  # Also write <feed>.delta.ndjson: beads added, changed or removed since the last run
+BEAD_FEED_HASH_INDEX_DIR = 'data/feed_hashes'  # Per-spider record hashes of the last run, compared against by the next one
+BEAD_FEED_S3_FULL_SNAPSHOTS = False  # Upload every full feed too, not just the delta, once a previous run's hashes exist
+
+# Item pipelines
+ITEM_PIPELINES = {
+    'pipelines.images.BeadImagePipeline': 400,  # Sets item['image'] before the feed and database see the item
+    'pipelines.feed_export.FeedExportPipeline': 800,  # Streams items to the spider's output_file
+    'pipelines.postgres.PostgresBeadPipeline': 900,  # Loads beads while crawling (when enabled)
+}
+
+# Bead images (downloaded through the engine like pages, stored once per distinct content)
+BEAD_IMAGES_ENABLED = True
+BEAD_IMAGES_STORE = 'data/bead-images'  # Served by the UI under /bead-images/
+BEAD_IMAGES_INDEX = 'data/image_index.sqlite3'  # URL -> content hash, lets recrawls skip downloads
+BEAD_IMAGES_CONCURRENCY = 8  # Most image requests in the downloader at once, leaving the other slots to pages
+BEAD_IMAGES_TIMEOUT = 30.0  # download_timeout of image requests
+BEAD_IMAGES_WAIT_TIMEOUT = 10.0  # Longest an item waits for its image; slower ones finish in the background for the next crawl (None: no limit, 0: never wait)
+BEAD_IMAGES_VARIANTS = {}  # e.g. {'thumb': 160, 'card': 480} (longest edge, needs Pillow)
+
+# Direct-to-Postgres loading (enabled by run_miyuki_directory_crawler.py)
+POSTGRES_PIPELINE_ENABLED = False
+POSTGRES_PIPELINE_BATCH_SIZE = 500  # Rows per batch
+POSTGRES_PIPELINE_MAX_PENDING_BATCHES = 2  # Batches in flight (and pooled connections) before the crawl is held back
+POSTGRES_PIPELINE_BACKEND = None  # 'values' or 'copy'; defaults to IMPORT_BACKEND
+POSTGRES_PIPELINE_MODE = 'upsert'  # 'insert' or 'upsert'
+POSTGRES_PIPELINE_BRAND_ID = 1  # Miyuki
+
+# Known product code index (skip detail fetches for beads already in the database)
+# None: only for insert-only loads without a delta feed, since a skipped bead's changes are never seen
+KNOWN_CODES_INDEX_ENABLED = None
+IMPORT_MODE = None  # Set by the runners to the --mode the feed is loaded with; defaults to IMPORT_CONFIG['mode']
+KNOWN_CODES_INDEX_PATH = 'data/known_product_codes.txt'
+KNOWN_CODES_INDEX_TTL = 6 * 3600  # Refresh from Postgres when older than 6 hours
+KNOWN_CODES_INDEX_FORCE_REFRESH = False
+
+# Sitemap discovery (-a discovery=sitemap): only products whose sitemap <lastmod> is after
+# the start of the spider's last finished sitemap crawl are fetched
+CRAWL_HISTORY_PATH = 'data/crawl_history.json'
+
+# Store API discovery (-a discovery=store_api): products per JSON page, at most 100
+STORE_API_PAGE_SIZE = 100
+
 # Enable or disable downloader middlewares
 DOWNLOADER_MIDDLEWARES = {
     'scrapy.downloadermiddlewares.useragent.UserAgentMiddleware': None,
     'scrapy.downloadermiddlewares.retry.RetryMiddleware': 90,
     'scrapy.downloadermiddlewares.httpproxy.HttpProxyMiddleware': 110,
+    'middlewares.conditional_requests.ConditionalRequestMiddleware': 580,
 }
 
+# Conditional requests (ETag / Last-Modified revalidation of detail pages)
+CONDITIONAL_REQUESTS_ENABLED = True
+CONDITIONAL_REQUESTS_STORE = 'data/http_validators.sqlite3'
+
 # Retry configuration
 RETRY_TIMES = 3
 RETRY_HTTP_CODES = [500, 502, 503, 504, 408, 429]
 
 # Enable and configure HTTP caching (disabled by default)
 HTTPCACHE_ENABLED = True
-HTTPCACHE_EXPIRATION_SECS = 3600  # Cache for 1 hour during development
+HTTPCACHE_EXPIRATION_SECS = 0  # No hard expiry: the policy revalidates stale pages and the store is size-bounded
 HTTPCACHE_DIR = 'httpcache'
-HTTPCACHE_IGNORE_HTTP_CODES = [404, 500, 503]
-HTTPCACHE_STORAGE = 'scrapy.extensions.httpcache.FilesystemCacheStorage'
+HTTPCACHE_IGNORE_HTTP_CODES = [304, 404, 500, 503]
+HTTPCACHE_STORAGE = 'extensions.httpcache.SqliteCacheStorage'  # One compressed SQLite file per spider
+HTTPCACHE_POLICY = 'extensions.httpcache.HeuristicRFC2616Policy'
+HTTPCACHE_FALLBACK_FRESHNESS_SECS = 3600  # Pages without caching headers stay fresh for 1 hour during development
+HTTPCACHE_SQLITE_MAX_BYTES = 512 * 1024 * 1024  # Least recently used responses are evicted beyond this
+HTTPCACHE_SQLITE_COMPRESSION_LEVEL = 6
 
 # User agent rotation (optional)
 USER_AGENT = 'PatternMaker/1.0 (+https://kohana-beads.com)'
@@ -59,4 +143,23 @@ LOG_LEVEL = 'INFO'
 LOG_FORMAT = '%(asctime)s [%(name)s] %(levelname)s: %(message)s'
 
 # Stats collection
-STATS_CLASS = 'scrapy.statscollectors.MemoryStatsCollector' 
\ No newline at end of file
+STATS_CLASS = 'scrapy.statscollectors.MemoryStatsCollector' 
+# Crawl telemetry (latency / callback histograms, queue depths, throughput)
+EXTENSIONS = {
+    'extensions.telemetry.CrawlTelemetry': 500,
+    'extensions.adaptive_concurrency.AdaptiveConcurrency': 510,  # See ADAPTIVE_CONCURRENCY_* above
+}
+SPIDER_MIDDLEWARES = {
+    'extensions.telemetry.CallbackTimingMiddleware': 950,  # Next to the spider, so only callback time is counted
+}
+TELEMETRY_ENABLED = True
+TELEMETRY_DIR = 'data/telemetry'  # <spider>.prom for node_exporter's textfile collector, <spider>-stats.json at close
+TELEMETRY_EXPORT_INTERVAL = 30.0  # Seconds between Prometheus exports and progress lines
+
+# Distributed crawling (used by run_distributed_crawl.py, which sets SCHEDULER per worker)
+DISTRIBUTED_QUEUE_URL = 'sqlite:///data/distributed/queue.sqlite3'  # Shared request queue and fingerprint set
+DISTRIBUTED_WORKER_ID = None  # Defaults to <hostname>-<pid>
+DISTRIBUTED_CLAIM_BATCH = 4  # Requests a worker takes from the shared queue at a time; small keeps work spread evenly
+DISTRIBUTED_MAX_IN_FLIGHT = 8  # Unfinished claims per worker; the rest stays in the queue for other workers
+DISTRIBUTED_LEASE_SECONDS = 600  # Claims of a worker that vanished are handed out again after this
+DISTRIBUTED_MAX_ATTEMPTS = 3
@@ -0,0 +1,48 @@
+"""
+Worker feed merge
+Combines the feeds written by distributed crawl workers into the single feed
+the importer reads
+"""
+
+import logging
+from pathlib import Path
+from typing import Dict, Iterable, List, Set, Union
+
+from feeds.writer import DONE_SUFFIX, PART_SUFFIX, FeedWriter
+from importers.feed_reader import iter_feed
+
+logger = logging.getLogger(__name__)
+
+
+def worker_feed_paths(directory: Union[str, Path], stem: str) -> List[Path]:
+    """Finished worker feeds named ``<stem>.<worker>.ndjson[.gz|.zst]`` in a directory"""
+    return sorted(
+        path for path in Path(directory).glob(f"{stem}.*.ndjson*")
+        if not path.name.endswith((PART_SUFFIX, DONE_SUFFIX))
+    )
+
+
+def merge_feeds(paths: Iterable[Path], writer: FeedWriter) -> Dict[str, int]:
+    """Stream every record of the worker feeds into one writer, dropping repeated product codes
+
+    Each detail page is crawled by exactly one worker, so duplicates only
+    appear if a lease expired while the original worker was still running.
+    """
+    seen: Set[str] = set()
+    counts = {'feeds': 0, 'records': 0, 'duplicates': 0}
+    with writer:
+        for path in paths:
+            counts['feeds'] += 1
+            for record in iter_feed(path):
+                product_code = record.get('product_code')
+                if product_code in seen:
+                    counts['duplicates'] += 1
+                    continue
+                if product_code:
+                    seen.add(product_code)
+                writer.write(record)
+                counts['records'] += 1
+            logger.info(f"Merged {path}")
+    logger.info(f"Merged {counts['records']} records from {counts['feeds']} worker feeds into {writer.path} "
+                f"({counts['duplicates']} duplicates dropped)")
+    return counts
@@ -0,0 +1,154 @@
+"""
+Shared request queue
+Persistent request queue with a fingerprint dedup set that several crawl
+workers claim work from. Requests are leased to the worker that claims them
+and only leave the queue once that worker reports them done.
+"""
+
+import logging
+import pickle
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+PENDING = 'pending'
+CLAIMED = 'claimed'
+DONE = 'done'
+ABANDONED = 'abandoned'
+
+
+class SqliteRequestQueue:
+    """Request queue backend on one SQLite file
+
+    Good for several worker processes on one host, or on hosts sharing a
+    local-disk-backed volume (SQLite locking is unreliable on NFS). Every
+    request is stored once per fingerprint, so a URL discovered by several
+    workers is only crawled once; requests without a fingerprint
+    (``dont_filter``) are always added. A claimed request whose worker
+    disappears is handed out again once its lease expires, up to
+    ``max_attempts`` times.
+    """
+
+    def __init__(self, path: Union[str, Path], lease_seconds: float = 600.0, max_attempts: int = 3):
+        self.path = Path(path)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._connection: Optional[sqlite3.Connection] = None
+
+    def open(self):
+        """Open (and create if needed) the queue"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Autocommit; claims take the write lock explicitly with BEGIN IMMEDIATE
+        self._connection = sqlite3.connect(str(self.path), timeout=30.0, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS requests (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                fingerprint BLOB UNIQUE,
+                priority INTEGER NOT NULL,
+                payload BLOB NOT NULL,
+                state TEXT NOT NULL,
+                worker TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                claimed_at REAL
+            )
+        """)
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS requests_pending ON requests (state, priority DESC, id)"
+        )
+
+    def close(self):
+        if self._connection:
+            self._connection.close()
+            self._connection = None
+
+    def reset(self):
+        """Forget every request, so the next crawl starts from scratch"""
+        self._connection.execute("DELETE FROM requests")
+
+    def push(self, request: Dict[str, Any], fingerprint: Optional[bytes], priority: int = 0) -> bool:
+        """Add a serialized request; False if its fingerprint was already queued or crawled"""
+        cursor = self._connection.execute(
+            "INSERT OR IGNORE INTO requests (fingerprint, priority, payload, state) VALUES (?, ?, ?, ?)",
+            (fingerprint, priority, pickle.dumps(request, protocol=4), PENDING)
+        )
+        return cursor.rowcount == 1
+
+    def claim(self, worker: str, limit: int) -> List[Tuple[int, Dict[str, Any]]]:
+        """Lease up to ``limit`` requests, highest priority first, re-leasing expired claims"""
+        now = time.time()
+        self._connection.execute("BEGIN IMMEDIATE")
+        try:
+            self._connection.execute(
+                "UPDATE requests SET state = CASE WHEN attempts >= ? THEN ? ELSE ? END, worker = NULL "
+                "WHERE state = ? AND claimed_at < ?",
+                (self.max_attempts, ABANDONED, PENDING, CLAIMED, now - self.lease_seconds)
+            )
+            rows = self._connection.execute(
+                "SELECT id, payload FROM requests WHERE state = ? ORDER BY priority DESC, id LIMIT ?",
+                (PENDING, limit)
+            ).fetchall()
+            self._connection.executemany(
+                "UPDATE requests SET state = ?, worker = ?, attempts = attempts + 1, claimed_at = ? WHERE id = ?",
+                [(CLAIMED, worker, now, request_id) for request_id, _ in rows]
+            )
+            self._connection.execute("COMMIT")
+        except Exception:
+            self._connection.execute("ROLLBACK")
+            raise
+        return [(request_id, pickle.loads(payload)) for request_id, payload in rows]
+
+    def complete(self, request_id: int):
+        """Mark a claimed request as crawled"""
+        self._connection.execute("UPDATE requests SET state = ? WHERE id = ?", (DONE, request_id))
+
+    def abandon(self, request_id: int):
+        """Give up a claimed request that failed for good"""
+        self._connection.execute("UPDATE requests SET state = ? WHERE id = ?", (ABANDONED, request_id))
+
+    def release(self, worker: str) -> int:
+        """Give up every request a worker still holds, returning how many there were
+
+        Called when the worker's engine is idle, so whatever it still holds was
+        not completed (a download that failed for good, for instance).
+        """
+        cursor = self._connection.execute(
+            "UPDATE requests SET state = ? WHERE state = ? AND worker = ?", (ABANDONED, CLAIMED, worker)
+        )
+        return cursor.rowcount
+
+    def has_pending(self) -> bool:
+        return self._connection.execute(
+            "SELECT 1 FROM requests WHERE state = ? LIMIT 1", (PENDING,)
+        ).fetchone() is not None
+
+    def counts(self) -> Dict[str, int]:
+        """Number of requests in each state"""
+        counts = dict.fromkeys((PENDING, CLAIMED, DONE, ABANDONED), 0)
+        counts.update(self._connection.execute("SELECT state, COUNT(*) FROM requests GROUP BY state").fetchall())
+        return counts
+
+
+BACKENDS = {
+    'sqlite': SqliteRequestQueue,
+}
+
+
+def open_request_queue(url: str, **options) -> SqliteRequestQueue:
+    """Open the queue backend named by a URL such as ``sqlite:///data/distributed/queue.sqlite3``
+
+    ``sqlite:///relative/path`` is relative to the working directory, as
+    Scrapy's data paths are; ``sqlite:////abs/path`` is absolute.
+    """
+    parsed = urlparse(url)
+    backend = BACKENDS.get(parsed.scheme)
+    if backend is None:
+        raise ValueError(f"Unknown request queue backend '{parsed.scheme}' (expected one of {', '.join(BACKENDS)})")
+    queue = backend(parsed.path[1:], **options)
+    queue.open()
+    return queue
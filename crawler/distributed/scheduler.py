@@ -0,0 +1,251 @@
+"""
+Distributed scheduler
+Scrapy scheduler that keeps requests in a shared queue, so several crawl
+workers (processes or hosts) split one crawl between them
+"""
+
+import inspect
+import logging
+import os
+import socket
+from collections import deque
+from typing import Any, Callable, Deque, Iterable, Optional, Set
+
+from scrapy import Request, Spider, signals
+from scrapy.core.scheduler import BaseScheduler
+from scrapy.exceptions import DontCloseSpider
+from scrapy.http import Response
+from scrapy.utils.misc import arg_to_iter
+from scrapy.utils.request import request_from_dict
+from twisted.python.failure import Failure
+
+from distributed.queue import CLAIMED, open_request_queue
+
+logger = logging.getLogger(__name__)
+
+META_KEY = 'distributed_id'
+
+
+class DistributedScheduler(BaseScheduler):
+    """SCHEDULER backed by the queue at DISTRIBUTED_QUEUE_URL
+
+    Every worker pushes the requests its spider yields into the shared queue,
+    where the fingerprint set drops ones any worker has already seen (even
+    with ``dont_filter``), and
+    claims batches of DISTRIBUTED_CLAIM_BATCH requests to crawl, holding at
+    most DISTRIBUTED_MAX_IN_FLIGHT unfinished claims at a time. A claimed
+    request is marked done by DistributedCompletionMiddleware once its callback
+    (or the exception handling for a failing callback or error response) has
+    run, marked failed by DistributedFailureMiddleware when its download fails
+    for good, and finished after its errback's output when it has one.
+    Retries and redirects of a claimed request stay with the worker
+    that holds it. A worker with nothing left to do keeps waiting while other
+    workers still hold claims, since their callbacks may queue more work.
+    """
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.queue_url = settings.get('DISTRIBUTED_QUEUE_URL', 'sqlite:///data/distributed/queue.sqlite3')
+        self.worker = settings.get('DISTRIBUTED_WORKER_ID') or f"{socket.gethostname()}-{os.getpid()}"
+        self.claim_batch = settings.getint('DISTRIBUTED_CLAIM_BATCH', 4)
+        self.max_in_flight = settings.getint('DISTRIBUTED_MAX_IN_FLIGHT', 8)
+        self.lease_seconds = settings.getfloat('DISTRIBUTED_LEASE_SECONDS', 600.0)
+        self.max_attempts = settings.getint('DISTRIBUTED_MAX_ATTEMPTS', 3)
+        self.queue = None
+        self.spider: Optional[Spider] = None
+        # Claimed requests not handed to the engine yet, plus retries/redirects of claimed ones
+        self._local: Deque[Request] = deque()
+        self._in_flight: Set[int] = set()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        scheduler = cls(crawler)
+        crawler.distributed_scheduler = scheduler
+        crawler.signals.connect(scheduler.spider_idle, signal=signals.spider_idle)
+        return scheduler
+
+    def open(self, spider: Spider):
+        self.spider = spider
+        self.queue = open_request_queue(
+            self.queue_url, lease_seconds=self.lease_seconds, max_attempts=self.max_attempts
+        )
+        logger.info(f"Worker {self.worker} sharing request queue {self.queue_url}")
+
+    def close(self, reason: str):
+        if self.queue is None:
+            return
+        counts = self.queue.counts()
+        logger.info(f"Worker {self.worker} closing ({reason}); shared queue: {counts}")
+        self.queue.close()
+
+    def has_pending_requests(self) -> bool:
+        if self._local:
+            return True
+        # At the cap nothing can be claimed; reporting the shared queue's work anyway would keep the engine
+        # from going idle, and spider_idle is where claims that never finished get released
+        return len(self._in_flight) < self.max_in_flight and self.queue.has_pending()
+
+    def enqueue_request(self, request: Request) -> bool:
+        if META_KEY in request.meta:
+            # A retry or redirect of a request this worker already holds
+            self._local.append(request)
+            return True
+
+        # dont_filter is not honored here: every worker yields the same start requests, which Scrapy
+        # marks dont_filter, and retries/redirects (the other users of the flag) never get this far
+        fingerprint = self.crawler.request_fingerprinter.fingerprint(request)
+        added = self.queue.push(request.to_dict(spider=self.spider), fingerprint, request.priority)
+        self.stats.inc_value('distributed/enqueued' if added else 'distributed/duplicate')
+        return added
+
+    def next_request(self) -> Optional[Request]:
+        if not self._local and len(self._in_flight) < self.max_in_flight:
+            # Without a cap the downloader would hoard CONCURRENT_REQUESTS claims while other workers idle
+            self._claim()
+        if not self._local:
+            return None
+        return self._local.popleft()
+
+    def __len__(self) -> int:
+        return len(self._local)
+
+    def _claim(self):
+        limit = min(self.claim_batch, self.max_in_flight - len(self._in_flight))
+        claimed = self.queue.claim(self.worker, limit)
+        for request_id, serialized in claimed:
+            request = request_from_dict(serialized, spider=self.spider)
+            request.meta[META_KEY] = request_id
+            if request.errback is not None:
+                request.errback = self._finishing_errback(request.errback, request_id)
+            self._local.append(request)
+            self._in_flight.add(request_id)
+        if claimed:
+            self.stats.inc_value('distributed/claimed', len(claimed))
+
+    def request_done(self, request: Optional[Request]):
+        """Mark the shared-queue entry behind a request as crawled"""
+        if request is not None:
+            self._finish(request.meta.get(META_KEY), failed=False)
+
+    def request_failed(self, request: Request):
+        """Give up the shared-queue entry behind a request whose download failed for good"""
+        self._finish(request.meta.get(META_KEY), failed=True)
+
+    def _finish(self, request_id: Optional[int], failed: bool):
+        # A claim can be reported more than once (an error response goes through the exception and
+        # the output hooks); only the first report counts
+        if request_id not in self._in_flight:
+            return
+        self._in_flight.discard(request_id)
+        if failed:
+            self.queue.abandon(request_id)
+            self.stats.inc_value('distributed/failed')
+        else:
+            self.queue.complete(request_id)
+            self.stats.inc_value('distributed/completed')
+
+    def _finishing_errback(self, errback: Callable, request_id: int) -> Callable:
+        """Wrap an errback so the claim is given up once its output has been consumed
+
+        Errback output does not pass through spider middlewares, so
+        DistributedCompletionMiddleware never sees it.
+        """
+        def finish_after_errback(failure: Failure):
+            try:
+                output = errback(failure)
+            except Exception:
+                self._finish(request_id, failed=True)
+                raise
+            if isinstance(output, Failure):
+                self._finish(request_id, failed=True)
+                return output
+            return self._finish_after(output, request_id)
+
+        return finish_after_errback
+
+    async def _finish_after(self, output: Any, request_id: int):
+        """Pass an errback's output through, then give up its claim"""
+        try:
+            if inspect.isawaitable(output):
+                output = await output
+            if hasattr(output, '__aiter__'):
+                async for result in output:
+                    yield result
+            else:
+                for result in arg_to_iter(output):
+                    yield result
+        finally:
+            self._finish(request_id, failed=True)
+
+    def spider_idle(self, spider: Spider):
+        """Stay open while other workers may still add requests"""
+        # Nothing is in flight here, so anything still claimed by this worker failed for good
+        abandoned = self.queue.release(self.worker)
+        self._in_flight.clear()
+        if abandoned:
+            self.stats.inc_value('distributed/abandoned', abandoned)
+            logger.warning(f"Worker {self.worker} gave up {abandoned} request(s) that never completed")
+
+        if self.queue.has_pending() or self.queue.counts()[CLAIMED]:
+            raise DontCloseSpider
+
+
+class DistributedCompletionMiddleware:
+    """Spider middleware telling DistributedScheduler when a callback has finished
+
+    A request only counts as done once its callback's output has been fully
+    consumed, so the requests it yields are in the shared queue before other
+    workers decide whether the crawl is over.
+    """
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def process_spider_output(self, response: Response, result: Iterable, spider: Optional[Spider] = None):
+        try:
+            yield from result
+        finally:
+            self._done(response)
+
+    async def process_spider_output_async(self, response: Response, result, spider: Optional[Spider] = None):
+        try:
+            async for output in result:
+                yield output
+        finally:
+            self._done(response)
+
+    def process_spider_exception(self, response: Response, exception: Exception, spider: Optional[Spider] = None):
+        """A callback that raised, or an error response (HttpError), is as crawled as it will get"""
+        self._done(response)
+
+    def _done(self, response: Response):
+        scheduler = getattr(self.crawler, 'distributed_scheduler', None)
+        if scheduler is not None:
+            scheduler.request_done(response.request)
+
+
+class DistributedFailureMiddleware:
+    """Downloader middleware telling DistributedScheduler when a download has failed for good
+
+    Sits before RetryMiddleware, so it only sees exceptions nothing retried.
+    Requests with an errback are given up after the errback has run instead.
+    """
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def process_exception(self, request: Request, exception: Exception, spider: Optional[Spider] = None):
+        scheduler = getattr(self.crawler, 'distributed_scheduler', None)
+        if scheduler is not None and request.errback is None:
+            scheduler.request_failed(request)
+        return None
@@ -0,0 +1,207 @@
+"""
+Adaptive concurrency
+Per download slot AIMD controller: concurrency grows additively while a site
+answers quickly and without errors, is cut multiplicatively on 429/5xx and
+download errors, and the slot pauses for as long as Retry-After asks
+"""
+
+import logging
+import time
+import weakref
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+from scrapy import Request, Spider, signals
+from scrapy.core import downloader as scrapy_downloader
+from scrapy.exceptions import NotConfigured
+from scrapy.http import Response
+
+logger = logging.getLogger(__name__)
+
+# The clock the downloader stamps Slot.lastseen with (time.time before Scrapy moved it to time.monotonic)
+slot_clock = getattr(scrapy_downloader, 'monotonic', None) or scrapy_downloader.time
+
+# Smoothing of the recent latency average and of the long-run baseline it is compared with
+LATENCY_EWMA_WEIGHT = 0.3
+BASELINE_EWMA_WEIGHT = 0.02
+# Delay a slot starts from once concurrency is at its floor and the site still pushes back,
+# and how much of it each healthy response takes off again
+MIN_BACKOFF_DELAY = 0.25
+DELAY_RECOVERY = 0.9
+
+
+@dataclass
+class SlotLimits:
+    """Controller state for one download slot"""
+    concurrency: float
+    delay: float
+    latency: Optional[float] = None  # Recent download latency (EWMA)
+    baseline_latency: Optional[float] = None  # Long-run download latency (slow EWMA)
+    last_backoff: float = 0.0
+    paused_until: float = 0.0
+    backoffs: int = 0
+
+
+class AdaptiveConcurrency:
+    """Extension adjusting every download slot's concurrency and delay as responses arrive
+
+    Replaces AutoThrottle (which only tunes the delay towards a fixed target
+    concurrency). Every healthy response (recent latency within
+    ADAPTIVE_CONCURRENCY_LATENCY_TOLERANCE times the slot's long-run average) adds
+    ADAPTIVE_CONCURRENCY_INCREASE / concurrency, so concurrency grows by about
+    one per round of requests, after any backoff delay has been wound down to
+    DOWNLOAD_DELAY. A response with a status in
+    ADAPTIVE_CONCURRENCY_BACKOFF_HTTP_CODES or a download error multiplies
+    concurrency by ADAPTIVE_CONCURRENCY_BACKOFF (at most once per round
+    trip); at ADAPTIVE_CONCURRENCY_MIN the delay grows instead, up to
+    ADAPTIVE_CONCURRENCY_MAX_DELAY. Retry-After on a 429 or 503 holds the slot
+    back for that long (capped at ADAPTIVE_CONCURRENCY_MAX_RETRY_AFTER), so the
+    RetryMiddleware retry waits too. Current limits are kept in the stats as
+    ``adaptive_concurrency/<slot>/concurrency`` and ``.../delay``.
+    """
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        if not settings.getbool('ADAPTIVE_CONCURRENCY_ENABLED'):
+            raise NotConfigured
+        if settings.getbool('AUTOTHROTTLE_ENABLED'):
+            logger.warning("AutoThrottle is enabled as well and will fight the adaptive concurrency controller over delays")
+
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.min_concurrency = settings.getint('ADAPTIVE_CONCURRENCY_MIN', 1)
+        self.max_concurrency = settings.getint('ADAPTIVE_CONCURRENCY_MAX', 8)
+        self.start_concurrency = settings.getint('ADAPTIVE_CONCURRENCY_START', 2)
+        self.increase = settings.getfloat('ADAPTIVE_CONCURRENCY_INCREASE', 1.0)
+        self.backoff = settings.getfloat('ADAPTIVE_CONCURRENCY_BACKOFF', 0.5)
+        self.latency_tolerance = settings.getfloat('ADAPTIVE_CONCURRENCY_LATENCY_TOLERANCE', 2.0)
+        self.min_delay = settings.getfloat('DOWNLOAD_DELAY')
+        self.max_delay = settings.getfloat('ADAPTIVE_CONCURRENCY_MAX_DELAY', 10.0)
+        self.max_retry_after = settings.getfloat('ADAPTIVE_CONCURRENCY_MAX_RETRY_AFTER', 300.0)
+        self.backoff_codes = set(int(code) for code in settings.getlist(
+            'ADAPTIVE_CONCURRENCY_BACKOFF_HTTP_CODES', [429, 500, 502, 503, 504]
+        ))
+        self.slots: Dict[str, SlotLimits] = {}
+        # Requests that got a response; any other request leaving the downloader failed
+        self._answered = weakref.WeakSet()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        extension = cls(crawler)
+        crawler.signals.connect(extension.response_downloaded, signal=signals.response_downloaded)
+        crawler.signals.connect(extension.request_left_downloader, signal=signals.request_left_downloader)
+        crawler.signals.connect(extension.spider_closed, signal=signals.spider_closed)
+        return extension
+
+    def response_downloaded(self, response: Response, request: Request, spider: Spider):
+        """Adjust the slot before the downloader picks its next request"""
+        self._answered.add(request)
+        key = request.meta.get('download_slot')
+        limits = self._limits(key)
+        now = slot_clock()
+
+        if response.status in self.backoff_codes:
+            retry_after = None
+            if response.status in (429, 503):
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            self._back_off(key, limits, now, retry_after)
+        else:
+            self._grow(limits, request.meta.get('download_latency'), now)
+        self._apply(key, limits, now)
+
+    def request_left_downloader(self, request: Request, spider: Spider):
+        """Back off after download errors (timeouts, refused or dropped connections)"""
+        if request in self._answered:
+            self._answered.discard(request)
+            return
+        key = request.meta.get('download_slot')
+        limits = self._limits(key)
+        now = slot_clock()
+        self._back_off(key, limits, now, None)
+        self._apply(key, limits, now)
+
+    def spider_closed(self, spider: Spider):
+        for key, limits in self.slots.items():
+            logger.info(f"Adaptive concurrency for {key}: ended at {int(limits.concurrency)} concurrent, "
+                        f"{limits.delay:.2f}s delay after {limits.backoffs} backoffs")
+
+    def _limits(self, key: str) -> SlotLimits:
+        if key not in self.slots:
+            self.slots[key] = SlotLimits(concurrency=float(self.start_concurrency), delay=self.min_delay)
+        return self.slots[key]
+
+    def _grow(self, limits: SlotLimits, latency: Optional[float], now: float):
+        """Additive increase, as long as latency is not climbing above its long-run level"""
+        if latency is not None:
+            limits.latency = _ewma(limits.latency, latency, LATENCY_EWMA_WEIGHT)
+            limits.baseline_latency = _ewma(limits.baseline_latency, latency, BASELINE_EWMA_WEIGHT)
+            if limits.latency > limits.baseline_latency * self.latency_tolerance:
+                return
+        if now < limits.paused_until:
+            return
+
+        if limits.delay > self.min_delay:
+            # Undo delay backoff before adding concurrency again
+            limits.delay *= DELAY_RECOVERY
+            if limits.delay < self.min_delay + 0.01:
+                limits.delay = self.min_delay
+            return
+        limits.concurrency = min(self.max_concurrency, limits.concurrency + self.increase / limits.concurrency)
+
+    def _back_off(self, key: str, limits: SlotLimits, now: float, retry_after: Optional[float]):
+        """Multiplicative decrease, once per round trip so one burst of errors counts once"""
+        if retry_after:
+            pause = min(retry_after, self.max_retry_after)
+            if now >= limits.paused_until:
+                self.stats.inc_value('adaptive_concurrency/retry_after_pauses')
+                logger.info(f"{key} asked to retry after {retry_after:.0f}s, pausing it for {pause:.0f}s")
+            limits.paused_until = max(limits.paused_until, now + pause)
+
+        if now - limits.last_backoff < max(limits.latency or 0.0, 1.0):
+            return
+        limits.last_backoff = now
+        limits.backoffs += 1
+        self.stats.inc_value('adaptive_concurrency/backoffs')
+        if limits.concurrency > self.min_concurrency:
+            limits.concurrency = max(self.min_concurrency, limits.concurrency * self.backoff)
+        else:
+            limits.delay = min(self.max_delay, max(limits.delay / self.backoff, MIN_BACKOFF_DELAY))
+        logger.debug(f"Backing off {key}: concurrency {limits.concurrency:.1f}, delay {limits.delay:.2f}s")
+
+    def _apply(self, key: str, limits: SlotLimits, now: float):
+        """Push the limits to the downloader slot and the stats"""
+        slot = self.crawler.engine.downloader.slots.get(key)
+        if slot is None:
+            return
+        slot.concurrency = int(limits.concurrency)
+        if now < limits.paused_until:
+            # The downloader sends nothing on a slot with a delay until lastseen + delay (randomized),
+            # so a lastseen in the future holds it back at least that long
+            slot.lastseen = limits.paused_until
+            slot.delay = max(limits.delay, 0.001)
+        else:
+            slot.delay = limits.delay
+        self.stats.set_value(f'adaptive_concurrency/{key}/concurrency', int(limits.concurrency))
+        self.stats.set_value(f'adaptive_concurrency/{key}/delay', round(limits.delay, 3))
+        self.stats.max_value(f'adaptive_concurrency/{key}/max_concurrency', int(limits.concurrency))
+
+
+def _ewma(average: Optional[float], value: float, weight: float) -> float:
+    return value if average is None else weight * value + (1 - weight) * average
+
+
+def parse_retry_after(value: Optional[bytes]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or an HTTP date)"""
+    if not value:
+        return None
+    text = value.decode('latin-1').strip()
+    if text.isdigit():
+        return float(text)
+    try:
+        retry_at = parsedate_to_datetime(text)
+    except (TypeError, ValueError):
+        return None
+    if retry_at is None:
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
@@ -0,0 +1,170 @@
+"""
+Single-file HTTP cache
+SQLite cache storage with zlib-compressed bodies and size-bounded LRU eviction,
+plus an RFC 2616 policy that falls back to a fixed freshness window for pages
+that send no caching headers
+"""
+
+import logging
+import time
+import zlib
+from pathlib import Path
+from typing import Optional
+
+from scrapy import Request, Spider
+from scrapy.extensions.httpcache import RFC2616Policy
+from scrapy.http import Headers, Response
+from scrapy.responsetypes import responsetypes
+from scrapy.utils.project import data_path
+from w3lib.http import headers_dict_to_raw, headers_raw_to_dict
+
+from storage.sqlite_store import SqliteStore
+
+logger = logging.getLogger(__name__)
+
+
+class SqliteCacheStorage(SqliteStore):
+    """HTTPCACHE_STORAGE backend keeping every cached response of a spider in one SQLite file
+
+    Replaces FilesystemCacheStorage's directory-per-response layout (several
+    files each) with one row per request fingerprint in
+    ``HTTPCACHE_DIR/<spider>.sqlite3``. Headers and bodies are zlib
+    compressed. When the stored (compressed) size exceeds
+    HTTPCACHE_SQLITE_MAX_BYTES, the least recently used responses are evicted
+    down to 90% of the limit. HTTPCACHE_EXPIRATION_SECS is honored as a hard
+    expiry, as by Scrapy's built-in storages.
+    """
+
+    EVICT_TO = 0.9
+    SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS responses (
+            fingerprint BLOB PRIMARY KEY,
+            url TEXT NOT NULL,
+            status INTEGER NOT NULL,
+            headers BLOB NOT NULL,
+            body BLOB NOT NULL,
+            size INTEGER NOT NULL,
+            stored_at REAL NOT NULL,
+            accessed_at REAL NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)",
+    )
+
+    def __init__(self, settings):
+        self.cachedir = Path(data_path(settings['HTTPCACHE_DIR'], createdir=True))
+        # The file is per spider, so its path is only known in open_spider
+        super().__init__(self.cachedir, settings.getint('HTTPCACHE_SQLITE_COMMIT_EVERY', 100))
+        self.expiration_secs = settings.getint('HTTPCACHE_EXPIRATION_SECS')
+        self.max_bytes = settings.getint('HTTPCACHE_SQLITE_MAX_BYTES', 512 * 1024 * 1024)
+        self.compression_level = settings.getint('HTTPCACHE_SQLITE_COMPRESSION_LEVEL', 6)
+        self._fingerprinter = None
+        self._total_bytes = 0
+
+    def open_spider(self, spider: Spider):
+        self.path = self.cachedir / f"{spider.name}.sqlite3"
+        self.open()
+        self._total_bytes = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        self._fingerprinter = spider.crawler.request_fingerprinter
+        logger.debug(f"Using SQLite cache storage in {self.path} ({self._total_bytes} bytes cached)")
+
+    def close_spider(self, spider: Spider):
+        self.close()
+
+    def retrieve_response(self, spider: Spider, request: Request) -> Optional[Response]:
+        """Return the cached response for a request, or None if missing or expired"""
+        fingerprint = self._fingerprinter.fingerprint(request)
+        row = self._connection.execute(
+            "SELECT url, status, headers, body, stored_at FROM responses WHERE fingerprint = ?",
+            (fingerprint,)
+        ).fetchone()
+        if row is None:
+            return None
+        url, status, headers, body, stored_at = row
+        if 0 < self.expiration_secs < time.time() - stored_at:
+            return None
+
+        self._write("UPDATE responses SET accessed_at = ? WHERE fingerprint = ?", (time.time(), fingerprint))
+        request.meta['cache_timestamp'] = stored_at
+
+        headers = Headers(headers_raw_to_dict(zlib.decompress(headers)))
+        body = zlib.decompress(body)
+        response_class = responsetypes.from_args(headers=headers, url=url, body=body)
+        return response_class(url=url, headers=headers, status=status, body=body)
+
+    def store_response(self, spider: Spider, request: Request, response: Response):
+        """Store (or replace) the response for a request, evicting old entries if over budget"""
+        fingerprint = self._fingerprinter.fingerprint(request)
+        headers = zlib.compress(headers_dict_to_raw(response.headers), self.compression_level)
+        body = zlib.compress(response.body, self.compression_level)
+        size = len(headers) + len(body)
+
+        previous = self._connection.execute(
+            "SELECT size FROM responses WHERE fingerprint = ?", (fingerprint,)
+        ).fetchone()
+        now = time.time()
+        self._write("""
+            INSERT OR REPLACE INTO responses (fingerprint, url, status, headers, body, size, stored_at, accessed_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (fingerprint, response.url, response.status, headers, body, size, now, now))
+        self._total_bytes += size - (previous[0] if previous else 0)
+
+        if self.max_bytes and self._total_bytes > self.max_bytes:
+            self._evict()
+
+    def _evict(self):
+        """Drop least recently used responses until the cache is back under EVICT_TO of its budget"""
+        target = self.max_bytes * self.EVICT_TO
+        evicted = 0
+        rows = self._connection.execute("SELECT fingerprint, size FROM responses ORDER BY accessed_at").fetchall()
+        for fingerprint, size in rows:
+            if self._total_bytes <= target:
+                break
+            self._connection.execute("DELETE FROM responses WHERE fingerprint = ?", (fingerprint,))
+            self._total_bytes -= size
+            evicted += 1
+        self.commit()
+        logger.info(f"HTTP cache over {self.max_bytes} bytes, evicted {evicted} least recently used responses")
+
+
+class HeuristicRFC2616Policy(RFC2616Policy):
+    """RFC 2616 caching with a fallback freshness window for pages without caching headers
+
+    Responses carrying max-age, Expires or Last-Modified follow the RFC as in
+    Scrapy's RFC2616Policy, and stale ones are revalidated with
+    If-None-Match / If-Modified-Since. Plain 200 responses with no such hints
+    (WooCommerce listing pages, for example) would otherwise never be cached;
+    they are treated as fresh for HTTPCACHE_FALLBACK_FRESHNESS_SECS instead.
+    HTTPCACHE_IGNORE_HTTP_CODES is honored as well.
+    """
+
+    def __init__(self, settings):
+        super().__init__(settings)
+        self.fallback_freshness = settings.getint('HTTPCACHE_FALLBACK_FRESHNESS_SECS', 3600)
+        self.ignore_http_codes = [int(code) for code in settings.getlist('HTTPCACHE_IGNORE_HTTP_CODES')]
+
+    def should_cache_response(self, response: Response, request: Request) -> bool:
+        if response.status in self.ignore_http_codes:
+            return False
+        if super().should_cache_response(response, request):
+            return True
+        cache_control = self._parse_cachecontrol(response)
+        return response.status == 200 and self.fallback_freshness > 0 and b'no-cache' not in cache_control
+
+    def _compute_freshness_lifetime(self, response: Response, request: Request, now: float) -> float:
+        lifetime = super()._compute_freshness_lifetime(response, request, now)
+        if lifetime:
+            return lifetime
+        cache_control = self._parse_cachecontrol(response)
+        if (b'max-age' in cache_control or b'Expires' in response.headers
+                or b'Last-Modified' in response.headers):
+            # The server gave freshness information, even if it says the page is already stale
+            return lifetime
+        return self.fallback_freshness
+
+    def _compute_current_age(self, response: Response, request: Request, now: float) -> float:
+        if b'Date' not in response.headers and 'cache_timestamp' in request.meta:
+            # No Date header to age the response by; use when it was stored instead
+            return max(0.0, now - request.meta['cache_timestamp'])
+        return super()._compute_current_age(response, request, now)
@@ -0,0 +1,91 @@
+"""
+Prometheus text exposition
+Cumulative-bucket histograms and the text format node_exporter's textfile
+collector reads, for the crawl telemetry extension
+"""
+
+import bisect
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus exposition model"""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile (None when empty or beyond the last bucket)"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return None
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """(le, cumulative count) pairs including +Inf"""
+        pairs = []
+        seen = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            seen += count
+            pairs.append(('+Inf' if bound == float('inf') else repr(bound), seen))
+        return pairs
+
+    def to_dict(self) -> Dict:
+        return {'buckets': dict(self.cumulative()), 'sum': self.sum, 'count': self.count}
+
+
+def crawl_metrics_text(spider_name: str, snapshot: Dict, download_latency: Dict[str, Histogram],
+                       callback_duration: Dict[str, Histogram]) -> str:
+    """Render a CrawlTelemetry snapshot and its histograms as a Prometheus text file"""
+    spider_label = f'spider="{spider_name}"'
+    lines = [
+        '# HELP crawler_items_total Items scraped',
+        '# TYPE crawler_items_total counter',
+        f'crawler_items_total{{{spider_label}}} {snapshot["items"]}',
+        '# HELP crawler_items_per_second Items scraped per second over the last export interval',
+        '# TYPE crawler_items_per_second gauge',
+        f'crawler_items_per_second{{{spider_label}}} {snapshot["items_per_sec"]:.3f}',
+        '# HELP crawler_retries_total Requests retried by RetryMiddleware',
+        '# TYPE crawler_retries_total counter',
+        f'crawler_retries_total{{{spider_label}}} {snapshot["retries"]}',
+        '# HELP crawler_responses_total Responses received by HTTP status',
+        '# TYPE crawler_responses_total counter',
+    ]
+    lines += [f'crawler_responses_total{{{spider_label},status="{status}"}} {count}'
+              for status, count in sorted(snapshot['responses_by_status'].items())]
+    lines += [
+        '# HELP crawler_queue_depth Requests currently waiting or in flight, by stage',
+        '# TYPE crawler_queue_depth gauge',
+    ]
+    lines += [f'crawler_queue_depth{{{spider_label},queue="{queue}"}} {depth}'
+              for queue, depth in snapshot['queues'].items()]
+    lines += _histogram_lines('crawler_download_latency_seconds', 'Download latency by domain',
+                              spider_label, 'domain', download_latency.items())
+    lines += _histogram_lines('crawler_callback_duration_seconds', 'Spider callback execution time',
+                              spider_label, 'callback', callback_duration.items())
+    return '\n'.join(lines) + '\n'
+
+
+def _histogram_lines(name: str, help_text: str, spider_label: str, label: str,
+                     histograms: Iterable[Tuple[str, Histogram]]) -> List[str]:
+    lines = [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+    for value, histogram in sorted(histograms, key=lambda pair: pair[0]):
+        labels = f'{spider_label},{label}="{value}"'
+        for bound, count in histogram.cumulative():
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+        lines.append(f'{name}_sum{{{labels}}} {histogram.sum:.6f}')
+        lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+    return lines
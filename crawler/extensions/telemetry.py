@@ -0,0 +1,236 @@
+"""
+Crawl telemetry
+Download latency per domain, callback execution time per callback, queue
+depths and throughput, exported periodically as a Prometheus text file and
+dumped together with the crawl stats as JSON when the spider closes
+"""
+
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+from urllib.parse import urlparse
+
+from scrapy import Request, Spider, signals
+from scrapy.exceptions import NotConfigured
+from scrapy.http import Response
+from twisted.internet import task
+
+from extensions.prometheus import Histogram, crawl_metrics_text
+from storage.atomic_file import atomic_write
+
+logger = logging.getLogger(__name__)
+
+# Histogram upper bounds in seconds (Prometheus ``le`` labels)
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+CALLBACK_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+STATUS_COUNT_PREFIX = 'downloader/response_status_count/'
+
+
+class CrawlTelemetry:
+    """Extension collecting where crawl time goes and exporting it for monitoring
+
+    Every TELEMETRY_EXPORT_INTERVAL seconds ``TELEMETRY_DIR/<spider>.prom`` is
+    rewritten (atomically, for node_exporter's textfile collector) and one
+    progress line is logged. At close ``TELEMETRY_DIR/<spider>-stats.json``
+    gets the final metrics plus every crawl stat. Callback timings come from
+    CallbackTimingMiddleware, which finds this extension as
+    ``crawler.telemetry``.
+    """
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        if not settings.getbool('TELEMETRY_ENABLED'):
+            raise NotConfigured
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.directory = Path(settings.get('TELEMETRY_DIR', 'data/telemetry'))
+        self.interval = settings.getfloat('TELEMETRY_EXPORT_INTERVAL', 30.0)
+
+        self.download_latency: Dict[str, Histogram] = {}
+        self.callback_duration: Dict[str, Histogram] = {}
+        self.items = 0
+        self._items_at_last_export = 0
+        self._last_export_at = time.monotonic()
+        self._items_per_sec = 0.0
+        self._task: Optional[task.LoopingCall] = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        extension = cls(crawler)
+        crawler.telemetry = extension
+        crawler.signals.connect(extension.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(extension.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(extension.response_received, signal=signals.response_received)
+        crawler.signals.connect(extension.item_scraped, signal=signals.item_scraped)
+        return extension
+
+    def spider_opened(self, spider: Spider):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._last_export_at = time.monotonic()
+        if self.interval > 0:
+            self._task = task.LoopingCall(self.export, spider)
+            self._task.start(self.interval, now=False)
+
+    def spider_closed(self, spider: Spider, reason: str):
+        if self._task and self._task.running:
+            self._task.stop()
+        self.export(spider)
+        dump_path = self.directory / f"{spider.name}-stats.json"
+        dump = {
+            'spider': spider.name,
+            'reason': reason,
+            'metrics': self._snapshot(),
+            'stats': self.stats.get_stats(),
+        }
+        _write_atomically(dump_path, json.dumps(dump, indent=2, sort_keys=True, default=str))
+        logger.info(f"Telemetry written to {dump_path}")
+
+    def response_received(self, response: Response, request: Request, spider: Spider):
+        latency = request.meta.get('download_latency')
+        if latency is None or 'cached' in response.flags:
+            return  # served from the HTTP cache, nothing was downloaded
+        domain = urlparse(response.url).hostname or 'unknown'
+        histogram = self.download_latency.get(domain)
+        if histogram is None:
+            histogram = self.download_latency[domain] = Histogram(LATENCY_BUCKETS)
+        histogram.observe(latency)
+
+    def item_scraped(self, item, response, spider: Spider):
+        self.items += 1
+
+    def observe_callback(self, callback: str, seconds: float):
+        histogram = self.callback_duration.get(callback)
+        if histogram is None:
+            histogram = self.callback_duration[callback] = Histogram(CALLBACK_BUCKETS)
+        histogram.observe(seconds)
+
+    def export(self, spider: Spider):
+        """Rewrite the Prometheus text file and log a progress line"""
+        now = time.monotonic()
+        elapsed = now - self._last_export_at
+        if elapsed > 0:
+            self._items_per_sec = (self.items - self._items_at_last_export) / elapsed
+        self._items_at_last_export, self._last_export_at = self.items, now
+
+        snapshot = self._snapshot()
+        text = crawl_metrics_text(spider.name, snapshot, self.download_latency, self.callback_duration)
+        _write_atomically(self.directory / f"{spider.name}.prom", text)
+
+        queues = snapshot['queues']
+        slowest = ', '.join(
+            f"{name} p95<={_format_seconds(self.callback_duration[name].quantile(0.95))}"
+            for name in sorted(self.callback_duration)
+        )
+        logger.info(
+            f"📈 {self.items} items ({self._items_per_sec:.1f}/s), "
+            f"scheduler {queues['scheduler']}, downloading {queues['downloader_active']}, "
+            f"retries {snapshot['retries']}, 429s {snapshot['throttled']}"
+            + (f", {slowest}" if slowest else "")
+        )
+
+    def _snapshot(self) -> Dict:
+        return {
+            'items': self.items,
+            'items_per_sec': self._items_per_sec,
+            'responses_by_status': self._responses_by_status(),
+            'retries': self.stats.get_value('retry/count', 0),
+            'throttled': self.stats.get_value(f'{STATUS_COUNT_PREFIX}429', 0),
+            'queues': self._queue_depths(),
+            'download_latency': {domain: h.to_dict() for domain, h in self.download_latency.items()},
+            'callback_duration': {name: h.to_dict() for name, h in self.callback_duration.items()},
+        }
+
+    def _responses_by_status(self) -> Dict[int, int]:
+        """Responses per HTTP status as counted by DownloaderStats, including ones later retried"""
+        return {
+            int(key[len(STATUS_COUNT_PREFIX):]): count
+            for key, count in self.stats.get_stats().items()
+            if key.startswith(STATUS_COUNT_PREFIX)
+        }
+
+    def _queue_depths(self) -> Dict[str, int]:
+        """Requests waiting in the scheduler, downloader and scraper right now"""
+        engine = self.crawler.engine
+        depths = dict.fromkeys(('scheduler', 'downloader_active', 'downloader_queued', 'scraper_active'), 0)
+        if engine is None:
+            return depths
+        # Scrapy 2.19 exposes engine.scheduler; older versions keep it on engine.slot
+        scheduler = getattr(engine, 'scheduler', None)
+        if scheduler is None and getattr(engine, 'slot', None) is not None:
+            scheduler = engine.slot.scheduler
+        if scheduler is not None and hasattr(scheduler, '__len__'):
+            depths['scheduler'] = len(scheduler)
+        depths['downloader_active'] = len(engine.downloader.active)
+        depths['downloader_queued'] = sum(len(slot.queue) for slot in engine.downloader.slots.values())
+        if engine.scraper.slot is not None:
+            depths['scraper_active'] = len(engine.scraper.slot.active)
+        return depths
+
+
+class CallbackTimingMiddleware:
+    """Spider middleware timing each callback for CrawlTelemetry
+
+    Only the time spent inside the callback's own generator is counted: the
+    clock stops whenever the callback yields, so work done downstream on its
+    output is not charged to it. Install it with a high order number so it
+    sits right next to the spider.
+    """
+
+    def __init__(self, telemetry: CrawlTelemetry):
+        self.telemetry = telemetry
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        telemetry = getattr(crawler, 'telemetry', None)
+        if telemetry is None:
+            raise NotConfigured
+        return cls(telemetry)
+
+    def process_spider_output(self, response: Response, result: Iterable, spider: Optional[Spider] = None):
+        iterator = iter(result)
+        elapsed = 0.0
+        while True:
+            started_at = time.perf_counter()
+            try:
+                output = next(iterator)
+            except StopIteration:
+                break
+            finally:
+                elapsed += time.perf_counter() - started_at
+            yield output
+        self.telemetry.observe_callback(_callback_name(response), elapsed)
+
+    async def process_spider_output_async(self, response: Response, result, spider: Optional[Spider] = None):
+        iterator = result.__aiter__()
+        elapsed = 0.0
+        while True:
+            started_at = time.perf_counter()
+            try:
+                output = await iterator.__anext__()
+            except StopAsyncIteration:
+                break
+            finally:
+                elapsed += time.perf_counter() - started_at
+            yield output
+        self.telemetry.observe_callback(_callback_name(response), elapsed)
+
+
+def _callback_name(response: Response) -> str:
+    request = response.request
+    callback = request.callback if request is not None else None
+    return getattr(callback, '__name__', None) or 'parse'
+
+
+def _format_seconds(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return '>1s'
+    return f"{seconds * 1000:g}ms"
+
+
+def _write_atomically(path: Path, text: str):
+    """Write to a temporary name and rename, so scrapers never read a partial file"""
+    with atomic_write(path) as f:
+        f.write(text)
@@ -0,0 +1,109 @@
+"""
+Run-to-run delta feeds
+Hashes every bead record over a canonical field order, compares the hashes
+with the previous run's index and writes only the added, changed and removed
+product codes to a delta feed next to the snapshot
+"""
+
+import hashlib
+import json
+import logging
+from pathlib import Path
+from typing import Any, Dict, Tuple, Union
+
+from feeds.writer import FeedWriter
+from importers.feed_reader import iter_feed
+from storage.atomic_file import write_json_atomically
+
+logger = logging.getLogger(__name__)
+
+CHANGE_TYPES = ('added', 'changed', 'removed')
+DELTA_SUFFIX = '.delta'
+
+
+def record_hash(record: Dict[str, Any]) -> str:
+    """Digest of a record that ignores key order, so only a changed value changes it"""
+    canonical = json.dumps(record, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.blake2b(canonical.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def delta_feed_path(snapshot_path: Union[str, Path]) -> Path:
+    """``data/beads.delta.ndjson`` for ``data/beads.ndjson`` (compression suffixes are kept)"""
+    snapshot_path = Path(snapshot_path)
+    stem, dot, suffixes = snapshot_path.name.partition('.')
+    return snapshot_path.with_name(f"{stem}{DELTA_SUFFIX}{dot}{suffixes}")
+
+
+class FeedHashIndex:
+    """Product code -> record hash of the beads exported by a spider's last run, as a JSON file"""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def load(self) -> Dict[str, str]:
+        """The saved hashes, or {} on the first run (or when the file is unreadable)"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable feed hash index {self.path}: {e}")
+            return {}
+
+    def save(self, hashes: Dict[str, str]):
+        """Replace the index atomically"""
+        write_json_atomically(self.path, hashes, separators=(',', ':'), sort_keys=True)
+
+
+def write_delta(snapshot_path: Union[str, Path], previous: Dict[str, str], writer: FeedWriter,
+                full_snapshot: bool) -> Dict[str, Any]:
+    """Write the changes between the previous run's hashes and a finished snapshot
+
+    Every delta line is ``{"change": "added"|"changed", "product_code": ...,
+    "bead": {...}}`` or ``{"change": "removed", "product_code": ...}``.
+    A product code repeated in the snapshot is diffed once, using its last
+    record, as the bead loaders keep the last row too. Removals are only known
+    when ``full_snapshot`` is set, i.e. the snapshot lists every product on the
+    site; otherwise the snapshot only updates the index. Returns the per-change
+    counts, ``unchanged``, ``duplicates`` and the new index as ``hashes``.
+    """
+    counts = dict.fromkeys((*CHANGE_TYPES, 'unchanged', 'duplicates'), 0)
+
+    # First pass: the hash and position of the last record per product code
+    latest: Dict[str, Tuple[str, int]] = {}
+    for position, bead in enumerate(iter_feed(snapshot_path)):
+        product_code = bead.get('product_code')
+        if not product_code:
+            continue
+        if product_code in latest:
+            counts['duplicates'] += 1
+        latest[product_code] = (record_hash(bead), position)
+
+    with writer:
+        for position, bead in enumerate(iter_feed(snapshot_path)):
+            product_code = bead.get('product_code')
+            if not product_code:
+                continue
+            digest, last_position = latest[product_code]
+            if position != last_position:
+                continue
+            before = previous.get(product_code)
+            if before == digest:
+                counts['unchanged'] += 1
+                continue
+            change = 'added' if before is None else 'changed'
+            counts[change] += 1
+            writer.write({'change': change, 'product_code': product_code, 'bead': bead})
+
+        if full_snapshot:
+            for product_code in sorted(previous.keys() - latest.keys()):
+                counts['removed'] += 1
+                writer.write({'change': 'removed', 'product_code': product_code})
+
+    current = {product_code: digest for product_code, (digest, _) in latest.items()}
+    counts['hashes'] = current if full_snapshot else {**previous, **current}
+    return counts
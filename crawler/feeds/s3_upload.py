@@ -0,0 +1,235 @@
+"""
+Streaming multipart S3 upload
+Ships a feed to S3 in parts while the crawl is still writing it, retrying
+failed parts individually, and completes the upload when the feed closes
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Union
+
+try:
+    import boto3
+    from botocore.exceptions import BotoCoreError, ClientError
+    S3_AVAILABLE = True
+except ImportError:
+    S3_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+MIN_PART_SIZE = 5 * 1024 * 1024  # S3 rejects smaller parts, except the last one
+
+
+def get_s3_config() -> Optional[Dict[str, Any]]:
+    """Read the bucket and credentials from the environment, or None if S3 is not configured
+
+    AWS_S3_ENDPOINT_URL points the client at an S3-compatible stand-in such as
+    MinIO for local testing.
+    """
+    bucket_name = os.environ.get('AWS_S3_BUCKET')
+    access_key = os.environ.get('AWS_ACCESS_KEY_ID')
+    secret_key = os.environ.get('AWS_SECRET_ACCESS_KEY')
+    if not all([bucket_name, access_key, secret_key]):
+        return None
+    return {
+        'bucket': bucket_name,
+        'region_name': os.environ.get('AWS_REGION', 'us-east-1'),
+        'aws_access_key_id': access_key,
+        'aws_secret_access_key': secret_key,
+        'endpoint_url': os.environ.get('AWS_S3_ENDPOINT_URL') or None,
+    }
+
+
+def create_s3_client(config: Dict[str, Any]):
+    """Build a boto3 S3 client from get_s3_config() output"""
+    return boto3.client(
+        's3',
+        region_name=config['region_name'],
+        aws_access_key_id=config['aws_access_key_id'],
+        aws_secret_access_key=config['aws_secret_access_key'],
+        endpoint_url=config['endpoint_url'],
+    )
+
+
+def upload_file(config: Dict[str, Any], path: Union[str, Path], key: str, content_type: str,
+                metadata: Dict[str, str]) -> bool:
+    """Upload a finished (small) file in one go; returns False (with the error logged) if it fails"""
+    try:
+        create_s3_client(config).upload_file(
+            str(path), config['bucket'], key, ExtraArgs={'ContentType': content_type, 'Metadata': metadata}
+        )
+    except Exception as e:
+        logger.error(f"Upload to s3://{config['bucket']}/{key} failed: {e}")
+        return False
+    logger.info(f"Uploaded {path} to s3://{config['bucket']}/{key}")
+    return True
+
+
+class MultipartS3Uploader:
+    """Accepts feed bytes as they are written and uploads them as multipart parts
+
+    ``write()`` only buffers and hands full parts to a small thread pool, so it
+    never blocks the crawl on the network. Once ``max_pending_parts`` parts
+    are waiting for S3, ``backlogged()`` reports it, and callers that must
+    bound memory stop writing until the ``on_part_done`` hook (called from
+    an upload thread) reports a freed slot. ``complete()`` uploads the
+    remainder, waits for every part and finishes the upload; any failure
+    aborts it so no orphaned parts are left behind.
+    """
+
+    def __init__(self, client, bucket: str, key: str, part_size: int = 8 * 1024 * 1024,
+                 max_retries: int = 3, retry_backoff: float = 1.0, max_workers: int = 2,
+                 max_pending_parts: Optional[int] = None, content_type: str = 'application/octet-stream',
+                 metadata: Optional[Dict[str, str]] = None):
+        if part_size < MIN_PART_SIZE:
+            raise ValueError(f"Part size must be at least {MIN_PART_SIZE} bytes")
+
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.content_type = content_type
+        self.metadata = metadata or {}
+
+        self.upload_id: Optional[str] = None
+        self.bytes_uploaded = 0
+        self.part_retries = 0
+        self.part_latencies: List[float] = []
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='s3-part')
+        self._futures: List[Future] = []
+        self.max_pending_parts = max_pending_parts or 2 * max_workers
+        # Called from an upload thread each time a part finishes, uploaded or not
+        self.on_part_done: Optional[Callable[[], None]] = None
+        # Parts submitted but not yet uploaded, each holding part_size bytes
+        self._pending_parts = 0
+        self._buffer = bytearray()
+        self._next_part_number = 1
+        self._lock = threading.Lock()
+
+    def start(self) -> 'MultipartS3Uploader':
+        """Create the multipart upload"""
+        response = self.client.create_multipart_upload(
+            Bucket=self.bucket,
+            Key=self.key,
+            ContentType=self.content_type,
+            Metadata=self.metadata
+        )
+        self.upload_id = response['UploadId']
+        logger.info(f"Started multipart upload to s3://{self.bucket}/{self.key}")
+        return self
+
+    def write(self, data: bytes):
+        """Buffer feed bytes, submitting a part whenever a full part is available"""
+        self._buffer.extend(data)
+        while len(self._buffer) >= self.part_size:
+            self._submit(bytes(self._buffer[:self.part_size]))
+            del self._buffer[:self.part_size]
+
+    def complete(self) -> bool:
+        """Upload the remaining bytes and finish the upload; returns False (and aborts) on failure"""
+        if self._buffer or self._next_part_number == 1:
+            # The last part may be short; an empty feed still needs one (empty) part
+            self._submit(bytes(self._buffer))
+            self._buffer.clear()
+
+        try:
+            parts = [future.result() for future in self._futures]
+            self.client.complete_multipart_upload(
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self.upload_id,
+                MultipartUpload={'Parts': parts}
+            )
+        except Exception as e:
+            logger.error(f"Error completing upload of s3://{self.bucket}/{self.key}: {e}")
+            self.abort()
+            return False
+        finally:
+            self._executor.shutdown(wait=True)
+
+        logger.info(
+            f"Successfully uploaded to s3://{self.bucket}/{self.key} "
+            f"({len(parts)} parts, {self.bytes_uploaded} bytes)"
+        )
+        return True
+
+    def abort(self):
+        """Abort the upload so S3 discards any parts already stored"""
+        if not self.upload_id:
+            return
+        try:
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+            logger.warning(f"Aborted multipart upload to s3://{self.bucket}/{self.key}")
+        except (BotoCoreError, ClientError) as e:
+            logger.error(f"Could not abort multipart upload {self.upload_id}: {e}")
+        finally:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def backlogged(self) -> bool:
+        """Whether ``max_pending_parts`` parts are still waiting for S3"""
+        with self._lock:
+            return self._pending_parts >= self.max_pending_parts
+
+    def metrics(self) -> Dict[str, Any]:
+        """Bytes, parts, retries and part latency figures for the crawl stats"""
+        with self._lock:
+            latencies = sorted(self.part_latencies)
+        metrics = {
+            'bytes_uploaded': self.bytes_uploaded,
+            'parts_uploaded': len(latencies),
+            'part_retries': self.part_retries,
+        }
+        if latencies:
+            metrics['part_latency_avg_ms'] = round(sum(latencies) / len(latencies) * 1000, 1)
+            metrics['part_latency_max_ms'] = round(latencies[-1] * 1000, 1)
+        return metrics
+
+    def _submit(self, data: bytes):
+        part_number = self._next_part_number
+        self._next_part_number += 1
+        with self._lock:
+            self._pending_parts += 1
+        future = self._executor.submit(self._upload_part, part_number, data)
+        future.add_done_callback(self._part_done)
+        self._futures.append(future)
+
+    def _part_done(self, future: Future):
+        with self._lock:
+            self._pending_parts -= 1
+        if self.on_part_done:
+            self.on_part_done()
+
+    def _upload_part(self, part_number: int, data: bytes) -> Dict[str, Any]:
+        """Upload one part, retrying just that part with exponential backoff"""
+        for attempt in range(self.max_retries + 1):
+            started_at = time.perf_counter()
+            try:
+                response = self.client.upload_part(
+                    Bucket=self.bucket,
+                    Key=self.key,
+                    UploadId=self.upload_id,
+                    PartNumber=part_number,
+                    Body=data
+                )
+            except (BotoCoreError, ClientError) as e:
+                if attempt == self.max_retries:
+                    raise
+                with self._lock:
+                    self.part_retries += 1
+                delay = self.retry_backoff * (2 ** attempt)
+                logger.warning(f"Part {part_number} failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+
+            with self._lock:
+                self.part_latencies.append(time.perf_counter() - started_at)
+                self.bytes_uploaded += len(data)
+            logger.debug(f"Uploaded part {part_number} ({len(data)} bytes)")
+            return {'PartNumber': part_number, 'ETag': response['ETag']}
@@ -0,0 +1,216 @@
+"""
+Buffered NDJSON feed writer
+Writes compact one-record-per-line JSON in batches, flushed by item count, buffered
+bytes or elapsed time, with optional gzip/zstd compression and an atomic rename on close
+"""
+
+import gzip
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Union
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+COMPRESSION_SUFFIXES = {
+    None: '',
+    'gzip': '.gz',
+    'zstd': '.zst',
+}
+PART_SUFFIX = '.part'
+DONE_SUFFIX = '.done'
+
+
+def done_marker_path(path: Union[str, Path]) -> Path:
+    """Path of the marker a FeedWriter creates once ``path`` is complete"""
+    path = Path(path)
+    return path.with_name(path.name + DONE_SUFFIX)
+
+
+class FeedWriter:
+    """Append-only NDJSON writer that batches records before touching the file
+
+    While open, records go to ``<path>.part``; ``close()`` renames it to ``path``
+    and then writes a ``<path>.done`` marker, so a reader tailing the feed from
+    another process knows when it has seen every record.
+    Every flush writes only whole lines (and, when compressed, one complete gzip
+    member or zstd frame), so an interrupted ``.part`` file stays readable up to
+    its last flush. ``sink``, if set, receives a copy of every block written,
+    which lets an uploader stream the feed while it is being produced, and
+    ``on_flush`` is called after each block, when everything written so far
+    is in the file. ``suspend()`` and ``resume()`` leave an unfinished feed in
+    ``.part`` and pick it up again in a later run.
+
+    ``flush_seconds`` is checked whenever a record is written; a caller that
+    may go quiet (a crawl waiting on slow pages) also calls ``flush_if_due()``
+    from a timer so buffered records do not wait for the next one. Used as a
+    context manager, a block that raises leaves the feed in ``.part`` without
+    a ``.done`` marker, so readers never take a failed feed for a finished one.
+    """
+
+    def __init__(self, path: Union[str, Path], flush_items: int = 500, flush_bytes: int = 1024 * 1024,
+                 flush_seconds: float = 5.0, compression: Optional[str] = None):
+        if compression not in COMPRESSION_SUFFIXES:
+            raise ValueError(f"Unknown compression '{compression}' (expected gzip, zstd or None)")
+        if compression == 'zstd' and not ZSTD_AVAILABLE:
+            raise RuntimeError("zstd compression requested but the zstandard package is not installed")
+
+        self.path = Path(path)
+        self.part_path = self.path.with_name(self.path.name + PART_SUFFIX)
+        self.done_path = done_marker_path(self.path)
+        self.flush_items = flush_items
+        self.flush_bytes = flush_bytes
+        self.flush_seconds = flush_seconds
+        self.compression = compression
+        self.items_written = 0
+        self.bytes_written = 0
+        self.sink: Optional[Callable[[bytes], None]] = None
+        self.on_flush: Optional[Callable[[], None]] = None
+
+        self._file = None
+        self._buffer: List[bytes] = []
+        self._buffered_bytes = 0
+        self._last_flush = time.monotonic()
+        self._compressor = zstandard.ZstdCompressor(level=3) if compression == 'zstd' else None
+
+    @classmethod
+    def from_settings(cls, path: Union[str, Path], settings) -> 'FeedWriter':
+        """Build a writer from the BEAD_FEED_* Scrapy settings, adding the compression suffix"""
+        compression = settings.get('BEAD_FEED_COMPRESSION') or None
+        path = Path(path)
+        suffix = COMPRESSION_SUFFIXES.get(compression, '')
+        if suffix and not path.name.endswith(suffix):
+            path = path.with_name(path.name + suffix)
+        return cls(
+            path,
+            flush_items=settings.getint('BEAD_FEED_FLUSH_ITEMS', 500),
+            flush_bytes=settings.getint('BEAD_FEED_FLUSH_BYTES', 1024 * 1024),
+            flush_seconds=settings.getfloat('BEAD_FEED_FLUSH_SECONDS', 5.0),
+            compression=compression
+        )
+
+    @property
+    def content_type(self) -> str:
+        """MIME type of the finished feed"""
+        if self.compression == 'gzip':
+            return 'application/gzip'
+        if self.compression == 'zstd':
+            return 'application/zstd'
+        return 'application/x-ndjson'
+
+    def open(self) -> 'FeedWriter':
+        """Create the ``.part`` file, replacing any leftover from an earlier run"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.done_path.unlink(missing_ok=True)
+        self._file = open(self.part_path, 'wb')
+        self._last_flush = time.monotonic()
+        logger.info(f"Writing feed to {self.part_path}")
+        return self
+
+    def part_size(self) -> int:
+        """Size of an earlier run's ``.part`` file, -1 if there is none"""
+        try:
+            return self.part_path.stat().st_size
+        except FileNotFoundError:
+            return -1
+
+    def resume(self, offset: int, items: int) -> 'FeedWriter':
+        """Reopen the ``.part`` file of an interrupted run, keeping its first ``offset`` bytes
+
+        ``offset`` and ``items`` must describe a flush boundary; anything after
+        it (possibly a torn block) is dropped.
+        """
+        self.done_path.unlink(missing_ok=True)
+        self._file = open(self.part_path, 'r+b')
+        self._file.truncate(offset)
+        self._file.seek(offset)
+        self.bytes_written = offset
+        self.items_written = items
+        self._last_flush = time.monotonic()
+        logger.info(f"Resuming feed {self.part_path} after {items} records")
+        return self
+
+    def write(self, record: Dict[str, Any]):
+        """Buffer one record, flushing if any flush threshold has been reached"""
+        line = json.dumps(record, separators=(',', ':'), ensure_ascii=False).encode('utf-8') + b'\n'
+        self._buffer.append(line)
+        self._buffered_bytes += len(line)
+        self.items_written += 1
+
+        if (len(self._buffer) >= self.flush_items
+                or self._buffered_bytes >= self.flush_bytes
+                or time.monotonic() - self._last_flush >= self.flush_seconds):
+            self.flush()
+
+    def flush_if_due(self):
+        """Flush buffered records once ``flush_seconds`` have passed since the last flush"""
+        if self._file and self._buffer and time.monotonic() - self._last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        """Write buffered records to the file as one block"""
+        self._last_flush = time.monotonic()
+        if not self._buffer:
+            return
+
+        payload = b''.join(self._buffer)
+        if self.compression == 'gzip':
+            payload = gzip.compress(payload, compresslevel=6, mtime=0)
+        elif self.compression == 'zstd':
+            payload = self._compressor.compress(payload)
+
+        self._file.write(payload)
+        self._file.flush()
+        if self.sink:
+            self.sink(payload)
+        self.bytes_written += len(payload)
+        self._buffer = []
+        self._buffered_bytes = 0
+        if self.on_flush:
+            self.on_flush()
+
+    def close(self):
+        """Flush, sync and atomically move the finished feed into place"""
+        if not self._file:
+            return
+        self.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._file = None
+        os.replace(self.part_path, self.path)
+        # Written last: once it exists, every record is in the final file
+        self.done_path.write_text(json.dumps({
+            'items': self.items_written,
+            'bytes': self.bytes_written,
+            'completed_at': datetime.now().isoformat()
+        }))
+        logger.info(f"Feed complete: {self.items_written} records, {self.bytes_written} bytes in {self.path}")
+
+    def suspend(self):
+        """Flush and sync, but leave the feed in ``.part`` for ``resume()`` instead of finishing it"""
+        if not self._file:
+            return
+        self.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._file = None
+        logger.info(f"Feed suspended: {self.items_written} records, {self.bytes_written} bytes in {self.part_path}")
+
+    def __enter__(self) -> 'FeedWriter':
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+            return
+        logger.error(f"Feed {self.part_path} left unfinished: {exc_type.__name__}: {exc}")
+        self.suspend()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the WooCommerce Store API products endpoint
+Serves the products in fixtures/store_api/products.json with the Store API's
+paging (per_page / page, X-WP-Total and X-WP-TotalPages headers), so the
+Store API mode of the Miyuki crawler can be run without the real site.
+
+Usage (from the crawler directory):
+    python -m fixtures.store_api_server --port 8780
+    scrapy crawl miyuki_directory -a discovery=store_api \
+        -a store_api_url=http://127.0.0.1:8780/wp-json/wc/store/v1/products
+"""
+
+import argparse
+import json
+import logging
+import math
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List
+from urllib.parse import parse_qs, urlparse
+
+from parsers.store_api import STORE_API_MAX_PAGE_SIZE, STORE_API_PRODUCTS_PATH
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FIXTURE = Path(__file__).parent / 'store_api' / 'products.json'
+DEFAULT_PAGE_SIZE = 10  # The Store API's own default
+
+
+def make_handler(products: List[Dict[str, Any]]):
+    """Request handler class serving these products"""
+
+    class StoreApiHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path.rstrip('/') != STORE_API_PRODUCTS_PATH:
+                self._send_json(404, {'code': 'rest_no_route', 'message': 'No route was found matching the URL and request method.'})
+                return
+
+            query = parse_qs(url.query)
+            try:
+                per_page = int(query.get('per_page', [DEFAULT_PAGE_SIZE])[0])
+                page = int(query.get('page', [1])[0])
+            except ValueError:
+                self._send_json(400, {'code': 'rest_invalid_param', 'message': 'Invalid parameter(s): per_page, page'})
+                return
+            if not 1 <= per_page <= STORE_API_MAX_PAGE_SIZE or page < 1:
+                self._send_json(400, {'code': 'rest_invalid_param', 'message': 'Invalid parameter(s): per_page, page'})
+                return
+
+            start = (page - 1) * per_page
+            self._send_json(200, products[start:start + per_page], {
+                'X-WP-Total': str(len(products)),
+                'X-WP-TotalPages': str(math.ceil(len(products) / per_page)),
+            })
+
+        def _send_json(self, status: int, payload: Any, headers: Dict[str, str] = None):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=UTF-8')
+            self.send_header('Content-Length', str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.info(f"{self.address_string()} {format % args}")
+
+    return StoreApiHandler
+
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="Serve fixture products the way the WooCommerce Store API does")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8780)
+    parser.add_argument('--fixture', type=Path, default=DEFAULT_FIXTURE,
+                        help="JSON array of Store API product objects (default: %(default)s)")
+    return parser.parse_args()
+
+def main():
+    """Serve the fixture until interrupted"""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(name)s] %(levelname)s: %(message)s')
+    args = parse_args()
+    products = json.loads(args.fixture.read_text(encoding='utf-8'))
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(products))
+    logger.info(f"Serving {len(products)} products at http://{args.host}:{args.port}{STORE_API_PRODUCTS_PATH}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
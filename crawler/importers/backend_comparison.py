@@ -0,0 +1,35 @@
+"""
+Loader backend comparison
+Times every loader backend on the same rows from a feed, rolling each run
+back, to pick IMPORT_BACKEND for a database
+"""
+
+import logging
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+from config.crawler_config import IMPORT_CONFIG
+from importers.bead_loader import bead_to_row, compare_loaders
+from importers.feed_reader import iter_feed
+
+logger = logging.getLogger(__name__)
+
+
+def compare_backends(connection, feed_path: Union[str, Path], mode: str = IMPORT_CONFIG['mode'],
+                     sample_size: Optional[int] = None) -> Dict[str, Dict[str, float]]:
+    """Time every loader backend on the first ``sample_size`` beads of a feed (the whole feed by default)"""
+    rows = []
+    for bead in iter_feed(feed_path, chunk_size=IMPORT_CONFIG['read_chunk_size']):
+        if bead.get('product_code'):
+            rows.append(bead_to_row(bead))
+        if sample_size and len(rows) >= sample_size:
+            break
+
+    logger.info(f"⏱️  Comparing loader backends on {len(rows)} rows from {feed_path}")
+    results = compare_loaders(connection, rows, mode=mode)
+
+    fastest = min(results, key=lambda backend: results[backend]['seconds'])
+    for backend, result in results.items():
+        speedup = result['seconds'] / results[fastest]['seconds'] if results[fastest]['seconds'] else 1.0
+        logger.info(f"📊 {backend}: {result['rows_per_second']:,.0f} rows/s ({speedup:.2f}x the time of {fastest})")
+    return results
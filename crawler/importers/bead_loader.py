@@ -0,0 +1,273 @@
+"""
+Bead loader backends
+Write batches of bead rows into the beads table, either through
+execute_values or through COPY into a staging table followed by a set-based merge.
+Both backends support an insert-only mode and an upsert mode that only rewrites
+rows whose attributes actually changed. Beads that left a site are kept but
+marked discontinued in their metadata.
+"""
+
+import io
+import json
+import logging
+import time
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+from psycopg2.extras import execute_values
+
+logger = logging.getLogger(__name__)
+
+BEAD_COLUMNS = (
+    'brand_product_code', 'name', 'brand_id', 'shape', 'size',
+    'color_group', 'glass_group', 'finish', 'dyed',
+    'galvanized', 'plating', 'metadata', 'image'
+)
+# Columns refreshed by upsert mode; the key and brand never change for a product code
+UPDATABLE_COLUMNS = tuple(column for column in BEAD_COLUMNS if column not in ('brand_product_code', 'brand_id'))
+# Columns an upsert never clears: a feed without images must not wipe stored ones
+KEEP_WHEN_NULL_COLUMNS = ('image',)
+# A secondary source (a retailer listing a manufacturer's beads) never clears anything it does not carry
+SECONDARY_SOURCE_KEEP_WHEN_NULL_COLUMNS = UPDATABLE_COLUMNS
+STAGING_TABLE = 'beads_staging'
+MODES = ('insert', 'upsert')
+# What a loader reports for a batch; duplicates are rows whose product code a later row in the batch repeats
+LOAD_COUNT_KEYS = ('inserted', 'updated', 'unchanged', 'duplicates')
+
+_COLUMN_LIST = ', '.join(BEAD_COLUMNS)
+_KEY_INDEX = BEAD_COLUMNS.index('brand_product_code')
+_COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+# metadata is a json column; merging goes through jsonb. Already discontinued beads are left alone
+DISCONTINUE_SQL = """
+    UPDATE beads
+    SET metadata = (COALESCE(metadata::jsonb, '{}'::jsonb)
+                    || jsonb_build_object('discontinued', true, 'discontinued_at', NOW()))::json,
+        updated_at = NOW()
+    WHERE brand_id = %s AND brand_product_code = ANY(%s)
+      AND (metadata IS NULL OR metadata::jsonb -> 'discontinued' IS DISTINCT FROM 'true'::jsonb)
+"""
+
+
+def bead_to_row(bead: Dict[str, Any], brand_id: int = 1) -> Tuple:
+    """Map a feed record to a row tuple in BEAD_COLUMNS order"""
+    return (
+        bead.get('product_code'),  # brand_product_code
+        bead.get('name'),
+        brand_id,  # Miyuki brand has ID 1 unless told otherwise
+        bead.get('shape'),
+        bead.get('size'),
+        bead.get('color'),  # Map 'color' to 'color_group'
+        bead.get('glass_group'),
+        bead.get('finish'),
+        bead.get('dyed'),
+        bead.get('galvanized'),
+        bead.get('plating'),
+        # Attributes the spider has no dedicated column for
+        json.dumps(bead['metadata'], sort_keys=True) if bead.get('metadata') else None,
+        bead.get('image')  # Stored path set by BeadImagePipeline
+    )
+
+
+def discontinue_beads(cursor, product_codes: Sequence[str], brand_id: int = 1) -> int:
+    """Mark beads no longer on the site as discontinued, returning how many were newly marked
+
+    Rows are kept (inventories and patterns refer to them); a bead that
+    reappears in a feed is rewritten by the next upsert, which clears the flag.
+    """
+    if not product_codes:
+        return 0
+    cursor.execute(DISCONTINUE_SQL, (brand_id, list(product_codes)))
+    return cursor.rowcount
+
+
+def _conflict_clause(mode: str, keep_when_null: Sequence[str] = KEEP_WHEN_NULL_COLUMNS) -> str:
+    """Build the ON CONFLICT ... RETURNING tail of an INSERT INTO beads AS b statement
+
+    In upsert mode rows are only rewritten when a tracked attribute is distinct,
+    which keeps unchanged beads from generating WAL and index churn, and the
+    ``keep_when_null`` columns keep their stored value when the incoming one is
+    NULL. RETURNING reports (xmax = 0), which is true for freshly inserted rows
+    and false for updated ones; unchanged and ignored rows return nothing.
+    """
+    if mode == 'insert':
+        return "ON CONFLICT (brand_product_code) DO NOTHING RETURNING (xmax = 0)"
+
+    assignments = ', '.join(f"{column} = {_incoming(column, keep_when_null)}" for column in UPDATABLE_COLUMNS)
+    current = ', '.join(_comparable(f"b.{column}", column) for column in UPDATABLE_COLUMNS)
+    incoming = ', '.join(_comparable(_incoming(column, keep_when_null), column) for column in UPDATABLE_COLUMNS)
+    return f"""
+        ON CONFLICT (brand_product_code) DO UPDATE SET {assignments}, updated_at = NOW()
+        WHERE ({current}) IS DISTINCT FROM ({incoming})
+        RETURNING (xmax = 0)
+    """
+
+
+def _incoming(column: str, keep_when_null: Sequence[str]) -> str:
+    """The value an upsert writes to a column"""
+    if column in keep_when_null:
+        return f"COALESCE(EXCLUDED.{column}, b.{column})"
+    return f"EXCLUDED.{column}"
+
+
+def _comparable(expression: str, column: str) -> str:
+    """json has no equality operator, so compare metadata as jsonb"""
+    return f"{expression}::jsonb" if column == 'metadata' else expression
+
+
+def _count_results(returned: List[Tuple], row_count: int, unique_count: int) -> Dict[str, int]:
+    """Turn RETURNING (xmax = 0) rows into inserted/updated/unchanged/duplicates counts
+
+    Only the last row per product code is written, so the earlier ones are
+    counted as duplicates rather than as unchanged beads.
+    """
+    inserted = sum(1 for (was_inserted,) in returned if was_inserted)
+    updated = len(returned) - inserted
+    return {
+        'inserted': inserted,
+        'updated': updated,
+        'unchanged': unique_count - inserted - updated,
+        'duplicates': row_count - unique_count,
+    }
+
+
+def _dedupe_rows(rows: Sequence[Tuple]) -> List[Tuple]:
+    """Keep the last row per product code, as one statement cannot update a row twice"""
+    return list({row[_KEY_INDEX]: row for row in rows}.values())
+
+
+class ValuesLoader:
+    """Multi-row INSERT ... VALUES through psycopg2's execute_values"""
+
+    name = 'values'
+
+    TEMPLATE = f"({', '.join(['%s'] * len(BEAD_COLUMNS))}, NOW(), NOW())"
+
+    def __init__(self, mode: str = 'insert', keep_when_null: Sequence[str] = KEEP_WHEN_NULL_COLUMNS):
+        self.mode = mode
+        self.insert_sql = f"""
+            INSERT INTO beads AS b ({_COLUMN_LIST}, created_at, updated_at)
+            VALUES %s
+            {_conflict_clause(mode, keep_when_null)}
+        """
+
+    def load(self, cursor, rows: Sequence[Tuple]) -> Dict[str, int]:
+        """Write rows, returning exact inserted/updated/unchanged/duplicates counts"""
+        if not rows:
+            return dict.fromkeys(LOAD_COUNT_KEYS, 0)
+        unique_rows = _dedupe_rows(rows)
+        # A single statement per batch so RETURNING covers every row
+        returned = execute_values(
+            cursor, self.insert_sql, unique_rows,
+            template=self.TEMPLATE, page_size=len(unique_rows), fetch=True
+        )
+        return _count_results(returned, len(rows), len(unique_rows))
+
+
+class CopyLoader:
+    """COPY rows into a temporary staging table, then merge with one INSERT ... SELECT"""
+
+    name = 'copy'
+
+    CREATE_STAGING_SQL = f"""
+        CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} (
+            brand_product_code text,
+            name text,
+            brand_id bigint,
+            shape text,
+            size text,
+            color_group text,
+            glass_group text,
+            finish text,
+            dyed text,
+            galvanized text,
+            plating text,
+            metadata json,
+            image text,
+            seq bigint
+        ) ON COMMIT DELETE ROWS
+    """
+    COPY_SQL = f"COPY {STAGING_TABLE} ({_COLUMN_LIST}, seq) FROM STDIN"
+
+    def __init__(self, mode: str = 'insert', keep_when_null: Sequence[str] = KEEP_WHEN_NULL_COLUMNS):
+        self.mode = mode
+        # DISTINCT ON keeps the merge valid if a feed repeats a product code; the
+        # highest seq picks the last row, as ValuesLoader does
+        self.merge_sql = f"""
+            INSERT INTO beads AS b ({_COLUMN_LIST}, created_at, updated_at)
+            SELECT DISTINCT ON (brand_product_code) {_COLUMN_LIST}, NOW(), NOW()
+            FROM {STAGING_TABLE}
+            ORDER BY brand_product_code, seq DESC
+            {_conflict_clause(mode, keep_when_null)}
+        """
+
+    def load(self, cursor, rows: Sequence[Tuple]) -> Dict[str, int]:
+        """Stage rows with COPY and merge them into beads, returning exact counts"""
+        if not rows:
+            return dict.fromkeys(LOAD_COUNT_KEYS, 0)
+        cursor.execute(self.CREATE_STAGING_SQL)
+        cursor.execute(f"TRUNCATE {STAGING_TABLE}")
+        cursor.copy_expert(self.COPY_SQL, io.StringIO(self._to_copy_text(rows)))
+        cursor.execute(self.merge_sql)
+        unique_count = len({row[_KEY_INDEX] for row in rows})
+        return _count_results(cursor.fetchall(), len(rows), unique_count)
+
+    @staticmethod
+    def _to_copy_text(rows: Iterable[Tuple]) -> str:
+        """Render rows in COPY's text format (tab separated, \\N for NULL), each followed by its seq"""
+        lines = []
+        for seq, row in enumerate(rows):
+            values = '\t'.join(
+                '\\N' if value is None else str(value).translate(_COPY_ESCAPES)
+                for value in row
+            )
+            lines.append(f"{values}\t{seq}")
+        lines.append('')
+        return '\n'.join(lines)
+
+
+LOADERS = {
+    ValuesLoader.name: ValuesLoader,
+    CopyLoader.name: CopyLoader,
+}
+
+
+def get_loader(backend: str, mode: str = 'insert', keep_when_null: Sequence[str] = KEEP_WHEN_NULL_COLUMNS):
+    """Instantiate the loader for a backend name and write mode"""
+    if mode not in MODES:
+        raise ValueError(f"Unknown load mode '{mode}' (expected one of: {', '.join(MODES)})")
+    try:
+        loader_class = LOADERS[backend]
+    except KeyError:
+        raise ValueError(f"Unknown loader backend '{backend}' (expected one of: {', '.join(LOADERS)})")
+    return loader_class(mode, keep_when_null)
+
+
+def compare_loaders(connection, rows: Sequence[Tuple], backends: Iterable[str] = tuple(LOADERS),
+                    mode: str = 'insert') -> Dict[str, Dict[str, float]]:
+    """Time each backend loading the same rows
+
+    Every run happens inside a transaction that is rolled back afterwards, so the
+    comparison leaves the beads table untouched.
+    """
+    results: Dict[str, Dict[str, float]] = {}
+    for backend in backends:
+        loader = get_loader(backend, mode)
+        try:
+            with connection.cursor() as cursor:
+                started_at = time.perf_counter()
+                counts = loader.load(cursor, rows)
+                elapsed = time.perf_counter() - started_at
+        finally:
+            connection.rollback()
+
+        results[backend] = {
+            'rows': len(rows),
+            'inserted': counts['inserted'],
+            'updated': counts['updated'],
+            'seconds': elapsed,
+            'rows_per_second': len(rows) / elapsed if elapsed > 0 else float('inf'),
+        }
+        logger.info(
+            f"⏱️  {backend}: {len(rows)} rows in {elapsed:.3f}s "
+            f"({results[backend]['rows_per_second']:,.0f} rows/s)"
+        )
+    return results
@@ -0,0 +1,27 @@
+"""
+Bead brands
+Resolves the brand names in feed records to bead_brands ids
+"""
+
+from typing import Dict, Optional
+
+DEFAULT_BRAND = 'Miyuki'  # For records without a 'brand' field
+
+
+class BrandCache:
+    """bead_brands name -> id, read once by the parent and shipped to every worker"""
+
+    def __init__(self, brand_ids: Dict[str, int], default_brand: Optional[str] = DEFAULT_BRAND):
+        self.brand_ids = {name.strip().lower(): brand_id for name, brand_id in brand_ids.items()}
+        self.default_brand = default_brand
+
+    @classmethod
+    def load(cls, connection, default_brand: Optional[str] = DEFAULT_BRAND) -> 'BrandCache':
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name, id FROM bead_brands")
+            return cls(dict(cursor.fetchall()), default_brand)
+
+    def resolve(self, name: Optional[str]) -> Optional[int]:
+        """brand_id for a record's brand name (case-insensitive), None if bead_brands has no such brand"""
+        name = name or self.default_brand
+        return self.brand_ids.get(name.strip().lower()) if name else None
@@ -0,0 +1,91 @@
+"""
+Stored product code normalization
+Rewrites beads stored under an older spelling of their product code (Fire
+Mountain Gems used to import ``DB-123`` and ``DB123``) to the canonical form
+the spiders now emit (``DB-0123``), so the next import matches them on
+brand_product_code instead of adding a second row for the same bead
+"""
+
+import logging
+from typing import Dict
+
+from parsers.product_codes import canonical_code
+
+logger = logging.getLogger(__name__)
+
+# Codes of Delica beads not yet in the canonical form: a hyphen and at least 4 digits
+SELECT_STALE_SQL = """
+    SELECT id, brand_product_code FROM beads
+    WHERE brand_product_code ~ '^DB[SML]?-?[0-9]'
+      AND brand_product_code !~ '^DB[SML]?-[0-9]{4,}(-[A-Z])?$'
+    ORDER BY id
+"""
+FIND_SQL = "SELECT id FROM beads WHERE brand_product_code = %s"
+RENAME_SQL = "UPDATE beads SET brand_product_code = %s, updated_at = NOW() WHERE id = %s"
+# A user holding both beads in the same unit keeps one inventory row with the sum
+ADD_QUANTITIES_SQL = """
+    UPDATE inventories AS kept SET quantity = kept.quantity + stale.quantity, updated_at = NOW()
+    FROM inventories AS stale
+    WHERE kept.bead_id = %(keep)s AND stale.bead_id = %(stale)s
+      AND stale.user_id = kept.user_id AND stale.quantity_unit = kept.quantity_unit
+"""
+DROP_ADDED_SQL = """
+    DELETE FROM inventories AS stale USING inventories AS kept
+    WHERE stale.bead_id = %(stale)s AND kept.bead_id = %(keep)s
+      AND stale.user_id = kept.user_id AND stale.quantity_unit = kept.quantity_unit
+"""
+MOVE_INVENTORIES_SQL = """
+    UPDATE inventories SET bead_id = %(keep)s, updated_at = NOW()
+    WHERE bead_id = %(stale)s AND user_id NOT IN (SELECT user_id FROM inventories WHERE bead_id = %(keep)s)
+"""
+# Left in place while a user still holds it (both beads in different units)
+DELETE_STALE_SQL = """
+    DELETE FROM beads
+    WHERE id = %(stale)s AND NOT EXISTS (SELECT 1 FROM inventories WHERE bead_id = %(stale)s)
+"""
+
+
+def normalize_stored_codes(connection) -> Dict[str, int]:
+    """Bring every stored Delica product code to its canonical form, in one transaction
+
+    A bead whose canonical code is free is renamed. One whose canonical code
+    is already taken (the same bead imported from both sources) is merged
+    into that row: its inventories move over, or are added to the user's
+    existing inventory in the same unit, and the stale row is deleted. A stale
+    row still held in a different unit is left alone and logged, as the
+    quantities cannot be added. Idempotent; once every code is canonical it
+    is a single query. Returns ``renamed``, ``merged`` and ``conflicts``.
+    """
+    counts = {'renamed': 0, 'merged': 0, 'conflicts': 0}
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(SELECT_STALE_SQL)
+            for bead_id, code in cursor.fetchall():
+                canonical = canonical_code(code)
+                if canonical is None or canonical == code:
+                    continue
+                cursor.execute(FIND_SQL, (canonical,))
+                existing = cursor.fetchone()
+                if existing is None:
+                    cursor.execute(RENAME_SQL, (canonical, bead_id))
+                    counts['renamed'] += 1
+                    continue
+
+                ids = {'keep': existing[0], 'stale': bead_id}
+                for sql in (ADD_QUANTITIES_SQL, DROP_ADDED_SQL, MOVE_INVENTORIES_SQL, DELETE_STALE_SQL):
+                    cursor.execute(sql, ids)
+                if cursor.rowcount:
+                    counts['merged'] += 1
+                else:
+                    counts['conflicts'] += 1
+                    logger.warning(f"⚠️  {code} is still held in a different unit than {canonical}, left as is")
+        connection.commit()
+    except Exception as e:
+        logger.error(f"❌ Product code normalization failed: {e}")
+        connection.rollback()
+        raise
+
+    if counts['renamed'] or counts['merged']:
+        logger.info(f"🔤 Product codes normalized: {counts['renamed']} renamed, "
+                    f"{counts['merged']} merged into their canonical bead")
+    return counts
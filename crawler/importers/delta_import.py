@@ -0,0 +1,131 @@
+"""
+Delta feed import
+Applies a delta feed (``<feed>.delta.ndjson``: the beads added, changed and
+removed since the spider's last run) to the beads table, batch by batch
+"""
+
+import logging
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Optional, Sequence, Union
+
+from config.crawler_config import IMPORT_CONFIG
+from feeds.delta import DELTA_SUFFIX
+from importers.bead_loader import (
+    LOAD_COUNT_KEYS, SECONDARY_SOURCE_KEEP_WHEN_NULL_COLUMNS, bead_to_row, discontinue_beads, get_loader
+)
+from importers.feed_reader import batched, iter_feed
+from importers.feed_tasks import feed_source, record_source
+
+logger = logging.getLogger(__name__)
+
+
+def delta_feed_source(path: Union[str, Path]) -> Optional[str]:
+    """Site a delta feed was crawled from
+
+    The source of its first added or changed bead; a delta that only removes
+    beads falls back to the snapshot feed next to it. None if neither tells.
+    """
+    path = Path(path)
+    for change in iter_feed(path):
+        if change.get('bead'):
+            return record_source(change['bead'])
+    snapshot_path = path.with_name(path.name.replace(f"{DELTA_SUFFIX}.", '.', 1))
+    if snapshot_path != path and snapshot_path.exists():
+        return feed_source(snapshot_path)
+    return None
+
+
+def is_primary_source(source: Optional[str], source_precedence=None) -> bool:
+    """Whether a feed source is the most authoritative one in IMPORT_CONFIG['source_precedence']"""
+    source_precedence = IMPORT_CONFIG['source_precedence'] if source_precedence is None else source_precedence
+    return bool(source) and bool(source_precedence) and source == source_precedence[0]
+
+
+def apply_delta_feed(connection, path: Union[str, Path], backend: str = IMPORT_CONFIG['backend'],
+                     batch_size: int = IMPORT_CONFIG['batch_size'], brand_id: int = 1,
+                     primary: bool = True,
+                     resolve_brand: Optional[Callable[[Optional[str]], Optional[int]]] = None) -> Dict[str, int]:
+    """Upsert the added and changed beads of a delta feed and discontinue the removed ones
+
+    Changes are upserted whatever the importer's mode, as a changed bead must
+    overwrite its row. Beads are keyed by product code alone, so a delta of a
+    secondary source (``primary`` false) goes in the way the multi-feed
+    importer loads its snapshots: it never clears a stored column, and its
+    removals are ignored, as a retailer dropping a product says nothing about
+    the manufacturer's catalog. Each batch is committed on its own (and
+    rolled back if it fails), so database writes scale with what changed
+    since the last run, not with the size of the catalog. With
+    ``resolve_brand`` (e.g. BrandCache.resolve) each bead gets the brand_id of
+    its ``brand`` field, and beads of unknown brands are skipped; otherwise
+    every bead gets ``brand_id``, as do the removals. Returns the loader
+    counts plus ``records``, ``discontinued``, ``ignored_removals`` and ``skipped``.
+    """
+    if primary:
+        upsert_loader = get_loader(backend, 'upsert')
+    else:
+        upsert_loader = get_loader(backend, 'upsert', keep_when_null=SECONDARY_SOURCE_KEEP_WHEN_NULL_COLUMNS)
+    counts = dict.fromkeys(('records', *LOAD_COUNT_KEYS, 'discontinued', 'ignored_removals', 'skipped'), 0)
+    changes = iter_feed(path, chunk_size=IMPORT_CONFIG['read_chunk_size'])
+
+    for batch_number, batch in enumerate(batched(changes, batch_size), start=1):
+        counts['records'] += len(batch)
+        rows = []
+        for change in batch:
+            if change.get('change') not in ('added', 'changed'):
+                continue
+            bead_brand_id = resolve_brand(change['bead'].get('brand')) if resolve_brand else brand_id
+            if bead_brand_id is None:
+                counts['skipped'] += 1
+                continue
+            rows.append(bead_to_row(change['bead'], brand_id=bead_brand_id))
+        removed = [change['product_code'] for change in batch if change.get('change') == 'removed']
+        if not primary:
+            counts['ignored_removals'] += len(removed)
+            removed = []
+        try:
+            with connection.cursor() as cursor:
+                batch_counts = upsert_loader.load(cursor, rows)
+                batch_discontinued = discontinue_beads(cursor, removed, brand_id=brand_id)
+            connection.commit()
+        except Exception as e:
+            logger.error(f"❌ Delta batch failed: {e}")
+            connection.rollback()
+            raise
+
+        for key, value in batch_counts.items():
+            counts[key] += value
+        counts['discontinued'] += batch_discontinued
+        logger.info(
+            f"📦 Delta batch {batch_number}: {batch_counts['inserted']} new, {batch_counts['updated']} updated, "
+            f"{batch_discontinued} discontinued"
+        )
+
+    logger.info(f"🛑 Beads discontinued: {counts['discontinued']}")
+    if counts['ignored_removals']:
+        logger.info(f"⏭️  Removals ignored (not the primary source): {counts['ignored_removals']}")
+    return counts
+
+
+def apply_site_deltas(connection, site_deltas: Iterable[Sequence], source_precedence: Sequence[str],
+                      backend: str = IMPORT_CONFIG['backend'], batch_size: int = IMPORT_CONFIG['batch_size'],
+                      brand_id: int = 1,
+                      resolve_brand: Optional[Callable[[Optional[str]], Optional[int]]] = None
+                      ) -> Dict[str, Dict[str, int]]:
+    """Apply ``(site, delta feeds oldest first)`` pairs after their snapshots, returning counts per delta feed
+
+    Each site's deltas go in the order they were written, as every one only
+    holds the changes since the run before it. Sites go in upsert tier order,
+    the primary source last, so where two sites changed the same bead the
+    most authoritative value is the one left.
+    """
+    def rank(site: str) -> int:
+        return source_precedence.index(site) if site in source_precedence else len(source_precedence)
+
+    results = {}
+    for site, deltas in sorted(site_deltas, key=lambda pair: rank(pair[0]), reverse=True):
+        primary = is_primary_source(site, source_precedence)
+        for delta in deltas:
+            logger.info(f"🔁 Applying {site} delta {delta}{'' if primary else ' (secondary source)'}")
+            results[str(delta)] = apply_delta_feed(connection, delta, backend, batch_size, brand_id=brand_id,
+                                                   primary=primary, resolve_brand=resolve_brand)
+    return results
@@ -0,0 +1,295 @@
+"""
+Streaming feed reader
+Yields bead records one at a time from JSON array or NDJSON feeds, optionally
+gzip or zstd compressed, without loading the whole file into memory. NDJSON
+feeds can also be tailed while a spider in another process is still writing them,
+and plain NDJSON feeds split into byte ranges that are read independently.
+"""
+
+import codecs
+import itertools
+import json
+import logging
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from feeds.writer import PART_SUFFIX, done_marker_path
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+_WHITESPACE = ' \t\r\n'
+_GZIP_MAGIC = b'\x1f\x8b'
+_ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+
+def iter_feed(path: Union[str, Path], chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Dict[str, Any]]:
+    """Yield bead records from a feed file, detecting compression and format from its content
+
+    A feed starting with ``[`` is treated as a JSON array, anything else as
+    NDJSON (one JSON object per line). A pretty-printed ``{"metadata": ...,
+    "beads": [...]}`` document, as the spiders wrote before NDJSON feeds,
+    yields its beads. Truncated feeds, such as the ``.part`` file of an
+    interrupted crawl, yield every complete record and then stop.
+    """
+    path = Path(path)
+    if not path.exists():
+        raise FileNotFoundError(f"Feed file not found: {path}")
+
+    chunks = _iter_text_chunks(path, chunk_size)
+    head = ''
+    for chunk in chunks:
+        head += chunk
+        if head.strip(_WHITESPACE):
+            break
+
+    stripped = head.lstrip(_WHITESPACE)
+    first_char = stripped[:1]
+    if first_char == '[':
+        yield from _iter_json_array(chunks, head)
+    elif first_char == '{' and stripped.split('\n', 1)[0].strip() == '{':
+        yield from _iter_wrapped_beads(chunks, head, path)
+    elif first_char:
+        yield from _iter_ndjson(chunks, head)
+
+
+def ndjson_ranges(path: Union[str, Path], range_bytes: int) -> Optional[List[Tuple[int, int]]]:
+    """Split an uncompressed NDJSON feed into byte ranges of about ``range_bytes`` for iter_ndjson_range
+
+    Returns None for feeds that can only be read from the start (compressed,
+    JSON array or wrapped documents).
+    """
+    path = Path(path)
+    with open(path, 'rb') as f:
+        head = f.read(DEFAULT_CHUNK_SIZE)
+    if head.startswith(_GZIP_MAGIC) or head.startswith(_ZSTD_MAGIC):
+        return None
+    stripped = head.lstrip(_WHITESPACE.encode())
+    if not stripped.startswith(b'{') or stripped.split(b'\n', 1)[0].strip() == b'{':
+        return None
+    size = path.stat().st_size
+    return [(start, min(start + range_bytes, size)) for start in range(0, size, max(range_bytes, 1))]
+
+
+def iter_ndjson_range(path: Union[str, Path], start: int, end: int) -> Iterator[Dict[str, Any]]:
+    """Yield the NDJSON records whose lines start within ``[start, end)``
+
+    Ranges from ndjson_ranges cover every line exactly once, so workers can
+    read one each in parallel.
+    """
+    with open(path, 'rb') as f:
+        if start:
+            # Skip to the first line starting at or after ``start``; the line in progress belongs to the previous range
+            f.seek(start - 1)
+            f.readline()
+        position = f.tell()
+        while position < end:
+            line_start = position
+            line = f.readline()
+            if not line:
+                return
+            position += len(line)
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                logger.warning(f"⚠️  Skipping malformed line at byte {line_start} of {path}: {e}")
+
+
+def tail_feed(path: Union[str, Path], should_stop: Optional[Callable[[], bool]] = None,
+              poll_interval: float = 0.5, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Dict[str, Any]]:
+    """Yield NDJSON records as a FeedWriter appends them, until the feed is marked done
+
+    Waits for ``<path>.part`` to appear and reads it as it grows; the open handle
+    keeps working after the writer renames it to ``path``. Reading stops once
+    ``<path>.done`` exists and the file is drained, or when ``should_stop()``
+    returns True (e.g. the spider process exited) and no more data arrives.
+    """
+    path = Path(path)
+    part_path = path.with_name(path.name + PART_SUFFIX)
+    done_path = done_marker_path(path)
+    should_stop = should_stop or (lambda: False)
+
+    while True:
+        if part_path.exists():
+            feed_path = part_path
+            break
+        if done_path.exists() and path.exists():
+            # The spider finished before we started watching
+            feed_path = path
+            break
+        if should_stop():
+            logger.warning(f"⚠️  Feed {part_path} never appeared")
+            return
+        time.sleep(poll_interval)
+
+    logger.info(f"👀 Tailing feed {feed_path}")
+    with open(feed_path, 'rb') as f:
+        chunks = _decode_stream(_follow(f, done_path, should_stop, poll_interval, chunk_size), path)
+        yield from _iter_ndjson(chunks, '')
+
+
+def batched(records: Iterable[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    """Group records into lists of at most ``size`` items"""
+    if size < 1:
+        raise ValueError("Batch size must be at least 1")
+
+    batch: List[Dict[str, Any]] = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _iter_text_chunks(path: Path, chunk_size: int) -> Iterator[str]:
+    """Yield decoded text from a feed, transparently decompressing gzip and zstd
+
+    Compressed feeds are a series of gzip members or zstd frames (one per writer
+    flush); a cut-off final block yields whatever decompressed before it ended.
+    """
+    with open(path, 'rb') as f:
+        yield from _decode_stream(iter(lambda: f.read(chunk_size), b''), path)
+
+
+def _decode_stream(raw_chunks: Iterator[bytes], path: Path) -> Iterator[str]:
+    """Decode raw feed bytes to text, picking the decompressor from the first bytes"""
+    head = b''
+    for raw in raw_chunks:
+        head += raw
+        if len(head) >= len(_ZSTD_MAGIC):
+            break
+    raw_chunks = itertools.chain([head], raw_chunks)
+
+    if head.startswith(_GZIP_MAGIC):
+        blocks = _decompress_blocks(raw_chunks, lambda: zlib.decompressobj(wbits=31), path)
+    elif head.startswith(_ZSTD_MAGIC):
+        if not ZSTD_AVAILABLE:
+            raise RuntimeError(f"{path} is zstd compressed but the zstandard package is not installed")
+        decompressor = zstandard.ZstdDecompressor()
+        blocks = _decompress_blocks(raw_chunks, decompressor.decompressobj, path)
+    else:
+        blocks = raw_chunks
+
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    for block in blocks:
+        text = decoder.decode(block)
+        if text:
+            yield text
+    text = decoder.decode(b'', final=True)
+    if text:
+        yield text
+
+
+def _follow(f, done_path: Path, should_stop: Callable[[], bool], poll_interval: float,
+            chunk_size: int) -> Iterator[bytes]:
+    """Yield bytes appended to an open file until the writer marks it done or stops"""
+    while True:
+        raw = f.read(chunk_size)
+        if raw:
+            yield raw
+            continue
+        # Check the marker before the final read so no bytes written before it are missed
+        if done_path.exists() or should_stop():
+            stopped = not done_path.exists()
+            raw = f.read()
+            if raw:
+                yield raw
+            if stopped:
+                logger.warning(f"⚠️  Stopped tailing {f.name} before the feed was marked done")
+            return
+        time.sleep(poll_interval)
+
+
+def _decompress_blocks(raw_chunks: Iterator[bytes], new_decompressor: Callable, path: Path) -> Iterator[bytes]:
+    """Decompress concatenated gzip members / zstd frames, starting a new decompressor at each boundary"""
+    decompressor = new_decompressor()
+    fed = False
+    for raw in raw_chunks:
+        while raw:
+            fed = True
+            yield decompressor.decompress(raw)
+            if not decompressor.eof:
+                break
+            raw = decompressor.unused_data
+            decompressor = new_decompressor()
+            fed = False
+    if fed:
+        logger.warning(f"⚠️  Compressed feed {path} is truncated, ignoring its incomplete last block")
+
+
+def _iter_json_array(chunks: Iterator[str], buffer: str) -> Iterator[Dict[str, Any]]:
+    """Incrementally decode the elements of a top-level JSON array"""
+    decoder = json.JSONDecoder()
+    pos = buffer.index('[') + 1
+
+    while True:
+        # Skip separators between elements
+        while pos < len(buffer) and buffer[pos] in _WHITESPACE + ',':
+            pos += 1
+
+        if pos < len(buffer) and buffer[pos] == ']':
+            return
+
+        try:
+            if pos >= len(buffer):
+                raise json.JSONDecodeError("Need more data", buffer, pos)
+            record, pos = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            chunk = next(chunks, '')
+            if not chunk:
+                if buffer[pos:].strip():
+                    logger.warning("⚠️  Feed ended mid-record (truncated file?), ignoring trailing data")
+                else:
+                    logger.warning("⚠️  Feed ended without closing ']' (truncated file?)")
+                return
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+
+        yield record
+
+
+def _iter_wrapped_beads(chunks: Iterator[str], buffer: str, path: Path) -> Iterator[Dict[str, Any]]:
+    """Yield the ``beads`` of a single wrapped JSON document (these legacy files are small enough to load whole)"""
+    try:
+        document = json.loads(buffer + ''.join(chunks))
+    except json.JSONDecodeError as e:
+        logger.warning(f"⚠️  Could not parse wrapped feed document {path}: {e}")
+        return
+    yield from document.get('beads') or []
+
+
+def _iter_ndjson(chunks: Iterator[str], buffer: str) -> Iterator[Dict[str, Any]]:
+    """Decode one JSON object per line, skipping blank lines"""
+    line_number = 0
+    while True:
+        chunk = next(chunks, '')
+        lines = (buffer + chunk).split('\n')
+        # The last piece may be an incomplete line until more data (or EOF) arrives
+        buffer = lines.pop() if chunk else ''
+
+        for line in lines:
+            line_number += 1
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                # A partially written last line is expected if the writer was interrupted
+                logger.warning(f"⚠️  Skipping malformed line {line_number}: {e}")
+
+        if not chunk:
+            return
@@ -0,0 +1,85 @@
+"""
+Feed task planning
+Finds finished feed files, works out which site each was crawled from and
+splits them into the tasks the multi-feed importer's workers load, grouped
+into tiers by source precedence
+"""
+
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence
+from urllib.parse import urlparse
+
+from feeds.delta import DELTA_SUFFIX
+from feeds.writer import DONE_SUFFIX, PART_SUFFIX
+from importers.feed_reader import iter_feed, ndjson_ranges
+
+
+class FeedTask(NamedTuple):
+    """A whole feed (``end`` None) or one byte range of a plain NDJSON feed
+
+    ``primary`` is set for feeds of the most authoritative source, the only
+    one whose upserts may clear a stored column.
+    """
+    feed: str
+    start: int = 0
+    end: Optional[int] = None
+    primary: bool = True
+
+
+def record_source(bead: Dict) -> Optional[str]:
+    """Site a bead record was crawled from: the host of its source_url, without www."""
+    host = urlparse(bead.get('source_url') or '').hostname
+    return host.removeprefix('www.') if host else None
+
+
+def feed_source(path: Path) -> Optional[str]:
+    """Site a feed was crawled from: the source of its first record"""
+    for bead in iter_feed(path):
+        return record_source(bead)
+    return None
+
+
+def find_feed_files(paths: Iterable[Path]) -> List[Path]:
+    """Feed files among the given paths, looking one level into directories
+
+    Unfinished (``.part``) feeds, ``.done`` markers and delta feeds are left out.
+    """
+    feeds = []
+    for path in paths:
+        candidates = sorted(path.iterdir()) if path.is_dir() else [path]
+        for candidate in candidates:
+            name = candidate.name
+            if not candidate.is_file() or name.endswith((PART_SUFFIX, DONE_SUFFIX)) or f"{DELTA_SUFFIX}." in name:
+                continue
+            if '.json' in name or '.ndjson' in name:
+                feeds.append(candidate)
+    return feeds
+
+
+def plan_tasks(feeds: List[Path], range_bytes: int, primary: bool = True) -> List[FeedTask]:
+    """One task per feed, plus one per range of large uncompressed NDJSON feeds; largest first"""
+    tasks = []
+    for feed in feeds:
+        ranges = ndjson_ranges(feed, range_bytes)
+        if ranges and len(ranges) > 1:
+            tasks.extend(FeedTask(str(feed), start, end, primary) for start, end in ranges)
+        else:
+            tasks.append(FeedTask(str(feed), primary=primary))
+    return sorted(tasks, key=lambda task: (task.end or Path(task.feed).stat().st_size) - task.start, reverse=True)
+
+
+def plan_tiers(feeds: List[Path], source_precedence: Sequence[str], mode: str,
+               range_bytes: int) -> List[List[FeedTask]]:
+    """Tasks grouped by feed source, in the order the groups have to be loaded
+
+    The most authoritative source goes first in insert mode, where the first
+    row wins, and last in upsert mode, where the last one does. Feeds of
+    sources missing from ``source_precedence`` share the least authoritative tier.
+    """
+    by_rank: Dict[int, List[Path]] = {}
+    for feed in feeds:
+        source = feed_source(feed)
+        rank = source_precedence.index(source) if source in source_precedence else len(source_precedence)
+        by_rank.setdefault(rank, []).append(feed)
+    ranks = sorted(by_rank, reverse=mode == 'upsert')
+    return [plan_tasks(by_rank[rank], range_bytes, primary=rank == 0) for rank in ranks]
@@ -4,34 +4,42 @@ Miyuki Directory Importer
 Reads JSON data from the Miyuki crawler and imports it directly to the Rails database
 """
 
-import json
+import argparse
 import logging
-import os
+import time
 import psycopg2
 from pathlib import Path
-from typing import List, Dict, Any, Set
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 from datetime import datetime
 
+from config.crawler_config import IMPORT_CONFIG, get_connection_kwargs
+from feeds.delta import delta_feed_path
+from importers.backend_comparison import compare_backends
+from importers.bead_loader import LOAD_COUNT_KEYS, LOADERS, MODES, bead_to_row, get_loader
+from importers.code_normalization import normalize_stored_codes
+from importers.delta_import import apply_delta_feed, delta_feed_source, is_primary_source
+from importers.feed_reader import batched, iter_feed, tail_feed
+from importers.schema_check import check_beads_schema
+
 logger = logging.getLogger(__name__)
 
+DEFAULT_FEED_PATH = "data/miyuki_directory_beads.ndjson"
+
 class MiyukiDirectoryImporter:
     """Imports Miyuki bead data from JSON to Rails database"""
     
-    def __init__(self, json_file_path: str = "data/miyuki_directory_beads.json"):
+    def __init__(self, json_file_path: str = DEFAULT_FEED_PATH,
+                 backend: str = IMPORT_CONFIG['backend'], mode: str = IMPORT_CONFIG['mode']):
         self.json_file_path = Path(json_file_path)
+        self.mode = mode
+        self.loader = get_loader(backend, mode)
         self.db_connection = None
-        self.existing_product_codes: Set[str] = set()
         
     def connect_to_database(self):
         """Connect to the Rails database"""
         try:
-            self.db_connection = psycopg2.connect(
-                host=os.getenv('DATABASE_HOST', 'localhost'),
-                port=int(os.getenv('DATABASE_PORT', '5432')),
-                database='pattern_maker_development',  # Use Rails development DB
-                user=os.getenv('DATABASE_USERNAME', ''),
-                password=os.getenv('DATABASE_PASSWORD', '')
-            )
+            # The same settings as the crawler's known-codes index and Postgres pipeline
+            self.db_connection = psycopg2.connect(**get_connection_kwargs())
             logger.info("✅ Connected to database successfully")
         except Exception as e:
             logger.error(f"❌ Failed to connect to database: {e}")
@@ -42,205 +50,165 @@ class MiyukiDirectoryImporter:
         self.connect_to_database()
         logger.info(f"Starting spider, will use ON CONFLICT DO NOTHING for duplicates")
     
-    def load_existing_product_codes(self):
-        """Load existing product codes from database to avoid duplicates"""
-        # NOTE: This method is now optional since we use ON CONFLICT DO NOTHING
-        # Keeping it for compatibility but it's not required anymore
-        if not self.db_connection:
-            logger.warning("⚠️  No database connection available")
-            return
-            
-        try:
-            with self.db_connection.cursor() as cursor:
-                cursor.execute("SELECT brand_product_code FROM beads WHERE brand_id = 1")  # Changed from brand = 'Miyuki'
-                self.existing_product_codes = {row[0] for row in cursor.fetchall()}
-            
-            logger.info(f"📊 Loaded {len(self.existing_product_codes)} existing Miyuki product codes (for reporting only)")
-            
-        except Exception as e:
-            logger.warning(f"⚠️  Could not load existing product codes: {e}")
-            self.existing_product_codes = set()
-    
-    def load_json_data(self) -> List[Dict[str, Any]]:
-        """Load bead data from JSON file"""
-        if not self.json_file_path.exists():
-            raise FileNotFoundError(f"JSON file not found: {self.json_file_path}")
-            
-        logger.info(f"📖 Loading data from {self.json_file_path}")
-        
-        with open(self.json_file_path, 'r', encoding='utf-8') as f:
-            beads = json.load(f)
-            
-        logger.info(f"📊 Loaded {len(beads)} beads from JSON")
-        return beads
-    
     def check_database_schema(self):
         """Check if the required table and columns exist"""
         if not self.db_connection:
             logger.error("⚠️  No database connection for schema check")
             return False
-            
-        try:
-            with self.db_connection.cursor() as cursor:
-                # Check if beads table exists
-                cursor.execute("""
-                    SELECT EXISTS (
-                        SELECT FROM information_schema.tables 
-                        WHERE table_schema = 'public' 
-                        AND table_name = 'beads'
-                    )
-                """)
-                result = cursor.fetchone()
-                table_exists = result[0] if result else False
-                
-                if not table_exists:
-                    logger.error("❌ Table 'beads' does not exist!")
-                    return False
-                
-                # Check if required columns exist
-                cursor.execute("""
-                    SELECT column_name 
-                    FROM information_schema.columns 
-                    WHERE table_name = 'beads' 
-                    AND table_schema = 'public'
-                """)
-                columns = [row[0] for row in cursor.fetchall()]
-                
-                required_columns = [
-                    'brand_product_code', 'name', 'brand_id', 'shape', 'size',
-                    'color_group', 'glass_group', 'finish', 'dyed',
-                    'galvanized', 'plating', 'created_at', 'updated_at'
-                ]
-                
-                missing_columns = [col for col in required_columns if col not in columns]
-                
-                if missing_columns:
-                    logger.error(f"❌ Missing columns in beads table: {missing_columns}")
-                    logger.info(f"📋 Available columns: {columns}")
-                    return False
-                
-                logger.info("✅ Database schema check passed")
-                return True
-                
-        except Exception as e:
-            logger.error(f"❌ Schema check failed: {e}")
-            return False
+        return check_beads_schema(self.db_connection)
 
-    def bulk_import_beads(self) -> Dict[str, int]:
-        """Main import method - bulk import all beads"""
-        logger.info("🚀 Starting Miyuki Directory import...")
-        
-        # Check database schema first
+    def prepare_database(self):
+        """Check the schema and bring stored product codes to canonical form before loading"""
         if not self.check_database_schema():
             raise RuntimeError("Database schema check failed - cannot proceed with import")
+        if not self.db_connection:
+            logger.error("⚠️  Database connection not available")
+            raise RuntimeError("No database connection")
+        normalize_stored_codes(self.db_connection)
+
+    def bulk_import_beads(self, batch_size: Optional[int] = None) -> Dict[str, int]:
+        """Main import method - import the whole feed
+
+        Goes through the streaming batch path, so the feed is never held in
+        memory whole and each batch is committed as soon as it is written.
+        """
+        logger.info("🚀 Starting Miyuki Directory import...")
+        return self.stream_import_beads(batch_size=batch_size)
+    
+    def stream_import_beads(self, batch_size: Optional[int] = None) -> Dict[str, int]:
+        """Stream beads from the feed and insert them in fixed-size batches
+
+        Reads the JSON array (or NDJSON) feed record by record, so memory stays
+        flat regardless of feed size, and commits each batch as soon as it is written.
+        """
+        batch_size = batch_size or IMPORT_CONFIG['batch_size']
+        logger.info(f"🚀 Starting streaming Miyuki Directory import (batch size {batch_size})...")
+        if not self.json_file_path.exists():
+            raise FileNotFoundError(f"JSON file not found: {self.json_file_path}")
+        logger.info(f"📖 Streaming data from {self.json_file_path} ({self._mode_description()})")
+        beads = iter_feed(self.json_file_path, chunk_size=IMPORT_CONFIG['read_chunk_size'])
+        return self._import_records(beads, batch_size)
+    
+    def tail_import_beads(self, should_stop: Optional[Callable[[], bool]] = None,
+                          batch_size: Optional[int] = None, poll_interval: float = 0.5) -> Dict[str, int]:
+        """Import beads while the spider is still writing the feed
+
+        Follows the NDJSON feed from another process, committing each batch as
+        soon as it fills, and finishes once the spider's ``.done`` marker appears
+        (or ``should_stop()`` reports the spider has gone away).
+        """
+        batch_size = batch_size or IMPORT_CONFIG['batch_size']
+        logger.info(f"🚀 Starting overlapped Miyuki Directory import (batch size {batch_size})...")
+        beads = tail_feed(self.json_file_path, should_stop=should_stop, poll_interval=poll_interval,
+                          chunk_size=IMPORT_CONFIG['read_chunk_size'])
+        return self._import_records(beads, batch_size)
+    
+    def apply_delta(self, batch_size: Optional[int] = None) -> Dict[str, int]:
+        """Import a delta feed (``<feed>.delta.ndjson``) instead of a full snapshot
+
+        See importers.delta_import: added and changed beads are upserted,
+        removed ones are marked discontinued. A delta from any source but the
+        most authoritative one never clears a stored column or discontinues a
+        bead.
+        """
+        batch_size = batch_size or IMPORT_CONFIG['batch_size']
+        logger.info(f"🚀 Applying delta feed {self.json_file_path} (batch size {batch_size})...")
+        self.prepare_database()
+
+        source = delta_feed_source(self.json_file_path)
+        primary = is_primary_source(source)
+        if not primary:
+            logger.info(f"ℹ️  {source or 'Unknown source'} is not the primary source: "
+                        f"stored values are kept and removals ignored")
+        counts = apply_delta_feed(self.db_connection, self.json_file_path, self.loader.name, batch_size,
+                                  primary=primary)
+        result = self._build_result(counts, total_count=counts['records'])
+        result['discontinued_count'] = counts['discontinued']
+        return result
+
+    def _import_records(self, beads: Iterable[Dict[str, Any]], batch_size: int) -> Dict[str, int]:
+        """Insert records in fixed-size batches, committing each one"""
+        self.prepare_database()
         
-        # Load data from JSON
-        beads = self.load_json_data()
-        
-        if not beads:
-            logger.warning("⚠️  No beads found in JSON file")
-            return {'imported_count': 0, 'total_count': 0, 'duplicate_count': 0}
+        total_count = 0
+        counts = dict.fromkeys(LOAD_COUNT_KEYS, 0)
+        started_at = time.perf_counter()
         
-        # Filter out beads with missing product codes
-        valid_beads = []
-        for bead in beads:
-            product_code = bead.get('product_code')
-            if not product_code:
-                logger.warning("⚠️  Bead missing product_code, skipping")
+        for batch_number, batch in enumerate(batched(beads, batch_size), start=1):
+            total_count += len(batch)
+            rows = []
+            for bead in batch:
+                if not bead.get('product_code'):
+                    logger.warning("⚠️  Bead missing product_code, skipping")
+                    continue
+                rows.append(bead_to_row(bead))
+            
+            if not rows:
                 continue
-            valid_beads.append(bead)
-        
-        if not valid_beads:
-            logger.info("❌ No valid beads found (all missing product codes)")
-            return {'imported_count': 0, 'total_count': len(beads), 'duplicate_count': 0}
+            
+            batch_started_at = time.perf_counter()
+            batch_counts = self._insert_batch(rows)
+            elapsed = time.perf_counter() - batch_started_at
+            
+            for key, value in batch_counts.items():
+                counts[key] += value
+            rate = len(rows) / elapsed if elapsed > 0 else float('inf')
+            logger.info(
+                f"📦 Batch {batch_number}: {len(rows)} rows, {batch_counts['inserted']} new, "
+                f"{batch_counts['updated']} updated in {elapsed:.2f}s ({rate:,.0f} rows/s)"
+            )
         
-        logger.info(f"📈 Attempting to import {len(valid_beads)} beads (duplicates will be ignored)")
+        elapsed = time.perf_counter() - started_at
+        rate = total_count / elapsed if elapsed > 0 else float('inf')
+        logger.info(f"💾 Streaming import completed in {elapsed:.2f}s ({rate:,.0f} rows/s overall)")
         
-        # Bulk insert using execute_values with ON CONFLICT DO NOTHING
-        if not self.db_connection:
-            logger.error("⚠️  Database connection not available")
-            raise RuntimeError("No database connection")
-            
+        return self._build_result(counts, total_count=total_count)
+    
+    def _insert_batch(self, rows: List[Tuple]) -> Dict[str, int]:
+        """Load one batch of rows and commit it, returning the loader's counts"""
         try:
-            from psycopg2.extras import execute_values
-            
             with self.db_connection.cursor() as cursor:
-                # Prepare data tuples for bulk insert
-                insert_data = [
-                    (
-                        bead.get('product_code'),  # brand_product_code
-                        bead.get('name'),
-                        1,  # brand_id (assuming Miyuki brand has ID 1)
-                        bead.get('shape'),
-                        bead.get('size'),
-                        bead.get('color'),  # Map 'color' to 'color_group'
-                        bead.get('glass_group'),
-                        bead.get('finish'),
-                        bead.get('dyed'),
-                        bead.get('galvanized'),
-                        bead.get('plating')
-                    )
-                    for bead in valid_beads
-                ]
-                
-                # Count existing beads before insert (using brand_id instead of brand name)
-                try:
-                    cursor.execute("SELECT COUNT(*) FROM beads WHERE brand_id = 1")  # Assuming Miyuki brand_id = 1
-                    result_before = cursor.fetchone()
-                    count_before = result_before[0] if result_before else 0
-                    logger.info(f"📊 Found {count_before} existing Miyuki beads")
-                except Exception as e:
-                    logger.warning(f"⚠️  Could not count existing beads: {e}")
-                    count_before = 0
-                
-                # Bulk insert with ON CONFLICT DO NOTHING
-                execute_values(
-                    cursor,
-                    """
-                    INSERT INTO beads (
-                        brand_product_code, name, brand_id, shape, size, 
-                        color_group, glass_group, finish, dyed, 
-                        galvanized, plating, created_at, updated_at
-                    ) VALUES %s
-                    ON CONFLICT (brand_product_code) DO NOTHING
-                    """,
-                    insert_data,
-                    template="(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW(), NOW())"
-                )
-                
-                # Count existing beads after insert
-                try:
-                    cursor.execute("SELECT COUNT(*) FROM beads WHERE brand_id = 1") # Changed from brand = 'Miyuki' to brand_id = 1
-                    result_after = cursor.fetchone()
-                    count_after = result_after[0] if result_after else 0
-                except Exception as e:
-                    logger.warning(f"⚠️  Could not count beads after insert: {e}")
-                    count_after = count_before  # Fallback
-                
-                imported_count = count_after - count_before
-                duplicate_count = len(valid_beads) - imported_count
-                
-            # Commit all changes
+                counts = self.loader.load(cursor, rows)
             self.db_connection.commit()
-            logger.info(f"💾 Bulk insert completed!")
-            logger.info(f"✅ New beads imported: {imported_count}")
-            logger.info(f"🔄 Duplicates ignored: {duplicate_count}")
-            
-            return {
-                'imported_count': imported_count,
-                'total_count': len(beads),
-                'duplicate_count': duplicate_count
-            }
-            
+            return counts
         except Exception as e:
-            logger.error(f"❌ Bulk insert failed: {e}")
-            try:
-                self.db_connection.rollback()
-                logger.info("🔄 Transaction rolled back")
-            except Exception as rollback_error:
-                logger.error(f"❌ Rollback failed: {rollback_error}")
+            logger.error(f"❌ Batch insert failed: {e}")
+            self.db_connection.rollback()
             raise
     
+    def _mode_description(self) -> str:
+        """Describe how existing beads are treated in the current mode"""
+        if self.mode == 'upsert':
+            return "changed beads will be updated"
+        return "duplicates will be ignored"
+    
+    def _build_result(self, counts: Dict[str, int], total_count: int) -> Dict[str, int]:
+        """Log loader counts and turn them into the importer's result dict"""
+        imported_count = counts.get('inserted', 0)
+        updated_count = counts.get('updated', 0)
+        unchanged_count = counts.get('unchanged', 0)
+        repeated_count = counts.get('duplicates', 0)
+        
+        logger.info(f"✅ New beads imported: {imported_count}")
+        if self.mode == 'upsert':
+            logger.info(f"♻️  Beads updated: {updated_count}")
+            logger.info(f"⏸️  Beads unchanged: {unchanged_count}")
+        else:
+            logger.info(f"🔄 Duplicates ignored: {unchanged_count}")
+        if repeated_count:
+            # Only the last record of a product code repeated within a batch is loaded
+            logger.info(f"🔁 Repeated product codes in the feed: {repeated_count}")
+        
+        return {
+            'imported_count': imported_count,
+            'updated_count': updated_count,
+            'unchanged_count': unchanged_count,
+            'repeated_count': repeated_count,
+            'total_count': total_count,
+            # Existing beads that were not inserted, whether updated or not
+            'duplicate_count': updated_count + unchanged_count
+        }
+    
     def rename_json_with_timestamp(self):
         """Rename the JSON file with a timestamp when processing is complete"""
         if not self.json_file_path.exists():
@@ -250,10 +218,9 @@ class MiyukiDirectoryImporter:
         # Create timestamp in format: YYYYMMDD_HHMMSS
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         
-        # Create new filename: original_name_timestamp.json
-        original_stem = self.json_file_path.stem  # filename without extension
-        original_suffix = self.json_file_path.suffix  # .json
-        new_filename = f"{original_stem}_{timestamp}{original_suffix}"
+        # Create new filename: original_name_timestamp.ndjson (keeping every suffix, e.g. .ndjson.gz)
+        original_stem, _, original_suffixes = self.json_file_path.name.partition('.')
+        new_filename = f"{original_stem}_{timestamp}.{original_suffixes}" if original_suffixes else f"{original_stem}_{timestamp}"
         new_path = self.json_file_path.parent / new_filename
         
         try:
@@ -275,15 +242,37 @@ def main():
         format='%(asctime)s [%(name)s] %(levelname)s: %(message)s'
     )
     
-    importer = MiyukiDirectoryImporter()
+    parser = argparse.ArgumentParser(description="Import Miyuki Directory beads into the Rails database")
+    parser.add_argument('--file', default=DEFAULT_FEED_PATH, help="Feed file (JSON array or NDJSON, optionally .gz/.zst)")
+    parser.add_argument('--stream', action='store_true',
+                        help="Stream the feed and insert in batches (every full import does; kept for old scripts)")
+    parser.add_argument('--delta', action='store_true',
+                        help="Apply a delta feed: only added, changed and removed beads "
+                             "(default file: the delta next to the default feed)")
+    parser.add_argument('--batch-size', type=int, default=IMPORT_CONFIG['batch_size'], help="Rows per streamed batch")
+    parser.add_argument('--backend', choices=sorted(LOADERS), default=IMPORT_CONFIG['backend'], help="Loader backend")
+    parser.add_argument('--mode', choices=MODES, default=IMPORT_CONFIG['mode'],
+                        help="'insert' skips existing beads, 'upsert' also refreshes changed ones")
+    parser.add_argument('--compare-backends', action='store_true', help="Time every backend on the feed and roll back")
+    parser.add_argument('--sample-size', type=int, help="Rows to use for --compare-backends (default: whole feed)")
+    args = parser.parse_args()
+    
+    feed_path = delta_feed_path(args.file) if args.delta and args.file == DEFAULT_FEED_PATH else args.file
+    importer = MiyukiDirectoryImporter(feed_path, backend=args.backend, mode=args.mode)
     
     try:
         # Connect and load existing data
         importer.connect_to_database()
-        importer.load_existing_product_codes()
+        
+        if args.compare_backends:
+            compare_backends(importer.db_connection, importer.json_file_path, importer.mode, args.sample_size)
+            return
         
         # Import beads
-        result = importer.bulk_import_beads()
+        if args.delta:
+            result = importer.apply_delta(batch_size=args.batch_size)
+        else:
+            result = importer.bulk_import_beads(batch_size=args.batch_size)
         
         # Rename JSON file
         importer.rename_json_with_timestamp()
@@ -291,7 +280,11 @@ def main():
         logger.info(f"🎉 Import completed!")
         logger.info(f"📊 Total beads in file: {result['total_count']}")
         logger.info(f"✅ New beads imported: {result['imported_count']}")
-        logger.info(f"🔄 Duplicates skipped: {result['duplicate_count']}")
+        logger.info(f"♻️  Beads updated: {result['updated_count']}")
+        logger.info(f"🔄 Unchanged beads skipped: {result['unchanged_count']}")
+        logger.info(f"🔁 Repeated product codes: {result['repeated_count']}")
+        if args.delta:
+            logger.info(f"🛑 Beads discontinued: {result['discontinued_count']}")
         
     except Exception as e:
         logger.error(f"💥 Import failed: {e}")
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Multi-feed importer
+Loads many bead feeds (local files, or the newest snapshot of every site under
+an S3 prefix plus the deltas uploaded after it) into the beads table from a
+pool of worker processes, resolving each bead's brand_id from bead_brands,
+and reports throughput per feed
+
+Usage (from the crawler directory):
+    python -m importers.multi_feed data/miyuki_directory_beads.ndjson data/fire_mountain_gems_beads.ndjson
+    python -m importers.multi_feed --s3-prefix beads/ --workers 8
+"""
+
+import argparse
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import psycopg2
+from psycopg2.extensions import TransactionRollbackError
+
+from config.crawler_config import IMPORT_CONFIG, get_connection_kwargs
+from importers.bead_loader import (
+    LOAD_COUNT_KEYS, LOADERS, MODES, SECONDARY_SOURCE_KEEP_WHEN_NULL_COLUMNS, bead_to_row, get_loader
+)
+from importers.brands import DEFAULT_BRAND, BrandCache
+from importers.code_normalization import normalize_stored_codes
+from importers.delta_import import apply_site_deltas
+from importers.feed_reader import batched, iter_feed, iter_ndjson_range
+from importers.feed_tasks import FeedTask, find_feed_files, plan_tiers
+from importers.s3_feeds import SiteFeeds, download_s3_feeds
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RANGE_BYTES = 32 * 1024 * 1024  # Plain NDJSON feeds are split into ranges of this size, one task each
+DEADLOCK_RETRIES = 3
+COUNT_KEYS = ('records', *LOAD_COUNT_KEYS, 'skipped')
+
+
+# Per-process state of a pool worker, set up by _init_worker
+_worker: Dict[str, Any] = {}
+
+
+def _init_worker(brands: BrandCache, backend: str, mode: str):
+    """Give each worker process its own connection; the pool reuses it for every task"""
+    _worker['connection'] = psycopg2.connect(**get_connection_kwargs())
+    _worker['brands'] = brands
+    _worker['loaders'] = {
+        True: get_loader(backend, mode),
+        False: get_loader(backend, mode, keep_when_null=SECONDARY_SOURCE_KEEP_WHEN_NULL_COLUMNS),
+    }
+
+
+def _load_task(task: FeedTask, batch_size: int) -> Dict[str, Any]:
+    """Parse one feed (or range) and load it batch by batch, committing each batch"""
+    started_at = time.time()
+    brands: BrandCache = _worker['brands']
+    records = iter_feed(task.feed) if task.end is None else iter_ndjson_range(task.feed, task.start, task.end)
+    counts = dict.fromkeys(COUNT_KEYS, 0)
+    unknown_brands = set()
+
+    for batch in batched(records, batch_size):
+        counts['records'] += len(batch)
+        rows = []
+        for bead in batch:
+            brand_id = brands.resolve(bead.get('brand'))
+            if brand_id is None:
+                unknown_brands.add(str(bead.get('brand')))
+            if brand_id is None or not bead.get('product_code'):
+                counts['skipped'] += 1
+                continue
+            rows.append(bead_to_row(bead, brand_id=brand_id))
+        # Every worker locks rows in product code order, so batches touching the same beads queue instead of deadlocking
+        rows.sort(key=lambda row: row[0])
+        for key, value in _load_rows(rows, _worker['loaders'][task.primary]).items():
+            counts[key] += value
+
+    return {
+        'feed': task.feed,
+        'started_at': started_at,
+        'finished_at': time.time(),
+        'unknown_brands': sorted(unknown_brands),
+        **counts
+    }
+
+
+def _load_rows(rows: List[Tuple], loader) -> Dict[str, int]:
+    """Load and commit one batch, retrying if Postgres still picks it as a deadlock victim"""
+    connection = _worker['connection']
+    for attempt in range(1, DEADLOCK_RETRIES + 1):
+        try:
+            with connection.cursor() as cursor:
+                counts = loader.load(cursor, rows)
+            connection.commit()
+            return counts
+        except TransactionRollbackError:
+            connection.rollback()
+            if attempt == DEADLOCK_RETRIES:
+                raise
+            time.sleep(0.1 * attempt)
+        except Exception:
+            connection.rollback()
+            raise
+
+
+class MultiFeedImporter:
+    """Loads feeds in parallel: each task (a feed, or a range of a large NDJSON feed) runs in a worker process
+
+    Beads are keyed by product code alone, and a retailer lists the same
+    codes as the manufacturer with fewer attributes, so feeds are loaded in
+    tiers by ``source_precedence`` (most authoritative first) rather than all
+    at once: the top source goes first in insert mode, where the first row
+    wins, and last in upsert mode, where the last one does. Upserts of any
+    other source never clear a column they have no value for.
+    """
+
+    def __init__(self, workers: Optional[int] = None, backend: str = IMPORT_CONFIG['backend'],
+                 mode: str = IMPORT_CONFIG['mode'], batch_size: int = IMPORT_CONFIG['batch_size'],
+                 range_bytes: int = DEFAULT_RANGE_BYTES, default_brand: Optional[str] = DEFAULT_BRAND,
+                 source_precedence: Sequence[str] = IMPORT_CONFIG['source_precedence']):
+        get_loader(backend, mode)  # Fail on a bad backend or mode before any worker starts
+        self.workers = workers or os.cpu_count() or 1
+        self.backend = backend
+        self.mode = mode
+        self.batch_size = batch_size
+        self.range_bytes = range_bytes
+        self.default_brand = default_brand
+        self.source_precedence = list(source_precedence)
+
+    def load_brands(self) -> BrandCache:
+        """Read bead_brands (closing the connection before the workers fork)"""
+        connection = psycopg2.connect(**get_connection_kwargs())
+        try:
+            brands = BrandCache.load(connection, self.default_brand)
+        finally:
+            connection.close()
+        logger.info(f"🏷️  Loaded {len(brands.brand_ids)} brands from bead_brands")
+        return brands
+
+    def normalize_codes(self) -> Dict[str, int]:
+        """Bring stored product codes to canonical form, so feeds match the beads already there"""
+        connection = psycopg2.connect(**get_connection_kwargs())
+        try:
+            return normalize_stored_codes(connection)
+        finally:
+            connection.close()
+
+    def plan_tiers(self, feeds: List[Path]) -> List[List[FeedTask]]:
+        """Tasks grouped by feed source, in the order the groups have to be loaded"""
+        return plan_tiers(feeds, self.source_precedence, self.mode, self.range_bytes)
+
+    def import_feeds(self, feeds: List[Path]) -> Dict[str, Dict[str, Any]]:
+        """Load every feed and return per-feed results (counts, seconds, rows/s)"""
+        self.normalize_codes()
+        brands = self.load_brands()
+        tiers = self.plan_tiers(feeds)
+        results = {str(feed): {**dict.fromkeys(COUNT_KEYS, 0), 'tasks': 0, 'failed_tasks': 0,
+                               'bytes': feed.stat().st_size, 'started_at': None, 'finished_at': None,
+                               'unknown_brands': set()} for feed in feeds}
+        logger.info(f"🚀 Importing {len(feeds)} feeds as {sum(map(len, tiers))} tasks in {len(tiers)} source tiers "
+                    f"on {self.workers} worker processes ({self.backend}, {self.mode})")
+
+        started_at = time.time()
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                 initargs=(brands, self.backend, self.mode)) as pool:
+            for tier in tiers:
+                # A tier starts once the previous one has committed, so precedence does not depend on timing
+                futures = {pool.submit(_load_task, task, self.batch_size): task for task in tier}
+                for future in as_completed(futures):
+                    self._record_task(results[futures[future].feed], futures[future], future)
+
+        for result in results.values():
+            seconds = (result['finished_at'] - result['started_at']) if result['started_at'] else 0.0
+            result['seconds'] = seconds
+            result['rows_per_second'] = result['records'] / seconds if seconds > 0 else 0.0
+            result['unknown_brands'] = sorted(result['unknown_brands'])
+        self._log_results(results, time.time() - started_at)
+        return results
+
+    def apply_deltas(self, sites: List[SiteFeeds]) -> Dict[str, Dict[str, int]]:
+        """Apply each site's delta feeds, oldest first, once every snapshot has been loaded"""
+        if not any(site.deltas for site in sites):
+            return {}
+        brands = self.load_brands()
+        connection = psycopg2.connect(**get_connection_kwargs())
+        try:
+            return apply_site_deltas(
+                connection, [(site.site, site.deltas) for site in sites if site.deltas], self.source_precedence,
+                self.backend, self.batch_size, brand_id=brands.resolve(None), resolve_brand=brands.resolve
+            )
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _record_task(result: Dict[str, Any], task: FeedTask, future):
+        """Add a finished task's counts to its feed's result"""
+        result['tasks'] += 1
+        try:
+            task_result = future.result()
+        except Exception as e:
+            result['failed_tasks'] += 1
+            logger.error(f"❌ Loading {task.feed} (bytes {task.start}-{task.end or 'end'}) failed: {e}")
+            return
+        for key in COUNT_KEYS:
+            result[key] += task_result[key]
+        result['unknown_brands'].update(task_result['unknown_brands'])
+        result['started_at'] = min(filter(None, (result['started_at'], task_result['started_at'])))
+        result['finished_at'] = max(filter(None, (result['finished_at'], task_result['finished_at'])))
+
+    def _log_results(self, results: Dict[str, Dict[str, Any]], wall_seconds: float):
+        """One line per feed, then the totals"""
+        for feed, result in results.items():
+            megabytes_per_second = result['bytes'] / 1024 / 1024 / result['seconds'] if result['seconds'] else 0.0
+            logger.info(
+                f"📦 {feed}: {result['records']} records, {result['inserted']} new, {result['updated']} updated, "
+                f"{result['unchanged']} unchanged, {result['duplicates']} repeated, {result['skipped']} skipped "
+                f"in {result['seconds']:.1f}s "
+                f"({result['rows_per_second']:,.0f} rows/s, {megabytes_per_second:.1f} MiB/s, {result['tasks']} tasks)"
+            )
+            if result['unknown_brands']:
+                logger.warning(f"⚠️  {feed}: brands not in bead_brands: {', '.join(result['unknown_brands'])}")
+            if result['failed_tasks']:
+                logger.error(f"❌ {feed}: {result['failed_tasks']} of {result['tasks']} tasks failed")
+
+        records = sum(result['records'] for result in results.values())
+        rate = records / wall_seconds if wall_seconds > 0 else float('inf')
+        logger.info(f"💾 {records} records from {len(results)} feeds in {wall_seconds:.1f}s ({rate:,.0f} rows/s overall)")
+
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="Import many bead feeds in parallel worker processes")
+    parser.add_argument('feeds', nargs='*', type=Path, help="Feed files, or directories holding them")
+    parser.add_argument('--s3-prefix', help="Also import the newest feed of every site under this S3 prefix (e.g. beads/), "
+                                            "then the deltas uploaded after it")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Worker processes (default: %(default)s)")
+    parser.add_argument('--batch-size', type=int, default=IMPORT_CONFIG['batch_size'], help="Rows per committed batch")
+    parser.add_argument('--range-mb', type=int, default=DEFAULT_RANGE_BYTES // (1024 * 1024),
+                        help="Split uncompressed NDJSON feeds into ranges of this many MiB (default: %(default)s)")
+    parser.add_argument('--backend', choices=sorted(LOADERS), default=IMPORT_CONFIG['backend'], help="Loader backend")
+    parser.add_argument('--mode', choices=MODES, default=IMPORT_CONFIG['mode'],
+                        help="'insert' skips existing beads, 'upsert' also refreshes changed ones")
+    parser.add_argument('--default-brand', default=DEFAULT_BRAND,
+                        help="bead_brands name for records without a brand (default: %(default)s)")
+    args = parser.parse_args()
+    if not args.feeds and not args.s3_prefix:
+        parser.error("give feed files or --s3-prefix")
+    return args
+
+def main():
+    """Import the given feeds and report per-feed throughput"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s [%(processName)s %(name)s] %(levelname)s: %(message)s'
+    )
+    args = parse_args()
+    importer = MultiFeedImporter(
+        workers=args.workers, backend=args.backend, mode=args.mode, batch_size=args.batch_size,
+        range_bytes=args.range_mb * 1024 * 1024, default_brand=args.default_brand
+    )
+
+    with tempfile.TemporaryDirectory(prefix='bead-feeds-') as download_dir:
+        feeds = find_feed_files(args.feeds)
+        sites = download_s3_feeds(args.s3_prefix, Path(download_dir)) if args.s3_prefix else []
+        feeds += [site.snapshot for site in sites]
+        if not feeds:
+            logger.error("💥 No feeds to import")
+            return 1
+        results = importer.import_feeds(feeds)
+        if any(result['failed_tasks'] for result in results.values()):
+            if any(site.deltas for site in sites):
+                # A delta is only right on top of its complete snapshot
+                logger.error("❌ Skipping the S3 delta feeds as snapshot tasks failed")
+            return 1
+        importer.apply_deltas(sites)
+
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
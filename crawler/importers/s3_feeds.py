@@ -0,0 +1,103 @@
+"""
+S3 feed download
+Fetches the newest snapshot feed of every site folder under an S3 prefix,
+plus the delta feeds uploaded after it, as written by FeedExportPipeline,
+for the multi-feed importer
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+
+from feeds.s3_upload import S3_AVAILABLE, create_s3_client, get_s3_config
+
+logger = logging.getLogger(__name__)
+
+# FeedExportPipeline uploads beads/<site>/feed-<timestamp>... and, from the second run on, delta-<timestamp>...
+SNAPSHOT_KEY_PREFIX = 'feed-'
+DELTA_KEY_PREFIX = 'delta-'
+
+
+class SiteFeeds(NamedTuple):
+    """A site's newest snapshot and the deltas uploaded after it, oldest first (S3 keys or local paths)"""
+    site: str
+    snapshot: Optional[str]
+    deltas: List
+
+
+def _timestamp(name: str, key_prefix: str) -> str:
+    """The sortable ``YYYYMMDD_HHMMSS`` of a feed- or delta- object name"""
+    return name[len(key_prefix):].partition('.')[0]
+
+
+def site_feed_keys(client, bucket: str, prefix: str) -> List[SiteFeeds]:
+    """The newest snapshot of every folder under a prefix and the deltas written after it
+
+    Once a site's feed hashes exist, FeedExportPipeline only uploads deltas
+    (unless BEAD_FEED_S3_FULL_SNAPSHOTS is set), so the newest snapshot alone
+    is stale: each delta holds the changes since the run before it and all of
+    them have to be applied after the snapshot, oldest first. Keys end in a
+    sortable timestamp, so the greatest snapshot key per folder is the newest.
+    """
+    snapshots: Dict[str, str] = {}
+    deltas: Dict[str, List[str]] = {}
+    for page in client.get_paginator('list_objects_v2').paginate(Bucket=bucket, Prefix=prefix):
+        for entry in page.get('Contents', []):
+            folder, _, name = entry['Key'].rpartition('/')
+            if name.startswith(SNAPSHOT_KEY_PREFIX) and entry['Key'] > snapshots.get(folder, ''):
+                snapshots[folder] = entry['Key']
+            elif name.startswith(DELTA_KEY_PREFIX):
+                deltas.setdefault(folder, []).append(entry['Key'])
+
+    sites = []
+    for folder in sorted(snapshots.keys() | deltas.keys()):
+        snapshot = snapshots.get(folder)
+        since = _timestamp(snapshot.rpartition('/')[2], SNAPSHOT_KEY_PREFIX) if snapshot else ''
+        newer = sorted((key for key in deltas.get(folder, [])
+                        if _timestamp(key.rpartition('/')[2], DELTA_KEY_PREFIX) > since),
+                       key=lambda key: _timestamp(key.rpartition('/')[2], DELTA_KEY_PREFIX))
+        sites.append(SiteFeeds(folder.rpartition('/')[2], snapshot, newer))
+    return sites
+
+
+def newest_snapshot_keys(client, bucket: str, prefix: str) -> List[str]:
+    """Key of the newest snapshot in every folder under a prefix"""
+    return [site.snapshot for site in site_feed_keys(client, bucket, prefix) if site.snapshot]
+
+
+def download_s3_feeds(prefix: str, target_dir: Path, threads: int = 8) -> List[SiteFeeds]:
+    """Download the newest snapshot of every site folder under an S3 prefix and the deltas after it
+
+    A folder holding deltas but no snapshot cannot be rebuilt (its first
+    deltas only carry what changed since a snapshot that is not there), so
+    it stops the import with an error rather than loading a partial catalog.
+    """
+    if not S3_AVAILABLE:
+        raise RuntimeError("Importing from S3 needs boto3")
+    config = get_s3_config()
+    if not config:
+        raise RuntimeError("S3 is not configured (AWS_S3_BUCKET, AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY)")
+    client = create_s3_client(config)
+
+    sites = site_feed_keys(client, config['bucket'], prefix)
+    orphaned = [site.site for site in sites if not site.snapshot]
+    if orphaned:
+        raise RuntimeError(
+            f"No snapshot feed under s3://{config['bucket']}/{prefix} for {', '.join(orphaned)}, only deltas: "
+            f"rerun those crawls with BEAD_FEED_S3_FULL_SNAPSHOTS=True to upload one"
+        )
+    delta_count = sum(len(site.deltas) for site in sites)
+    logger.info(f"☁️  Found {len(sites)} site feeds and {delta_count} newer deltas under "
+                f"s3://{config['bucket']}/{prefix}")
+
+    def download(key: str) -> Path:
+        path = target_dir / key.replace('/', '__')
+        client.download_file(config['bucket'], key, str(path))
+        return path
+
+    with ThreadPoolExecutor(max_workers=threads, thread_name_prefix='s3-download') as pool:
+        snapshots = [pool.submit(download, site.snapshot) for site in sites]
+        deltas = [[pool.submit(download, key) for key in site.deltas] for site in sites]
+        return [SiteFeeds(site.site, snapshot.result(), [delta.result() for delta in site_deltas])
+                for site, snapshot, site_deltas in zip(sites, snapshots, deltas)]
@@ -0,0 +1,58 @@
+"""
+Beads schema check
+Verifies the Rails database has the beads table and every column the
+importers write before any rows are loaded
+"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_COLUMNS = (
+    'brand_product_code', 'name', 'brand_id', 'shape', 'size',
+    'color_group', 'glass_group', 'finish', 'dyed',
+    'galvanized', 'plating', 'metadata', 'image', 'created_at', 'updated_at'
+)
+
+
+def check_beads_schema(connection) -> bool:
+    """Check if the beads table and the required columns exist (logging what is missing)"""
+    try:
+        with connection.cursor() as cursor:
+            # Check if beads table exists
+            cursor.execute("""
+                SELECT EXISTS (
+                    SELECT FROM information_schema.tables 
+                    WHERE table_schema = 'public' 
+                    AND table_name = 'beads'
+                )
+            """)
+            result = cursor.fetchone()
+            table_exists = result[0] if result else False
+
+            if not table_exists:
+                logger.error("❌ Table 'beads' does not exist!")
+                return False
+
+            # Check if required columns exist
+            cursor.execute("""
+                SELECT column_name 
+                FROM information_schema.columns 
+                WHERE table_name = 'beads' 
+                AND table_schema = 'public'
+            """)
+            columns = [row[0] for row in cursor.fetchall()]
+
+            missing_columns = [col for col in REQUIRED_COLUMNS if col not in columns]
+
+            if missing_columns:
+                logger.error(f"❌ Missing columns in beads table: {missing_columns}")
+                logger.info(f"📋 Available columns: {columns}")
+                return False
+
+            logger.info("✅ Database schema check passed")
+            return True
+
+    except Exception as e:
+        logger.error(f"❌ Schema check failed: {e}")
+        return False
@@ -0,0 +1,104 @@
+"""
+Conditional request middleware
+Revalidates pages with If-None-Match / If-Modified-Since and hands the
+previously extracted record back to the spider when the server answers 304
+"""
+
+import logging
+from typing import Optional
+
+from scrapy import Request, Spider, signals
+from scrapy.exceptions import NotConfigured
+from scrapy.http import Response
+
+from storage.validator_store import ValidatorStore
+
+logger = logging.getLogger(__name__)
+
+
+class ConditionalRequestMiddleware:
+    """Downloader middleware that turns unchanged pages into cheap 304 responses
+
+    Only requests with ``meta['revalidate'] = True`` take part. When such a
+    request gets a 304, ``meta['revalidated_item']`` holds the record stored
+    for that URL on a previous run; records are stored from scraped items.
+    Those requests are marked ``dont_cache``: the HTTP cache sits closer to
+    the downloader and would otherwise answer them from its own copy, or
+    turn the 304 back into the cached 200, so no record would be replayed.
+    """
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        if not settings.getbool('CONDITIONAL_REQUESTS_ENABLED'):
+            raise NotConfigured
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.store = ValidatorStore(settings.get('CONDITIONAL_REQUESTS_STORE', 'data/http_validators.sqlite3'))
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        middleware = cls(crawler)
+        crawler.signals.connect(middleware.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(middleware.item_scraped, signal=signals.item_scraped)
+        return middleware
+
+    def spider_opened(self, spider: Spider):
+        self.store.open()
+
+    def spider_closed(self, spider: Spider):
+        self.store.close()
+
+    def process_request(self, request: Request, spider: Optional[Spider] = None):
+        if not request.meta.get('revalidate'):
+            return None
+
+        # Key everything by the URL the spider asked for, not where redirects ended up
+        request.meta.setdefault('revalidate_key', request.url)
+        # The validator store already does this page's caching
+        request.meta['dont_cache'] = True
+        etag, last_modified = self.store.get_validators(request.meta['revalidate_key'])
+        if etag:
+            request.headers.setdefault('If-None-Match', etag)
+        if last_modified:
+            request.headers.setdefault('If-Modified-Since', last_modified)
+        if etag or last_modified:
+            self.stats.inc_value('conditional/revalidated')
+        return None
+
+    def process_response(self, request: Request, response: Response, spider: Optional[Spider] = None):
+        if not request.meta.get('revalidate'):
+            return response
+
+        key = request.meta['revalidate_key']
+        if response.status == 304:
+            record = self.store.get_record(key)
+            if record is None:
+                # Nothing to replay, fetch the page unconditionally instead
+                self.stats.inc_value('conditional/missing_record')
+                retry = request.replace(dont_filter=True)
+                retry.meta['revalidate'] = False
+                for header in (b'If-None-Match', b'If-Modified-Since'):
+                    retry.headers.pop(header, None)
+                return retry
+            self.stats.inc_value('conditional/not_modified')
+            request.meta['revalidated_item'] = record
+            return response
+
+        if response.status == 200:
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+            if etag or last_modified:
+                self.store.save_validators(
+                    key,
+                    etag.decode('latin-1') if etag else None,
+                    last_modified.decode('latin-1') if last_modified else None
+                )
+                self.stats.inc_value('conditional/validators_stored')
+        return response
+
+    def item_scraped(self, item, response: Response, spider: Spider):
+        """Keep the record extracted from a revalidatable page for future 304s"""
+        if response.status != 200 or not response.meta.get('revalidate'):
+            return
+        self.store.save_record(response.meta['revalidate_key'], dict(item))
@@ -0,0 +1,64 @@
+"""
+Bead records
+The fields every Miyuki Delica record starts with, whether they come from a
+listing tile, a product page or a Store API product
+"""
+
+import logging
+from typing import Any, Dict, Optional
+from urllib.parse import urljoin
+
+from parsers.product_codes import ProductCode, normalize_product_code
+
+logger = logging.getLogger(__name__)
+
+
+def delica_bead(product_name: str, product_code: ProductCode, image_url: Optional[str],
+                source_url: Optional[str]) -> Dict[str, Any]:
+    """The listing fields of a bead record; attributes are added from the product page or API"""
+    return {
+        'name': product_name,
+        'product_code': product_code.code,
+        'brand': 'Miyuki',
+        'type': 'Delica',
+        'size': product_code.size,
+        'image_url': image_url,
+        'source_url': source_url,
+    }
+
+
+def listing_tile_bead(item, response) -> Optional[Dict[str, Any]]:
+    """The listing fields of one product tile on a listing page, None for tiles that are not Delicas"""
+    product_link = item.css('.woocommerce-LoopProduct-link::attr(href)').get()
+    if not product_link:
+        return None
+
+    product_name = (item.css('h2.woocommerce-loop-product__title::text').get() or '').strip()
+    product_name = product_name.replace('\nProduct Title', '')
+    product_code = normalize_product_code(product_name)
+    if not product_code:
+        logger.debug(f"Skipping non-delicas: {product_name}")
+        return None
+
+    image_url = item.css('img.attachment-woocommerce_thumbnail::attr(src)').get()
+    return delica_bead(
+        product_name, product_code,
+        urljoin(response.url, image_url) if image_url else None,
+        urljoin(response.url, product_link)
+    )
+
+
+def product_page_bead(response) -> Optional[Dict[str, Any]]:
+    """The fields listing_tile_bead reads from a listing tile, read from the product page instead"""
+    product_name = (response.css('h1.product_title::text').get() or '').strip()
+    product_code = normalize_product_code(product_name)
+    if not product_code:
+        logger.debug(f"Skipping non-delicas: {product_name or response.url}")
+        return None
+
+    image_url = response.css('.woocommerce-product-gallery__image img.wp-post-image::attr(src)').get()
+    return delica_bead(
+        product_name, product_code,
+        urljoin(response.url, image_url) if image_url else None,
+        response.url
+    )
@@ -0,0 +1,90 @@
+"""
+Listing pagination
+Works out every listing page URL from the first page, so a spider can request
+them all at once instead of discovering page N+1 only after parsing page N
+"""
+
+import re
+from typing import Iterable, List, Optional
+from urllib.parse import parse_qs, urlencode, urljoin, urlparse, urlunparse
+
+# WordPress pretty permalinks (/directory/page/3/); plain permalinks use ?paged=3
+PAGE_PATH_PATTERN = re.compile(r'/page/(\d+)(?=/|$)')
+PAGE_QUERY_PARAM = 'paged'
+RESULT_COUNT_PATTERN = re.compile(r'(\d[\d,.]*)\s*results?\b', re.IGNORECASE)
+
+
+def page_number(url: str) -> Optional[int]:
+    """Page number encoded in a paginated listing URL, None for an unnumbered (first) page"""
+    parsed = urlparse(url)
+    match = PAGE_PATH_PATTERN.search(parsed.path)
+    if match:
+        return int(match.group(1))
+    values = parse_qs(parsed.query).get(PAGE_QUERY_PARAM)
+    if values and values[0].isdigit():
+        return int(values[0])
+    return None
+
+
+def with_page_number(url: str, number: int) -> str:
+    """The same listing URL pointing at another page"""
+    parsed = urlparse(url)
+    if PAGE_PATH_PATTERN.search(parsed.path):
+        return urlunparse(parsed._replace(path=PAGE_PATH_PATTERN.sub(f'/page/{number}', parsed.path, count=1)))
+    query = parse_qs(parsed.query, keep_blank_values=True)
+    query[PAGE_QUERY_PARAM] = [str(number)]
+    return urlunparse(parsed._replace(query=urlencode(query, doseq=True)))
+
+
+def numbered_page_urls(base_url: str, links: Iterable[str]) -> List[str]:
+    """URLs of pages 2..last given the hrefs of numbered pagination links
+
+    WooCommerce abbreviates long paginations (``1 2 3 … 37 →``) but always
+    links the last page, so the highest number found is the page count.
+    Returns [] when the links carry no page numbers.
+    """
+    last_page, template = 1, None
+    for link in links:
+        url = urljoin(base_url, link)
+        number = page_number(url)
+        if number and number > last_page:
+            last_page, template = number, url
+    if template is None:
+        return []
+    return [with_page_number(template, number) for number in range(2, last_page + 1)]
+
+
+def offset_page_urls(next_url: str, total_items: int, offset_param: str = 'start', size_param: str = 'sz') -> List[str]:
+    """URLs of every page after the first for offset pagination (``?start=48&sz=48``)
+
+    ``next_url`` is the link to the second page, which carries the page size.
+    Returns [] when it has no usable offset.
+    """
+    parsed = urlparse(next_url)
+    query = parse_qs(parsed.query, keep_blank_values=True)
+    size = query.get(size_param) or query.get(offset_param)
+    if not size or not size[0].isdigit() or int(size[0]) <= 0:
+        return []
+    page_size = int(size[0])
+    return [
+        urlunparse(parsed._replace(query=urlencode({**query, offset_param: [str(offset)]}, doseq=True)))
+        for offset in range(page_size, total_items, page_size)
+    ]
+
+
+def result_count(text: Optional[str]) -> Optional[int]:
+    """Total result count from text like 'Showing 1–48 of 1780 results' or '1,204 Results'"""
+    if not text:
+        return None
+    match = RESULT_COUNT_PATTERN.search(text)
+    if not match:
+        return None
+    digits = re.sub(r'[^\d]', '', match.group(1))
+    return int(digits) if digits else None
+
+
+def limit_pages(urls: List[str], max_pages: Optional[int]) -> List[str]:
+    """Pages after the first that fit in ``max_pages`` listing pages in total"""
+    if max_pages is None:
+        return urls
+    return urls[:max(max_pages - 1, 0)]
@@ -0,0 +1,102 @@
+"""
+Product code normalization
+Extracts Miyuki Delica product codes from product names and canonicalizes them
+(``DB-0123``, ``DBS-0005-C``) together with the bead size, in a single regex pass
+"""
+
+import re
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+# One alternation covers every Delica line: DB (11/0), DBS (15/0), DBM (10/0), DBL (8/0).
+# An optional single-letter variant suffix is only taken when it is not the start of a word.
+PRODUCT_CODE_PATTERN = re.compile(r'(DB[SML]?)-?(\d+)(?:-?([A-Z])(?![A-Za-z]))?')
+
+SIZE_BY_PREFIX = {
+    'DBS': '15/0',
+    'DB': '11/0',
+    'DBM': '10/0',
+    'DBL': '8/0'
+}
+UNKNOWN_SIZE = 'Unknown'
+
+# Feeds repeat the same codes across colorways and runs, so canonical forms are memoized
+# by the matched text; the catalog is small enough that the cap is only a safety net.
+_CACHE_LIMIT = 100_000
+_code_cache: Dict[str, 'ProductCode'] = {}
+
+
+class ProductCode(NamedTuple):
+    """A canonical product code and the bead size implied by its prefix"""
+    code: str
+    prefix: str
+    size: str
+
+
+def normalize_product_code(product_name: str) -> Optional[ProductCode]:
+    """Extract and canonicalize the product code in a product name"""
+    match = PRODUCT_CODE_PATTERN.search(product_name)
+    if not match:
+        return None
+    return _from_match(match)
+
+
+def extract_product_code(product_name: str) -> Optional[str]:
+    """Return just the canonical code string (e.g. ``DB-0123``) for a product name"""
+    product_code = normalize_product_code(product_name)
+    return product_code.code if product_code else None
+
+
+def canonical_code(product_code: str) -> Optional[str]:
+    """Canonical form of a stored code in an older spelling (``DB-123``, ``DB123``), None if it is not one"""
+    match = PRODUCT_CODE_PATTERN.fullmatch(product_code.strip())
+    return _from_match(match).code if match else None
+
+
+def size_for_code(product_code: str) -> str:
+    """Determine bead size from a canonical product code's prefix"""
+    return SIZE_BY_PREFIX.get(product_code.split('-', 1)[0], UNKNOWN_SIZE)
+
+
+def normalize_names(product_names: Iterable[str]) -> List[Optional[ProductCode]]:
+    """Normalize a whole feed of product names, preserving order"""
+    search = PRODUCT_CODE_PATTERN.search
+    from_match = _from_match
+    results: List[Optional[ProductCode]] = []
+    append = results.append
+    for product_name in product_names:
+        match = search(product_name)
+        append(from_match(match) if match else None)
+    return results
+
+
+def normalize_records(records: Iterable[Dict[str, Any]], name_field: str = 'name') -> Iterator[Dict[str, Any]]:
+    """Fill canonical ``product_code`` and ``size`` on feed records, dropping ones without a code"""
+    search = PRODUCT_CODE_PATTERN.search
+    for record in records:
+        match = search(record.get(name_field) or '')
+        if not match:
+            continue
+        product_code = _from_match(match)
+        record['product_code'] = product_code.code
+        record['size'] = product_code.size
+        yield record
+
+
+def _from_match(match: 're.Match[str]') -> ProductCode:
+    """Canonicalize a pattern match, reusing the result for text seen before"""
+    key = match.group()
+    product_code = _code_cache.get(key)
+    if product_code is None:
+        if len(_code_cache) >= _CACHE_LIMIT:
+            _code_cache.clear()
+        product_code = _code_cache[key] = _to_product_code(*match.groups())
+    return product_code
+
+
+def _to_product_code(prefix: str, number: str, suffix: Optional[str]) -> ProductCode:
+    """Build the canonical form: prefix, 4-digit zero padded number, optional suffix"""
+    if suffix:
+        code = f"{prefix}-{number.zfill(4)}-{suffix}"
+    else:
+        code = f"{prefix}-{number.zfill(4)}"
+    return ProductCode(code, prefix, SIZE_BY_PREFIX[prefix])
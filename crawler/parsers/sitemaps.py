@@ -0,0 +1,74 @@
+"""
+Sitemap parsing
+Reads sitemap indexes and url sets (plain or gzipped) so a spider can seed
+product pages straight from a site's sitemaps, with each page's <lastmod>
+"""
+
+import logging
+import re
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from lxml import etree
+from scrapy.utils.gz import gunzip
+from scrapy.utils.sitemap import Sitemap
+
+logger = logging.getLogger(__name__)
+
+GZIP_MAGIC = b'\x1f\x8b'
+# Product sitemaps in a WordPress sitemap index: Yoast's product-sitemap.xml, product-sitemap2.xml, ...
+# and WordPress core's wp-sitemap-posts-product-1.xml
+PRODUCT_SITEMAP_PATTERN = re.compile(r'(^|[/-])product-sitemap\d*\.xml|wp-sitemap-posts-product-\d+\.xml')
+
+
+def read_sitemap(body: bytes, url: str = '') -> Tuple[str, List[Dict[str, str]]]:
+    """The sitemap's type (``sitemapindex`` or ``urlset``) and its entries
+
+    Each entry has ``loc`` and, when the site publishes it, ``lastmod``.
+    Returns ``('', [])`` for a body that is not a sitemap, logging why when
+    it cannot be read at all.
+    """
+    try:
+        if body.startswith(GZIP_MAGIC):
+            body = gunzip(body)
+        sitemap = Sitemap(body)
+    except (OSError, EOFError, etree.LxmlError, StopIteration) as e:
+        # Truncated gzip, an empty body (XMLSyntaxError) or one without any element (StopIteration)
+        logger.warning(f"Could not read sitemap {url}: {e!r}")
+        return '', []
+    return sitemap.type or '', [entry for entry in sitemap if entry.get('loc')]
+
+
+def product_sitemaps(entries: List[Dict[str, str]]) -> Iterator[str]:
+    """URLs of the product sitemaps listed in a sitemap index"""
+    for entry in entries:
+        if PRODUCT_SITEMAP_PATTERN.search(entry['loc']):
+            yield entry['loc']
+
+
+def changed_entries(entries: List[Dict[str, str]], changed_since: Optional[datetime]) -> List[Dict[str, str]]:
+    """Url set entries modified after ``changed_since`` (all of them when it is None)
+
+    Entries without a <lastmod> are always kept, as nothing says they did not change.
+    """
+    if changed_since is None:
+        return list(entries)
+    changed = []
+    for entry in entries:
+        lastmod = parse_lastmod(entry.get('lastmod'))
+        if lastmod is None or lastmod > changed_since:
+            changed.append(entry)
+    return changed
+
+
+def parse_lastmod(value: Optional[str]) -> Optional[datetime]:
+    """A W3C datetime (``2024-05-01``, ``2024-05-01T10:00:00+00:00``) as an aware UTC datetime"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
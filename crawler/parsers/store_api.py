@@ -0,0 +1,54 @@
+"""
+WooCommerce Store API products
+Builds the paged product listing URLs of the Store API and maps its product
+objects to bead records, attributes included, so no HTML has to be fetched
+"""
+
+import logging
+from html import unescape
+from typing import Any, Dict, Optional
+from urllib.parse import urlencode
+
+from parsers.beads import delica_bead
+from parsers.product_codes import normalize_product_code
+from parsers.woocommerce import store_api_attributes
+
+logger = logging.getLogger(__name__)
+
+# Public product listing of the WooCommerce Store API (no authentication; at most 100 products per page)
+STORE_API_PRODUCTS_PATH = '/wp-json/wc/store/v1/products'
+STORE_API_MAX_PAGE_SIZE = 100
+
+
+def store_api_page_url(products_url: str, page_size: int, page: int) -> str:
+    """URL of one page of ``page_size`` products"""
+    separator = '&' if '?' in products_url else '?'
+    return f"{products_url}{separator}{urlencode({'per_page': page_size, 'page': page})}"
+
+
+def store_api_total_pages(response) -> Optional[int]:
+    """The page count WordPress reports in X-WP-TotalPages, if it sent one"""
+    total_pages = (response.headers.get('X-WP-TotalPages') or b'').decode()
+    return int(total_pages) if total_pages.isdigit() else None
+
+
+def store_api_bead(product: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """The record a listing tile and its product page give together, from one Store API product"""
+    product_name = unescape(product.get('name') or '').strip()
+    product_code = normalize_product_code(product_name)
+    if not product_code:
+        logger.debug(f"Skipping non-delicas: {product_name}")
+        return None
+
+    # The listing tile shows the woocommerce_thumbnail size, which the API returns as 'thumbnail'
+    images = product.get('images') or [{}]
+    bead_data = delica_bead(
+        product_name, product_code,
+        images[0].get('thumbnail') or images[0].get('src'),
+        product.get('permalink')
+    )
+    attributes, extra_attributes = store_api_attributes(product)
+    bead_data.update(attributes)
+    if extra_attributes:
+        bead_data['metadata'] = extra_attributes
+    return bead_data
@@ -0,0 +1,107 @@
+"""
+WooCommerce product attribute extraction
+Reads the ``woocommerce-product-attributes`` table of a product page in one pass
+and maps its ``attribute_pa_*`` rows to bead fields through a declarative table;
+products from the Store API JSON endpoint are mapped through the same table
+"""
+
+import re
+from html import unescape
+from typing import Any, Dict, Optional, Tuple
+
+# attribute_pa_<slug> -> bead field. Attributes not listed here are kept as metadata.
+ATTRIBUTE_FIELDS = {
+    'color-group': 'color',
+    'finish': 'finish',
+    'shape': 'shape',
+    'size': 'size_detail',
+    'glass-group': 'glass_group',
+    'dyed': 'dyed',
+    'galva': 'galvanized',
+    'plating': 'plating',
+}
+
+ROW_CLASS_PREFIX = 'woocommerce-product-attributes-item--attribute_'
+VALUE_CELL_CLASS = 'woocommerce-product-attributes-item__value'
+TAXONOMY_PREFIX = 'pa_'
+
+
+def extract_product_attributes(response) -> Tuple[Dict[str, Optional[str]], Dict[str, str]]:
+    """Extract mapped bead fields and any unmapped attributes from a product page
+
+    Returns ``(fields, extra)``: ``fields`` has every ATTRIBUTE_FIELDS value as a
+    key (None when the page lacks it), ``extra`` maps unknown attribute slugs to
+    their values so new attributes are captured instead of dropped.
+    """
+    fields: Dict[str, Optional[str]] = dict.fromkeys(ATTRIBUTE_FIELDS.values())
+    extra: Dict[str, str] = {}
+
+    # Walk the parsed lxml tree directly: one iteration over <tr> elements is much
+    # cheaper than compiling and running a CSS query per attribute
+    for row in response.selector.root.iter('tr'):
+        slug = _attribute_slug(row.get('class') or '')
+        if not slug:
+            continue
+        value = _cell_text(row)
+        if not value:
+            continue
+
+        field = ATTRIBUTE_FIELDS.get(slug)
+        if field:
+            fields[field] = value
+        else:
+            extra[slug] = value
+
+    return fields, extra
+
+
+def _cell_text(row) -> Optional[str]:
+    """Whitespace-normalized text of a row's value cell, including linked terms"""
+    for cell in row.iterchildren('td'):
+        if VALUE_CELL_CLASS in (cell.get('class') or ''):
+            return ' '.join(''.join(cell.itertext()).split()) or None
+    return None
+
+
+def _attribute_slug(class_attribute: str) -> Optional[str]:
+    """Pull ``color-group`` out of ``... woocommerce-product-attributes-item--attribute_pa_color-group``"""
+    for css_class in class_attribute.split():
+        if css_class.startswith(ROW_CLASS_PREFIX):
+            slug = css_class[len(ROW_CLASS_PREFIX):]
+            # Global attributes are prefixed pa_, custom per-product ones are not
+            return slug[len(TAXONOMY_PREFIX):] if slug.startswith(TAXONOMY_PREFIX) else slug
+    return None
+
+
+def store_api_attributes(product: Dict[str, Any]) -> Tuple[Dict[str, Optional[str]], Dict[str, str]]:
+    """Same as extract_product_attributes, for one product object from the Store API
+
+    Term names are joined with ', ' the way the product page's attribute table
+    lists several values, so both sources give identical records.
+    """
+    fields: Dict[str, Optional[str]] = dict.fromkeys(ATTRIBUTE_FIELDS.values())
+    extra: Dict[str, str] = {}
+
+    for attribute in product.get('attributes') or []:
+        slug = _store_api_attribute_slug(attribute)
+        terms = [unescape(term.get('name') or '').strip() for term in attribute.get('terms') or []]
+        value = ', '.join(term for term in terms if term)
+        if not slug or not value:
+            continue
+
+        field = ATTRIBUTE_FIELDS.get(slug)
+        if field:
+            fields[field] = value
+        else:
+            extra[slug] = value
+
+    return fields, extra
+
+
+def _store_api_attribute_slug(attribute: Dict[str, Any]) -> Optional[str]:
+    """``color-group`` from taxonomy ``pa_color-group``; custom attributes only have a name"""
+    taxonomy = attribute.get('taxonomy') or ''
+    if taxonomy.startswith(TAXONOMY_PREFIX):
+        return taxonomy[len(TAXONOMY_PREFIX):]
+    # WordPress sanitize_title(), which the product page uses for custom attribute rows
+    return re.sub(r'[^a-z0-9_-]+', '-', (attribute.get('name') or '').lower()).strip('-') or None
@@ -0,0 +1,294 @@
+"""
+Streaming feed export pipeline
+Writes every scraped bead to the spider's NDJSON feed as it arrives, streams
+the feed to S3 while the crawl runs, and keeps running per-size counts so
+memory stays flat however large the catalog is. With JOBDIR set the feed is
+checkpointed, so an interrupted crawl resumes it instead of starting over.
+Each finished feed is also compared with the previous run's, and what changed
+is written to a delta feed next to it
+"""
+
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+from itemadapter import ItemAdapter
+from scrapy import Spider, signals
+from scrapy.utils.defer import maybe_deferred_to_future
+from twisted.internet import defer, reactor, task
+from twisted.internet.threads import deferToThread
+
+from feeds.delta import CHANGE_TYPES, FeedHashIndex, delta_feed_path, write_delta
+from feeds.s3_upload import S3_AVAILABLE, MultipartS3Uploader, create_s3_client, get_s3_config, upload_file
+from feeds.writer import FeedWriter
+from storage.crawl_checkpoint import CrawlCheckpoint
+
+logger = logging.getLogger(__name__)
+
+SAMPLES_PER_SIZE = 5
+
+
+class FeedExportPipeline:
+    """Item pipeline that streams items to ``spider.output_file`` through a FeedWriter
+
+    Spiders opt in by defining ``output_file``; the compression suffix from
+    BEAD_FEED_COMPRESSION is added to it. When S3 is configured the feed is
+    uploaded as it is written, under ``beads/<spider.feed_site_name>/``, and
+    the upload is completed once the spider has closed. Parts upload on
+    their own threads; once BEAD_FEED_S3_MAX_PENDING_PARTS are waiting for
+    S3, ``process_item`` holds its item on a Deferred until a part finishes,
+    which slows the crawl down without blocking the reactor.
+
+    When JOBDIR is set (Scrapy then persists the scheduler queue and seen
+    requests there too), every flush saves a CrawlCheckpoint of the feed's
+    length and product codes. A crawl that closes for any reason but
+    ``finished`` keeps its ``.part`` file; the next run with the same JOBDIR
+    appends to it and sets ``spider.resumed_product_codes`` so their detail
+    pages are not fetched again.
+
+    With BEAD_FEED_DELTA_ENABLED, the finished feed is hashed record by
+    record against the previous run's FeedHashIndex and
+    the beads added, changed or (when ``spider.feed_is_full_snapshot`` says
+    the feed lists the whole catalog of a finished crawl) removed are written
+    to ``<feed>.delta.ndjson``. From the second run on only that delta goes to
+    S3, as ``delta-<timestamp>``, unless BEAD_FEED_S3_FULL_SNAPSHOTS is set.
+    """
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.writer: Optional[FeedWriter] = None
+        self.uploader: Optional[MultipartS3Uploader] = None
+        self.size_counts: Dict[str, int] = {}
+        self.samples: Dict[str, List[Dict[str, Any]]] = {}
+        jobdir = crawler.settings.get('JOBDIR')
+        self.checkpoint: Optional[CrawlCheckpoint] = CrawlCheckpoint.in_jobdir(jobdir) if jobdir else None
+        # Codes already flushed to the feed, and those still in the writer's buffer
+        self.written_codes: Set[str] = set()
+        self.pending_codes: List[str] = []
+        self.hash_index: Optional[FeedHashIndex] = None
+        self.delta_writer: Optional[FeedWriter] = None
+        self._upload_waiters: List[defer.Deferred] = []
+        self._flush_task: Optional[task.LoopingCall] = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        pipeline = cls(crawler)
+        crawler.signals.connect(pipeline.spider_closed, signal=signals.spider_closed)
+        return pipeline
+
+    async def open_spider(self, spider: Optional[Spider] = None):
+        spider = spider or self.crawler.spider
+        output_file = getattr(spider, 'output_file', None)
+        if not output_file:
+            logger.info(f"{spider.name} has no output_file, feed export disabled")
+            return
+
+        writer = FeedWriter.from_settings(Path(output_file), self.crawler.settings)
+        state = self.checkpoint.load() if self.checkpoint else None
+        if state and state.get('feed') == str(writer.path) and writer.part_size() >= state['offset']:
+            self.writer = writer.resume(state['offset'], state['items'])
+            self.written_codes = set(state['product_codes'])
+            spider.resumed_product_codes = set(self.written_codes)
+            self.stats.set_value('feed/resumed_items', state['items'])
+        else:
+            self.writer = writer.open()
+        if self.checkpoint:
+            self.writer.on_flush = self._save_checkpoint
+        if self.crawler.settings.getbool('BEAD_FEED_DELTA_ENABLED'):
+            index_dir = Path(self.crawler.settings.get('BEAD_FEED_HASH_INDEX_DIR', 'data/feed_hashes'))
+            self.hash_index = FeedHashIndex(index_dir / f"{spider.name}.json")
+            self.delta_writer = FeedWriter.from_settings(delta_feed_path(output_file), self.crawler.settings)
+        spider.output_file = self.writer.path
+        spider.feed_writer = self.writer
+        if self.writer.flush_seconds > 0:
+            # write() only checks flush_seconds when a record arrives; this covers a crawl gone quiet
+            self._flush_task = task.LoopingCall(self.writer.flush_if_due)
+            self._flush_task.start(self.writer.flush_seconds, now=False)
+        await self._start_upload(spider)
+
+    async def process_item(self, item, spider: Optional[Spider] = None):
+        if not self.writer:
+            return item
+
+        bead = ItemAdapter(item).asdict()
+        if self.checkpoint and bead.get('product_code'):
+            # Before write(), which may flush and checkpoint this record
+            self.pending_codes.append(bead['product_code'])
+        self.writer.write(bead)
+        self.stats.inc_value('feed/items_written')
+
+        size = bead.get('size') or 'unknown'
+        self.size_counts[size] = self.size_counts.get(size, 0) + 1
+        samples = self.samples.setdefault(size, [])
+        if len(samples) < SAMPLES_PER_SIZE:
+            samples.append({'name': bead.get('name'), 'product_code': bead.get('product_code')})
+        await self._wait_for_upload_slot()
+        return item
+
+    async def _wait_for_upload_slot(self):
+        """Hold the caller while the S3 upload has its maximum of parts in flight"""
+        while self.uploader and self.uploader.backlogged():
+            self.stats.inc_value('s3/backpressure_waits')
+            waiter = defer.Deferred()
+            self._upload_waiters.append(waiter)
+            await maybe_deferred_to_future(waiter)
+
+    def _part_uploaded(self):
+        """MultipartS3Uploader.on_part_done, moved to the reactor thread: release held items"""
+        waiting, self._upload_waiters = self._upload_waiters, []
+        for waiter in waiting:
+            waiter.callback(None)
+
+    async def spider_closed(self, spider: Spider, reason: str):
+        """Finish the feed of a finished crawl, or keep it for the next run to resume
+
+        Decided on the close reason here rather than in close_spider: shutdowns,
+        memusage_exceeded and closespider_* stops all close the spider while the
+        engine is still running, and finishing their feed would make the next
+        run start a new one with only the requests left over.
+        """
+        if not self.writer:
+            return
+        if self._flush_task and self._flush_task.running:
+            self._flush_task.stop()
+        if self.checkpoint and reason != 'finished':
+            await self._suspend()
+            return
+
+        self.writer.close()
+        if self.checkpoint:
+            self.checkpoint.clear()
+        self.stats.set_value('feed/bytes_written', self.writer.bytes_written)
+        self._display_summary()
+        if self.uploader:
+            # Waiting on the last parts must not block the reactor
+            uploaded = await maybe_deferred_to_future(deferToThread(self.uploader.complete))
+            self._record_upload_stats(uploaded)
+
+        if self.hash_index:
+            # A page that failed to download would otherwise look like a removed product
+            full_snapshot = (reason == 'finished' and not self.stats.get_value('log_count/ERROR')
+                             and getattr(spider, 'feed_is_full_snapshot', False))
+            site_name = getattr(spider, 'feed_site_name', spider.name)
+            # In a thread: the delta reads the whole feed
+            result = await maybe_deferred_to_future(
+                deferToThread(self._write_delta, full_snapshot, site_name, spider.name)
+            )
+            self._record_delta_stats(result)
+
+    def _write_delta(self, full_snapshot: bool, site_name: str, spider_name: str) -> Dict[str, Any]:
+        """Diff the feed against the last run's hashes, ship the delta, then remember this run's hashes"""
+        result = write_delta(self.writer.path, self.hash_index.load(), self.delta_writer, full_snapshot)
+        hashes = result.pop('hashes')
+        logger.info(f"Delta feed {self.delta_writer.path}: {result['added']} added, {result['changed']} changed, "
+                    f"{result['removed']} removed, {result['unchanged']} unchanged, "
+                    f"{result['duplicates']} duplicates")
+
+        config = self._s3_config() if any(result[change] for change in CHANGE_TYPES) else None
+        if config:
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            s3_key = f"beads/{site_name}/delta-{timestamp}{''.join(self.delta_writer.path.suffixes[1:])}"
+            result['uploaded'] = upload_file(
+                config, self.delta_writer.path, s3_key, self.delta_writer.content_type,
+                {'spider': spider_name, 'scraped_at': datetime.now().isoformat()}
+            )
+            if not result['uploaded']:
+                # Keep the old hashes so the next delta carries these changes again
+                return result
+        self.hash_index.save(hashes)
+        return result
+
+    def _record_delta_stats(self, result: Dict[str, Any]):
+        for name, value in result.items():
+            self.stats.set_value(f'feed/delta_{name}', value)
+
+    async def _suspend(self):
+        """Checkpoint and leave the unfinished feed in place, dropping its partial S3 upload"""
+        self.writer.suspend()
+        self.stats.set_value('feed/bytes_written', self.writer.bytes_written)
+        logger.info(f"Crawl interrupted: {self.writer.items_written} beads checkpointed in {self.writer.part_path}, "
+                    f"rerun with JOBDIR={self.crawler.settings.get('JOBDIR')} to resume")
+        if self.uploader:
+            # The next run uploads the whole feed again
+            await maybe_deferred_to_future(deferToThread(self.uploader.abort))
+
+    def _save_checkpoint(self):
+        """FeedWriter.on_flush hook: everything written so far is in the file"""
+        self.written_codes.update(self.pending_codes)
+        self.pending_codes = []
+        self.checkpoint.save(self.writer.path, self.writer.bytes_written, self.writer.items_written,
+                             self.written_codes)
+
+    def _s3_config(self) -> Optional[Dict[str, Any]]:
+        """S3 bucket and credentials, or None (with the reason logged) when feeds are not uploaded"""
+        if not self.crawler.settings.getbool('BEAD_FEED_S3_UPLOAD_ENABLED', True):
+            return None
+        if not S3_AVAILABLE:
+            logger.info("Skipping S3 upload - boto3 not available")
+            return None
+        config = get_s3_config()
+        if not config:
+            logger.warning("Skipping S3 upload - missing AWS credentials or bucket name")
+            logger.info("Required env vars: AWS_S3_BUCKET, AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY")
+        return config
+
+    async def _start_upload(self, spider: Spider):
+        """Begin a multipart upload fed by the writer's flushes, if S3 is configured"""
+        settings = self.crawler.settings
+        if self.hash_index and self.hash_index.exists() and not settings.getbool('BEAD_FEED_S3_FULL_SNAPSHOTS'):
+            logger.info("Only the delta feed will be uploaded to S3 (BEAD_FEED_S3_FULL_SNAPSHOTS is off)")
+            return
+        config = self._s3_config()
+        if not config:
+            return
+
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        site_name = getattr(spider, 'feed_site_name', spider.name)
+        s3_key = f"beads/{site_name}/feed-{timestamp}{''.join(self.writer.path.suffixes)}"
+
+        try:
+            self.uploader = MultipartS3Uploader(
+                create_s3_client(config),
+                config['bucket'],
+                s3_key,
+                part_size=settings.getint('BEAD_FEED_S3_PART_SIZE', 8 * 1024 * 1024),
+                max_retries=settings.getint('BEAD_FEED_S3_MAX_RETRIES', 3),
+                max_workers=settings.getint('BEAD_FEED_S3_UPLOAD_THREADS', 2),
+                max_pending_parts=settings.getint('BEAD_FEED_S3_MAX_PENDING_PARTS', 4),
+                content_type=self.writer.content_type,
+                metadata={'spider': spider.name, 'scraped_at': datetime.now().isoformat()}
+            ).start()
+        except Exception as e:
+            logger.error(f"Could not start S3 upload, feed will be kept locally only: {e}")
+            self.uploader = None
+            return
+        self.uploader.on_part_done = lambda: reactor.callFromThread(self._part_uploaded)
+        if self.writer.bytes_written:
+            # A resumed feed: upload what the interrupted run wrote before the new blocks
+            with open(self.writer.part_path, 'rb') as f:
+                remaining = self.writer.bytes_written
+                while remaining:
+                    block = f.read(min(remaining, self.uploader.part_size))
+                    if not block:
+                        break
+                    self.uploader.write(block)
+                    remaining -= len(block)
+                    await self._wait_for_upload_slot()
+        self.writer.sink = self.uploader.write
+
+    def _record_upload_stats(self, uploaded: bool):
+        for name, value in self.uploader.metrics().items():
+            self.stats.set_value(f's3/{name}', value)
+        self.stats.set_value('s3/uploaded', uploaded)
+
+    def _display_summary(self):
+        """Log per-size totals with the first few beads of each size"""
+        logger.info(f"SUMMARY: Exported {self.writer.items_written} beads to {self.writer.path}")
+        for size, count in self.size_counts.items():
+            logger.info(f"Size {size}: {count} beads")
+            for sample in self.samples[size]:
+                logger.info(f"  - {sample['name']} ({sample['product_code']})")
+            if count > len(self.samples[size]):
+                logger.info(f"  ... and {count - len(self.samples[size])} more")
@@ -0,0 +1,238 @@
+"""
+Bead image pipeline
+Downloads each bead's image_url through Scrapy's downloader, stores it once per
+distinct content (by SHA-256) and sets the item's ``image`` to the stored path
+"""
+
+import hashlib
+import io
+import logging
+import mimetypes
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+from urllib.parse import urlparse
+
+from itemadapter import ItemAdapter
+from scrapy import Request, Spider
+from scrapy.exceptions import IgnoreRequest, NotConfigured
+from scrapy.http import Response
+from scrapy.utils.defer import deferred_from_coro, maybe_deferred_to_future
+from twisted.internet import defer, reactor
+from twisted.internet.threads import deferToThread
+
+from storage.atomic_file import atomic_write
+from storage.image_index import ImageIndex
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE_EXTENSIONS = {
+    'image/jpeg': '.jpg',
+    'image/png': '.png',
+    'image/gif': '.gif',
+    'image/webp': '.webp',
+}
+DEFAULT_EXTENSION = '.jpg'
+
+
+class BeadImagePipeline:
+    """Item pipeline that fetches bead images with ``crawler.engine.download_async``
+
+    Image requests go through the downloader and its middlewares like page
+    requests do, so robots.txt, the spider's allowed_domains, download delays,
+    AutoThrottle, retries and the user agent all apply to them. At most
+    BEAD_IMAGES_CONCURRENCY of them are in the downloader at once, so images
+    never take every download slot from pages. Hashing, writing and resizing
+    run in a thread, off the reactor. An item waits at most
+    BEAD_IMAGES_WAIT_TIMEOUT seconds for its image before it moves on without
+    one. Files are stored as ``<sha[:2]>/<sha><ext>`` under BEAD_IMAGES_STORE,
+    so the same picture used by several URLs is kept once; an index of
+    URL -> hash lets recrawls skip downloads entirely. With Pillow installed, BEAD_IMAGES_VARIANTS (name -> longest edge in pixels)
+    also writes resized JPEG variants next to each original.
+    """
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        if not settings.getbool('BEAD_IMAGES_ENABLED'):
+            raise NotConfigured
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.store = Path(settings.get('BEAD_IMAGES_STORE', 'data/bead-images'))
+        self.index = ImageIndex(settings.get('BEAD_IMAGES_INDEX', 'data/image_index.sqlite3'))
+        self.timeout = settings.getfloat('BEAD_IMAGES_TIMEOUT', 30.0)
+        self.variants: Dict[str, int] = settings.getdict('BEAD_IMAGES_VARIANTS')
+        if self.variants and not PIL_AVAILABLE:
+            logger.warning("BEAD_IMAGES_VARIANTS set but Pillow is not installed - only originals will be stored")
+            self.variants = {}
+
+        self.downloads = defer.DeferredSemaphore(settings.getint('BEAD_IMAGES_CONCURRENCY', 8))
+        # None waits for every download; 0 never waits, so items only get images stored by earlier runs
+        self.wait_timeout: Optional[float] = (
+            settings.getfloat('BEAD_IMAGES_WAIT_TIMEOUT') if settings.get('BEAD_IMAGES_WAIT_TIMEOUT') is not None else None
+        )
+        # URL -> items waiting on a download that is already in flight
+        self._inflight: Dict[str, List[defer.Deferred]] = {}
+        self._fetches: Set[defer.Deferred] = set()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def open_spider(self, spider: Optional[Spider] = None):
+        self.store.mkdir(parents=True, exist_ok=True)
+        self.index.open()
+
+    async def close_spider(self, spider: Optional[Spider] = None):
+        # Downloads an item stopped waiting for still record their file in the index
+        await maybe_deferred_to_future(defer.DeferredList(list(self._fetches)))
+        self.index.close()
+
+    async def process_item(self, item, spider: Optional[Spider] = None):
+        bead = ItemAdapter(item)
+        image_url = bead.get('image_url')
+        if not image_url:
+            return item
+
+        stored_path = self._stored(image_url)
+        if stored_path is None:
+            waiter = self._wait_for(image_url)
+            if self.wait_timeout != 0:
+                stored_path = await maybe_deferred_to_future(waiter)
+        if stored_path:
+            bead['image'] = stored_path
+        return item
+
+    def _stored(self, url: str) -> Optional[str]:
+        """Stored path of an image URL downloaded before, if its file is still there"""
+        known = self.index.get(url)
+        if known and (self.store / known[1]).exists():
+            self.stats.inc_value('images/cached')
+            return known[1]
+        return None
+
+    def _wait_for(self, url: str) -> defer.Deferred:
+        """Fires with the stored path of an image (None if it failed), starting its download if needed
+
+        After BEAD_IMAGES_WAIT_TIMEOUT seconds it fires with None instead, but
+        the download carries on in the background and the next crawl finds it
+        in the index.
+        """
+        waiter = defer.Deferred()
+        if url in self._inflight:
+            # Another item is already downloading this URL; share its result
+            self._inflight[url].append(waiter)
+        else:
+            self._inflight[url] = [waiter]
+            fetch = deferred_from_coro(self._fetch(url))
+            self._fetches.add(fetch)
+            fetch.addBoth(lambda _: self._fetches.discard(fetch))
+        if self.wait_timeout:
+            waiter.addTimeout(self.wait_timeout, reactor, onTimeoutCancel=self._stop_waiting)
+        return waiter
+
+    def _stop_waiting(self, result, timeout: float) -> None:
+        self.stats.inc_value('images/wait_timeout')
+        return None
+
+    async def _fetch(self, url: str):
+        """Download and record one image, then hand its stored path to every item waiting on it"""
+        stored_path = None
+        try:
+            response = await self._download(url)
+            sha256, stored_path, size, deduplicated = await maybe_deferred_to_future(
+                deferToThread(self._store_image, response.body, response.headers.get('Content-Type'), url)
+            )
+            self.index.save(url, sha256, stored_path)
+            self.stats.inc_value('images/downloaded')
+            self.stats.inc_value('images/bytes', size)
+            if deduplicated:
+                self.stats.inc_value('images/deduplicated')
+        except IgnoreRequest as e:
+            # Disallowed by robots.txt, off the spider's allowed_domains, or a non-200 response
+            self.stats.inc_value('images/ignored')
+            logger.debug(f"Image {url} not fetched: {e}")
+        except Exception as e:
+            self.stats.inc_value('images/failed')
+            logger.warning(f"Could not fetch image {url}: {e}")
+        finally:
+            for waiter in self._inflight.pop(url):
+                if not waiter.called:
+                    waiter.callback(stored_path)
+
+    async def _download(self, url: str) -> Response:
+        """Fetch an image through the engine's downloader, holding one of the BEAD_IMAGES_CONCURRENCY slots"""
+        # The image index already skips known URLs; caching the bodies too would only duplicate the store
+        request = Request(url, meta={'download_timeout': self.timeout, 'dont_cache': True})
+        await maybe_deferred_to_future(self.downloads.acquire())
+        try:
+            engine = self.crawler.engine
+            if hasattr(engine, 'download_async'):  # Scrapy 2.14+
+                response = await engine.download_async(request)
+            else:
+                response = await maybe_deferred_to_future(engine.download(request))
+        finally:
+            self.downloads.release()
+        if response.status != 200:
+            raise IgnoreRequest(f"HTTP {response.status}")
+        return response
+
+    def _store_image(self, body: bytes, content_type: Optional[bytes], url: str) -> Tuple[str, str, int, bool]:
+        """Store one downloaded image and its variants (runs in a thread)
+
+        Returns ``(sha256, stored_path, size, deduplicated)``; ``deduplicated`` is
+        True when identical content was already stored under another URL.
+        """
+        sha256 = hashlib.sha256(body).hexdigest()
+        extension = _extension(content_type.decode('latin-1') if content_type else None, url)
+        stored_path = f"{sha256[:2]}/{sha256}{extension}"
+        target = self.store / stored_path
+
+        deduplicated = target.exists()
+        if not deduplicated:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            _write_atomically(target, body)
+        if self.variants:
+            self._write_variants(body, target)
+        return sha256, stored_path, len(body), deduplicated
+
+    def _write_variants(self, body: bytes, original: Path):
+        """Write resized JPEG variants (``<sha>_<name>.jpg``) that do not exist yet"""
+        image = None
+        for name, max_edge in self.variants.items():
+            target = original.with_name(f"{original.stem}_{name}.jpg")
+            if target.exists():
+                continue
+            if image is None:
+                image = Image.open(io.BytesIO(body))
+                image.load()
+                if image.mode != 'RGB':
+                    # Flatten transparency onto white, as the UI shows beads on a light background
+                    background = Image.new('RGB', image.size, (255, 255, 255))
+                    background.paste(image, mask=image.convert('RGBA').getchannel('A'))
+                    image = background
+            variant = image.copy()
+            variant.thumbnail((int(max_edge), int(max_edge)))
+            output = io.BytesIO()
+            variant.save(output, format='JPEG', quality=85, optimize=True)
+            _write_atomically(target, output.getvalue())
+
+
+def _extension(content_type: Optional[str], url: str) -> str:
+    """File extension from the response Content-Type, falling back to the URL"""
+    if content_type:
+        extension = CONTENT_TYPE_EXTENSIONS.get(content_type.split(';')[0].strip().lower())
+        if extension:
+            return extension
+    guessed = mimetypes.guess_type(urlparse(url).path)[0]
+    return CONTENT_TYPE_EXTENSIONS.get(guessed, DEFAULT_EXTENSION)
+
+
+def _write_atomically(target: Path, data: bytes):
+    """Write to a temporary name and rename, so readers never see a partial file"""
+    with atomic_write(target, 'wb') as f:
+        f.write(data)
@@ -0,0 +1,184 @@
+"""
+Direct-to-Postgres bead pipeline
+Loads scraped beads into the beads table in batches while the crawl is running,
+through a small connection pool, with database work kept off the reactor thread
+"""
+
+import logging
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from itemadapter import ItemAdapter
+from psycopg2.pool import ThreadedConnectionPool
+from scrapy import Spider
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.defer import maybe_deferred_to_future
+from twisted.internet import defer
+from twisted.internet.threads import deferToThread
+
+from config.crawler_config import IMPORT_CONFIG, get_connection_kwargs
+from importers.bead_loader import LOAD_COUNT_KEYS, bead_to_row, get_loader
+from importers.code_normalization import normalize_stored_codes
+
+logger = logging.getLogger(__name__)
+
+
+class PostgresBeadPipeline:
+    """Item pipeline that batches beads and writes them with a bead_loader backend
+
+    Each full batch is written in a worker thread with a pooled connection and
+    committed on its own. At most POSTGRES_PIPELINE_MAX_PENDING_BATCHES batches
+    are in flight; beyond that ``process_item`` does not return until a batch
+    finishes, which holds the item in Scrapy's scraper slot
+    and makes the engine stop scheduling downloads until the database catches up.
+    """
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        if not settings.getbool('POSTGRES_PIPELINE_ENABLED'):
+            raise NotConfigured
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.batch_size = settings.getint('POSTGRES_PIPELINE_BATCH_SIZE', 500)
+        self.max_pending = settings.getint('POSTGRES_PIPELINE_MAX_PENDING_BATCHES', 2)
+        self.brand_id = settings.getint('POSTGRES_PIPELINE_BRAND_ID', 1)
+        self.loader = get_loader(
+            settings.get('POSTGRES_PIPELINE_BACKEND') or IMPORT_CONFIG['backend'],
+            settings.get('POSTGRES_PIPELINE_MODE') or 'upsert'
+        )
+
+        self.pool: Optional[ThreadedConnectionPool] = None
+        self._rows: List[Tuple] = []
+        self._pending: Set[defer.Deferred] = set()
+        self._waiting: List[defer.Deferred] = []
+        self._started_at = time.monotonic()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    async def open_spider(self, spider: Optional[Spider] = None):
+        self._started_at = time.monotonic()
+        try:
+            # One connection per batch that can be in flight at once
+            self.pool = await maybe_deferred_to_future(
+                deferToThread(ThreadedConnectionPool, 1, self.max_pending, **get_connection_kwargs())
+            )
+        except Exception as e:
+            # Keep crawling; the NDJSON feed can still be imported afterwards
+            logger.error(f"❌ Could not connect to Postgres, beads will only be written to the feed: {e}")
+            return
+        try:
+            # Before any batch, so beads stored under an older code spelling are matched, not duplicated
+            await maybe_deferred_to_future(deferToThread(self._normalize_codes))
+        except Exception as e:
+            logger.error(f"❌ Could not normalize stored product codes, beads will only be written to the feed: {e}")
+            await maybe_deferred_to_future(deferToThread(self.pool.closeall))
+            self.pool = None
+            return
+        logger.info(
+            f"🔌 Loading beads into Postgres while crawling "
+            f"({self.loader.name} backend, {self.loader.mode} mode, batches of {self.batch_size})"
+        )
+
+    async def process_item(self, item, spider: Optional[Spider] = None):
+        if not self.pool:
+            return item
+
+        self._rows.append(bead_to_row(ItemAdapter(item).asdict(), brand_id=self.brand_id))
+        if len(self._rows) < self.batch_size:
+            return item
+        if len(self._pending) < self.max_pending:
+            self._flush()
+            return item
+
+        # Every connection is busy: hold this item until a batch completes
+        self.stats.inc_value('postgres/backpressure_waits')
+        waiter = defer.Deferred()
+        self._waiting.append(waiter)
+        await maybe_deferred_to_future(waiter)
+        return item
+
+    async def close_spider(self, spider: Optional[Spider] = None):
+        if not self.pool:
+            return
+        # Drain in-flight batches first so the final one gets a free connection
+        await self._drain()
+        self._flush()
+        await self._drain()
+        await maybe_deferred_to_future(deferToThread(self.pool.closeall))
+        self._display_summary()
+
+    async def _drain(self):
+        """Wait until no batch is in flight, including any started as others finish"""
+        while self._pending:
+            await maybe_deferred_to_future(defer.DeferredList(list(self._pending)))
+
+    def _flush(self):
+        """Hand the buffered rows to a worker thread"""
+        if not self._rows:
+            return
+        rows, self._rows = self._rows, []
+        pending = deferToThread(self._write_batch, rows)
+        self._pending.add(pending)
+        pending.addCallbacks(self._batch_written, self._batch_failed, errbackArgs=(len(rows),))
+        pending.addBoth(self._batch_done, pending)
+
+    def _normalize_codes(self) -> Dict[str, int]:
+        """Run normalize_stored_codes on a pooled connection (runs in a worker thread)"""
+        connection = self.pool.getconn()
+        try:
+            return normalize_stored_codes(connection)
+        finally:
+            self.pool.putconn(connection)
+
+    def _write_batch(self, rows: List[Tuple]) -> Dict[str, int]:
+        """Write and commit one batch on a pooled connection (runs in a worker thread)"""
+        connection = self.pool.getconn()
+        try:
+            started_at = time.perf_counter()
+            with connection.cursor() as cursor:
+                counts = self.loader.load(cursor, rows)
+            connection.commit()
+            counts['seconds'] = time.perf_counter() - started_at
+            return counts
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            self.pool.putconn(connection)
+
+    def _batch_written(self, counts: Dict[str, int]):
+        self.stats.inc_value('postgres/batches')
+        for key in LOAD_COUNT_KEYS:
+            self.stats.inc_value(f'postgres/{key}', counts[key])
+        logger.info(
+            f"💾 Batch loaded in {counts['seconds']:.2f}s: {counts['inserted']} new, "
+            f"{counts['updated']} updated, {counts['unchanged']} unchanged, {counts['duplicates']} repeated"
+        )
+
+    def _batch_failed(self, failure, row_count: int):
+        # The beads are still in the NDJSON feed and can be re-imported from there
+        self.stats.inc_value('postgres/failed_rows', row_count)
+        logger.error(f"❌ Failed to load batch of {row_count} beads: {failure.getErrorMessage()}")
+
+    def _batch_done(self, _, pending: defer.Deferred):
+        self._pending.discard(pending)
+        if len(self._rows) >= self.batch_size:
+            self._flush()
+        # Release items held back while every connection was busy
+        waiting, self._waiting = self._waiting, []
+        for waiter in waiting:
+            waiter.callback(None)
+
+    def _display_summary(self):
+        elapsed = time.monotonic() - self._started_at
+        loaded = sum(self.stats.get_value(f'postgres/{key}', 0) for key in LOAD_COUNT_KEYS)
+        logger.info(
+            f"📊 Postgres load: {self.stats.get_value('postgres/inserted', 0)} new, "
+            f"{self.stats.get_value('postgres/updated', 0)} updated, "
+            f"{self.stats.get_value('postgres/unchanged', 0)} unchanged, "
+            f"{self.stats.get_value('postgres/duplicates', 0)} repeated, "
+            f"{self.stats.get_value('postgres/failed_rows', 0)} failed "
+            f"({loaded / elapsed if elapsed else 0:.0f} rows/s over the crawl)"
+        )
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Script to run every spider side by side in one process
+
+All spiders share one reactor, so a full refresh takes as long as the slowest
+source instead of the sum of all of them. Each spider gets its own concurrency
+budget and runner settings from CRAWL_BUDGETS, its own crawl state in data/jobs/<spider> (an
+interrupted run resumes when the script is run again) and its own local
+stores; combined stats are reported once every spider has finished.
+
+    python run_all_crawlers.py                       # every spider in spiders/
+    python run_all_crawlers.py miyuki_directory      # just these
+"""
+
+import argparse
+import json
+import logging
+import shutil
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+# Add the crawler directory to the Python path
+crawler_dir = Path(__file__).parent
+sys.path.insert(0, str(crawler_dir))
+
+# Load environment variables from .env file
+try:
+    from dotenv import load_dotenv
+    load_dotenv(crawler_dir / '.env')
+    print("✅ Loaded environment variables from .env file")
+except ImportError:
+    print("⚠️  python-dotenv not installed - please set environment variables manually")
+except Exception as e:
+    print(f"⚠️  Could not load .env file: {e}")
+
+from scrapy.crawler import Crawler, CrawlerProcess
+from scrapy.utils.project import get_project_settings
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(name)s] %(levelname)s: %(message)s'
+)
+
+logger = logging.getLogger(__name__)
+
+JOBS_DIR = Path('data/jobs')
+# Stats summed over all spiders in the combined report
+TOTAL_STATS = (
+    'item_scraped_count',
+    'downloader/request_count',
+    'downloader/response_count',
+    'downloader/response_bytes',
+    'log_count/ERROR',
+)
+
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="Run every spider side by side in one process")
+    parser.add_argument('spiders', nargs='*', help="Spiders to run (default: all of them)")
+    parser.add_argument('--fresh', action='store_true',
+                        help="Discard the state of interrupted crawls and start over")
+    parser.add_argument('--stats-file', type=Path, help="Also write the combined stats to this JSON file")
+    return parser.parse_args()
+
+def apply_spider_settings(settings, name: str):
+    """Give one spider's (not yet started) crawler its budget, runner settings, crawl state and local stores
+
+    Set at 'spider' priority, like custom_settings, because starting the
+    crawler merges the project settings into it again.
+    """
+    overrides = {
+        **settings.getdict('CRAWL_BUDGETS').get(name, {}),
+        'JOBDIR': str(JOBS_DIR / name),
+        # Batched SQLite commits would make crawlers on the same reactor wait on each other's locks
+        'CONDITIONAL_REQUESTS_STORE': f"data/http_validators.{name}.sqlite3",
+        'BEAD_IMAGES_INDEX': f"data/image_index.{name}.sqlite3",
+    }
+    settings.setdict(overrides, priority='spider')
+
+def prepare_job_dir(name: str, fresh: bool):
+    """Clear or report the saved state of an earlier, interrupted crawl"""
+    job_dir = JOBS_DIR / name
+    if not job_dir.exists():
+        return
+    if fresh:
+        shutil.rmtree(job_dir)
+        logger.info(f"🧹 Discarded crawl state of {name} in {job_dir}")
+    else:
+        logger.info(f"♻️  Resuming interrupted crawl of {name} from {job_dir}")
+
+def combined_stats(crawlers: List[Crawler], wall_seconds: float) -> Dict[str, Any]:
+    """Per-spider stats plus totals, and how long the run took against running them back to back"""
+    spiders = {crawler.spidercls.name: crawler.stats.get_stats() for crawler in crawlers}
+    totals = {key: sum(stats.get(key, 0) for stats in spiders.values()) for key in TOTAL_STATS}
+    return {
+        'spiders': spiders,
+        'totals': totals,
+        'wall_seconds': round(wall_seconds, 1),
+        'sequential_seconds': round(sum(stats.get('elapsed_time_seconds', 0) for stats in spiders.values()), 1),
+    }
+
+def log_summary(combined: Dict[str, Any]):
+    """Log one line per spider, then the totals"""
+    for name, stats in combined['spiders'].items():
+        icon = '✅' if stats.get('finish_reason') == 'finished' else '⚠️ '
+        logger.info(f"{icon} {name}: {stats.get('item_scraped_count', 0)} items, "
+                    f"{stats.get('downloader/request_count', 0)} requests in "
+                    f"{stats.get('elapsed_time_seconds', 0):.0f}s ({stats.get('finish_reason')})")
+    totals = combined['totals']
+    logger.info(f"📊 Total: {totals['item_scraped_count']} items, {totals['downloader/request_count']} requests, "
+                f"{totals['downloader/response_bytes'] / 1024 / 1024:.1f} MiB, {totals['log_count/ERROR']} errors")
+    logger.info(f"⏱️  {combined['wall_seconds']:.0f}s for all spiders "
+                f"(back to back would have taken {combined['sequential_seconds']:.0f}s)")
+
+def main():
+    """Run the selected spiders concurrently and report combined stats"""
+    args = parse_args()
+    settings = get_project_settings()
+    settings.set('SPIDER_MODULES', ['spiders'])
+    settings.set('NEWSPIDER_MODULE', 'spiders')
+
+    process = CrawlerProcess(settings)
+    available = process.spider_loader.list()
+    names = args.spiders or sorted(available)
+    unknown = sorted(set(names) - set(available))
+    if unknown:
+        logger.error(f"💥 Unknown spider(s): {', '.join(unknown)} (available: {', '.join(sorted(available))})")
+        return 1
+
+    crawlers = []
+    for name in names:
+        prepare_job_dir(name, args.fresh)
+        crawler = process.create_crawler(name)
+        apply_spider_settings(crawler.settings, name)
+        process.crawl(crawler)
+        crawlers.append(crawler)
+
+    logger.info(f"🕷️  Starting {len(crawlers)} spiders side by side: {', '.join(names)}")
+    started_at = time.monotonic()
+    process.start()
+    combined = combined_stats(crawlers, time.monotonic() - started_at)
+
+    for crawler in crawlers:
+        if crawler.stats.get_value('finish_reason') == 'finished':
+            # Scrapy would treat every request in a finished job as already seen
+            shutil.rmtree(crawler.settings.get('JOBDIR'), ignore_errors=True)
+
+    log_summary(combined)
+    if args.stats_file:
+        args.stats_file.parent.mkdir(parents=True, exist_ok=True)
+        args.stats_file.write_text(json.dumps(combined, indent=2, default=str))
+        logger.info(f"💾 Combined stats written to {args.stats_file}")
+
+    finished = all(stats.get('finish_reason') == 'finished' for stats in combined['spiders'].values())
+    if not finished:
+        logger.warning("⚠️  Some crawls stopped early - run again to resume them")
+    return 0 if finished else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
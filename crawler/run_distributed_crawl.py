@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Script to run the Miyuki Directory crawl split across several worker processes
+
+Workers share one request queue (DISTRIBUTED_QUEUE_URL), so listing and detail
+pages are spread over all of them, and each writes its own feed; once they
+have finished the feeds are merged into data/miyuki_directory_beads.ndjson.
+
+On one host:
+    python run_distributed_crawl.py --workers 4
+
+Across hosts sharing the queue:
+    python run_distributed_crawl.py --reset              # once, before the crawl
+    python run_distributed_crawl.py --worker-id host-a   # on every host
+    python run_distributed_crawl.py --merge              # once all workers are done
+"""
+
+import argparse
+import logging
+import multiprocessing
+import os
+import sys
+from pathlib import Path
+
+# Add the crawler directory to the Python path
+crawler_dir = Path(__file__).parent
+sys.path.insert(0, str(crawler_dir))
+
+# Load environment variables from .env file
+try:
+    from dotenv import load_dotenv
+    load_dotenv(crawler_dir / '.env')
+    print("✅ Loaded environment variables from .env file")
+except ImportError:
+    print("⚠️  python-dotenv not installed - please set environment variables manually")
+except Exception as e:
+    print(f"⚠️  Could not load .env file: {e}")
+
+from scrapy.crawler import CrawlerProcess
+from scrapy.utils.project import get_project_settings
+from spiders.miyuki_directory_crawler import MiyukiDirectoryCrawler
+from distributed.merge import merge_feeds, worker_feed_paths
+from distributed.queue import open_request_queue
+from feeds.writer import FeedWriter
+from importers.miyuki_directory import DEFAULT_FEED_PATH
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(name)s] %(levelname)s: %(message)s'
+)
+
+logger = logging.getLogger(__name__)
+
+WORKER_FEED_DIR = Path('data/distributed')
+WORKER_FEED_STEM = 'miyuki_directory_beads'
+
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="Crawl the Miyuki directory with several workers sharing one queue")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2,
+                        help="Worker processes to start on this host (default: %(default)s)")
+    parser.add_argument('--queue-url', help="Shared request queue (default: the DISTRIBUTED_QUEUE_URL setting)")
+    role = parser.add_mutually_exclusive_group()
+    role.add_argument('--worker-id', help="Run a single worker with this id against an existing queue")
+    role.add_argument('--reset', action='store_true', help="Empty the shared queue for a new crawl and exit")
+    role.add_argument('--merge', action='store_true', help="Merge the finished worker feeds and exit")
+    return parser.parse_args()
+
+def worker_settings(settings, worker_id: str):
+    """Settings for one worker: shared scheduler, but its own local stores"""
+    settings = settings.copy()
+    settings.set('SCHEDULER', 'distributed.scheduler.DistributedScheduler')
+    settings.set('DISTRIBUTED_WORKER_ID', worker_id)
+    settings.set('SPIDER_MIDDLEWARES', {
+        **settings.getdict('SPIDER_MIDDLEWARES'),
+        'distributed.scheduler.DistributedCompletionMiddleware': 25,  # Outside HttpErrorMiddleware
+    })
+    settings.set('DOWNLOADER_MIDDLEWARES', {
+        **settings.getdict('DOWNLOADER_MIDDLEWARES'),
+        'distributed.scheduler.DistributedFailureMiddleware': 50,  # Before RetryMiddleware (90)
+    })
+    # SQLite stores batch their commits, so concurrent writers would block each other
+    worker_dir = WORKER_FEED_DIR / worker_id
+    settings.set('HTTPCACHE_DIR', f"httpcache/{worker_id}")
+    settings.set('CONDITIONAL_REQUESTS_STORE', str(worker_dir / 'http_validators.sqlite3'))
+    settings.set('BEAD_IMAGES_INDEX', str(worker_dir / 'image_index.sqlite3'))
+    settings.set('TELEMETRY_DIR', str(worker_dir / 'telemetry'))
+    # Only the merged feed is meant for import, and one worker's feed is no run-to-run delta
+    settings.set('BEAD_FEED_S3_UPLOAD_ENABLED', False)
+    settings.set('BEAD_FEED_DELTA_ENABLED', False)
+    return settings
+
+def run_worker(settings, worker_id: str):
+    """Run one crawl worker to completion"""
+    process = CrawlerProcess(worker_settings(settings, worker_id))
+    output_file = WORKER_FEED_DIR / f"{WORKER_FEED_STEM}.{worker_id}.ndjson"
+    process.crawl(MiyukiDirectoryCrawler, output_file=str(output_file))
+    process.start()
+
+def reset_queue(queue_url: str):
+    """Empty the shared queue so the next workers start a fresh crawl"""
+    queue = open_request_queue(queue_url)
+    try:
+        queue.reset()
+    finally:
+        queue.close()
+    logger.info(f"🧹 Reset shared request queue {queue_url}")
+
+def merge(settings):
+    """Merge every finished worker feed into the feed the importer reads"""
+    paths = worker_feed_paths(WORKER_FEED_DIR, WORKER_FEED_STEM)
+    if not paths:
+        logger.error(f"💥 No finished worker feeds in {WORKER_FEED_DIR}")
+        return None
+    return merge_feeds(paths, FeedWriter.from_settings(DEFAULT_FEED_PATH, settings))
+
+def main():
+    """Run the distributed crawl, or one role of it"""
+    args = parse_args()
+    settings = get_project_settings()
+    settings.set('SPIDER_MODULES', ['spiders'])
+    settings.set('NEWSPIDER_MODULE', 'spiders')
+    queue_url = args.queue_url or settings.get('DISTRIBUTED_QUEUE_URL')
+    settings.set('DISTRIBUTED_QUEUE_URL', queue_url)
+
+    if args.reset:
+        reset_queue(queue_url)
+        return
+    if args.merge:
+        merge(settings)
+        return
+    if args.worker_id:
+        logger.info(f"🕷️  Starting worker {args.worker_id} on {queue_url}")
+        run_worker(settings, args.worker_id)
+        return
+
+    reset_queue(queue_url)
+    # Feeds from an earlier run would be merged into this one
+    for path in worker_feed_paths(WORKER_FEED_DIR, WORKER_FEED_STEM):
+        path.unlink()
+
+    logger.info(f"🕷️  Starting {args.workers} crawl workers on {queue_url}")
+    workers = [
+        multiprocessing.Process(target=run_worker, args=(settings, f"worker-{i}"), name=f"miyuki-worker-{i}")
+        for i in range(args.workers)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        if worker.exitcode != 0:
+            logger.warning(f"⚠️  {worker.name} exited with code {worker.exitcode} - its feed may be missing")
+
+    result = merge(settings)
+    if result:
+        logger.info(f"🎉 Distributed crawl finished: {result['records']} beads in {DEFAULT_FEED_PATH}")
+        logger.info("📊 Import them with: python -m importers.miyuki_directory")
+
+if __name__ == '__main__':
+    main()
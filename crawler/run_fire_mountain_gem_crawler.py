@@ -38,7 +38,7 @@ def main():
     process.crawl(FireMountainGemsSpider)
     process.start()
     
-    logger.info("✅ Crawler completed! Check miyuki_directory_beads.json for results")
+    logger.info("✅ Crawler completed! Check data/fire_mountain_gems_beads.ndjson for results")
 
 if __name__ == '__main__':
     main() 
\ No newline at end of file
@@ -63,18 +63,9 @@ def main():
     # Check S3 configuration
     s3_configured = check_s3_config()
     
-    # Get scrapy settings
+    # Get scrapy settings (robots.txt and cookies are set by the spider's custom_settings)
     settings = get_project_settings()
     
-    # Configure additional settings for this run
-    settings.update({
-        'USER_AGENT': 'PatternMaker/1.0 (+https://kohana-beads.com)',
-        'DOWNLOAD_DELAY': 1.0,  # Be polite to the server
-        'RANDOMIZE_DOWNLOAD_DELAY': 0.5,
-        'COOKIES_ENABLED': True,
-        'ROBOTSTXT_OBEY': True,
-    })
-    
     # Create and run the crawler
     process = CrawlerProcess(settings)
     process.crawl(FireMountainGemsSpider)
@@ -1,12 +1,23 @@
 #!/usr/bin/env python3
 """
-Script to run the Miyuki Directory crawler and then import the data to database
+Script to run the Miyuki Directory crawler and load the beads into the database
+
+By default beads are upserted in batches while the crawl runs. With --overlap
+the crawl runs in its own process and the importer tails its NDJSON feed; with
+--import-after-crawl the feed is imported once the crawl has finished.
+
+Crawl state is kept in --job-dir, so a crawl that is stopped or crashes picks
+up where it left off when the script is run again (--fresh starts over).
 """
 
+import argparse
 import logging
+import multiprocessing
+import shutil
 import sys
 import os
 from pathlib import Path
+from typing import Any, Dict
 
 # Add the crawler directory to the Python path
 crawler_dir = Path(__file__).parent
@@ -25,7 +36,10 @@ except Exception as e:
 from scrapy.crawler import CrawlerProcess
 from scrapy.utils.project import get_project_settings
 from spiders.miyuki_directory_crawler import MiyukiDirectoryCrawler
-from importers.miyuki_directory import MiyukiDirectoryImporter
+from importers.miyuki_directory import DEFAULT_FEED_PATH, MiyukiDirectoryImporter
+from feeds.writer import FeedWriter
+from importers.bead_loader import LOADERS, MODES
+from config.crawler_config import IMPORT_CONFIG
 
 # Configure logging
 logging.basicConfig(
@@ -35,6 +49,8 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_JOB_DIR = Path('data/jobs/miyuki_directory')
+
 def check_s3_config():
     """Check if S3 configuration is present"""
     bucket = os.environ.get('AWS_S3_BUCKET')
@@ -53,38 +69,145 @@ def check_s3_config():
         logger.info(f"✅ S3 upload configured - will upload to bucket: {bucket}")
         return True
 
-def main():
-    """Run the Miyuki Directory crawler and then import the data"""
-    logger.info("🕷️  Starting Miyuki Directory crawler...")
-    
-    # Check S3 configuration
-    s3_configured = check_s3_config()
-    
-    # Step 1: Run the crawler to scrape data to JSON
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="Crawl the Miyuki directory and import the beads")
+    parser.add_argument('--backend', choices=sorted(LOADERS), default=IMPORT_CONFIG['backend'],
+                        help="Loader backend for the import step (default: %(default)s)")
+    parser.add_argument('--mode', choices=MODES, default=IMPORT_CONFIG['mode'],
+                        help="'insert' skips existing beads, 'upsert' also refreshes changed ones (default: %(default)s)")
+    load_mode = parser.add_mutually_exclusive_group()
+    load_mode.add_argument('--import-after-crawl', action='store_true',
+                           help="Import the finished feed after the crawl instead of loading beads while crawling")
+    load_mode.add_argument('--overlap', action='store_true',
+                           help="Crawl in a separate process and import by tailing its feed as it is written")
+    parser.add_argument('--job-dir', type=Path, default=DEFAULT_JOB_DIR,
+                        help="Where crawl state is kept so an interrupted crawl can resume (default: %(default)s)")
+    parser.add_argument('--fresh', action='store_true',
+                        help="Discard the state of an interrupted crawl and start over")
+    parser.add_argument('--discovery', choices=('listing', 'sitemap', 'store_api'), default='listing',
+                        help="Find products on the listing pages, only the ones the product sitemap shows as "
+                             "changed since the last finished sitemap crawl, or read them with their attributes "
+                             "from the WooCommerce Store API (default: %(default)s)")
+    return parser.parse_args()
+
+def build_settings(args):
+    """Scrapy settings for this run; the Postgres pipeline is only used when loading in-process"""
     settings = get_project_settings()
     settings.set('SPIDER_MODULES', ['spiders'])
     settings.set('NEWSPIDER_MODULE', 'spiders')
+    settings.set('IMPORT_MODE', args.mode)
+    if not (args.import_after_crawl or args.overlap):
+        settings.set('POSTGRES_PIPELINE_ENABLED', True)
+        settings.set('POSTGRES_PIPELINE_BACKEND', args.backend)
+        settings.set('POSTGRES_PIPELINE_MODE', args.mode)
+    if not args.overlap:
+        # The overlapped importer tails a feed from its first record, so it always starts a fresh crawl
+        if args.fresh and args.job_dir.exists():
+            shutil.rmtree(args.job_dir)
+            logger.info(f"🧹 Discarded crawl state in {args.job_dir}")
+        elif args.job_dir.exists():
+            logger.info(f"♻️  Resuming interrupted crawl from {args.job_dir}")
+        settings.set('JOBDIR', str(args.job_dir))
+    return settings
 
+def run_crawl(settings, discovery: str = 'listing') -> Dict[str, Any]:
+    """Run the spider to completion and return its stats"""
     process = CrawlerProcess(settings)
-    process.crawl(MiyukiDirectoryCrawler)
+    crawler = process.create_crawler(MiyukiDirectoryCrawler)
+    process.crawl(crawler, discovery=discovery)
     process.start()
+    stats = crawler.stats.get_stats()
+    jobdir = settings.get('JOBDIR')
+    if stats.get('finish_reason') != 'finished':
+        logger.warning(f"⚠️  Crawl stopped early ({stats.get('finish_reason')}) - run again to resume it")
+        return stats
+    if jobdir:
+        # Scrapy would treat every request in a finished job as already seen
+        shutil.rmtree(jobdir, ignore_errors=True)
+    logger.info("✅ Crawler completed! NDJSON feed created")
+    return stats
+
+def log_import_result(result: Dict[str, int]):
+    """Log the importer's result counts"""
+    logger.info(f"🎉 Import completed!")
+    logger.info(f"📊 Total beads in file: {result['total_count']}")
+    logger.info(f"✅ New beads imported: {result['imported_count']}")
+    logger.info(f"♻️  Beads updated: {result['updated_count']}")
+    logger.info(f"🔄 Unchanged beads skipped: {result['unchanged_count']}")
+    logger.info(f"🔁 Repeated product codes: {result['repeated_count']}")
+
+def run_overlapped(args, settings):
+    """Crawl in a child process while this process imports the feed as it grows"""
+    feed = FeedWriter.from_settings(DEFAULT_FEED_PATH, settings)
+    feed_path = feed.path
+    # Leftovers from an earlier run would be tailed (or end the tail) before this crawl starts
+    feed.part_path.unlink(missing_ok=True)
+    feed.done_path.unlink(missing_ok=True)
+
+    crawl = multiprocessing.Process(target=run_crawl, args=(settings, args.discovery), name='miyuki-crawl')
+    crawl.start()
+    logger.info(f"🕷️  Crawler running in process {crawl.pid}, importing from {feed_path} as it is written")
+
+    importer = MiyukiDirectoryImporter(feed_path, backend=args.backend, mode=args.mode)
+    try:
+        importer.connect_to_database()
+        result = importer.tail_import_beads(should_stop=lambda: not crawl.is_alive())
+    except Exception as e:
+        logger.error(f"💥 Database import failed: {e}")
+        crawl.terminate()
+        raise
+    finally:
+        crawl.join()
+        importer.close_connection()
+
+    if crawl.exitcode != 0:
+        logger.warning(f"⚠️  Crawler process exited with code {crawl.exitcode} - the import may be incomplete")
+    log_import_result(result)
+    logger.info("🚀 Complete pipeline finished: Scrape ∥ Import → Done!")
+
+def main():
+    """Run the Miyuki Directory crawler and load the beads into the database"""
+    args = parse_args()
+    logger.info("🕷️  Starting Miyuki Directory crawler...")
     
-    logger.info("✅ Crawler completed! JSON file created")
+    # Check S3 configuration
+    s3_configured = check_s3_config()
     
-    # Step 2: Import the JSON data to database
+    settings = build_settings(args)
+    if args.overlap:
+        run_overlapped(args, settings)
+        return
+
+    # Step 1: Run the crawler, loading beads into the database as they are scraped
+    stats = run_crawl(settings, args.discovery)
+    if args.import_after_crawl and stats.get('finish_reason') != 'finished':
+        logger.warning("⚠️  Skipping the import until the crawl has finished")
+        return
+
+    if not args.import_after_crawl:
+        logger.info(f"🎉 Loaded while crawling!")
+        logger.info(f"✅ New beads imported: {stats.get('postgres/inserted', 0)}")
+        logger.info(f"♻️  Beads updated: {stats.get('postgres/updated', 0)}")
+        logger.info(f"🔄 Unchanged beads skipped: {stats.get('postgres/unchanged', 0)}")
+        logger.info(f"🔁 Repeated product codes: {stats.get('postgres/duplicates', 0)}")
+        if stats.get('postgres/failed_rows'):
+            logger.warning(f"⚠️  {stats['postgres/failed_rows']} beads failed to load - import them from the feed with python -m importers.miyuki_directory")
+        logger.info("🚀 Complete pipeline finished: Scrape + Load → Done!")
+        return
+
+    # Step 2: Import the NDJSON feed to database
     logger.info("📊 Starting database import...")
     
     try:
-        importer = MiyukiDirectoryImporter()
+        # With BEAD_FEED_COMPRESSION the feed carries a .gz/.zst suffix
+        feed_path = FeedWriter.from_settings(DEFAULT_FEED_PATH, settings).path
+        importer = MiyukiDirectoryImporter(feed_path, backend=args.backend, mode=args.mode)
         importer.connect_to_database()
-        importer.load_existing_product_codes()
         
+        # Streamed in batches: the feed is never loaded whole
         result = importer.bulk_import_beads()
-        
-        logger.info(f"🎉 Import completed!")
-        logger.info(f"📊 Total beads in file: {result['total_count']}")
-        logger.info(f"✅ New beads imported: {result['imported_count']}")
-        logger.info(f"🔄 Duplicates skipped: {result['duplicate_count']}")
+        log_import_result(result)
         
         importer.close_connection()
         
@@ -3,43 +3,47 @@ Fire Mountain Gems Spider - Simple JSON Export
 Crawls Miyuki Delica beads and saves them to a JSON file for Rails import
 """
 
-import re
-import json
 import logging
-import os
-import psycopg2
-from datetime import datetime
-from urllib.parse import urljoin
-from scrapy import Spider, Request
+from datetime import datetime, timezone
+from urllib.parse import urljoin, urlparse
+from scrapy import Spider, Request, signals
 from typing import Dict, Any, Optional, Set
 from pathlib import Path
 
-try:
-    import boto3
-    from botocore.exceptions import ClientError, NoCredentialsError
-    S3_AVAILABLE = True
-except ImportError:
-    S3_AVAILABLE = False
-    logging.warning("boto3 not installed - S3 upload will be skipped")
+from parsers.beads import listing_tile_bead, product_page_bead
+from parsers.pagination import limit_pages, numbered_page_urls, page_number
+from parsers.store_api import STORE_API_PRODUCTS_PATH
+from parsers.woocommerce import extract_product_attributes
+from feeds.writer import FeedWriter
+from spiders.miyuki_discovery import SitemapDiscovery, StoreApiDiscovery
+from storage.product_code_index import load_known_product_codes, skips_known_beads
 
 logger = logging.getLogger(__name__)
 
 
-class MiyukiDirectoryCrawler(Spider):
+class MiyukiDirectoryCrawler(SitemapDiscovery, StoreApiDiscovery, Spider):
     """Simple spider that crawls and saves to JSON"""
     
     name = 'miyuki_directory'
     allowed_domains = ['miyuki-beads.co.jp']
+    feed_site_name = 'miyuki-beads.co.jp'  # S3 prefix for the streamed feed
     start_urls = ['https://www.miyuki-beads.co.jp/directory/']
+    # -a discovery=sitemap seeds detail pages from the product sitemaps instead of the listing,
+    # -a discovery=store_api reads products with their attributes from the Store API's JSON pages
+    discovery = 'listing'
+    sitemap_url = 'https://www.miyuki-beads.co.jp/sitemap_index.xml'
+    store_api_url = f'https://www.miyuki-beads.co.jp{STORE_API_PRODUCTS_PATH}'
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         
         self.total_count = 0
         self.duplicate_count = 0
-        self.output_file = Path('data/miyuki_directory_beads.json')
-        self.size_counts = {}
+        # -a output_file=... lets distributed crawl workers each write their own feed
+        self.output_file = Path(getattr(self, 'output_file', None) or 'data/miyuki_directory_beads.ndjson')
         self.existing_product_codes: Set[str] = set()
+        # Set by FeedExportPipeline when it resumes an interrupted run's feed (JOBDIR)
+        self.resumed_product_codes: Set[str] = set()
         self.pages_crawled = 0
         # max_pages comes from -a max_pages=N argument and gets set as self.max_pages automatically
         # Convert to int if provided, otherwise None (unlimited)
@@ -51,123 +55,83 @@ class MiyukiDirectoryCrawler(Spider):
         # self.max_pages = 1  # Commented out to allow unlimited pages
         # You can also pass -a max_pages=10 to limit pages from command line
 
-        # Open file for streaming JSON output
-        self._json_file = None
-        self._first_item = True
+        # -a refresh_known=true re-fetches detail pages even for beads already in the database
+        self.refresh_known = str(getattr(self, 'refresh_known', '')).lower() in ('1', 'true', 'yes')
+
+        if self.discovery not in ('listing', 'sitemap', 'store_api'):
+            raise ValueError(f"Unknown discovery mode {self.discovery!r} (expected 'listing', 'sitemap' or 'store_api')")
+        if self.discovery == 'store_api':
+            # -a store_api_url=... may point at another host, e.g. fixtures/store_api_server.py
+            host = urlparse(self.store_api_url).hostname
+            if host and not any(host == domain or host.endswith(f'.{domain}') for domain in self.allowed_domains):
+                self.allowed_domains = [*self.allowed_domains, host]
+        # Sitemap discovery skips products whose <lastmod> is not after this (the start of the last finished crawl)
+        self.changed_since: Optional[datetime] = None
+        self.crawl_started_at = datetime.now(timezone.utc)
+        self.unchanged_count = 0
+
+        # Set by FeedExportPipeline, which streams scraped items to output_file
+        self.feed_writer: Optional[FeedWriter] = None
+    
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        crawler.signals.connect(spider.open_spider, signal=signals.spider_opened)
+        return spider
     
     def open_spider(self, spider):
-        """Initialize JSON file for streaming output and load existing product codes"""
-        # Skip database check for now - just create empty set
-        self.existing_product_codes = set()
-        logger.info("Skipping database duplicate check - will scrape all products")
+        """Load existing product codes so known beads can skip their detail fetch"""
+        if self.discovery == 'sitemap':
+            self._open_sitemap_discovery()
+        elif self.refresh_known:
+            self.existing_product_codes = set()
+            logger.info("refresh_known set - will scrape all products, including known ones")
+        elif skips_known_beads(self.settings):
+            self.existing_product_codes = load_known_product_codes(self.settings)
+            if not self.existing_product_codes:
+                logger.info("Continuing without duplicate checking")
+        else:
+            self.existing_product_codes = set()
+            logger.info("Known product code index off - will scrape all products")
         
-        self._json_file = open(self.output_file, 'w')
-        self._json_file.write('[\n')
         logger.info(f"Starting spider, streaming to {self.output_file}")
         logger.info(f"Found {len(self.existing_product_codes)} existing products in database")
+
+        if self.resumed_product_codes:
+            # Already in the resumed feed, so their detail pages are not fetched again
+            self.existing_product_codes |= self.resumed_product_codes
+            logger.info(f"Resuming crawl: {len(self.resumed_product_codes)} beads already in the feed")
     
-    def _load_existing_product_codes(self):
-        """Load existing product codes from database to avoid duplicates"""
-        try:
-            # Use same database config as Rails
-            conn = psycopg2.connect(
-                host=os.getenv('DATABASE_HOST', 'localhost'),
-                port=int(os.getenv('DATABASE_PORT', '5432')),
-                database='pattern_maker_development',  # Use Rails development DB
-                user=os.getenv('DATABASE_USERNAME', ''),
-                password=os.getenv('DATABASE_PASSWORD', '')
-            )
-            
-            with conn.cursor() as cursor:
-                cursor.execute("SELECT product_code FROM beads WHERE brand = 'Miyuki'")
-                self.existing_product_codes = {row[0] for row in cursor.fetchall()}
-            
-            conn.close()
-            logger.info(f"Loaded {len(self.existing_product_codes)} existing Miyuki product codes")
-            
-        except Exception as e:
-            logger.warning(f"Could not load existing product codes: {e}")
-            logger.info("Continuing without duplicate checking")
-            self.existing_product_codes = set()
+    @property
+    def feed_is_full_snapshot(self) -> bool:
+        """Whether the feed lists every product, so a code missing from it has left the site"""
+        # Sitemap crawls, page limits and known beads skipped before their detail fetch all leave products out
+        return (self.discovery != 'sitemap' and self.max_pages is None
+                and not (self.existing_product_codes - self.resumed_product_codes))
 
     def closed(self, reason):
-        """Close JSON file, upload to S3, and display summary"""
-        if self._json_file:
-            self._json_file.write('\n]')
-            self._json_file.close()
-            self._json_file = None
-        
-        # Upload to S3 if configured
-        self._upload_to_s3()
-        
+        """Display summary; FeedExportPipeline closes and uploads the feed once every spider_closed handler has been called"""
         self._display_summary()
         logger.info(f"Spider completed: {self.total_count} beads saved to {self.output_file}")
         logger.info(f"Spider closed with reason: {reason}")
-    
-    def _upload_to_s3(self):
-        """Upload the JSON file to S3"""
-        if not S3_AVAILABLE:
-            logger.info("Skipping S3 upload - boto3 not available")
-            return
-            
-        # Check for required environment variables
-        bucket_name = os.environ.get('AWS_S3_BUCKET')
-        access_key = os.environ.get('AWS_ACCESS_KEY_ID')
-        secret_key = os.environ.get('AWS_SECRET_ACCESS_KEY')
-        region = os.environ.get('AWS_REGION', 'us-east-1')
-        
-        if not all([bucket_name, access_key, secret_key]):
-            logger.warning("Skipping S3 upload - missing AWS credentials or bucket name")
-            logger.info("Required env vars: AWS_S3_BUCKET, AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY")
-            return
-        
-        try:
-            # Create S3 client
-            s3_client = boto3.client(
-                's3',
-                region_name=region,
-                aws_access_key_id=access_key,
-                aws_secret_access_key=secret_key
-            )
-            
-            # Create timestamped S3 key
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            site_name = 'miyuki-beads.co.jp'
-            s3_key = f"beads/{site_name}/feed-{timestamp}.json"
-            
-            # Upload file
-            with open(self.output_file, 'rb') as f:
-                s3_client.put_object(
-                    Bucket=bucket_name,
-                    Key=s3_key,
-                    Body=f,
-                    ContentType='application/json',
-                    Metadata={
-                        'spider': self.name,
-                        'scraped_at': datetime.now().isoformat(),
-                        'total_beads': str(self.total_count),
-                        'pages_crawled': str(self.pages_crawled)
-                    }
-                )
-            
-            logger.info(f"Successfully uploaded to s3://{bucket_name}/{s3_key}")
-            
-        except NoCredentialsError:
-            logger.error("AWS credentials not found")
-        except ClientError as e:
-            logger.error(f"AWS S3 error: {e}")
-        except Exception as e:
-            logger.error(f"Unexpected error uploading to S3: {e}")
+        if self.discovery == 'sitemap' and reason == 'finished':
+            # Only a complete crawl moves the cutoff; an interrupted one would lose the pages it never reached
+            self._record_sitemap_crawl()
+
+    async def start(self):
+        # Scrapy >= 2.13 entry point; older versions call start_requests directly
+        for request in self.start_requests():
+            yield request
+
+    def start_requests(self):
+        if self.discovery == 'sitemap':
+            yield self._sitemap_start_request()
+        elif self.discovery == 'store_api':
+            yield Request(self._store_api_page_url(1), callback=self.parse_store_api, meta={'store_api_page': 1})
+        else:
+            for url in self.start_urls:
+                yield Request(url, dont_filter=True)
 
-    def __del__(self):
-        """Destructor to ensure file is always closed"""
-        if hasattr(self, '_json_file') and self._json_file:
-            try:
-                self._json_file.write('\n]')
-                self._json_file.close()
-            except:
-                pass  # File might already be closed
-    
     def parse(self, response):
         """Parse the main Miyuki Delica page"""
         logger.info(f"Parsing page: {response.url}")
@@ -178,8 +142,12 @@ class MiyukiDirectoryCrawler(Spider):
         for item in product_items:
             bead_data = self._parse_product(item, response)
             if bead_data:
-                # Instead of crawling the product page now, just show how to do it:
-                yield Request(bead_data['source_url'], callback=self.parse_product_detail, meta={'bead_data': bead_data})
+                # Detail pages are revalidated with conditional requests when enabled
+                yield Request(
+                    bead_data['source_url'],
+                    callback=self.parse_product_detail,
+                    meta={'bead_data': bead_data, 'revalidate': True, 'handle_httpstatus_list': [304]}
+                )
         
         # Follow pagination
         yield from self._follow_pagination(response)
@@ -187,103 +155,40 @@ class MiyukiDirectoryCrawler(Spider):
     def _parse_product(self, item, response) -> Optional[Dict[str, Any]]:
         """Parse individual product item"""
         try:
-            # Extract basic product info
-            product_link = item.css('.woocommerce-LoopProduct-link::attr(href)').get()
-            if not product_link:
-                return None
-            
-            product_url = urljoin(response.url, product_link)
-            product_name = self._extract_product_name(item)
-            
-            # Extract and validate product code
-            product_code = self._extract_product_code(product_name)
-            if not product_code:
-                logger.debug(f"Skipping non-delicas: {product_name}")
-                return None
-            
-            # Check for duplicates
-            if product_code in self.existing_product_codes:
-                logger.debug(f"Skipping duplicate product: {product_name} ({product_code})")
-                self.duplicate_count += 1
-                return None
-            
-            # Get image URL
-            image_url = self._extract_image_url(item, response)
-
-            return {
-                'name': product_name,
-                'product_code': product_code,
-                'brand': 'Miyuki',
-                'type': 'Delica',
-                'size': self._get_product_size(product_code),
-                'image_url': image_url,
-                'source_url': product_url,
-            }
-            
+            bead_data = listing_tile_bead(item, response)
         except Exception as e:
             logger.error(f"Error parsing product: {e}")
             return None
-    
-    def _extract_product_name(self, item) -> str:
-        """Extract and clean product name"""
-        product_name = item.css('h2.woocommerce-loop-product__title::text').get()
-        if product_name:
-            return product_name.strip().replace('\nProduct Title', '')
-        return ""
-    
-    def _extract_product_code(self, product_name: str) -> Optional[str]:
-        """Extract product code from product name"""
-        patterns = [
-            r'(DB)(\d+)([A-Z]?)',
-            r'(DBS)(\d+)([A-Z]?)',
-            r'(DBM)(\d+)([A-Z]?)',
-            r'(DBL)(\d+)([A-Z]?)'
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, product_name)
-            if match:
-                prefix = match.group(1)      # "DB", "DBS", etc.
-                number = match.group(2)      # "123", "5", etc.
-                suffix = match.group(3)      # "B", "C", or ""
-                
-                # Pad number to 4 digits
-                padded_number = number.zfill(4)
-                
-                # Build the formatted code
-                if suffix:
-                    return f"{prefix}-{padded_number}-{suffix}"
-                else:
-                    return f"{prefix}-{padded_number}"
-        
-        return None
-    
-    def _extract_image_url(self, item, response) -> Optional[str]:
-        """Extract image URL from product item"""
-        image_url = item.css('img.attachment-woocommerce_thumbnail::attr(src)').get()
-        if image_url:
-            return urljoin(response.url, image_url)
-        return None
-    
-    def _get_product_size(self, product_code: str) -> str:
-        """Determine product size based on product code prefix"""
-        size_mapping = {
-            'DBS-': '15/0',
-            'DB-': '11/0',
-            'DBM-': '10/0',
-            'DBL-': '8/0'
-        }
-        
-        for prefix, size in size_mapping.items():
-            if product_code.startswith(prefix):
-                return size
-        
-        return 'Unknown'
+        if bead_data and self._is_known(bead_data, self.existing_product_codes):
+            return None
+        return bead_data
+
+    def _is_known(self, bead_data: Dict[str, Any], known_product_codes: Set[str]) -> bool:
+        """Count and skip a bead whose product code is already known"""
+        if bead_data['product_code'] not in known_product_codes:
+            return False
+        logger.debug(f"Skipping duplicate product: {bead_data['name']} ({bead_data['product_code']})")
+        self.duplicate_count += 1
+        return True
     
     def _follow_pagination(self, response):
-        """Follow pagination links"""
+        """Schedule every listing page from the first one, or follow the next link one page at a time"""
         self.pages_crawled += 1
-        
+
+        if response.meta.get('pagination_fanned_out'):
+            # Scheduled together with its siblings from the first page
+            return
+
+        if page_number(response.url) is None:
+            page_urls = numbered_page_urls(response.url, response.css('a.page-numbers:not(.next):not(.prev)::attr(href)').getall())
+            if page_urls:
+                page_urls = limit_pages(page_urls, self.max_pages)
+                logger.info(f"Scheduling {len(page_urls)} more listing pages at once")
+                for page_url in page_urls:
+                    # Ahead of the detail pages, so the whole listing is discovered first
+                    yield Request(page_url, callback=self.parse, priority=1, meta={'pagination_fanned_out': True})
+                return
+
         if self.max_pages is not None and self.pages_crawled >= self.max_pages:
             logger.info(f"Reached max pages limit ({self.max_pages}), stopping pagination")
             return
@@ -294,71 +199,44 @@ class MiyukiDirectoryCrawler(Spider):
             logger.info(f"Following next page: {next_page_url}")
             yield Request(next_page_url, callback=self.parse)
     
-    def _write_bead_to_json(self, bead_data):
-        """Write a single bead to the JSON file"""
-        # Ensure file is open (in case spider instance issues)
-        if not self._json_file:
-            self._json_file = open(self.output_file, 'w')
-            self._json_file.write('[\n')
-            self._first_item = True
-            
-        try:
-            if not self._first_item:
-                self._json_file.write(',\n')
-            else:
-                self._first_item = False
-            
-            json.dump(bead_data, self._json_file, indent=2)
-            self._json_file.flush()  # Ensure data is written immediately
-        except Exception as e:
-            logger.error(f"Error writing bead to JSON: {e}")
-    
     def _display_summary(self):
         """Display summary of all beads found"""
         logger.info(f"SUMMARY: Found {self.total_count} beads")
         logger.info(f"Skipped {self.duplicate_count} duplicate products")
-        
-        for size, count in self.size_counts.items():
-            logger.info(f"Size {size}: {count} beads")
+        if self.discovery == 'sitemap':
+            logger.info(f"Skipped {self.unchanged_count} products unchanged since the last crawl")
     
     def parse_product_detail(self, response):
         """Parse the product detail page to extract color and finish info"""
-        bead_data = response.meta['bead_data']
+        bead_data = response.meta.get('bead_data')
+
+        if response.status == 304:
+            # Page unchanged since the last run - replay the record extracted back then
+            cached_bead = response.meta.get('revalidated_item')
+            if not cached_bead:
+                logger.warning(f"Got 304 without a stored record for {response.url}, skipping")
+                return
+            # Listing data is fresh from this run, details come from the stored record
+            yield from self._emit_bead({**cached_bead, **(bead_data or {})})
+            return
+
+        if bead_data is None:
+            # Seeded from the sitemap, so the listing fields come from the page itself
+            bead_data = product_page_bead(response)
+            # Already in the resumed feed
+            if not bead_data or self._is_known(bead_data, self.resumed_product_codes):
+                return
 
-        color = response.css(
-            'tr.woocommerce-product-attributes-item--attribute_pa_color-group td.woocommerce-product-attributes-item__value p::text'
-        ).get()
-        finish = response.css(
-            'tr.woocommerce-product-attributes-item--attribute_pa_finish td.woocommerce-product-attributes-item__value p::text'
-        ).get()
-        shape = response.css(
-            'tr.woocommerce-product-attributes-item--attribute_pa_shape td.woocommerce-product-attributes-item__value p::text'
-        ).get()
-        size = response.css(
-            'tr.woocommerce-product-attributes-item--attribute_pa_size td.woocommerce-product-attributes-item__value p::text'
-        ).get()
-        glass_group = response.css(
-            'tr.woocommerce-product-attributes-item--attribute_pa_glass-group td.woocommerce-product-attributes-item__value p::text'
-        ).get()
-        dyed = response.css(
-            'tr.woocommerce-product-attributes-item--attribute_pa_dyed td.woocommerce-product-attributes-item__value p::text'
-        ).get()
-        galvanized = response.css(
-            'tr.woocommerce-product-attributes-item--attribute_pa_galva td.woocommerce-product-attributes-item__value p::text'
-        ).get()
-        plating = response.css(
-            'tr.woocommerce-product-attributes-item--attribute_pa_plating td.woocommerce-product-attributes-item__value p::text'
-        ).get()
+        # One pass over the attribute table; unknown attributes are kept as metadata
+        attributes, extra_attributes = extract_product_attributes(response)
+        bead_data.update(attributes)
+        if extra_attributes:
+            bead_data['metadata'] = extra_attributes
 
-        bead_data['color'] = color.strip() if color else None
-        bead_data['finish'] = finish.strip() if finish else None
-        bead_data['shape'] = shape.strip() if shape else None
-        bead_data['size_detail'] = size.strip() if size else None
-        bead_data['glass_group'] = glass_group.strip() if glass_group else None
-        bead_data['dyed'] = dyed.strip() if dyed else None
-        bead_data['galvanized'] = galvanized.strip() if galvanized else None
-        bead_data['plating'] = plating.strip() if plating else None
+        yield from self._emit_bead(bead_data)
 
+    def _emit_bead(self, bead_data):
+        """Count and log a fully detailed bead, then hand it to Scrapy as an item"""
         logger.info(
             f"Detailed bead #{self.total_count + 1}: {bead_data['name']} ({bead_data['product_code']}) - "
             f"Color: {bead_data['color']}, Finish: {bead_data['finish']}, "
@@ -366,5 +244,4 @@ class MiyukiDirectoryCrawler(Spider):
         )
 
         self.total_count += 1
-        self.size_counts[bead_data['size']] = self.size_counts.get(bead_data['size'], 0) + 1
-        self._write_bead_to_json(bead_data) 
\ No newline at end of file
+        yield bead_data
@@ -0,0 +1,122 @@
+"""
+Discovery modes of the Miyuki directory crawler
+Request flows that find products without the listing pages: the product
+sitemaps (only pages changed since the last finished crawl) and the
+WooCommerce Store API (whole records, attributes included, in JSON pages)
+"""
+
+import logging
+from datetime import datetime
+
+from scrapy import Request
+
+from parsers.pagination import limit_pages
+from parsers.sitemaps import changed_entries, product_sitemaps, read_sitemap
+from parsers.store_api import STORE_API_MAX_PAGE_SIZE, store_api_bead, store_api_page_url, store_api_total_pages
+from storage.crawl_history import CrawlHistory
+
+logger = logging.getLogger(__name__)
+
+
+class SitemapDiscovery:
+    """-a discovery=sitemap: seed detail pages from the product sitemaps, skipping unchanged ones"""
+
+    def _open_sitemap_discovery(self):
+        """Find when the last finished sitemap crawl started; products changed since then are fetched"""
+        # Known beads are fetched too when their page changed, so the code index is not used
+        self.existing_product_codes = set()
+        if self.refresh_known:
+            logger.info("refresh_known set - will scrape every product in the sitemap")
+            return
+        history = CrawlHistory(self.settings.get('CRAWL_HISTORY_PATH', 'data/crawl_history.json'))
+        self.changed_since = history.last_crawl_started_at(self.name)
+        if self.changed_since:
+            logger.info(f"Sitemap discovery: fetching products modified after {self.changed_since.isoformat()}")
+        else:
+            logger.info("Sitemap discovery: no finished sitemap crawl yet - will scrape every product")
+
+    def _sitemap_start_request(self) -> Request:
+        """The sitemap index request; a resumed crawl keeps its original start time"""
+        # Scrapy persists spider.state in JOBDIR (loaded once the spider has opened)
+        state = getattr(self, 'state', None)
+        if state is not None:
+            self.crawl_started_at = datetime.fromisoformat(
+                state.setdefault('crawl_started_at', self.crawl_started_at.isoformat())
+            )
+        return Request(self.sitemap_url, callback=self.parse_sitemap)
+
+    def parse_sitemap(self, response):
+        """Follow the product sitemaps of a sitemap index, or seed detail pages from a url set"""
+        sitemap_type, entries = read_sitemap(response.body, response.url)
+        if sitemap_type == 'sitemapindex':
+            sitemap_urls = list(product_sitemaps(entries))
+            logger.info(f"Found {len(sitemap_urls)} product sitemaps in {response.url}")
+            for sitemap_url in sitemap_urls:
+                yield Request(sitemap_url, callback=self.parse_sitemap)
+            return
+        if sitemap_type != 'urlset':
+            logger.warning(f"Not a sitemap, skipping: {response.url}")
+            return
+
+        changed = changed_entries(entries, self.changed_since)
+        unchanged = len(entries) - len(changed)
+        self.unchanged_count += unchanged
+        for entry in changed:
+            # No listing data: parse_product_detail reads name and image from the page itself
+            yield Request(
+                entry['loc'],
+                callback=self.parse_product_detail,
+                meta={'revalidate': True, 'handle_httpstatus_list': [304]}
+            )
+        self.crawler.stats.inc_value('sitemap/changed', len(changed))
+        self.crawler.stats.inc_value('sitemap/unchanged', unchanged)
+        logger.info(f"Sitemap {response.url}: {len(changed)} changed products, {unchanged} unchanged")
+
+    def _record_sitemap_crawl(self):
+        """Move the <lastmod> cutoff to the start of this (finished) crawl"""
+        history = CrawlHistory(self.settings.get('CRAWL_HISTORY_PATH', 'data/crawl_history.json'))
+        history.record_finished_crawl(self.name, self.crawl_started_at, discovery='sitemap', beads=self.total_count)
+
+
+class StoreApiDiscovery:
+    """-a discovery=store_api: read products from the Store API's JSON pages, no detail requests"""
+
+    def parse_store_api(self, response):
+        """Turn one page of Store API products into beads, attributes included, without any detail request"""
+        products = response.json()
+        logger.info(f"Store API page {response.meta.get('store_api_page')}: {len(products)} products")
+
+        for product in products:
+            bead_data = store_api_bead(product)
+            if bead_data and not self._is_known(bead_data, self.existing_product_codes):
+                yield from self._emit_bead(bead_data)
+
+        yield from self._follow_store_api_pages(response, len(products))
+
+    def _store_api_page_size(self) -> int:
+        return min(self.settings.getint('STORE_API_PAGE_SIZE', STORE_API_MAX_PAGE_SIZE), STORE_API_MAX_PAGE_SIZE)
+
+    def _store_api_page_url(self, page: int) -> str:
+        return store_api_page_url(self.store_api_url, self._store_api_page_size(), page)
+
+    def _follow_store_api_pages(self, response, product_count: int):
+        """Schedule every page from the first one's X-WP-TotalPages header, or ask for the next while pages are full"""
+        self.pages_crawled += 1
+        if response.meta.get('pagination_fanned_out'):
+            return
+
+        page = response.meta.get('store_api_page', 1)
+        total_pages = store_api_total_pages(response)
+        if page == 1 and total_pages is not None:
+            page_urls = limit_pages([self._store_api_page_url(number) for number in range(2, total_pages + 1)], self.max_pages)
+            logger.info(f"Scheduling {len(page_urls)} more Store API pages at once")
+            for number, page_url in enumerate(page_urls, start=2):
+                yield Request(page_url, callback=self.parse_store_api,
+                              meta={'store_api_page': number, 'pagination_fanned_out': True})
+            return
+
+        if self.max_pages is not None and self.pages_crawled >= self.max_pages:
+            logger.info(f"Reached max pages limit ({self.max_pages}), stopping pagination")
+            return
+        if product_count >= self._store_api_page_size():
+            yield Request(self._store_api_page_url(page + 1), callback=self.parse_store_api, meta={'store_api_page': page + 1})
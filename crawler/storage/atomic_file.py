@@ -0,0 +1,36 @@
+"""
+Atomic file writes
+Write to a temporary file next to the target and rename it into place, so
+readers never see a partial file and a crash leaves the old one intact
+"""
+
+import json
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Any, Iterator, Union
+
+
+@contextmanager
+def atomic_write(path: Union[str, Path], mode: str = 'w') -> Iterator[IO]:
+    """Open a temporary file for writing that replaces ``path`` once the block exits cleanly
+
+    The temporary name is unique per process and thread, so concurrent
+    writers (crawl workers, download threads) never share one.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(tmp_path, mode, **({} if 'b' in mode else {'encoding': 'utf-8'})) as f:
+            yield f
+        os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
+def write_json_atomically(path: Union[str, Path], data: Any, **dump_options):
+    """Replace ``path`` with ``data`` as JSON (``dump_options`` go to json.dump)"""
+    with atomic_write(path) as f:
+        json.dump(data, f, **dump_options)
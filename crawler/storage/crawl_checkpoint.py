@@ -0,0 +1,55 @@
+"""
+Crawl checkpoint
+Records how much of a feed's ``.part`` file is safely written and which product
+codes it holds, so an interrupted crawl can resume its feed and skip the detail
+pages it already exported
+"""
+
+import json
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Union
+
+from storage.atomic_file import write_json_atomically
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_FILENAME = 'feed_checkpoint.json'
+
+
+class CrawlCheckpoint:
+    """JSON checkpoint file, rewritten atomically after every feed flush"""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+
+    @classmethod
+    def in_jobdir(cls, jobdir: Union[str, Path]) -> 'CrawlCheckpoint':
+        """Checkpoint kept next to Scrapy's own persisted state in JOBDIR"""
+        return cls(Path(jobdir) / CHECKPOINT_FILENAME)
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        """The last saved checkpoint, or None if there is none (or it is unreadable)"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable crawl checkpoint {self.path}: {e}")
+            return None
+
+    def save(self, feed_path: Union[str, Path], offset: int, items: int, product_codes: Iterable[str]):
+        """Record that the first ``offset`` bytes of the feed hold ``items`` records with these codes"""
+        write_json_atomically(self.path, {
+            'feed': str(feed_path),
+            'offset': offset,
+            'items': items,
+            'product_codes': sorted(product_codes),
+            'saved_at': datetime.now().isoformat()
+        })
+
+    def clear(self):
+        """Forget the checkpoint once its feed is complete"""
+        self.path.unlink(missing_ok=True)
@@ -0,0 +1,50 @@
+"""
+Crawl history
+Remembers when each spider's last finished sitemap crawl started, so the next
+one only fetches pages whose sitemap <lastmod> is newer
+"""
+
+import json
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+from storage.atomic_file import write_json_atomically
+
+logger = logging.getLogger(__name__)
+
+
+class CrawlHistory:
+    """JSON file of per-spider crawl start times, rewritten atomically"""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+
+    def last_crawl_started_at(self, spider_name: str) -> Optional[datetime]:
+        """When the spider's last finished crawl started, or None if it never finished one"""
+        entry = self._load().get(spider_name) or {}
+        try:
+            return datetime.fromisoformat(entry['started_at'])
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    def record_finished_crawl(self, spider_name: str, started_at: datetime, **details: Any):
+        """Record a crawl that ran to completion; changes made since it started are picked up next time"""
+        history = self._load()
+        history[spider_name] = {
+            'started_at': started_at.isoformat(),
+            'finished_at': datetime.now(started_at.tzinfo).isoformat(),
+            **details
+        }
+        write_json_atomically(self.path, history, indent=2)
+
+    def _load(self) -> Dict[str, Any]:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable crawl history {self.path}: {e}")
+            return {}
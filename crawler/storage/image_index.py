@@ -0,0 +1,46 @@
+"""
+Image index
+Maps image URLs to the content hash of the file downloaded for them, so a
+recrawl can reuse stored images instead of fetching them again
+"""
+
+import logging
+import time
+from typing import Optional, Tuple
+
+from storage.sqlite_store import SqliteStore
+
+logger = logging.getLogger(__name__)
+
+
+class ImageIndex(SqliteStore):
+    """SQLite-backed URL -> (sha256, stored path) index"""
+
+    SCHEMA = ("""
+        CREATE TABLE IF NOT EXISTS images (
+            url TEXT PRIMARY KEY,
+            sha256 TEXT NOT NULL,
+            stored_path TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        )
+    """,)
+
+    def open(self):
+        """Open (and create if needed) the index"""
+        super().open()
+        logger.info(f"Opened image index at {self.path}")
+
+    def get(self, url: str) -> Optional[Tuple[str, str]]:
+        """Return the (sha256, stored_path) recorded for a URL"""
+        row = self._connection.execute(
+            "SELECT sha256, stored_path FROM images WHERE url = ?", (url,)
+        ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def save(self, url: str, sha256: str, stored_path: str):
+        """Record which stored file a URL resolved to"""
+        self._write("""
+            INSERT INTO images (url, sha256, stored_path, updated_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT (url) DO UPDATE SET
+                sha256 = excluded.sha256, stored_path = excluded.stored_path, updated_at = excluded.updated_at
+        """, (url, sha256, stored_path, time.time()))
@@ -0,0 +1,113 @@
+"""
+Known product code index
+A local on-disk copy of the brand_product_codes already in the beads table,
+refreshed from Postgres on a TTL so spiders can skip detail fetches for known beads
+"""
+
+import logging
+import time
+from pathlib import Path
+from typing import Callable, Set, Union
+
+import psycopg2
+
+from config.crawler_config import IMPORT_CONFIG, get_connection_kwargs
+from storage.atomic_file import atomic_write
+
+logger = logging.getLogger(__name__)
+
+
+class ProductCodeIndex:
+    """Newline-delimited file of known product codes with a time-to-live"""
+
+    def __init__(self, path: Union[str, Path], ttl_seconds: float, fetch_size: int = 5000):
+        self.path = Path(path)
+        self.ttl_seconds = ttl_seconds
+        self.fetch_size = fetch_size
+
+    def is_stale(self) -> bool:
+        """True when the index is missing or older than its TTL"""
+        try:
+            age = time.time() - self.path.stat().st_mtime
+        except FileNotFoundError:
+            return True
+        return age > self.ttl_seconds
+
+    def load(self) -> Set[str]:
+        """Read the index from disk (empty if it does not exist yet)"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return set(f.read().split())
+        except FileNotFoundError:
+            return set()
+
+    def refresh(self, connection) -> Set[str]:
+        """Rebuild the index from the beads table and write it atomically
+
+        Uses a named (server-side) cursor so codes are streamed in chunks of
+        ``fetch_size`` instead of being materialised by the driver all at once.
+        """
+        started_at = time.perf_counter()
+        codes: Set[str] = set()
+
+        with connection.cursor(name='known_product_codes') as cursor:
+            cursor.itersize = self.fetch_size
+            cursor.execute("SELECT brand_product_code FROM beads")
+            with atomic_write(self.path) as f:
+                for (code,) in cursor:
+                    codes.add(code)
+                    f.write(code)
+                    f.write('\n')
+
+        elapsed = time.perf_counter() - started_at
+        logger.info(f"Refreshed known product code index with {len(codes)} codes in {elapsed:.2f}s")
+        return codes
+
+    def load_or_refresh(self, connect: Callable, force: bool = False) -> Set[str]:
+        """Return known codes, refreshing from the database first if the index is stale
+
+        If the database cannot be reached, the existing (possibly stale) index is used.
+        """
+        if force or self.is_stale():
+            try:
+                connection = connect()
+                try:
+                    return self.refresh(connection)
+                finally:
+                    connection.close()
+            except Exception as e:
+                logger.warning(f"Could not refresh known product code index: {e}")
+
+        started_at = time.perf_counter()
+        codes = self.load()
+        elapsed_ms = (time.perf_counter() - started_at) * 1000
+        logger.info(f"Loaded {len(codes)} known product codes from {self.path} in {elapsed_ms:.1f}ms")
+        return codes
+
+
+def skips_known_beads(settings) -> bool:
+    """Whether beads already in the database skip their detail fetch
+
+    KNOWN_CODES_INDEX_ENABLED = None (the default) only skips them for
+    insert-only loads without a delta feed: upserts, revalidation and
+    the delta can only see a change to a bead whose page is fetched.
+    """
+    if settings.get('KNOWN_CODES_INDEX_ENABLED') is not None:
+        return settings.getbool('KNOWN_CODES_INDEX_ENABLED')
+    if settings.getbool('POSTGRES_PIPELINE_ENABLED'):
+        mode = settings.get('POSTGRES_PIPELINE_MODE')
+    else:
+        mode = settings.get('IMPORT_MODE') or IMPORT_CONFIG['mode']
+    return mode == 'insert' and not settings.getbool('BEAD_FEED_DELTA_ENABLED')
+
+
+def load_known_product_codes(settings) -> Set[str]:
+    """Known product codes from the local index, refreshed from the database on a TTL"""
+    index = ProductCodeIndex(
+        settings.get('KNOWN_CODES_INDEX_PATH', 'data/known_product_codes.txt'),
+        ttl_seconds=settings.getfloat('KNOWN_CODES_INDEX_TTL', 6 * 3600)
+    )
+    return index.load_or_refresh(
+        lambda: psycopg2.connect(**get_connection_kwargs()),
+        force=settings.getbool('KNOWN_CODES_INDEX_FORCE_REFRESH')
+    )
@@ -0,0 +1,55 @@
+"""
+SQLite store base
+Connection handling shared by the single-file SQLite stores: WAL journaling,
+relaxed syncing, and writes committed in batches instead of one by one
+"""
+
+import sqlite3
+from pathlib import Path
+from typing import Optional, Sequence, Union
+
+
+class SqliteStore:
+    """One SQLite file opened with ``open`` and created from ``SCHEMA``
+
+    Writes go through ``_write``, which commits every ``commit_every`` writes;
+    ``close`` commits whatever is still pending.
+    """
+
+    # CREATE statements run every time the store is opened
+    SCHEMA: Sequence[str] = ()
+
+    def __init__(self, path: Union[str, Path], commit_every: int = 100):
+        self.path = Path(path)
+        self.commit_every = commit_every
+        self._pending_writes = 0
+        self._connection: Optional[sqlite3.Connection] = None
+
+    def open(self):
+        """Open (and create if needed) the store"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(str(self.path))
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        for statement in self.SCHEMA:
+            self._connection.execute(statement)
+        self._connection.commit()
+
+    def close(self):
+        """Flush pending writes and close the store"""
+        if self._connection:
+            self._connection.commit()
+            self._connection.close()
+            self._connection = None
+
+    def commit(self):
+        """Commit pending writes now"""
+        self._connection.commit()
+        self._pending_writes = 0
+
+    def _write(self, sql: str, params: tuple):
+        """Execute a write, committing every ``commit_every`` writes"""
+        self._connection.execute(sql, params)
+        self._pending_writes += 1
+        if self._pending_writes >= self.commit_every:
+            self.commit()
@@ -0,0 +1,68 @@
+"""
+HTTP validator store
+Persists ETag / Last-Modified validators and the last extracted record per URL
+so unchanged pages can be revalidated with a conditional request on the next run
+"""
+
+import json
+import logging
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from storage.sqlite_store import SqliteStore
+
+logger = logging.getLogger(__name__)
+
+
+class ValidatorStore(SqliteStore):
+    """SQLite-backed store of per-URL validators and extracted records"""
+
+    SCHEMA = ("""
+        CREATE TABLE IF NOT EXISTS validators (
+            url TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT,
+            record TEXT,
+            updated_at REAL NOT NULL
+        )
+    """,)
+
+    def open(self):
+        """Open (and create if needed) the store"""
+        super().open()
+        logger.info(f"Opened validator store at {self.path}")
+
+    def get_validators(self, url: str) -> Tuple[Optional[str], Optional[str]]:
+        """Return the (etag, last_modified) pair stored for a URL"""
+        row = self._connection.execute(
+            "SELECT etag, last_modified FROM validators WHERE url = ? AND record IS NOT NULL",
+            (url,)
+        ).fetchone()
+        return (row[0], row[1]) if row else (None, None)
+
+    def get_record(self, url: str) -> Optional[Dict[str, Any]]:
+        """Return the last record extracted from a URL"""
+        row = self._connection.execute("SELECT record FROM validators WHERE url = ?", (url,)).fetchone()
+        if not row or row[0] is None:
+            return None
+        return json.loads(row[0])
+
+    def save_validators(self, url: str, etag: Optional[str], last_modified: Optional[str]):
+        """Remember the validators a response was served with
+
+        Any stored record is cleared until the new response's record is saved,
+        so a page that fails to parse is never answered from a stale record.
+        """
+        self._write("""
+            INSERT INTO validators (url, etag, last_modified, updated_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT (url) DO UPDATE SET
+                etag = excluded.etag, last_modified = excluded.last_modified,
+                record = NULL, updated_at = excluded.updated_at
+        """, (url, etag, last_modified, time.time()))
+
+    def save_record(self, url: str, record: Dict[str, Any]):
+        """Remember the record extracted from a URL"""
+        self._write("""
+            INSERT INTO validators (url, record, updated_at) VALUES (?, ?, ?)
+            ON CONFLICT (url) DO UPDATE SET record = excluded.record, updated_at = excluded.updated_at
+        """, (url, json.dumps(record, separators=(',', ':')), time.time()))
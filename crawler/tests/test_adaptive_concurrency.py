@@ -0,0 +1,154 @@
+"""AIMD concurrency per download slot: growth, backoff, Retry-After pauses and the configured bounds"""
+
+from types import SimpleNamespace
+
+import pytest
+from scrapy import Request, Spider
+from scrapy.http import Response
+from scrapy.utils.test import get_crawler
+
+from extensions.adaptive_concurrency import MIN_BACKOFF_DELAY, AdaptiveConcurrency, parse_retry_after
+from spiders.fire_mountain_gems_view import FireMountainGemsSpider
+
+SLOT = 'example.com'
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr('extensions.adaptive_concurrency.slot_clock', clock)
+    return clock
+
+
+def _controller(**settings):
+    crawler = get_crawler(Spider, {
+        'ADAPTIVE_CONCURRENCY_ENABLED': True,
+        'ADAPTIVE_CONCURRENCY_START': 2,
+        'ADAPTIVE_CONCURRENCY_MIN': 1,
+        'ADAPTIVE_CONCURRENCY_MAX': 4,
+        'DOWNLOAD_DELAY': 0,
+        **settings,
+    })
+    slot = SimpleNamespace(concurrency=2, delay=0.0, lastseen=0.0)
+    crawler.engine = SimpleNamespace(downloader=SimpleNamespace(slots={SLOT: slot}))
+    return AdaptiveConcurrency(crawler), slot, crawler.stats
+
+
+def _respond(controller, status=200, latency=0.1, headers=None):
+    request = Request(f'https://{SLOT}/beads', meta={'download_slot': SLOT, 'download_latency': latency})
+    controller.response_downloaded(Response(request.url, status=status, headers=headers), request, None)
+
+
+def test_healthy_responses_add_about_one_per_round_up_to_the_max(clock):
+    controller, slot, stats = _controller()
+
+    for expected in (2, 2, 3):
+        _respond(controller)
+        assert slot.concurrency == expected
+    for _ in range(50):
+        _respond(controller)
+    assert slot.concurrency == 4
+    assert stats.get_value(f'adaptive_concurrency/{SLOT}/max_concurrency') == 4
+
+
+def test_rising_latency_stops_growth(clock):
+    controller, slot, _ = _controller()
+    for _ in range(5):
+        _respond(controller, latency=0.1)
+    grown = controller.slots[SLOT].concurrency
+
+    _respond(controller, latency=5.0)
+    assert controller.slots[SLOT].concurrency == grown
+
+
+@pytest.mark.parametrize('status', [429, 503, 500])
+def test_pushback_halves_concurrency_once_per_round_trip(clock, status):
+    controller, slot, stats = _controller(ADAPTIVE_CONCURRENCY_START=4)
+
+    _respond(controller, status=status)
+    assert slot.concurrency == 2
+    # The rest of the same burst counts as one backoff
+    _respond(controller, status=status)
+    assert slot.concurrency == 2
+    assert stats.get_value('adaptive_concurrency/backoffs') == 1
+
+    clock.now += 1.5
+    _respond(controller, status=status)
+    assert slot.concurrency == 1
+
+
+def test_download_errors_back_off_too(clock):
+    controller, slot, stats = _controller(ADAPTIVE_CONCURRENCY_START=4)
+    controller.request_left_downloader(Request(f'https://{SLOT}/beads', meta={'download_slot': SLOT}), None)
+
+    assert slot.concurrency == 2
+    assert stats.get_value('adaptive_concurrency/backoffs') == 1
+
+
+def test_retry_after_pushes_lastseen_into_the_future(clock):
+    controller, slot, stats = _controller()
+
+    _respond(controller, status=429, headers={'Retry-After': '30'})
+    assert slot.lastseen == clock.now + 30
+    assert slot.delay > 0
+    assert stats.get_value('adaptive_concurrency/retry_after_pauses') == 1
+
+    # No growth while paused, and the pause is kept on later responses
+    clock.now += 10
+    before = controller.slots[SLOT].concurrency
+    _respond(controller)
+    assert controller.slots[SLOT].concurrency == before
+    assert slot.lastseen == 1030.0
+
+
+def test_retry_after_is_capped(clock):
+    controller, slot, _ = _controller(ADAPTIVE_CONCURRENCY_MAX_RETRY_AFTER=60)
+    _respond(controller, status=503, headers={'Retry-After': '3600'})
+    assert slot.lastseen == clock.now + 60
+
+
+def test_at_min_concurrency_the_delay_grows_up_to_its_ceiling_and_winds_back_down(clock):
+    controller, slot, _ = _controller(ADAPTIVE_CONCURRENCY_START=1, ADAPTIVE_CONCURRENCY_MAX_DELAY=1.0)
+
+    _respond(controller, status=429)
+    assert slot.concurrency == 1
+    assert slot.delay == MIN_BACKOFF_DELAY
+    for _ in range(5):
+        clock.now += 2
+        _respond(controller, status=429)
+    assert slot.concurrency == 1
+    assert slot.delay == 1.0
+
+    for _ in range(100):
+        _respond(controller)
+    assert slot.delay == 0
+    assert slot.concurrency > 1
+
+
+def test_download_delay_is_the_delay_floor(clock):
+    controller, slot, _ = _controller(DOWNLOAD_DELAY=1.0, ADAPTIVE_CONCURRENCY_START=1)
+    _respond(controller, status=429)
+    assert slot.delay == 2.0
+    for _ in range(100):
+        _respond(controller)
+    assert slot.delay == 1.0
+
+
+def test_fire_mountain_gems_keeps_a_politeness_floor():
+    crawler = get_crawler(FireMountainGemsSpider, {'ADAPTIVE_CONCURRENCY_ENABLED': True})
+    assert AdaptiveConcurrency(crawler).min_delay >= 1.0
+
+
+def test_parse_retry_after():
+    assert parse_retry_after(b'120') == 120.0
+    assert parse_retry_after(b'Thu, 01 Jan 1970 00:00:00 GMT') == 0.0
+    assert parse_retry_after(b'soon') is None
+    assert parse_retry_after(None) is None
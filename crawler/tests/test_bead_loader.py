@@ -0,0 +1,104 @@
+"""Loader SQL and row handling that do not need a database"""
+
+import pytest
+
+from importers.bead_loader import (
+    BEAD_COLUMNS, SECONDARY_SOURCE_KEEP_WHEN_NULL_COLUMNS, CopyLoader, ValuesLoader,
+    _conflict_clause, _count_results, _dedupe_rows, bead_to_row, get_loader
+)
+
+
+def _row(code, name):
+    return bead_to_row({'product_code': code, 'name': name})
+
+
+def test_bead_to_row_follows_bead_columns():
+    row = bead_to_row({'product_code': 'DB-0001', 'name': 'Black', 'color': 'Black',
+                       'metadata': {'b': 1, 'a': 2}, 'image': 'ab/abc.jpg'}, brand_id=3)
+    values = dict(zip(BEAD_COLUMNS, row))
+    assert values['brand_product_code'] == 'DB-0001'
+    assert values['brand_id'] == 3
+    assert values['color_group'] == 'Black'
+    assert values['metadata'] == '{"a": 2, "b": 1}'
+    assert values['image'] == 'ab/abc.jpg'
+
+
+def test_dedupe_rows_keeps_the_last_row_per_code():
+    rows = [_row('DB-0001', 'first'), _row('DB-0002', 'other'), _row('DB-0001', 'last')]
+    assert _dedupe_rows(rows) == [_row('DB-0001', 'last'), _row('DB-0002', 'other')]
+
+
+def test_insert_mode_ignores_conflicts():
+    assert _conflict_clause('insert') == "ON CONFLICT (brand_product_code) DO NOTHING RETURNING (xmax = 0)"
+
+
+def test_upsert_only_rewrites_changed_rows_and_keeps_stored_images():
+    clause = _conflict_clause('upsert')
+    assert 'DO UPDATE SET' in clause
+    assert 'image = COALESCE(EXCLUDED.image, b.image)' in clause
+    assert 'name = EXCLUDED.name' in clause
+    assert 'IS DISTINCT FROM' in clause
+    # json has no equality operator
+    assert 'b.metadata::jsonb' in clause
+    assert 'brand_id =' not in clause
+
+
+def test_secondary_source_never_clears_a_column():
+    clause = _conflict_clause('upsert', SECONDARY_SOURCE_KEEP_WHEN_NULL_COLUMNS)
+    assert 'name = COALESCE(EXCLUDED.name, b.name)' in clause
+    assert clause.count('EXCLUDED.name') == clause.count('COALESCE(EXCLUDED.name, b.name)')
+
+
+def test_count_results_reports_repeated_codes_apart_from_unchanged_beads():
+    assert _count_results([(True,), (False,), (True,)], 6, 5) == {
+        'inserted': 2, 'updated': 1, 'unchanged': 2, 'duplicates': 1
+    }
+
+
+class _Cursor:
+    """Records COPY input and answers the merge with one RETURNING row per staged product code"""
+
+    def __init__(self):
+        self.copied = ''
+
+    def execute(self, sql, params=None):
+        pass
+
+    def copy_expert(self, sql, stream):
+        self.copied = stream.read()
+
+    def fetchall(self):
+        return [(True,) for _ in {line.split('\t')[0] for line in self.copied.splitlines()}]
+
+
+@pytest.mark.parametrize('backend', ['copy', 'values'])
+def test_loaders_count_repeated_codes_as_duplicates(backend, monkeypatch):
+    rows = [_row('DB-0001', 'first'), _row('DB-0002', 'other'), _row('DB-0001', 'last')]
+    # execute_values would need a connection; answer it like the merge does
+    monkeypatch.setattr('importers.bead_loader.execute_values',
+                        lambda cursor, sql, unique_rows, **kwargs: [(True,)] * len(unique_rows))
+    counts = get_loader(backend).load(_Cursor(), rows)
+    assert counts == {'inserted': 2, 'updated': 0, 'unchanged': 0, 'duplicates': 1}
+
+
+def test_copy_merge_keeps_the_last_row_of_a_repeated_code():
+    rows = [_row('DB-0001', 'first'), _row('DB-0001', 'last')]
+    seqs = [line.rsplit('\t', 1)[1] for line in CopyLoader._to_copy_text(rows).splitlines()]
+    assert seqs == ['0', '1']
+    assert 'ORDER BY brand_product_code, seq DESC' in CopyLoader().merge_sql
+
+
+def test_copy_text_escapes_and_nulls():
+    text = CopyLoader._to_copy_text([('DB-0001', 'tab\there', None), ('DB-0002', 'line\nbreak\\', 1)])
+    assert text == 'DB-0001\ttab\\there\t\\N\t0\nDB-0002\tline\\nbreak\\\\\t1\t1\n'
+
+
+def test_get_loader():
+    loader = get_loader('copy', 'upsert')
+    assert isinstance(loader, CopyLoader)
+    assert 'DO UPDATE' in loader.merge_sql
+    assert isinstance(get_loader('values'), ValuesLoader)
+    with pytest.raises(ValueError):
+        get_loader('values', 'replace')
+    with pytest.raises(ValueError):
+        get_loader('orm')
@@ -0,0 +1,129 @@
+"""Beads stored under an older code spelling are renamed, or merged into the bead already holding the canonical code"""
+
+import re
+from decimal import Decimal
+
+import pytest
+
+from importers import code_normalization as sql
+from importers.code_normalization import normalize_stored_codes
+
+
+class _Database:
+    """Runs the module's statements against in-memory beads and inventories tables"""
+
+    def __init__(self, beads, inventories=()):
+        self.beads = dict(beads)  # id -> brand_product_code
+        self.inventories = [dict(zip(('user_id', 'bead_id', 'quantity', 'quantity_unit'), row))
+                            for row in inventories]
+        self.commits = 0
+        self.rollbacks = 0
+        self._result = []
+        self.rowcount = 0
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def fetchall(self):
+        return self._result
+
+    def fetchone(self):
+        return self._result[0] if self._result else None
+
+    def execute(self, statement, params=None):
+        if statement == sql.SELECT_STALE_SQL:
+            self._result = [(bead_id, code) for bead_id, code in sorted(self.beads.items())
+                            if re.match(r'DB[SML]?-?[0-9]', code)
+                            and not re.fullmatch(r'DB[SML]?-[0-9]{4,}(-[A-Z])?', code)]
+        elif statement == sql.FIND_SQL:
+            self._result = [(bead_id,) for bead_id, code in self.beads.items() if code == params[0]]
+        elif statement == sql.RENAME_SQL:
+            self.beads[params[1]] = params[0]
+        elif statement == sql.ADD_QUANTITIES_SQL:
+            for kept in self._held(params['keep']):
+                for stale in self._held(params['stale']):
+                    if (stale['user_id'], stale['quantity_unit']) == (kept['user_id'], kept['quantity_unit']):
+                        kept['quantity'] += stale['quantity']
+        elif statement == sql.DROP_ADDED_SQL:
+            kept = {(row['user_id'], row['quantity_unit']) for row in self._held(params['keep'])}
+            self.inventories = [row for row in self.inventories if not (
+                row['bead_id'] == params['stale'] and (row['user_id'], row['quantity_unit']) in kept)]
+        elif statement == sql.MOVE_INVENTORIES_SQL:
+            holders = {row['user_id'] for row in self._held(params['keep'])}
+            for row in self._held(params['stale']):
+                if row['user_id'] not in holders:
+                    row['bead_id'] = params['keep']
+        elif statement == sql.DELETE_STALE_SQL:
+            held = bool(self._held(params['stale']))
+            self.rowcount = 0 if held else int(self.beads.pop(params['stale'], None) is not None)
+        else:
+            raise AssertionError(f'unexpected statement {statement}')
+
+    def _held(self, bead_id):
+        return [row for row in self.inventories if row['bead_id'] == bead_id]
+
+
+def test_stale_codes_are_renamed_when_their_canonical_code_is_free():
+    database = _Database({1: 'DB-0001', 2: 'DB-123', 3: 'DBS5', 4: 'DB-0123-C', 5: '11-0001'})
+
+    assert normalize_stored_codes(database) == {'renamed': 2, 'merged': 0, 'conflicts': 0}
+    assert database.beads == {1: 'DB-0001', 2: 'DB-0123', 3: 'DBS-0005', 4: 'DB-0123-C', 5: '11-0001'}
+    assert database.commits == 1
+
+    # Nothing left to do on the next import
+    assert normalize_stored_codes(database) == {'renamed': 0, 'merged': 0, 'conflicts': 0}
+
+
+def test_a_bead_stored_under_both_spellings_is_merged_with_its_inventories():
+    database = _Database(
+        {1: 'DB-0123', 2: 'DB-123', 3: 'DB123'},
+        [
+            (10, 1, Decimal('5'), 'unit'),
+            (10, 2, Decimal('3'), 'unit'),  # Same user and unit: added up
+            (11, 2, Decimal('2'), 'gram'),  # Only held under the old code: moved over
+            (12, 3, Decimal('1'), 'unit'),
+        ],
+    )
+
+    assert normalize_stored_codes(database) == {'renamed': 0, 'merged': 2, 'conflicts': 0}
+    assert database.beads == {1: 'DB-0123'}
+    assert sorted((row['user_id'], row['bead_id'], row['quantity']) for row in database.inventories) == [
+        (10, 1, Decimal('8')), (11, 1, Decimal('2')), (12, 1, Decimal('1'))
+    ]
+
+
+def test_a_bead_held_in_another_unit_is_left_for_a_person_to_merge(caplog):
+    database = _Database({1: 'DB-0123', 2: 'DB-123'},
+                         [(10, 1, Decimal('5'), 'unit'), (10, 2, Decimal('3'), 'gram')])
+
+    assert normalize_stored_codes(database) == {'renamed': 0, 'merged': 0, 'conflicts': 1}
+    assert database.beads == {1: 'DB-0123', 2: 'DB-123'}
+    assert len(database.inventories) == 2
+    assert 'DB-123 is still held in a different unit' in caplog.text
+
+
+def test_a_failure_rolls_the_transaction_back():
+    database = _Database({1: 'DB-1', 2: 'DB-2'})
+    execute = database.execute
+
+    def failing_execute(statement, params=None):
+        if statement == sql.RENAME_SQL and params[1] == 2:
+            raise RuntimeError('lock timeout')
+        execute(statement, params)
+
+    database.execute = failing_execute
+    with pytest.raises(RuntimeError):
+        normalize_stored_codes(database)
+    assert (database.commits, database.rollbacks) == (0, 1)
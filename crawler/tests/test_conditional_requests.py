@@ -0,0 +1,113 @@
+"""Revalidated pages send their validators, replay the stored record on 304 and bypass the HTTP cache"""
+
+import pytest
+from scrapy import Request, Spider
+from scrapy.downloadermiddlewares.httpcache import HttpCacheMiddleware
+from scrapy.http import HtmlResponse, Response
+from scrapy.utils.test import get_crawler
+
+from middlewares.conditional_requests import ConditionalRequestMiddleware
+
+URL = 'https://example.com/product/db-0001/'
+ETAG = '"abc"'
+LAST_MODIFIED = 'Tue, 01 Sep 2026 00:00:00 GMT'
+
+
+@pytest.fixture
+def crawler(tmp_path):
+    crawler = get_crawler(Spider, {
+        'CONDITIONAL_REQUESTS_ENABLED': True,
+        'CONDITIONAL_REQUESTS_STORE': str(tmp_path / 'validators.sqlite3'),
+        'HTTPCACHE_ENABLED': True,
+        'HTTPCACHE_DIR': str(tmp_path / 'httpcache'),
+        'HTTPCACHE_EXPIRATION_SECS': 0,
+        'HTTPCACHE_IGNORE_HTTP_CODES': [304],
+        'HTTPCACHE_STORAGE': 'extensions.httpcache.SqliteCacheStorage',
+        'HTTPCACHE_POLICY': 'extensions.httpcache.HeuristicRFC2616Policy',
+    })
+    crawler.spider = Spider.from_crawler(crawler, name='beads')
+    return crawler
+
+
+@pytest.fixture
+def middleware(crawler):
+    middleware = ConditionalRequestMiddleware(crawler)
+    middleware.spider_opened(crawler.spider)
+    yield middleware
+    middleware.spider_closed(crawler.spider)
+
+
+def _page(request):
+    return HtmlResponse(URL, status=200, body=b'<html>DB-0001</html>', request=request,
+                        headers={'ETag': ETAG, 'Last-Modified': LAST_MODIFIED})
+
+
+def _crawl_once(middleware, crawler):
+    """A first run: the page is fetched in full and its record scraped"""
+    request = Request(URL, meta={'revalidate': True})
+    middleware.process_request(request)
+    response = middleware.process_response(request, _page(request))
+    middleware.item_scraped({'product_code': 'DB-0001', 'finish': 'Opaque'}, response, crawler.spider)
+
+
+def test_the_validators_and_record_are_stored_on_200(middleware, crawler):
+    _crawl_once(middleware, crawler)
+
+    assert middleware.store.get_validators(URL) == (ETAG, LAST_MODIFIED)
+    assert middleware.store.get_record(URL) == {'product_code': 'DB-0001', 'finish': 'Opaque'}
+    assert crawler.stats.get_value('conditional/validators_stored') == 1
+
+
+def test_stored_validators_are_sent_and_the_cache_is_bypassed(middleware, crawler):
+    _crawl_once(middleware, crawler)
+    request = Request(URL, meta={'revalidate': True})
+    middleware.process_request(request)
+
+    assert request.headers['If-None-Match'] == ETAG.encode()
+    assert request.headers['If-Modified-Since'] == LAST_MODIFIED.encode()
+    assert request.meta['dont_cache']
+    assert crawler.stats.get_value('conditional/revalidated') == 1
+
+
+def test_a_304_replays_the_stored_record(middleware, crawler):
+    _crawl_once(middleware, crawler)
+    request = Request(URL, meta={'revalidate': True})
+    middleware.process_request(request)
+
+    response = middleware.process_response(request, Response(URL, status=304, request=request))
+
+    assert response.status == 304
+    assert request.meta['revalidated_item'] == {'product_code': 'DB-0001', 'finish': 'Opaque'}
+    assert crawler.stats.get_value('conditional/not_modified') == 1
+
+
+def test_a_304_without_a_record_refetches_the_page_unconditionally(middleware, crawler):
+    middleware.store.save_validators(URL, ETAG, None)
+    request = Request(URL, meta={'revalidate': True}, headers={'If-None-Match': ETAG})
+    middleware.process_request(request)
+
+    retry = middleware.process_response(request, Response(URL, status=304, request=request))
+
+    assert isinstance(retry, Request)
+    assert retry.dont_filter
+    assert not retry.meta['revalidate']
+    assert b'If-None-Match' not in retry.headers
+
+
+def test_the_http_cache_passes_the_304_through(middleware, crawler):
+    cache = HttpCacheMiddleware.from_crawler(crawler)
+    cache.spider_opened(crawler.spider)
+    # A copy of the page cached by an earlier run, which the cache would serve or revalidate itself
+    cache.storage.store_response(crawler.spider, Request(URL), _page(Request(URL)))
+    _crawl_once(middleware, crawler)
+
+    # Downloader middlewares see requests in priority order (580, then 900) and responses the other way
+    request = Request(URL, meta={'revalidate': True})
+    middleware.process_request(request)
+    assert cache.process_request(request) is None
+    response = cache.process_response(request, Response(URL, status=304, request=request))
+    response = middleware.process_response(request, response)
+    cache.spider_closed(crawler.spider)
+
+    assert response.status == 304
+    assert request.meta['revalidated_item']['product_code'] == 'DB-0001'
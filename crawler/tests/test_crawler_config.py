@@ -0,0 +1,38 @@
+"""Every database client reads one configuration, falling back to the Rails app's variables"""
+
+import importlib
+
+import pytest
+
+from config import crawler_config
+
+ENV_NAMES = ('DB_HOST', 'DB_PORT', 'DB_USER', 'DB_PASSWORD', 'DB_NAME',
+             'DATABASE_HOST', 'DATABASE_PORT', 'DATABASE_USERNAME', 'DATABASE_PASSWORD')
+
+
+@pytest.fixture
+def reload_config(monkeypatch):
+    for name in ENV_NAMES:
+        monkeypatch.delenv(name, raising=False)
+
+    def reload(**env):
+        for name, value in env.items():
+            monkeypatch.setenv(name, value)
+        return importlib.reload(crawler_config).get_connection_kwargs()
+
+    yield reload
+    monkeypatch.undo()
+    importlib.reload(crawler_config)
+
+
+def test_rails_database_variables_are_used_when_db_ones_are_unset(reload_config):
+    kwargs = reload_config(DATABASE_HOST='db.internal', DATABASE_PORT='6543',
+                           DATABASE_USERNAME='rails', DATABASE_PASSWORD='secret')
+    assert kwargs == {'host': 'db.internal', 'port': 6543, 'dbname': 'pattern_maker_development',
+                      'user': 'rails', 'password': 'secret'}
+
+
+def test_db_variables_win(reload_config):
+    kwargs = reload_config(DB_HOST='crawler-db', DATABASE_HOST='db.internal', DB_USER='crawler',
+                           DATABASE_USERNAME='rails')
+    assert (kwargs['host'], kwargs['user']) == ('crawler-db', 'crawler')
@@ -0,0 +1,112 @@
+"""Delta feeds list each added, changed or removed product code once"""
+
+import json
+
+from feeds.delta import FeedHashIndex, delta_feed_path, record_hash, write_delta
+from feeds.writer import FeedWriter
+from storage.atomic_file import atomic_write
+
+
+def _snapshot(tmp_path, records):
+    with FeedWriter(tmp_path / 'beads.ndjson') as writer:
+        for record in records:
+            writer.write(record)
+    return writer.path
+
+
+def _delta(tmp_path, records, previous, full_snapshot=True):
+    writer = FeedWriter(delta_feed_path(tmp_path / 'beads.ndjson'))
+    result = write_delta(_snapshot(tmp_path, records), previous, writer, full_snapshot)
+    lines = [json.loads(line) for line in writer.path.read_text().splitlines()]
+    return result, lines
+
+
+def test_record_hash_ignores_key_order():
+    assert record_hash({'a': 1, 'b': 2}) == record_hash({'b': 2, 'a': 1})
+    assert record_hash({'a': 1}) != record_hash({'a': 2})
+
+
+def test_delta_feed_path_keeps_compression_suffixes(tmp_path):
+    assert delta_feed_path(tmp_path / 'beads.ndjson.gz') == tmp_path / 'beads.delta.ndjson.gz'
+
+
+def test_changes_against_previous_hashes(tmp_path):
+    kept = {'product_code': 'DB0001', 'name': 'Black'}
+    previous = {
+        'DB0001': record_hash(kept),
+        'DB0002': record_hash({'product_code': 'DB0002', 'name': 'White'}),
+        'DB0003': record_hash({'product_code': 'DB0003'}),
+    }
+    changed = {'product_code': 'DB0002', 'name': 'Opaque White'}
+    added = {'product_code': 'DB0004'}
+
+    result, lines = _delta(tmp_path, [kept, changed, added], previous)
+
+    assert lines == [
+        {'change': 'changed', 'product_code': 'DB0002', 'bead': changed},
+        {'change': 'added', 'product_code': 'DB0004', 'bead': added},
+        {'change': 'removed', 'product_code': 'DB0003'},
+    ]
+    assert {key: result[key] for key in ('added', 'changed', 'removed', 'unchanged', 'duplicates')} == {
+        'added': 1, 'changed': 1, 'removed': 1, 'unchanged': 1, 'duplicates': 0
+    }
+    assert result['hashes'].keys() == {'DB0001', 'DB0002', 'DB0004'}
+
+
+def test_repeated_product_code_is_written_once_with_its_last_record(tmp_path):
+    previous = {'DB0001': record_hash({'product_code': 'DB0001', 'name': 'Old'})}
+    first = {'product_code': 'DB0001', 'name': 'First'}
+    last = {'product_code': 'DB0001', 'name': 'Last'}
+
+    result, lines = _delta(tmp_path, [first, {'product_code': 'DB0002'}, last], previous)
+
+    assert lines == [
+        {'change': 'added', 'product_code': 'DB0002', 'bead': {'product_code': 'DB0002'}},
+        {'change': 'changed', 'product_code': 'DB0001', 'bead': last},
+    ]
+    assert result['changed'] == 1
+    assert result['duplicates'] == 1
+    assert result['hashes']['DB0001'] == record_hash(last)
+
+
+def test_repeat_of_an_unchanged_record_is_not_a_change(tmp_path):
+    record = {'product_code': 'DB0001', 'name': 'Black'}
+    result, lines = _delta(tmp_path, [{'product_code': 'DB0001', 'name': 'Stale'}, record],
+                           {'DB0001': record_hash(record)})
+
+    assert lines == []
+    assert result['unchanged'] == 1
+
+
+def test_partial_snapshot_reports_no_removals_and_merges_the_index(tmp_path):
+    previous = {'DB0001': 'old', 'DB0002': 'old'}
+    record = {'product_code': 'DB0002', 'name': 'New'}
+
+    result, lines = _delta(tmp_path, [record], previous, full_snapshot=False)
+
+    assert lines == [{'change': 'changed', 'product_code': 'DB0002', 'bead': record}]
+    assert result['removed'] == 0
+    assert result['hashes'] == {'DB0001': 'old', 'DB0002': record_hash(record)}
+
+
+def test_hash_index_round_trip(tmp_path):
+    index = FeedHashIndex(tmp_path / 'hashes' / 'miyuki.json')
+    assert index.load() == {}
+
+    index.save({'DB0001': 'abc'})
+    assert index.load() == {'DB0001': 'abc'}
+    assert list(index.path.parent.iterdir()) == [index.path]
+
+
+def test_atomic_write_keeps_the_old_file_when_writing_fails(tmp_path):
+    path = tmp_path / 'state.json'
+    path.write_text('old')
+    try:
+        with atomic_write(path) as f:
+            f.write('partial')
+            raise RuntimeError('disk full')
+    except RuntimeError:
+        pass
+
+    assert path.read_text() == 'old'
+    assert list(tmp_path.iterdir()) == [path]
@@ -0,0 +1,127 @@
+"""Delta feeds honour source precedence: only the primary source overwrites columns and discontinues beads"""
+
+import json
+
+import pytest
+
+from importers.bead_loader import DISCONTINUE_SQL
+from importers.delta_import import apply_delta_feed, apply_site_deltas, delta_feed_source, is_primary_source
+
+
+class _Cursor:
+    def __init__(self, statements):
+        self.statements = statements
+        self.rowcount = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, sql, params=None):
+        self.statements.append((sql, params))
+        self.rowcount = len(params[1])
+
+
+class _Connection:
+    def __init__(self):
+        self.statements = []
+        self.commits = 0
+
+    def cursor(self):
+        return _Cursor(self.statements)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        pass
+
+
+@pytest.fixture
+def upserts(monkeypatch):
+    """(sql, rows) of every execute_values call, each row reported as updated"""
+    calls = []
+
+    def execute_values(cursor, sql, rows, **kwargs):
+        calls.append((sql, rows))
+        return [(False,)] * len(rows)
+
+    monkeypatch.setattr('importers.bead_loader.execute_values', execute_values)
+    return calls
+
+
+def _write_delta(path, host):
+    changes = [
+        {'change': 'changed', 'product_code': 'DB-0001',
+         'bead': {'product_code': 'DB-0001', 'name': 'Opaque Black', 'source_url': f'https://www.{host}/p/1'}},
+        {'change': 'removed', 'product_code': 'DB-0002'},
+    ]
+    path.write_text(''.join(json.dumps(change) + '\n' for change in changes), encoding='utf-8')
+    return path
+
+
+def test_a_primary_delta_overwrites_columns_and_discontinues_removed_beads(tmp_path, upserts):
+    delta = _write_delta(tmp_path / 'miyuki.delta.ndjson', 'miyuki-beads.co.jp')
+    connection = _Connection()
+
+    counts = apply_delta_feed(connection, delta, backend='values', primary=True)
+
+    [(sql, rows)] = upserts
+    assert 'name = EXCLUDED.name' in sql
+    assert [row[0] for row in rows] == ['DB-0001']
+    assert connection.statements == [(DISCONTINUE_SQL, (1, ['DB-0002']))]
+    assert counts['updated'] == 1
+    assert counts['discontinued'] == 1
+    assert counts['ignored_removals'] == 0
+    assert connection.commits == 1
+
+
+def test_a_secondary_delta_keeps_stored_columns_and_discontinues_nothing(tmp_path, upserts):
+    delta = _write_delta(tmp_path / 'fmg.delta.ndjson', 'firemountaingems.com')
+    connection = _Connection()
+
+    counts = apply_delta_feed(connection, delta, backend='values', primary=False)
+
+    [(sql, rows)] = upserts
+    assert 'name = COALESCE(EXCLUDED.name, b.name)' in sql
+    assert 'name = EXCLUDED.name' not in sql
+    assert connection.statements == []
+    assert counts['discontinued'] == 0
+    assert counts['ignored_removals'] == 1
+
+
+def test_delta_feed_source_falls_back_to_the_snapshot_for_removal_only_deltas(tmp_path):
+    delta = _write_delta(tmp_path / 'fmg.delta.ndjson', 'firemountaingems.com')
+    assert delta_feed_source(delta) == 'firemountaingems.com'
+
+    removals = tmp_path / 'miyuki.delta.ndjson'
+    removals.write_text(json.dumps({'change': 'removed', 'product_code': 'DB-0002'}) + '\n', encoding='utf-8')
+    assert delta_feed_source(removals) is None
+    (tmp_path / 'miyuki.ndjson').write_text(
+        json.dumps({'product_code': 'DB-0001', 'source_url': 'https://miyuki-beads.co.jp/p/1'}) + '\n', encoding='utf-8'
+    )
+    assert delta_feed_source(removals) == 'miyuki-beads.co.jp'
+
+
+def test_only_the_first_source_in_the_precedence_is_primary():
+    precedence = ['miyuki-beads.co.jp', 'firemountaingems.com']
+    assert is_primary_source('miyuki-beads.co.jp', precedence)
+    assert not is_primary_source('firemountaingems.com', precedence)
+    assert not is_primary_source(None, precedence)
+
+
+def test_site_deltas_apply_oldest_first_with_the_primary_source_last(tmp_path, upserts):
+    miyuki = [_write_delta(tmp_path / f'miyuki-{n}.ndjson', 'miyuki-beads.co.jp') for n in (1, 2)]
+    fmg = [_write_delta(tmp_path / 'fmg-1.ndjson', 'firemountaingems.com')]
+    connection = _Connection()
+
+    results = apply_site_deltas(connection, [('miyuki-beads.co.jp', miyuki), ('firemountaingems.com', fmg)],
+                                ['miyuki-beads.co.jp', 'firemountaingems.com'], backend='values')
+
+    assert list(results) == [str(fmg[0]), str(miyuki[0]), str(miyuki[1])]
+    assert 'COALESCE(EXCLUDED.name, b.name)' in upserts[0][0]
+    assert 'name = EXCLUDED.name' in upserts[1][0]
+    assert results[str(fmg[0])]['ignored_removals'] == 1
+    assert results[str(miyuki[1])]['discontinued'] == 1
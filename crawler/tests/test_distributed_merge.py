@@ -0,0 +1,43 @@
+"""Worker feeds merge into one feed with each product code once"""
+
+import json
+
+from distributed.merge import merge_feeds, worker_feed_paths
+from feeds.writer import FeedWriter
+from importers.feed_reader import iter_feed
+
+
+def _write_feed(path, records):
+    path.write_text(''.join(json.dumps(record) + '\n' for record in records), encoding='utf-8')
+    return path
+
+
+def test_merge_keeps_the_first_copy_of_a_code_both_workers_crawled(tmp_path):
+    _write_feed(tmp_path / 'beads.worker-1.ndjson', [
+        {'product_code': 'DB-0001', 'name': 'first worker'},
+        {'product_code': 'DB-0002'},
+    ])
+    # A lease expired while worker 1 was still on DB-0001, so worker 2 crawled it too
+    _write_feed(tmp_path / 'beads.worker-2.ndjson', [
+        {'product_code': 'DB-0003'},
+        {'product_code': 'DB-0001', 'name': 'second worker'},
+        {'name': 'no code'},
+    ])
+    # Feeds still being written, and their markers, are not merged
+    (tmp_path / 'beads.worker-3.ndjson.part').write_text('{"product_code": "DB-0004"}\n')
+    (tmp_path / 'beads.worker-1.ndjson.done').write_text('{}')
+
+    paths = worker_feed_paths(tmp_path, 'beads')
+    assert [path.name for path in paths] == ['beads.worker-1.ndjson', 'beads.worker-2.ndjson']
+
+    writer = FeedWriter(tmp_path / 'merged' / 'beads.ndjson')
+    counts = merge_feeds(paths, writer)
+
+    assert counts == {'feeds': 2, 'records': 4, 'duplicates': 1}
+    assert list(iter_feed(writer.path)) == [
+        {'product_code': 'DB-0001', 'name': 'first worker'},
+        {'product_code': 'DB-0002'},
+        {'product_code': 'DB-0003'},
+        {'name': 'no code'},
+    ]
+    assert writer.done_path.exists()
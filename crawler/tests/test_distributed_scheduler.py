@@ -0,0 +1,197 @@
+"""Claims of failed requests must not pin a worker's in-flight cap, and idle workers wait for busy ones"""
+
+import asyncio
+
+import pytest
+from scrapy import Request, Spider
+from scrapy.exceptions import DontCloseSpider
+from scrapy.http import HtmlResponse
+from scrapy.spidermiddlewares.httperror import HttpError
+from scrapy.utils.test import get_crawler
+from twisted.python.failure import Failure
+
+from distributed.queue import ABANDONED, CLAIMED, DONE, PENDING
+from distributed.scheduler import (
+    DistributedCompletionMiddleware, DistributedFailureMiddleware, DistributedScheduler
+)
+
+
+class QueueSpider(Spider):
+    name = 'queue_test'
+
+    def failed(self, failure):
+        yield {'failed': failure.request.url}
+
+    def failed_list(self, failure):
+        return [{'failed': failure.request.url}]
+
+    async def failed_async(self, failure):
+        return [{'failed': failure.request.url}]
+
+    def failed_raises(self, failure):
+        raise ValueError('errback broke')
+
+    def failed_passes_on(self, failure):
+        return failure
+
+
+def _worker(tmp_path, worker_id):
+    crawler = get_crawler(QueueSpider, {
+        'DISTRIBUTED_QUEUE_URL': f"sqlite:///{tmp_path}/queue.sqlite3",
+        'DISTRIBUTED_WORKER_ID': worker_id,
+        'DISTRIBUTED_MAX_IN_FLIGHT': 1,
+        'DISTRIBUTED_CLAIM_BATCH': 1,
+    })
+    spider = QueueSpider()
+    scheduler = DistributedScheduler.from_crawler(crawler)
+    scheduler.open(spider)
+    return crawler, spider, scheduler
+
+
+@pytest.fixture
+def crawl(tmp_path):
+    crawler, spider, scheduler = _worker(tmp_path, 'worker-1')
+    yield crawler, spider, scheduler
+    scheduler.close('finished')
+
+
+@pytest.fixture
+def other_worker(tmp_path, crawl):
+    crawler, spider, scheduler = _worker(tmp_path, 'worker-2')
+    yield crawler, spider, scheduler
+    scheduler.close('finished')
+
+
+def _response(request: Request, status: int = 200) -> HtmlResponse:
+    return HtmlResponse(request.url, status=status, body=b'<html></html>', request=request)
+
+
+def test_in_flight_cap_reports_no_pending_work(crawl):
+    crawler, spider, scheduler = crawl
+    for page in range(3):
+        scheduler.enqueue_request(Request(f"https://example.com/{page}"))
+
+    assert scheduler.next_request().url == 'https://example.com/0'
+    # The queue still holds work, but nothing can be claimed until the claim finishes
+    assert scheduler.next_request() is None
+    assert not scheduler.has_pending_requests()
+
+
+def test_failed_download_gives_up_its_claim(crawl):
+    crawler, spider, scheduler = crawl
+    scheduler.enqueue_request(Request('https://example.com/refused'))
+    scheduler.enqueue_request(Request('https://example.com/next'))
+
+    request = scheduler.next_request()
+    DistributedFailureMiddleware(crawler).process_exception(request, ConnectionRefusedError())
+
+    assert scheduler.has_pending_requests()
+    assert scheduler.next_request().url == 'https://example.com/next'
+    assert scheduler.queue.counts() == {PENDING: 0, CLAIMED: 1, DONE: 0, ABANDONED: 1}
+
+
+def test_error_response_and_raising_callback_complete_their_claims(crawl):
+    crawler, spider, scheduler = crawl
+    scheduler.enqueue_request(Request('https://example.com/missing'))
+    scheduler.enqueue_request(Request('https://example.com/raises'))
+    middleware = DistributedCompletionMiddleware(crawler)
+
+    missing = _response(scheduler.next_request(), status=404)
+    middleware.process_spider_exception(missing, HttpError(missing, 'Ignoring non-200 response'))
+    # HttpErrorMiddleware's empty output then passes through process_spider_output as well
+    assert list(middleware.process_spider_output(missing, [])) == []
+
+    def raising_callback():
+        yield {'partial': True}
+        raise ValueError('boom')
+
+    with pytest.raises(ValueError):
+        list(middleware.process_spider_output(_response(scheduler.next_request()), raising_callback()))
+
+    assert scheduler.queue.counts() == {PENDING: 0, CLAIMED: 0, DONE: 2, ABANDONED: 0}
+    assert crawler.stats.get_value('distributed/completed') == 2
+
+
+def test_errback_output_is_passed_through_before_the_claim_is_given_up(crawl):
+    crawler, spider, scheduler = crawl
+    scheduler.enqueue_request(Request('https://example.com/refused', errback=spider.failed))
+    request = scheduler.next_request()
+
+    failure = type('FakeFailure', (), {'request': request})()
+    DistributedFailureMiddleware(crawler).process_exception(request, ConnectionRefusedError())
+    assert scheduler.queue.counts()[CLAIMED] == 1  # Left for the errback
+
+    async def consume(output):
+        return [result async for result in output]
+
+    assert asyncio.run(consume(request.errback(failure))) == [{'failed': 'https://example.com/refused'}]
+    assert scheduler.queue.counts() == {PENDING: 0, CLAIMED: 0, DONE: 0, ABANDONED: 1}
+
+
+async def _consume(output):
+    return [result async for result in output]
+
+
+def _failure(request):
+    failure = Failure(ConnectionRefusedError())
+    failure.request = request
+    return failure
+
+
+@pytest.mark.parametrize('errback', ['failed_list', 'failed_async'])
+def test_errback_returning_a_list_or_coroutine_gives_up_the_claim_after_its_output(crawl, errback):
+    crawler, spider, scheduler = crawl
+    scheduler.enqueue_request(Request('https://example.com/refused', errback=getattr(spider, errback)))
+    request = scheduler.next_request()
+
+    output = request.errback(_failure(request))
+    assert scheduler.queue.counts()[CLAIMED] == 1
+    assert asyncio.run(_consume(output)) == [{'failed': 'https://example.com/refused'}]
+    assert scheduler.queue.counts() == {PENDING: 0, CLAIMED: 0, DONE: 0, ABANDONED: 1}
+    assert crawler.stats.get_value('distributed/failed') == 1
+
+
+def test_errback_that_raises_or_passes_the_failure_on_gives_up_the_claim(crawl):
+    crawler, spider, scheduler = crawl
+    scheduler.enqueue_request(Request('https://example.com/raises', errback=spider.failed_raises))
+    scheduler.enqueue_request(Request('https://example.com/passes-on', errback=spider.failed_passes_on))
+
+    raising = scheduler.next_request()
+    with pytest.raises(ValueError):
+        raising.errback(_failure(raising))
+    # The in-flight slot was freed, so the next claim goes ahead
+    passing_on = scheduler.next_request()
+    failure = _failure(passing_on)
+    assert passing_on.errback(failure) is failure
+
+    assert scheduler.queue.counts() == {PENDING: 0, CLAIMED: 0, DONE: 0, ABANDONED: 2}
+
+
+def test_idle_worker_releases_claims_that_never_finished_and_waits_for_other_workers(crawl, other_worker):
+    crawler, spider, scheduler = crawl
+    other_crawler, other_spider, other_scheduler = other_worker
+    scheduler.enqueue_request(Request('https://example.com/lost'))
+    scheduler.enqueue_request(Request('https://example.com/busy'))
+
+    assert scheduler.next_request().url == 'https://example.com/lost'
+    busy = other_scheduler.next_request()
+    # The engine went idle without this worker hearing back about its claim
+    with pytest.raises(DontCloseSpider):
+        scheduler.spider_idle(spider)
+    assert crawler.stats.get_value('distributed/abandoned') == 1
+    assert scheduler.queue.counts() == {PENDING: 0, CLAIMED: 1, DONE: 0, ABANDONED: 1}
+    # The released claim no longer counts against the in-flight cap
+    assert not scheduler._in_flight
+
+    # The other worker's callback queues more work, which the idle worker picks up
+    DistributedCompletionMiddleware(other_crawler).process_spider_exception(_response(busy), ValueError('boom'))
+    other_scheduler.enqueue_request(Request('https://example.com/found-later'))
+    with pytest.raises(DontCloseSpider):
+        scheduler.spider_idle(spider)
+    found = scheduler.next_request()
+    assert found.url == 'https://example.com/found-later'
+    scheduler.request_done(found)
+
+    # Nothing pending and nothing claimed anywhere: the worker may close
+    scheduler.spider_idle(spider)
+    assert scheduler.queue.counts() == {PENDING: 0, CLAIMED: 0, DONE: 2, ABANDONED: 1}
@@ -0,0 +1,105 @@
+"""The feed is only finished by a crawl that finished, every other close keeps it for the next run, and a quiet crawl still flushes"""
+
+import asyncio
+
+import pytest
+from scrapy import Spider
+from scrapy.utils.test import get_crawler
+from twisted.internet import defer, task
+
+from pipelines.feed_export import FeedExportPipeline
+
+
+class FeedSpider(Spider):
+    name = 'feed_test'
+
+
+def _crawl(tmp_path, items):
+    crawler = get_crawler(FeedSpider, {
+        'JOBDIR': str(tmp_path / 'job'),
+        'BEAD_FEED_FLUSH_ITEMS': 1,
+        'BEAD_FEED_S3_UPLOAD_ENABLED': False,
+    })
+    spider = FeedSpider(output_file=str(tmp_path / 'beads.ndjson'))
+    pipeline = FeedExportPipeline(crawler)
+    asyncio.run(pipeline.open_spider(spider))
+    for item in items:
+        asyncio.run(pipeline.process_item(item, spider))
+    return crawler, spider, pipeline
+
+
+@pytest.mark.parametrize('reason', ['shutdown', 'memusage_exceeded', 'closespider_timeout', 'cancelled'])
+def test_unfinished_crawl_keeps_its_feed_to_resume(tmp_path, reason):
+    crawler, spider, pipeline = _crawl(tmp_path, [{'product_code': 'DB0001'}, {'product_code': 'DB0002'}])
+    asyncio.run(pipeline.spider_closed(spider, reason))
+
+    assert not (tmp_path / 'beads.ndjson').exists()
+    assert (tmp_path / 'beads.ndjson.part').exists()
+    assert pipeline.checkpoint.load()['product_codes'] == ['DB0001', 'DB0002']
+
+    # The next run appends to the feed instead of starting a new one
+    crawler, spider, pipeline = _crawl(tmp_path, [{'product_code': 'DB0003'}])
+    assert spider.resumed_product_codes == {'DB0001', 'DB0002'}
+    asyncio.run(pipeline.spider_closed(spider, 'finished'))
+
+    lines = (tmp_path / 'beads.ndjson').read_text().splitlines()
+    assert lines == [
+        '{"product_code":"DB0001"}', '{"product_code":"DB0002"}', '{"product_code":"DB0003"}'
+    ]
+    assert pipeline.checkpoint.load() is None
+
+
+class _BackloggedUploader:
+    def __init__(self):
+        self.backlog = True
+
+    def backlogged(self):
+        return self.backlog
+
+
+def test_items_are_held_without_blocking_while_s3_is_backlogged(tmp_path):
+    crawler, spider, pipeline = _crawl(tmp_path, [])
+    pipeline.uploader = _BackloggedUploader()
+
+    held = defer.ensureDeferred(pipeline.process_item({'product_code': 'DB0001'}, spider))
+    # process_item returned to the reactor with the item held, rather than waiting on S3
+    assert not held.called
+    assert crawler.stats.get_value('s3/backpressure_waits') == 1
+
+    # A part finishing while others are still queued keeps the item held
+    pipeline._part_uploaded()
+    assert not held.called
+
+    pipeline.uploader.backlog = False
+    pipeline._part_uploaded()
+    assert held.result == {'product_code': 'DB0001'}
+
+
+def test_buffered_items_are_flushed_on_a_timer_while_no_item_arrives(tmp_path, monkeypatch):
+    clock = task.Clock()
+
+    class LoopingCall(task.LoopingCall):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.clock = clock
+
+    monkeypatch.setattr('pipelines.feed_export.task.LoopingCall', LoopingCall)
+    monkeypatch.setattr('feeds.writer.time.monotonic', lambda: clock.seconds())
+    crawler = get_crawler(FeedSpider, {
+        'BEAD_FEED_FLUSH_ITEMS': 100,
+        'BEAD_FEED_FLUSH_SECONDS': 5.0,
+        'BEAD_FEED_S3_UPLOAD_ENABLED': False,
+    })
+    spider = FeedSpider(output_file=str(tmp_path / 'beads.ndjson'))
+    pipeline = FeedExportPipeline(crawler)
+    asyncio.run(pipeline.open_spider(spider))
+    asyncio.run(pipeline.process_item({'product_code': 'DB0001'}, spider))
+    part_path = tmp_path / 'beads.ndjson.part'
+    assert part_path.read_bytes() == b''
+
+    clock.advance(5)
+    assert part_path.read_text() == '{"product_code":"DB0001"}\n'
+
+    asyncio.run(pipeline.spider_closed(spider, 'finished'))
+    assert not pipeline._flush_task.running
+    assert not clock.getDelayedCalls()
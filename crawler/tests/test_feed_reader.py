@@ -0,0 +1,175 @@
+"""Feeds are read record by record whatever their format, compression or state"""
+
+import gzip
+import json
+import logging
+
+import pytest
+
+from importers.feed_reader import batched, iter_feed, iter_ndjson_range, ndjson_ranges, tail_feed
+
+RECORDS = [{'product_code': f"DB-{number:04d}", 'name': f"Delica {number}"} for number in range(1, 8)]
+
+
+def _ndjson(records) -> bytes:
+    return b''.join(json.dumps(record).encode() + b'\n' for record in records)
+
+
+def _write(tmp_path, name, data: bytes):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return path
+
+
+@pytest.mark.parametrize('chunk_size', [7, 64 * 1024])
+def test_json_array(tmp_path, chunk_size):
+    path = _write(tmp_path, 'beads.json', json.dumps(RECORDS, indent=2).encode())
+    assert list(iter_feed(path, chunk_size=chunk_size)) == RECORDS
+
+
+def test_truncated_json_array_yields_every_complete_record(tmp_path, caplog):
+    text = json.dumps(RECORDS)
+    path = _write(tmp_path, 'beads.json', text[:text.index('DB-0004') - 20].encode())
+
+    with caplog.at_level(logging.WARNING):
+        assert list(iter_feed(path, chunk_size=16)) == RECORDS[:3]
+    assert 'truncated' in caplog.text
+
+
+def test_wrapped_document_yields_its_beads(tmp_path):
+    path = _write(tmp_path, 'beads.json', json.dumps({'metadata': {}, 'beads': RECORDS}, indent=2).encode())
+    assert list(iter_feed(path)) == RECORDS
+
+
+def test_ndjson_with_torn_last_line(tmp_path):
+    path = _write(tmp_path, 'beads.ndjson.part', _ndjson(RECORDS) + b'{"product_code": "DB-00')
+    assert list(iter_feed(path, chunk_size=10)) == RECORDS
+
+
+def test_gzip_feed_of_several_members(tmp_path):
+    # FeedWriter writes one gzip member per flush
+    data = b''.join(gzip.compress(_ndjson(RECORDS[start:start + 3])) for start in range(0, len(RECORDS), 3))
+    path = _write(tmp_path, 'beads.ndjson.gz', data)
+    assert list(iter_feed(path, chunk_size=16)) == RECORDS
+
+
+def test_gzip_feed_with_a_cut_off_member(tmp_path, caplog):
+    complete = gzip.compress(_ndjson(RECORDS[:3]))
+    torn = gzip.compress(_ndjson(RECORDS[3:]))[:-10]
+    path = _write(tmp_path, 'beads.ndjson.gz.part', complete + torn)
+
+    with caplog.at_level(logging.WARNING):
+        records = list(iter_feed(path))
+    assert records[:3] == RECORDS[:3]
+    assert 'truncated' in caplog.text
+
+
+def test_missing_feed():
+    with pytest.raises(FileNotFoundError):
+        list(iter_feed('does/not/exist.ndjson'))
+
+
+@pytest.mark.parametrize('range_bytes', [1, 10, 45, 10_000])
+def test_byte_ranges_cover_every_line_once(tmp_path, range_bytes):
+    path = _write(tmp_path, 'beads.ndjson', _ndjson(RECORDS))
+    ranges = ndjson_ranges(path, range_bytes)
+
+    records = [record for start, end in ranges for record in iter_ndjson_range(path, start, end)]
+    assert records == RECORDS
+
+
+def test_byte_range_skips_malformed_lines(tmp_path):
+    path = _write(tmp_path, 'beads.ndjson', _ndjson(RECORDS[:1]) + b'not json\n' + _ndjson(RECORDS[1:2]))
+    assert list(iter_ndjson_range(path, 0, path.stat().st_size)) == RECORDS[:2]
+
+
+@pytest.mark.parametrize('name, data', [
+    ('beads.ndjson.gz', gzip.compress(_ndjson(RECORDS))),
+    ('beads.json', json.dumps(RECORDS).encode()),
+    ('beads.json', json.dumps({'beads': RECORDS}, indent=2).encode()),
+])
+def test_only_plain_ndjson_is_split(tmp_path, name, data):
+    assert ndjson_ranges(_write(tmp_path, name, data), 10) is None
+
+
+def test_batched():
+    assert [len(batch) for batch in batched(RECORDS, 3)] == [3, 3, 1]
+    with pytest.raises(ValueError):
+        list(batched(RECORDS, 0))
+
+
+class _Writer:
+    """Plays a spider's FeedWriter, one step each time the tailing reader sleeps"""
+
+    def __init__(self, path, steps):
+        self.path = path
+        self.part_path = path.with_name(path.name + '.part')
+        self.steps = list(steps)
+        self.sleeps = 0
+
+    def sleep(self, seconds):
+        self.sleeps += 1
+        if self.steps:
+            self.steps.pop(0)(self)
+
+    def append(self, data: bytes):
+        with open(self.part_path, 'ab') as f:
+            f.write(data)
+
+    def finish(self):
+        self.part_path.rename(self.path)
+        self.path.with_name(self.path.name + '.done').touch()
+
+
+@pytest.fixture
+def tail(tmp_path, monkeypatch):
+    def start(steps, **options):
+        writer = _Writer(tmp_path / 'beads.ndjson', steps)
+        monkeypatch.setattr('importers.feed_reader.time.sleep', writer.sleep)
+        return writer, tail_feed(writer.path, poll_interval=0.01, **options)
+    return start
+
+
+def test_tail_waits_for_the_part_file_and_follows_appends_until_done(tail):
+    half = _ndjson(RECORDS[2:3])[:10]
+    writer, records = tail([
+        lambda w: None,  # The spider has not opened its feed yet
+        lambda w: w.append(_ndjson(RECORDS[:2])),
+        lambda w: w.append(half),  # A line cut off mid-write is held back, not parsed
+        lambda w: w.append(_ndjson(RECORDS[2:3])[10:] + _ndjson(RECORDS[3:4])),
+        lambda w: w.finish(),
+    ])
+
+    assert list(records) == RECORDS[:4]
+    assert writer.sleeps == 5
+
+
+def test_tail_reads_a_feed_finished_before_it_started(tail, tmp_path):
+    (tmp_path / 'beads.ndjson').write_bytes(_ndjson(RECORDS))
+    (tmp_path / 'beads.ndjson.done').touch()
+    writer, records = tail([])
+
+    assert list(records) == RECORDS
+    assert writer.sleeps == 0
+
+
+def test_tail_drops_a_partial_last_line_when_the_spider_dies(tail, caplog):
+    stopped = []
+    writer, records = tail([
+        lambda w: w.append(_ndjson(RECORDS[:1]) + b'{"product_code": "DB-00'),
+        lambda w: stopped.append(True),
+    ], should_stop=lambda: bool(stopped))
+
+    with caplog.at_level(logging.WARNING):
+        assert list(records) == RECORDS[:1]
+    assert 'before the feed was marked done' in caplog.text
+    assert 'Skipping malformed line' in caplog.text
+
+
+def test_tail_gives_up_when_the_spider_stops_before_writing(tail, caplog):
+    stopped = []
+    writer, records = tail([lambda w: stopped.append(True)], should_stop=lambda: bool(stopped))
+
+    with caplog.at_level(logging.WARNING):
+        assert list(records) == []
+    assert 'never appeared' in caplog.text
@@ -0,0 +1,115 @@
+"""Feeds are written in whole-line blocks, and a suspended feed resumes where it stopped"""
+
+import gzip
+import json
+
+import pytest
+from scrapy.settings import Settings
+
+from feeds.writer import FeedWriter
+from importers.feed_reader import iter_feed
+
+
+def _records(start, stop):
+    return [{'product_code': f"DB-{number:04d}"} for number in range(start, stop)]
+
+
+def test_close_moves_the_feed_into_place_and_marks_it_done(tmp_path):
+    with FeedWriter(tmp_path / 'beads.ndjson', flush_items=2) as writer:
+        for record in _records(1, 6):
+            writer.write(record)
+        assert writer.part_path.exists()
+
+    assert not writer.part_path.exists()
+    assert list(iter_feed(writer.path)) == _records(1, 6)
+    assert json.loads(writer.done_path.read_text())['items'] == 5
+
+
+def test_records_are_buffered_until_a_threshold(tmp_path):
+    writer = FeedWriter(tmp_path / 'beads.ndjson', flush_items=3, flush_seconds=3600).open()
+    flushed = []
+    writer.on_flush = lambda: flushed.append(writer.items_written)
+
+    for record in _records(1, 3):
+        writer.write(record)
+    assert writer.part_path.read_bytes() == b''
+    writer.write(_records(3, 4)[0])
+    assert flushed == [3]
+    assert writer.part_path.read_bytes().count(b'\n') == 3
+    writer.close()
+
+
+@pytest.mark.parametrize('compression', [None, 'gzip'])
+def test_suspended_feed_resumes_from_its_last_flush(tmp_path, compression):
+    writer = FeedWriter(tmp_path / 'beads.ndjson', flush_items=2, compression=compression).open()
+    for record in _records(1, 4):
+        writer.write(record)
+    writer.suspend()
+    offset, items = writer.bytes_written, writer.items_written
+    assert items == 3
+    assert not writer.path.exists()
+
+    # A torn block written after the checkpoint is dropped on resume
+    with open(writer.part_path, 'ab') as f:
+        f.write(b'{"product_code":"DB-99')
+
+    resumed = FeedWriter(tmp_path / 'beads.ndjson', flush_items=2, compression=compression).resume(offset, items)
+    for record in _records(4, 6):
+        resumed.write(record)
+    resumed.close()
+
+    assert list(iter_feed(resumed.path)) == _records(1, 6)
+    assert resumed.items_written == 5
+
+
+def test_gzip_blocks_are_separate_members(tmp_path):
+    blocks = []
+    writer = FeedWriter(tmp_path / 'beads.ndjson.gz', flush_items=2, compression='gzip').open()
+    writer.sink = blocks.append
+    for record in _records(1, 5):
+        writer.write(record)
+    writer.close()
+
+    assert len(blocks) == 2
+    assert [gzip.decompress(block).count(b'\n') for block in blocks] == [2, 2]
+    assert writer.bytes_written == sum(map(len, blocks))
+
+
+def test_from_settings_adds_the_compression_suffix(tmp_path):
+    writer = FeedWriter.from_settings(tmp_path / 'beads.ndjson', Settings({'BEAD_FEED_COMPRESSION': 'gzip'}))
+    assert writer.path.name == 'beads.ndjson.gz'
+    assert writer.content_type == 'application/gzip'
+
+
+def test_unknown_compression():
+    with pytest.raises(ValueError):
+        FeedWriter('beads.ndjson', compression='bz2')
+
+
+def test_flush_if_due_flushes_a_quiet_feed_once_flush_seconds_have_passed(tmp_path, monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr('feeds.writer.time.monotonic', lambda: now[0])
+    writer = FeedWriter(tmp_path / 'beads.ndjson', flush_items=100, flush_seconds=5.0).open()
+    writer.write(_records(1, 2)[0])
+
+    now[0] = 4.0
+    writer.flush_if_due()
+    assert writer.part_path.read_bytes() == b''
+
+    now[0] = 5.0
+    writer.flush_if_due()
+    assert list(iter_feed(writer.part_path)) == _records(1, 2)
+    writer.close()
+
+
+def test_a_failed_block_leaves_the_feed_unfinished(tmp_path):
+    with pytest.raises(RuntimeError):
+        with FeedWriter(tmp_path / 'beads.ndjson', flush_items=100) as writer:
+            for record in _records(1, 4):
+                writer.write(record)
+            raise RuntimeError('spider crashed')
+
+    assert not writer.path.exists()
+    assert not writer.done_path.exists()
+    # What was buffered is flushed, so the feed can be resumed or inspected
+    assert list(iter_feed(writer.part_path)) == _records(1, 4)
@@ -0,0 +1,65 @@
+"""The SQLite HTTP cache round-trips responses, honors expiry and evicts the least recently used"""
+
+from scrapy import Request, Spider
+from scrapy.http import HtmlResponse
+from scrapy.utils.test import get_crawler
+
+from extensions.httpcache import SqliteCacheStorage
+
+URL = 'https://example.com/product/db-0001/'
+
+
+def _cache(tmp_path, **settings):
+    crawler = get_crawler(Spider, {'HTTPCACHE_DIR': str(tmp_path / 'httpcache'), **settings})
+    spider = Spider.from_crawler(crawler, name='beads')
+    storage = SqliteCacheStorage(crawler.settings)
+    storage.open_spider(spider)
+    return storage, spider
+
+
+def _response(url, body=b'<html>beads</html>'):
+    return HtmlResponse(url, status=200, headers={'Content-Type': 'text/html'}, body=body)
+
+
+def test_cached_responses_round_trip(tmp_path):
+    storage, spider = _cache(tmp_path)
+    request = Request(URL)
+    assert storage.retrieve_response(spider, request) is None
+
+    storage.store_response(spider, request, _response(URL))
+    cached = storage.retrieve_response(spider, Request(URL))
+    storage.close_spider(spider)
+
+    assert cached.body == b'<html>beads</html>'
+    assert cached.status == 200
+    assert cached.headers['Content-Type'] == b'text/html'
+    assert (tmp_path / 'httpcache' / 'beads.sqlite3').exists()
+
+
+def test_expired_responses_are_not_returned(tmp_path, monkeypatch):
+    storage, spider = _cache(tmp_path, HTTPCACHE_EXPIRATION_SECS=60)
+    storage.store_response(spider, Request(URL), _response(URL))
+
+    stored_at = storage._connection.execute("SELECT stored_at FROM responses").fetchone()[0]
+    monkeypatch.setattr('extensions.httpcache.time.time', lambda: stored_at + 61)
+    assert storage.retrieve_response(spider, Request(URL)) is None
+    storage.close_spider(spider)
+
+
+def test_least_recently_used_responses_are_evicted_over_budget(tmp_path, monkeypatch):
+    clock = iter(range(1000))
+    monkeypatch.setattr('extensions.httpcache.time.time', lambda: float(next(clock)))
+    storage, spider = _cache(tmp_path, HTTPCACHE_SQLITE_COMPRESSION_LEVEL=0)
+    urls = [f'https://example.com/product/db-{n:04d}/' for n in range(3)]
+    for url in urls:
+        storage.store_response(spider, Request(url), _response(url, body=bytes(400)))
+    # Reading the first response makes the second one the least recently used
+    storage.retrieve_response(spider, Request(urls[0]))
+
+    storage.max_bytes = storage._total_bytes
+    storage.store_response(spider, Request(urls[2]), _response(urls[2], body=bytes(500)))
+
+    assert storage.retrieve_response(spider, Request(urls[1])) is None
+    assert storage.retrieve_response(spider, Request(urls[0])) is not None
+    assert storage._total_bytes <= storage.max_bytes * storage.EVICT_TO
+    storage.close_spider(spider)
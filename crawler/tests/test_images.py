@@ -0,0 +1,130 @@
+"""Images download through the engine; items wait a bounded time for them and slow downloads still end up in the index"""
+
+import hashlib
+
+import pytest
+from scrapy.exceptions import IgnoreRequest
+from scrapy.http import Response
+from scrapy.utils.test import get_crawler
+from twisted.internet import defer, task
+
+import pipelines.images
+from pipelines.images import BeadImagePipeline
+
+
+class _Engine:
+    """Stands in for crawler.engine: each download waits until the test answers it"""
+
+    def __init__(self):
+        self.requests = {}
+        self.downloads = {}
+
+    async def download_async(self, request):
+        self.requests[request.url] = request
+        self.downloads[request.url] = defer.Deferred()
+        return await self.downloads[request.url]
+
+    def respond(self, url, body=b'jpeg', status=200, content_type=b'image/jpeg'):
+        self.downloads[url].callback(Response(url, status=status, body=body, headers={'Content-Type': content_type}))
+
+
+def _pipeline(tmp_path, monkeypatch, wait_timeout, concurrency=8):
+    clock = task.Clock()
+    monkeypatch.setattr(pipelines.images, 'reactor', clock)
+    # No reactor runs in these tests: store in the calling thread and await the Deferreds directly
+    monkeypatch.setattr(pipelines.images, 'deferToThread', lambda function, *args: defer.maybeDeferred(function, *args))
+    monkeypatch.setattr(pipelines.images, 'maybe_deferred_to_future', lambda deferred: deferred)
+    crawler = get_crawler(settings_dict={
+        'BEAD_IMAGES_ENABLED': True,
+        'BEAD_IMAGES_STORE': str(tmp_path / 'images'),
+        'BEAD_IMAGES_INDEX': str(tmp_path / 'index.sqlite3'),
+        'BEAD_IMAGES_WAIT_TIMEOUT': wait_timeout,
+        'BEAD_IMAGES_CONCURRENCY': concurrency,
+        'BEAD_IMAGES_TIMEOUT': 15,
+    })
+    engine = _Engine()
+    crawler.engine = engine
+    pipeline = BeadImagePipeline(crawler)
+    pipeline.open_spider()
+    return pipeline, clock, engine
+
+
+def _stored_path(body=b'jpeg', extension='.jpg'):
+    sha256 = hashlib.sha256(body).hexdigest()
+    return f"{sha256[:2]}/{sha256}{extension}"
+
+
+def test_item_waits_for_its_image(tmp_path, monkeypatch):
+    pipeline, clock, engine = _pipeline(tmp_path, monkeypatch, 10.0)
+    url = 'https://example.com/a.png'
+    first = defer.ensureDeferred(pipeline.process_item({'image_url': url}))
+    second = defer.ensureDeferred(pipeline.process_item({'image_url': url}))
+
+    assert list(engine.downloads) == [url]
+    assert engine.requests[url].meta['download_timeout'] == 15
+    assert engine.requests[url].meta['dont_cache']
+    engine.respond(url, content_type=b'image/png')
+
+    stored_path = _stored_path(extension='.png')
+    assert first.result == {'image_url': url, 'image': stored_path}
+    assert second.result == {'image_url': url, 'image': stored_path}
+    assert (pipeline.store / stored_path).read_bytes() == b'jpeg'
+    assert pipeline.stats.get_value('images/downloaded') == 1
+
+
+def test_slow_image_does_not_hold_the_item(tmp_path, monkeypatch):
+    pipeline, clock, engine = _pipeline(tmp_path, monkeypatch, 10.0)
+    url = 'https://example.com/a.jpg'
+    result = defer.ensureDeferred(pipeline.process_item({'image_url': url}))
+
+    clock.advance(10)
+    assert result.result == {'image_url': url}
+    assert pipeline.stats.get_value('images/wait_timeout') == 1
+
+    # The download carries on and the next crawl reuses it
+    engine.respond(url)
+    assert pipeline.index.get(url)[1] == _stored_path()
+    later = defer.ensureDeferred(pipeline.process_item({'image_url': url}))
+    assert later.result['image'] == _stored_path()
+    assert len(engine.downloads) == 1
+
+
+def test_zero_wait_only_uses_stored_images(tmp_path, monkeypatch):
+    pipeline, clock, engine = _pipeline(tmp_path, monkeypatch, 0)
+    url = 'https://example.com/a.jpg'
+    result = defer.ensureDeferred(pipeline.process_item({'image_url': url}))
+
+    assert result.result == {'image_url': url}
+    assert list(engine.downloads) == [url]
+    engine.respond(url)
+    assert pipeline.index.get(url)[1] == _stored_path()
+
+
+def test_image_requests_are_capped_at_the_configured_concurrency(tmp_path, monkeypatch):
+    pipeline, clock, engine = _pipeline(tmp_path, monkeypatch, None, concurrency=1)
+    first = defer.ensureDeferred(pipeline.process_item({'image_url': 'https://example.com/a.jpg'}))
+    second = defer.ensureDeferred(pipeline.process_item({'image_url': 'https://example.com/b.jpg'}))
+
+    # The second image waits for a slot instead of going to the downloader
+    assert list(engine.downloads) == ['https://example.com/a.jpg']
+    engine.respond('https://example.com/a.jpg', body=b'a')
+    assert list(engine.downloads) == ['https://example.com/a.jpg', 'https://example.com/b.jpg']
+    engine.respond('https://example.com/b.jpg', body=b'b')
+    assert first.result['image'] == _stored_path(b'a')
+    assert second.result['image'] == _stored_path(b'b')
+
+
+@pytest.mark.parametrize('outcome, stat', [
+    (lambda engine, url: engine.downloads[url].errback(IgnoreRequest('Forbidden by robots.txt')), 'images/ignored'),
+    (lambda engine, url: engine.respond(url, status=404), 'images/ignored'),
+    (lambda engine, url: engine.downloads[url].errback(ConnectionRefusedError()), 'images/failed'),
+])
+def test_an_image_the_downloader_refuses_leaves_the_item_without_one(tmp_path, monkeypatch, outcome, stat):
+    pipeline, clock, engine = _pipeline(tmp_path, monkeypatch, 10.0)
+    url = 'https://cdn.example.net/a.jpg'
+    result = defer.ensureDeferred(pipeline.process_item({'image_url': url}))
+
+    outcome(engine, url)
+    assert result.result == {'image_url': url}
+    assert pipeline.stats.get_value(stat) == 1
+    assert pipeline.index.get(url) is None
@@ -0,0 +1,24 @@
+"""Known beads only skip their detail fetch when nothing needs to see their changes"""
+
+import pytest
+from scrapy.utils.test import get_crawler
+
+from storage.product_code_index import skips_known_beads
+
+
+def _skips(**settings) -> bool:
+    return skips_known_beads(get_crawler(settings_dict=settings).settings)
+
+
+@pytest.mark.parametrize('settings, skips', [
+    ({'IMPORT_MODE': 'insert', 'BEAD_FEED_DELTA_ENABLED': False}, True),
+    ({'IMPORT_MODE': 'insert', 'BEAD_FEED_DELTA_ENABLED': True}, False),
+    ({'IMPORT_MODE': 'upsert', 'BEAD_FEED_DELTA_ENABLED': False}, False),
+    ({'POSTGRES_PIPELINE_ENABLED': True, 'POSTGRES_PIPELINE_MODE': 'upsert', 'IMPORT_MODE': 'insert'}, False),
+    ({'POSTGRES_PIPELINE_ENABLED': True, 'POSTGRES_PIPELINE_MODE': 'insert'}, True),
+    # An explicit setting wins
+    ({'KNOWN_CODES_INDEX_ENABLED': True, 'IMPORT_MODE': 'upsert', 'BEAD_FEED_DELTA_ENABLED': True}, True),
+    ({'KNOWN_CODES_INDEX_ENABLED': False, 'IMPORT_MODE': 'insert'}, False),
+])
+def test_known_beads_are_skipped_only_for_insert_loads_without_delta(settings, skips):
+    assert _skips(**settings) is skips
@@ -0,0 +1,128 @@
+"""The Miyuki importer's full and delta imports, against a fake connection and loader"""
+
+import json
+
+import pytest
+
+from importers.miyuki_directory import MiyukiDirectoryImporter
+
+
+class _Cursor:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class _Connection:
+    def __init__(self):
+        self.commits = 0
+        self.rollbacks = 0
+
+    def cursor(self):
+        return _Cursor()
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+class _Loader:
+    """Records each batch it is given and reports every row as inserted"""
+
+    name = 'values'
+
+    def __init__(self):
+        self.batches = []
+
+    def load(self, cursor, rows):
+        self.batches.append([row[0] for row in rows])
+        return {'inserted': len(rows), 'updated': 0, 'unchanged': 0, 'duplicates': 0}
+
+
+def _write_ndjson(path, records):
+    path.write_text(''.join(json.dumps(record) + '\n' for record in records), encoding='utf-8')
+    return path
+
+
+@pytest.fixture
+def importer(tmp_path, monkeypatch):
+    importer = MiyukiDirectoryImporter(str(tmp_path / 'beads.ndjson'))
+    importer.db_connection = _Connection()
+    importer.loader = _Loader()
+    monkeypatch.setattr(importer, 'check_database_schema', lambda: True)
+    monkeypatch.setattr('importers.miyuki_directory.normalize_stored_codes', lambda connection: {})
+    return importer
+
+
+def test_bulk_import_streams_the_feed_in_committed_batches(importer):
+    _write_ndjson(importer.json_file_path, [{'product_code': f'DB-{n:04d}'} for n in range(5)] + [{'name': 'no code'}])
+
+    result = importer.bulk_import_beads(batch_size=2)
+
+    assert importer.loader.batches == [['DB-0000', 'DB-0001'], ['DB-0002', 'DB-0003'], ['DB-0004']]
+    assert importer.db_connection.commits == 3
+    assert result['imported_count'] == 5
+    assert result['total_count'] == 6
+
+
+def test_bulk_import_of_a_missing_feed_fails(importer):
+    with pytest.raises(FileNotFoundError):
+        importer.bulk_import_beads()
+
+
+@pytest.mark.parametrize('host, primary', [('miyuki-beads.co.jp', True), ('firemountaingems.com', False)])
+def test_apply_delta_only_treats_the_primary_source_as_primary(importer, monkeypatch, host, primary):
+    _write_ndjson(importer.json_file_path, [
+        {'change': 'added', 'product_code': 'DB-0001',
+         'bead': {'product_code': 'DB-0001', 'source_url': f'https://www.{host}/p/1'}}
+    ])
+    calls = []
+
+    def apply_delta_feed(connection, path, backend, batch_size, primary):
+        calls.append(primary)
+        return {'records': 1, 'inserted': 1, 'updated': 0, 'unchanged': 0, 'duplicates': 0,
+                'discontinued': 0, 'ignored_removals': 0}
+
+    monkeypatch.setattr('importers.miyuki_directory.apply_delta_feed', apply_delta_feed)
+    result = importer.apply_delta()
+
+    assert calls == [primary]
+    assert result['imported_count'] == 1
+
+
+def test_tail_import_commits_batches_while_the_spider_is_still_writing(importer, monkeypatch):
+    part_path = importer.json_file_path.with_name('beads.ndjson.part')
+    beads = [{'product_code': f'DB-{n:04d}'} for n in range(5)]
+    commits_seen = []
+
+    def write_next(lines):
+        def step():
+            with open(part_path, 'a', encoding='utf-8') as f:
+                f.write(lines)
+        return step
+
+    def finish():
+        part_path.rename(importer.json_file_path)
+        importer.json_file_path.with_name('beads.ndjson.done').touch()
+
+    steps = [write_next(json.dumps(beads[0]) + '\n' + json.dumps(beads[1]) + '\n{"product_'),
+             write_next('code": "DB-0002"}\n'),
+             write_next(''.join(json.dumps(bead) + '\n' for bead in beads[3:])),
+             finish]
+
+    def sleep(seconds):
+        commits_seen.append(importer.db_connection.commits)
+        if steps:
+            steps.pop(0)()
+
+    monkeypatch.setattr('importers.feed_reader.time.sleep', sleep)
+    result = importer.tail_import_beads(batch_size=2, poll_interval=0.01)
+
+    assert importer.loader.batches == [['DB-0000', 'DB-0001'], ['DB-0002', 'DB-0003'], ['DB-0004']]
+    # The first batch went in before the rest of the feed had been written
+    assert commits_seen[2] == 1
+    assert result['imported_count'] == 5
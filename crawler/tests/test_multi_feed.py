@@ -0,0 +1,143 @@
+"""Feeds of several sources load in a fixed order, and secondary sources never clear columns"""
+
+import json
+
+import pytest
+
+from importers.bead_loader import KEEP_WHEN_NULL_COLUMNS, SECONDARY_SOURCE_KEEP_WHEN_NULL_COLUMNS, _conflict_clause
+from importers.feed_tasks import feed_source, find_feed_files
+from importers.multi_feed import MultiFeedImporter
+from importers.s3_feeds import SiteFeeds, download_s3_feeds, newest_snapshot_keys, site_feed_keys
+
+
+def _write_feed(path, host, codes):
+    with open(path, 'w', encoding='utf-8') as f:
+        for code in codes:
+            f.write(json.dumps({'product_code': code, 'brand': 'Miyuki', 'source_url': f"https://www.{host}/{code}"}) + '\n')
+    return path
+
+
+@pytest.fixture
+def feeds(tmp_path):
+    return [
+        _write_feed(tmp_path / 'fire_mountain_gems_beads.ndjson', 'firemountaingems.com', ['DB0001', 'DB0002']),
+        _write_feed(tmp_path / 'other_shop_beads.ndjson', 'beads.example', ['DB0001']),
+        _write_feed(tmp_path / 'miyuki_directory_beads.ndjson', 'miyuki-beads.co.jp', ['DB0001', 'DB0002', 'DB0003']),
+    ]
+
+
+def test_feed_source_is_the_host_of_the_first_source_url(feeds):
+    assert [feed_source(feed) for feed in feeds] == ['firemountaingems.com', 'beads.example', 'miyuki-beads.co.jp']
+
+
+def test_insert_mode_loads_the_manufacturer_first(feeds):
+    tiers = MultiFeedImporter(workers=1, mode='insert').plan_tiers(feeds)
+    assert [[task.feed.rsplit('/', 1)[1] for task in tier] for tier in tiers] == [
+        ['miyuki_directory_beads.ndjson'], ['fire_mountain_gems_beads.ndjson'], ['other_shop_beads.ndjson']
+    ]
+    assert [[task.primary for task in tier] for tier in tiers] == [[True], [False], [False]]
+
+
+def test_upsert_mode_loads_the_manufacturer_last(feeds):
+    tiers = MultiFeedImporter(workers=1, mode='upsert').plan_tiers(feeds)
+    assert [tier[0].feed.rsplit('/', 1)[1] for tier in tiers] == [
+        'other_shop_beads.ndjson', 'fire_mountain_gems_beads.ndjson', 'miyuki_directory_beads.ndjson'
+    ]
+    assert tiers[-1][0].primary
+
+
+def test_secondary_sources_keep_every_stored_column_they_lack():
+    primary = _conflict_clause('upsert')
+    secondary = _conflict_clause('upsert', SECONDARY_SOURCE_KEEP_WHEN_NULL_COLUMNS)
+
+    assert 'color_group = EXCLUDED.color_group' in primary
+    assert 'image = COALESCE(EXCLUDED.image, b.image)' in primary
+    for column in SECONDARY_SOURCE_KEEP_WHEN_NULL_COLUMNS:
+        assert f"{column} = COALESCE(EXCLUDED.{column}, b.{column})" in secondary
+    assert set(KEEP_WHEN_NULL_COLUMNS) <= set(SECONDARY_SOURCE_KEEP_WHEN_NULL_COLUMNS)
+
+
+def test_find_feed_files_skips_unfinished_and_delta_feeds(tmp_path, feeds):
+    for name in ('beads.ndjson.part', 'beads.ndjson.done', 'beads.delta.ndjson', 'notes.txt'):
+        (tmp_path / name).write_text('')
+    assert find_feed_files([tmp_path]) == sorted(feeds)
+
+
+class _Paginator:
+    def __init__(self, keys):
+        self.keys = keys
+
+    def paginate(self, Bucket, Prefix):
+        yield {'Contents': [{'Key': key} for key in self.keys[:2]]}
+        yield {'Contents': [{'Key': key} for key in self.keys[2:]]}
+
+
+class _Client:
+    def __init__(self, keys):
+        self.keys = keys
+        self.downloaded = []
+
+    def get_paginator(self, operation):
+        return _Paginator(self.keys)
+
+    def download_file(self, bucket, key, filename):
+        self.downloaded.append(key)
+        with open(filename, 'w', encoding='utf-8') as f:
+            f.write(key)
+
+
+def test_newest_snapshot_keys_takes_the_latest_feed_of_each_site():
+    client = _Client([
+        'beads/miyuki/feed-20260901_000000.ndjson.gz',
+        'beads/miyuki/delta-20261001_000000.ndjson.gz',
+        'beads/fmg/feed-20261002_000000.ndjson',
+        'beads/miyuki/feed-20260915_000000.ndjson.gz',
+    ])
+    assert newest_snapshot_keys(client, 'bucket', 'beads/') == [
+        'beads/fmg/feed-20261002_000000.ndjson', 'beads/miyuki/feed-20260915_000000.ndjson.gz'
+    ]
+
+
+def test_deltas_uploaded_after_the_newest_snapshot_are_applied_in_order():
+    client = _Client([
+        'beads/miyuki/delta-20261003_000000.ndjson',
+        'beads/miyuki/feed-20261001_000000.ndjson',
+        'beads/miyuki/delta-20260930_000000.ndjson',
+        'beads/miyuki/delta-20261002_000000.ndjson',
+    ])
+    assert site_feed_keys(client, 'bucket', 'beads/') == [SiteFeeds(
+        'miyuki', 'beads/miyuki/feed-20261001_000000.ndjson',
+        ['beads/miyuki/delta-20261002_000000.ndjson', 'beads/miyuki/delta-20261003_000000.ndjson']
+    )]
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    def use(keys):
+        client = _Client(keys)
+        monkeypatch.setattr('importers.s3_feeds.get_s3_config', lambda: {'bucket': 'bucket'})
+        monkeypatch.setattr('importers.s3_feeds.create_s3_client', lambda config: client)
+        return client
+    return use
+
+
+def test_download_s3_feeds_fetches_the_snapshot_and_its_later_deltas(tmp_path, s3):
+    client = s3([
+        'beads/miyuki/feed-20261001_000000.ndjson',
+        'beads/miyuki/delta-20261002_000000.ndjson',
+        'beads/miyuki/delta-20261003_000000.ndjson',
+    ])
+    [site] = download_s3_feeds('beads/', tmp_path)
+
+    assert site.site == 'miyuki'
+    assert site.snapshot.read_text() == 'beads/miyuki/feed-20261001_000000.ndjson'
+    assert [delta.read_text() for delta in site.deltas] == [
+        'beads/miyuki/delta-20261002_000000.ndjson', 'beads/miyuki/delta-20261003_000000.ndjson'
+    ]
+
+
+def test_a_site_with_deltas_but_no_snapshot_stops_the_import(tmp_path, s3):
+    client = s3(['beads/fmg/delta-20261002_000000.ndjson'])
+    with pytest.raises(RuntimeError, match='BEAD_FEED_S3_FULL_SNAPSHOTS'):
+        download_s3_feeds('beads/', tmp_path)
+    assert client.downloaded == []
@@ -0,0 +1,88 @@
+"""Listing page URLs worked out from the first page's pagination links"""
+
+import pytest
+
+from parsers.pagination import (
+    limit_pages, numbered_page_urls, offset_page_urls, page_number, result_count, with_page_number
+)
+
+BASE_URL = 'https://www.example.com/directory/'
+
+
+@pytest.mark.parametrize('url, number', [
+    ('https://www.example.com/directory/page/3/', 3),
+    ('https://www.example.com/directory/page/12', 12),
+    ('https://www.example.com/directory/?paged=4', 4),
+    ('https://www.example.com/directory/?orderby=name&paged=5', 5),
+    ('https://www.example.com/directory/', None),
+    ('https://www.example.com/directory/?paged=last', None),
+    ('https://www.example.com/pages/3/', None),
+])
+def test_page_number(url, number):
+    assert page_number(url) == number
+
+
+def test_with_page_number_keeps_the_rest_of_the_url():
+    assert with_page_number('https://www.example.com/directory/page/2/?orderby=name', 7) == \
+        'https://www.example.com/directory/page/7/?orderby=name'
+    assert with_page_number('https://www.example.com/directory/?orderby=name&paged=2', 7) == \
+        'https://www.example.com/directory/?orderby=name&paged=7'
+
+
+def test_numbered_page_urls_fills_the_gap_of_an_abbreviated_pagination():
+    links = ['/directory/page/2/', '/directory/page/3/', '/directory/page/37/']
+    urls = numbered_page_urls(BASE_URL, links)
+
+    assert len(urls) == 36
+    assert urls[0] == 'https://www.example.com/directory/page/2/'
+    assert urls[-1] == 'https://www.example.com/directory/page/37/'
+    assert [page_number(url) for url in urls] == list(range(2, 38))
+
+
+def test_numbered_page_urls_lists_each_page_once_whatever_the_links_repeat():
+    # The same page linked by its number and by the next arrow, and the first page itself
+    links = [BASE_URL, 'page/2/', 'page/3/', 'page/2/', 'page/3/']
+    assert numbered_page_urls(BASE_URL, links) == [
+        'https://www.example.com/directory/page/2/',
+        'https://www.example.com/directory/page/3/',
+    ]
+
+
+def test_numbered_page_urls_resolves_relative_hrefs_and_query_pagination():
+    links = ['?paged=2', '?paged=4', '#top']
+    assert numbered_page_urls('https://www.example.com/directory/?orderby=name', links) == [
+        'https://www.example.com/directory/?paged=2',
+        'https://www.example.com/directory/?paged=3',
+        'https://www.example.com/directory/?paged=4',
+    ]
+
+
+def test_numbered_page_urls_without_page_numbers():
+    assert numbered_page_urls(BASE_URL, ['/about/', 'https://www.example.com/cart/']) == []
+    assert numbered_page_urls(BASE_URL, []) == []
+
+
+@pytest.mark.parametrize('max_pages, count', [(None, 9), (0, 0), (1, 0), (4, 3), (10, 9), (50, 9)])
+def test_limit_pages_counts_the_first_page_against_max_pages(max_pages, count):
+    urls = [f'{BASE_URL}page/{number}/' for number in range(2, 11)]
+    assert limit_pages(urls, max_pages) == urls[:count]
+
+
+def test_offset_page_urls():
+    urls = offset_page_urls('https://www.example.com/beads/?start=48&sz=48', 150)
+    assert urls == [
+        'https://www.example.com/beads/?start=48&sz=48',
+        'https://www.example.com/beads/?start=96&sz=48',
+        'https://www.example.com/beads/?start=144&sz=48',
+    ]
+    assert offset_page_urls('https://www.example.com/beads/?sz=0', 150) == []
+
+
+@pytest.mark.parametrize('text, count', [
+    ('Showing 1–48 of 1780 results', 1780),
+    ('1,204 Results', 1204),
+    ('Showing the single result', None),
+    (None, None),
+])
+def test_result_count(text, count):
+    assert result_count(text) == count
@@ -0,0 +1,214 @@
+"""Batches, backpressure, the final flush and failed batches of the Postgres pipeline, against a fake pool"""
+
+import pytest
+from scrapy import Spider
+from scrapy.utils.test import get_crawler
+from twisted.internet import defer
+
+from pipelines.postgres import PostgresBeadPipeline
+
+
+class _Threads:
+    """Stands in for deferToThread: calls queue up until the test runs them"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, function, *args, **kwargs):
+        deferred = defer.Deferred()
+        self.calls.append((function, args, kwargs, deferred))
+        return deferred
+
+    def run_next(self):
+        function, args, kwargs, deferred = self.calls.pop(0)
+        try:
+            result = function(*args, **kwargs)
+        except Exception as e:
+            deferred.errback(e)
+        else:
+            deferred.callback(result)
+
+
+class _Connection:
+    def __init__(self):
+        self.commits = 0
+        self.rollbacks = 0
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+class _Pool:
+    def __init__(self, minconn, maxconn, **kwargs):
+        self.maxconn = maxconn
+        self.connection = _Connection()
+        self.checked_out = 0
+        self.closed = False
+
+    def getconn(self):
+        self.checked_out += 1
+        return self.connection
+
+    def putconn(self, connection):
+        self.checked_out -= 1
+
+    def closeall(self):
+        self.closed = True
+
+
+class _Loader:
+    name = 'values'
+    mode = 'upsert'
+
+    def __init__(self):
+        self.batches = []
+        self.fail = False
+
+    def load(self, cursor, rows):
+        if self.fail:
+            raise RuntimeError('deadlock detected')
+        self.batches.append([row[0] for row in rows])
+        return {'inserted': len(rows), 'updated': 0, 'unchanged': 0, 'duplicates': 0}
+
+
+@pytest.fixture
+def threads(monkeypatch):
+    threads = _Threads()
+    monkeypatch.setattr('pipelines.postgres.deferToThread', threads)
+    # No reactor runs in these tests, so the coroutines await the Deferreds themselves
+    monkeypatch.setattr('pipelines.postgres.maybe_deferred_to_future', lambda deferred: deferred)
+    monkeypatch.setattr('pipelines.postgres.ThreadedConnectionPool', _Pool)
+    monkeypatch.setattr('pipelines.postgres.get_connection_kwargs', lambda: {})
+    monkeypatch.setattr('pipelines.postgres.normalize_stored_codes', lambda connection: {})
+    return threads
+
+
+@pytest.fixture
+def pipeline(threads):
+    crawler = get_crawler(Spider, {
+        'POSTGRES_PIPELINE_ENABLED': True,
+        'POSTGRES_PIPELINE_BATCH_SIZE': 2,
+        'POSTGRES_PIPELINE_MAX_PENDING_BATCHES': 1,
+    })
+    pipeline = PostgresBeadPipeline(crawler)
+    pipeline.loader = _Loader()
+    opened = defer.ensureDeferred(pipeline.open_spider())
+    threads.run_next()  # Connection pool
+    threads.run_next()  # Stored code normalization
+    assert opened.called
+    assert pipeline.pool.maxconn == 1
+    return pipeline
+
+
+def _item(number):
+    return {'product_code': f'DB-{number:04d}'}
+
+
+def _process(pipeline, number):
+    return defer.ensureDeferred(pipeline.process_item(_item(number)))
+
+
+def test_full_batches_are_written_in_a_thread(pipeline, threads):
+    assert all(_process(pipeline, number).called for number in (1, 2, 3))
+    assert len(threads.calls) == 1
+
+    threads.run_next()
+    assert pipeline.loader.batches == [['DB-0001', 'DB-0002']]
+    assert pipeline.pool.connection.commits == 1
+    assert pipeline.pool.checked_out == 0
+    assert pipeline.stats.get_value('postgres/inserted') == 2
+    assert pipeline._rows and not threads.calls
+
+
+def test_items_wait_while_every_connection_is_busy(pipeline, threads):
+    for number in (1, 2, 3):
+        _process(pipeline, number)
+    held = _process(pipeline, 4)
+    # The batch of 3 and 4 has no free connection, so the item is held back
+    assert not held.called
+    assert pipeline.stats.get_value('postgres/backpressure_waits') == 1
+
+    threads.run_next()
+    assert held.called
+    # The finished batch's connection went straight to the waiting rows
+    assert len(threads.calls) == 1
+    threads.run_next()
+    assert pipeline.loader.batches == [['DB-0001', 'DB-0002'], ['DB-0003', 'DB-0004']]
+
+
+def test_closing_drains_in_flight_batches_and_flushes_the_rest(pipeline, threads):
+    for number in (1, 2, 3):
+        _process(pipeline, number)
+    closed = defer.ensureDeferred(pipeline.close_spider())
+    assert not closed.called
+
+    threads.run_next()  # The in-flight batch
+    threads.run_next()  # The final, partial one
+    threads.run_next()  # closeall
+    assert closed.called
+    assert pipeline.loader.batches == [['DB-0001', 'DB-0002'], ['DB-0003']]
+    assert pipeline.pool.closed
+    assert pipeline.stats.get_value('postgres/batches') == 2
+
+
+def test_a_failed_batch_is_rolled_back_counted_and_the_crawl_goes_on(pipeline, threads):
+    pipeline.loader.fail = True
+    _process(pipeline, 1)
+    _process(pipeline, 2)
+    threads.run_next()
+
+    connection = pipeline.pool.connection
+    assert connection.rollbacks == 1
+    assert connection.commits == 0
+    assert pipeline.pool.checked_out == 0
+    assert pipeline.stats.get_value('postgres/failed_rows') == 2
+    assert not pipeline._pending
+
+    pipeline.loader.fail = False
+    _process(pipeline, 3)
+    _process(pipeline, 4)
+    threads.run_next()
+    assert pipeline.loader.batches == [['DB-0003', 'DB-0004']]
+
+
+def test_without_a_database_beads_only_go_to_the_feed(threads):
+    crawler = get_crawler(Spider, {'POSTGRES_PIPELINE_ENABLED': True})
+    pipeline = PostgresBeadPipeline(crawler)
+    opened = defer.ensureDeferred(pipeline.open_spider())
+    function, args, kwargs, deferred = threads.calls.pop()
+    deferred.errback(OSError('connection refused'))
+
+    assert opened.called
+    assert pipeline.pool is None
+    assert _process(pipeline, 1).result == _item(1)
+    assert not threads.calls
+
+
+def test_a_failed_code_normalization_leaves_beads_to_the_feed(threads, monkeypatch):
+    def normalize_stored_codes(connection):
+        raise RuntimeError('permission denied for table beads')
+
+    monkeypatch.setattr('pipelines.postgres.normalize_stored_codes', normalize_stored_codes)
+    pipeline = PostgresBeadPipeline(get_crawler(Spider, {'POSTGRES_PIPELINE_ENABLED': True}))
+    opened = defer.ensureDeferred(pipeline.open_spider())
+    threads.run_next()
+    pool = pipeline.pool
+    threads.run_next()
+    threads.run_next()
+
+    assert opened.called
+    assert pool.closed and pool.checked_out == 0
+    assert pipeline.pool is None
+    assert _process(pipeline, 1).result == _item(1)
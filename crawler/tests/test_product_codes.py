@@ -0,0 +1,61 @@
+"""Product codes are found in any spelling and canonicalized with their bead size"""
+
+import pytest
+
+from parsers.product_codes import (
+    canonical_code, extract_product_code, normalize_names, normalize_product_code, normalize_records,
+    size_for_code
+)
+
+
+@pytest.mark.parametrize('name, code, size', [
+    ('Miyuki Delica DB-1234, Red', 'DB-1234', '11/0'),
+    ('DB0001', 'DB-0001', '11/0'),
+    ('DB-12', 'DB-0012', '11/0'),
+    ('DBS-0005-C Silver', 'DBS-0005-C', '15/0'),
+    ('DBS5C', 'DBS-0005-C', '15/0'),
+    ('DBM-0310', 'DBM-0310', '10/0'),
+    ('DBL0001', 'DBL-0001', '8/0'),
+    # A letter starting a word is not a variant suffix
+    ('DB-0001 Black', 'DB-0001', '11/0'),
+    ('DB-0001Black', 'DB-0001', '11/0'),
+])
+def test_normalize_product_code(name, code, size):
+    product_code = normalize_product_code(name)
+    assert (product_code.code, product_code.size) == (code, size)
+    assert extract_product_code(name) == code
+
+
+def test_names_without_a_code():
+    assert normalize_product_code('Round Rocaille 11/0') is None
+    assert extract_product_code('') is None
+
+
+@pytest.mark.parametrize('stored, code', [
+    ('DB-123', 'DB-0123'),
+    ('DB123', 'DB-0123'),
+    ('DBS-5', 'DBS-0005'),
+    ('DB-0123', 'DB-0123'),
+    ('DB-0123-C', 'DB-0123-C'),
+    # Only whole codes: not a product name, nor a code of another brand
+    ('DB-123 Red', None),
+    ('11-123', None),
+])
+def test_canonical_code_of_a_stored_code(stored, code):
+    assert canonical_code(stored) == code
+
+
+def test_size_for_code():
+    assert size_for_code('DBS-0005') == '15/0'
+    assert size_for_code('XX-0001') == 'Unknown'
+
+
+def test_normalize_names_keeps_order():
+    codes = normalize_names(['DB1', 'Sampler', 'DBL2'])
+    assert [code.code if code else None for code in codes] == ['DB-0001', None, 'DBL-0002']
+
+
+def test_normalize_records_fills_code_and_size_and_drops_the_rest():
+    records = [{'name': 'DBM12 Gold'}, {'name': 'Sampler'}, {'title': 'DB3'}]
+    assert list(normalize_records(records)) == [{'name': 'DBM12 Gold', 'product_code': 'DBM-0012', 'size': '10/0'}]
+    assert [record['product_code'] for record in normalize_records(records, name_field='title')] == ['DB-0003']
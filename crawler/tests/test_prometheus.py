@@ -0,0 +1,46 @@
+"""Histograms and the Prometheus text file written by the crawl telemetry"""
+
+import pytest
+
+from extensions.prometheus import Histogram, crawl_metrics_text
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram((0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value)
+
+    assert histogram.cumulative() == [('0.1', 2), ('1.0', 3), ('+Inf', 4)]
+    assert histogram.count == 4
+    assert histogram.sum == pytest.approx(2.65)
+    assert histogram.quantile(0.5) == 0.1
+    assert histogram.quantile(0.75) == 1.0
+    assert histogram.quantile(1.0) is None
+    assert Histogram((1.0,)).quantile(0.5) is None
+
+
+def test_crawl_metrics_text_labels_every_series_with_the_spider():
+    latency = Histogram((0.5,))
+    latency.observe(0.2)
+    snapshot = {
+        'items': 12,
+        'items_per_sec': 1.5,
+        'retries': 2,
+        'responses_by_status': {429: 1, 200: 14},
+        'queues': {'scheduler': 3},
+    }
+
+    text = crawl_metrics_text('miyuki_directory', snapshot, {'miyuki-beads.com': latency}, {})
+    lines = text.splitlines()
+
+    assert 'crawler_items_total{spider="miyuki_directory"} 12' in lines
+    assert 'crawler_items_per_second{spider="miyuki_directory"} 1.500' in lines
+    assert lines.index('crawler_responses_total{spider="miyuki_directory",status="200"} 14') < \
+        lines.index('crawler_responses_total{spider="miyuki_directory",status="429"} 1')
+    assert 'crawler_queue_depth{spider="miyuki_directory",queue="scheduler"} 3' in lines
+    labels = 'spider="miyuki_directory",domain="miyuki-beads.com"'
+    assert f'crawler_download_latency_seconds_bucket{{{labels},le="0.5"}} 1' in lines
+    assert f'crawler_download_latency_seconds_bucket{{{labels},le="+Inf"}} 1' in lines
+    assert f'crawler_download_latency_seconds_count{{{labels}}} 1' in lines
+    assert '# TYPE crawler_callback_duration_seconds histogram' in lines
+    assert text.endswith('\n')
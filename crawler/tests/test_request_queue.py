@@ -0,0 +1,112 @@
+"""The shared request queue hands each request to one worker and re-leases lost claims"""
+
+import pytest
+
+from distributed.queue import ABANDONED, CLAIMED, DONE, PENDING, SqliteRequestQueue, open_request_queue
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr('distributed.queue.time', clock)
+    return clock
+
+
+@pytest.fixture
+def queue(tmp_path, clock):
+    queue = SqliteRequestQueue(tmp_path / 'queue.sqlite3', lease_seconds=60, max_attempts=2)
+    queue.open()
+    yield queue
+    queue.close()
+
+
+def _request(url):
+    return {'url': url, 'callback': 'parse_product'}
+
+
+def test_requests_are_queued_once_per_fingerprint(queue):
+    assert queue.push(_request('https://example.com/a'), b'a')
+    assert not queue.push(_request('https://example.com/a'), b'a')
+    # dont_filter requests have no fingerprint and are always added
+    assert queue.push(_request('https://example.com/b'), None)
+    assert queue.push(_request('https://example.com/b'), None)
+    assert queue.counts()[PENDING] == 3
+
+
+def test_claims_are_highest_priority_first_and_exclusive(queue):
+    queue.push(_request('https://example.com/listing'), b'listing', priority=0)
+    queue.push(_request('https://example.com/product'), b'product', priority=10)
+    queue.push(_request('https://example.com/other'), b'other', priority=0)
+
+    claimed = queue.claim('worker-1', limit=2)
+    assert [request['url'] for _, request in claimed] == [
+        'https://example.com/product', 'https://example.com/listing'
+    ]
+    assert [request['url'] for _, request in queue.claim('worker-2', limit=5)] == ['https://example.com/other']
+    assert queue.claim('worker-3', limit=5) == []
+    assert queue.counts() == {PENDING: 0, CLAIMED: 3, DONE: 0, ABANDONED: 0}
+
+
+def test_completed_requests_leave_the_queue(queue):
+    queue.push(_request('https://example.com/a'), b'a')
+    [(request_id, _)] = queue.claim('worker-1', limit=1)
+    queue.complete(request_id)
+
+    assert not queue.has_pending()
+    assert queue.counts()[DONE] == 1
+    # A crawled fingerprint is not queued again
+    assert not queue.push(_request('https://example.com/a'), b'a')
+
+
+def test_expired_claims_are_re_leased_until_max_attempts(queue, clock):
+    queue.push(_request('https://example.com/a'), b'a')
+    [(request_id, _)] = queue.claim('worker-1', limit=1)
+
+    clock.now += 30
+    assert queue.claim('worker-2', limit=1) == []
+
+    clock.now += 31
+    assert [claimed_id for claimed_id, _ in queue.claim('worker-2', limit=1)] == [request_id]
+
+    clock.now += 61
+    assert queue.claim('worker-3', limit=1) == []
+    assert queue.counts()[ABANDONED] == 1
+
+
+def test_release_abandons_what_a_worker_still_holds(queue):
+    for name in ('a', 'b', 'c'):
+        queue.push(_request(f'https://example.com/{name}'), name.encode())
+    [(first_id, _), _] = queue.claim('worker-1', limit=2)
+    queue.claim('worker-2', limit=1)
+    queue.complete(first_id)
+
+    assert queue.release('worker-1') == 1
+    assert queue.counts() == {PENDING: 0, CLAIMED: 1, DONE: 1, ABANDONED: 1}
+
+
+def test_reset_forgets_every_request(queue):
+    queue.push(_request('https://example.com/a'), b'a')
+    queue.reset()
+    assert queue.counts() == dict.fromkeys((PENDING, CLAIMED, DONE, ABANDONED), 0)
+    assert queue.push(_request('https://example.com/a'), b'a')
+
+
+def test_open_request_queue_picks_the_backend_from_the_url(tmp_path):
+    queue = open_request_queue(f"sqlite:///{tmp_path / 'queue.sqlite3'}", lease_seconds=5)
+    try:
+        assert isinstance(queue, SqliteRequestQueue)
+        assert queue.lease_seconds == 5
+        assert (tmp_path / 'queue.sqlite3').exists()
+    finally:
+        queue.close()
+
+    with pytest.raises(ValueError):
+        open_request_queue('redis://localhost/0')
@@ -0,0 +1,29 @@
+"""Spiders run side by side get the same settings as when their own runner starts them"""
+
+from scrapy.crawler import CrawlerRunner
+from scrapy.utils.project import get_project_settings
+
+from run_all_crawlers import apply_spider_settings
+
+
+def _crawler_settings(name):
+    settings = get_project_settings()
+    settings.set('SPIDER_MODULES', ['spiders'])
+    crawler = CrawlerRunner(settings).create_crawler(name)
+    apply_spider_settings(crawler.settings, name)
+    return crawler.settings
+
+
+def test_fire_mountain_gems_keeps_its_site_rules():
+    settings = _crawler_settings('fire_mountain_gems')
+    assert settings.getbool('ROBOTSTXT_OBEY')
+    assert settings.getbool('COOKIES_ENABLED')
+    assert settings.getint('CONCURRENT_REQUESTS') == 8
+    assert not settings.getbool('POSTGRES_PIPELINE_ENABLED')
+
+
+def test_miyuki_directory_loads_beads_while_crawling():
+    settings = _crawler_settings('miyuki_directory')
+    assert settings.getbool('POSTGRES_PIPELINE_ENABLED')
+    assert settings.getint('CONCURRENT_REQUESTS') == 16
+    assert settings.get('JOBDIR').endswith('miyuki_directory')
@@ -0,0 +1,114 @@
+"""Multipart uploads against a stub S3 client: parts, retries, aborts and non-blocking backpressure"""
+
+import threading
+import time
+
+import pytest
+from botocore.exceptions import ClientError
+
+from feeds.s3_upload import MIN_PART_SIZE, MultipartS3Uploader
+
+
+class StubS3Client:
+    """Records multipart calls the way S3 would store them; ``failures`` fails that many part uploads first"""
+
+    def __init__(self, failures: int = 0, gate: threading.Event = None):
+        self.failures = failures
+        self.gate = gate
+        self.parts = {}
+        self.completed = None
+        self.aborted = False
+        self._lock = threading.Lock()
+
+    def create_multipart_upload(self, **kwargs):
+        return {'UploadId': 'upload-1'}
+
+    def upload_part(self, PartNumber, Body, **kwargs):
+        with self._lock:
+            if self.failures:
+                self.failures -= 1
+                raise ClientError({'Error': {'Code': 'SlowDown', 'Message': 'Slow down'}}, 'UploadPart')
+        if self.gate:
+            self.gate.wait(5)
+        self.parts[PartNumber] = bytes(Body)
+        return {'ETag': f'"etag-{PartNumber}"'}
+
+    def complete_multipart_upload(self, MultipartUpload, **kwargs):
+        self.completed = MultipartUpload['Parts']
+
+    def abort_multipart_upload(self, **kwargs):
+        self.aborted = True
+
+    def body(self) -> bytes:
+        return b''.join(self.parts[number] for number in sorted(self.parts))
+
+
+def _uploader(client, **options):
+    return MultipartS3Uploader(client, 'beads', 'beads/miyuki/feed.ndjson', part_size=MIN_PART_SIZE,
+                               retry_backoff=0, **options).start()
+
+
+def test_feed_bytes_are_uploaded_in_order_as_parts():
+    client = StubS3Client()
+    uploader = _uploader(client)
+    data = bytes(range(256)) * (MIN_PART_SIZE // 128 + 10)
+    for start in range(0, len(data), 100_000):
+        uploader.write(data[start:start + 100_000])
+
+    assert uploader.complete()
+    assert client.body() == data
+    assert [part['PartNumber'] for part in client.completed] == [1, 2, 3]
+    assert uploader.metrics()['bytes_uploaded'] == len(data)
+
+
+def test_an_empty_feed_is_uploaded_as_one_empty_part():
+    client = StubS3Client()
+    uploader = _uploader(client)
+    assert uploader.complete()
+    assert client.completed == [{'PartNumber': 1, 'ETag': '"etag-1"'}]
+
+
+def test_failed_parts_are_retried():
+    client = StubS3Client(failures=2)
+    uploader = _uploader(client, max_retries=3)
+    uploader.write(b'x' * MIN_PART_SIZE)
+
+    assert uploader.complete()
+    assert uploader.metrics()['part_retries'] == 2
+
+
+def test_the_upload_is_aborted_when_a_part_keeps_failing():
+    client = StubS3Client(failures=10)
+    uploader = _uploader(client, max_retries=1)
+    uploader.write(b'x' * MIN_PART_SIZE)
+
+    assert not uploader.complete()
+    assert client.aborted
+    assert client.completed is None
+
+
+def test_a_slow_part_does_not_block_the_writing_thread():
+    gate = threading.Event()
+    client = StubS3Client(gate=gate)
+    uploader = _uploader(client, max_workers=1, max_pending_parts=2)
+    freed = threading.Event()
+    uploader.on_part_done = freed.set
+
+    started_at = time.monotonic()
+    for block in (b'a', b'b', b'c'):
+        uploader.write(block * MIN_PART_SIZE)
+    # S3 has not taken a single part, yet every write returned at once
+    assert time.monotonic() - started_at < 1
+    assert not client.parts
+    assert uploader.backlogged()
+
+    gate.set()
+    assert freed.wait(5)
+    assert uploader.complete()
+    assert not uploader.backlogged()
+    assert client.body() == b'a' * MIN_PART_SIZE + b'b' * MIN_PART_SIZE + b'c' * MIN_PART_SIZE
+
+
+def test_part_size_below_the_s3_minimum_is_rejected():
+    with pytest.raises(ValueError):
+        MultipartS3Uploader(StubS3Client(), 'beads', 'key', part_size=MIN_PART_SIZE - 1)
@@ -0,0 +1,56 @@
+"""Sitemaps are read plain or gzipped, and unreadable ones are reported instead of raising"""
+
+import gzip
+import logging
+from datetime import datetime, timezone
+
+import pytest
+
+from parsers.sitemaps import parse_lastmod, product_sitemaps, read_sitemap
+
+URLSET = b"""<?xml version="1.0" encoding="UTF-8"?>
+<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+  <url><loc>https://example.com/product/db-0001/</loc><lastmod>2024-05-01T10:00:00+00:00</lastmod></url>
+  <url><loc>https://example.com/product/db-0002/</loc></url>
+</urlset>"""
+
+
+@pytest.mark.parametrize('body', [URLSET, gzip.compress(URLSET)])
+def test_reads_plain_and_gzipped_url_sets(body):
+    sitemap_type, entries = read_sitemap(body)
+    assert sitemap_type == 'urlset'
+    assert [entry['loc'] for entry in entries] == [
+        'https://example.com/product/db-0001/', 'https://example.com/product/db-0002/'
+    ]
+    assert entries[0]['lastmod'] == '2024-05-01T10:00:00+00:00'
+
+
+@pytest.mark.parametrize('body', [b'', b'not xml', gzip.compress(URLSET)[:20]])
+def test_unreadable_body_is_logged_and_skipped(body, caplog):
+    with caplog.at_level(logging.WARNING):
+        assert read_sitemap(body, 'https://example.com/sitemap.xml') == ('', [])
+    assert 'Could not read sitemap https://example.com/sitemap.xml' in caplog.text
+
+
+def test_html_page_is_not_a_sitemap():
+    assert read_sitemap(b'<html><body>Not found</body></html>') == ('html', [])
+
+
+def test_product_sitemaps_in_an_index():
+    entries = [
+        {'loc': 'https://example.com/post-sitemap.xml'},
+        {'loc': 'https://example.com/product-sitemap.xml'},
+        {'loc': 'https://example.com/product-sitemap2.xml'},
+        {'loc': 'https://example.com/wp-sitemap-posts-product-1.xml'},
+    ]
+    assert list(product_sitemaps(entries)) == [
+        'https://example.com/product-sitemap.xml',
+        'https://example.com/product-sitemap2.xml',
+        'https://example.com/wp-sitemap-posts-product-1.xml',
+    ]
+
+
+def test_parse_lastmod():
+    assert parse_lastmod('2024-05-01') == datetime(2024, 5, 1, tzinfo=timezone.utc)
+    assert parse_lastmod('2024-05-01T12:00:00+02:00') == datetime(2024, 5, 1, 10, tzinfo=timezone.utc)
+    assert parse_lastmod('yesterday') is None
@@ -0,0 +1,28 @@
+"""The SQLite stores create their schema on open and commit writes in batches"""
+
+import sqlite3
+
+from storage.image_index import ImageIndex
+
+
+def _rows_visible(path):
+    with sqlite3.connect(str(path)) as connection:
+        return connection.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+
+
+def test_writes_are_committed_every_commit_every_writes(tmp_path):
+    index = ImageIndex(tmp_path / 'nested' / 'index.sqlite3', commit_every=2)
+    index.open()
+
+    index.save('https://example.com/a.jpg', 'a', 'aa/a.jpg')
+    assert _rows_visible(index.path) == 0
+    index.save('https://example.com/b.jpg', 'b', 'bb/b.jpg')
+    assert _rows_visible(index.path) == 2
+
+    index.save('https://example.com/a.jpg', 'c', 'cc/c.jpg')
+    index.close()
+    assert _rows_visible(index.path) == 2
+
+    index.open()
+    assert index.get('https://example.com/a.jpg') == ('c', 'cc/c.jpg')
+    index.close()
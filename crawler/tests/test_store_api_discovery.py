@@ -0,0 +1,84 @@
+"""Store API discovery pages through the fixture server and maps every Delica on it"""
+
+import json
+import threading
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pytest
+from scrapy import Request
+from scrapy.http import TextResponse
+from scrapy.utils.test import get_crawler
+
+from fixtures.store_api_server import DEFAULT_FIXTURE, make_handler
+from parsers.store_api import STORE_API_PRODUCTS_PATH
+from spiders.miyuki_directory_crawler import MiyukiDirectoryCrawler
+
+PRODUCTS = json.loads(DEFAULT_FIXTURE.read_text(encoding='utf-8'))
+
+
+@pytest.fixture(scope='module')
+def store_api_url():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(PRODUCTS))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}{STORE_API_PRODUCTS_PATH}"
+    server.shutdown()
+    server.server_close()
+
+
+def _crawl(store_api_url, page_size, existing_product_codes=(), **spider_args):
+    """Run the spider's callbacks against the fixture server, returning its items and the pages it fetched"""
+    crawler = get_crawler(MiyukiDirectoryCrawler, {'STORE_API_PAGE_SIZE': page_size})
+    spider = MiyukiDirectoryCrawler.from_crawler(
+        crawler, discovery='store_api', store_api_url=store_api_url, **spider_args
+    )
+    spider.existing_product_codes = set(existing_product_codes)
+
+    items, pages = [], []
+    pending = list(spider.start_requests())
+    while pending:
+        request = pending.pop(0)
+        with urllib.request.urlopen(request.url) as f:
+            response = TextResponse(request.url, body=f.read(), headers=dict(f.headers), request=request)
+        pages.append(response.meta['store_api_page'])
+        for output in request.callback(response):
+            if isinstance(output, Request):
+                pending.append(output)
+            else:
+                items.append(output)
+    return spider, items, pages
+
+
+def test_every_page_is_fetched(store_api_url):
+    spider, items, pages = _crawl(store_api_url, page_size=5)
+
+    assert pages == [1, 2, 3]
+    # The sampler has no Delica product code
+    assert [item['product_code'] for item in items] == [f"DB-{number:04d}" for number in range(1, 13)]
+    assert spider.total_count == 12
+
+
+def test_records_carry_their_attributes(store_api_url):
+    _, items, _ = _crawl(store_api_url, page_size=5)
+
+    first = items[0]
+    assert first['name'] == PRODUCTS[0]['name']
+    assert first['source_url'] == PRODUCTS[0]['permalink']
+    assert (first['brand'], first['type'], first['size']) == ('Miyuki', 'Delica', '11/0')
+    assert first['color'] is not None
+
+
+def test_max_pages_limits_the_fan_out(store_api_url):
+    _, items, pages = _crawl(store_api_url, page_size=5, max_pages=2)
+
+    assert pages == [1, 2]
+    assert len(items) == 10
+
+
+def test_known_beads_are_skipped(store_api_url):
+    spider, items, _ = _crawl(store_api_url, page_size=5, existing_product_codes={'DB-0001', 'DB-0002'})
+
+    assert 'DB-0001' not in {item['product_code'] for item in items}
+    assert len(items) == 10
+    assert spider.duplicate_count == 2
@@ -0,0 +1,144 @@
+"""Callback timing counts only the callback's own time; telemetry is exported on a timer and at close"""
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+from scrapy import Request, Spider
+from scrapy.exceptions import NotConfigured
+from scrapy.http import HtmlResponse
+from scrapy.utils.test import get_crawler
+from twisted.internet import task
+
+from extensions.telemetry import CallbackTimingMiddleware, CrawlTelemetry
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def perf_counter(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr('extensions.telemetry.time.perf_counter', clock)
+    return clock
+
+
+@pytest.fixture
+def reactor_clock(monkeypatch):
+    clock = task.Clock()
+
+    class LoopingCall(task.LoopingCall):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.clock = clock
+
+    monkeypatch.setattr('extensions.telemetry.task.LoopingCall', LoopingCall)
+    return clock
+
+
+@pytest.fixture
+def crawler(tmp_path):
+    crawler = get_crawler(Spider, {
+        'TELEMETRY_ENABLED': True,
+        'TELEMETRY_DIR': str(tmp_path / 'telemetry'),
+        'TELEMETRY_EXPORT_INTERVAL': 30,
+    })
+    crawler.spider = Spider.from_crawler(crawler, name='beads')
+    return crawler
+
+
+def _response(callback):
+    request = Request('https://example.com/beads', callback=callback)
+    return HtmlResponse(request.url, body=b'<html></html>', request=request)
+
+
+def parse_listing(response):
+    """The callback the timed output is charged to"""
+
+
+def test_sync_callbacks_are_timed_without_downstream_work(crawler, perf_counter):
+    telemetry = CrawlTelemetry.from_crawler(crawler)
+    middleware = CallbackTimingMiddleware.from_crawler(crawler)
+
+    def callback_output():
+        for item in range(3):
+            perf_counter.now += 1
+            yield item
+
+    for _ in middleware.process_spider_output(_response(parse_listing), callback_output()):
+        # Pipelines and the scheduler working on the output
+        perf_counter.now += 10
+
+    histogram = telemetry.callback_duration['parse_listing']
+    assert histogram.count == 1
+    assert histogram.sum == 3
+
+
+def test_async_callbacks_are_timed_without_downstream_work(crawler, perf_counter):
+    telemetry = CrawlTelemetry.from_crawler(crawler)
+    middleware = CallbackTimingMiddleware.from_crawler(crawler)
+
+    async def callback_output():
+        for item in range(2):
+            perf_counter.now += 2
+            yield item
+
+    async def consume():
+        async for _ in middleware.process_spider_output_async(_response(parse_listing), callback_output()):
+            perf_counter.now += 10
+
+    asyncio.run(consume())
+    assert telemetry.callback_duration['parse_listing'].sum == 4
+
+
+def test_the_middleware_needs_the_telemetry_extension():
+    with pytest.raises(NotConfigured):
+        CallbackTimingMiddleware.from_crawler(get_crawler(Spider))
+
+
+def test_cached_responses_are_not_counted_as_downloads(crawler):
+    telemetry = CrawlTelemetry.from_crawler(crawler)
+    request = Request('https://www.example.com/a', meta={'download_latency': 0.2})
+    telemetry.response_received(HtmlResponse(request.url, request=request), request, crawler.spider)
+    telemetry.response_received(HtmlResponse(request.url, request=request, flags=['cached']), request, crawler.spider)
+
+    assert telemetry.download_latency['www.example.com'].count == 1
+
+
+def test_metrics_are_exported_periodically_and_dumped_at_close(crawler, tmp_path, reactor_clock):
+    crawler.engine = SimpleNamespace(
+        scheduler=['queued'] * 5,
+        downloader=SimpleNamespace(active={'downloading'}, slots={'example.com': SimpleNamespace(queue=['waiting'])}),
+        scraper=SimpleNamespace(slot=None),
+    )
+    telemetry = CrawlTelemetry.from_crawler(crawler)
+    telemetry.spider_opened(crawler.spider)
+    prom = tmp_path / 'telemetry' / 'beads.prom'
+    assert not prom.exists()
+
+    for _ in range(3):
+        telemetry.item_scraped({}, None, crawler.spider)
+    reactor_clock.advance(30)
+    lines = prom.read_text().splitlines()
+    assert 'crawler_items_total{spider="beads"} 3' in lines
+    assert 'crawler_queue_depth{spider="beads",queue="scheduler"} 5' in lines
+    assert 'crawler_queue_depth{spider="beads",queue="downloader_queued"} 1' in lines
+
+    telemetry.item_scraped({}, None, crawler.spider)
+    reactor_clock.advance(30)
+    assert 'crawler_items_total{spider="beads"} 4' in prom.read_text().splitlines()
+
+    crawler.stats.set_value('retry/count', 2)
+    telemetry.spider_closed(crawler.spider, 'finished')
+    assert not telemetry._task.running
+    dump = json.loads((tmp_path / 'telemetry' / 'beads-stats.json').read_text())
+    assert dump['reason'] == 'finished'
+    assert dump['metrics']['items'] == 4
+    assert dump['metrics']['retries'] == 2
+    assert dump['stats']['retry/count'] == 2
@@ -0,0 +1,34 @@
+"""Validators are only offered for a URL once its extracted record has been saved"""
+
+import pytest
+
+from storage.validator_store import ValidatorStore
+
+URL = 'https://example.com/product/db-0001/'
+
+
+@pytest.fixture
+def validators(tmp_path):
+    store = ValidatorStore(tmp_path / 'validators.sqlite3')
+    store.open()
+    yield store
+    store.close()
+
+
+def test_validators_are_only_returned_once_their_record_is_saved(validators):
+    validators.save_validators(URL, '"abc"', 'Tue, 01 Sep 2026 00:00:00 GMT')
+    assert validators.get_validators(URL) == (None, None)
+    assert validators.get_record(URL) is None
+
+    validators.save_record(URL, {'product_code': 'DB-0001'})
+    assert validators.get_validators(URL) == ('"abc"', 'Tue, 01 Sep 2026 00:00:00 GMT')
+    assert validators.get_record(URL) == {'product_code': 'DB-0001'}
+
+
+def test_new_validators_clear_the_stored_record(validators):
+    validators.save_validators(URL, '"abc"', None)
+    validators.save_record(URL, {'product_code': 'DB-0001'})
+
+    validators.save_validators(URL, '"def"', None)
+    assert validators.get_record(URL) is None
+    assert validators.get_validators(URL) == (None, None)
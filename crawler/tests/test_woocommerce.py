@@ -0,0 +1,67 @@
+"""Product page attribute tables and Store API attributes map to the same bead fields"""
+
+from scrapy.http import HtmlResponse
+
+from parsers.woocommerce import ATTRIBUTE_FIELDS, extract_product_attributes, store_api_attributes
+
+PRODUCT_PAGE = """
+<table class="woocommerce-product-attributes shop_attributes">
+  <tr class="woocommerce-product-attributes-item woocommerce-product-attributes-item--attribute_pa_color-group">
+    <th>Color group</th>
+    <td class="woocommerce-product-attributes-item__value"><p><a href="/c/black/">Black</a>, <a href="/c/gray/">Gray</a></p></td>
+  </tr>
+  <tr class="woocommerce-product-attributes-item woocommerce-product-attributes-item--attribute_pa_finish">
+    <th>Finish</th>
+    <td class="woocommerce-product-attributes-item__value"><p>  Opaque
+        Matte </p></td>
+  </tr>
+  <tr class="woocommerce-product-attributes-item woocommerce-product-attributes-item--attribute_pa_dyed">
+    <th>Dyed</th>
+    <td class="woocommerce-product-attributes-item__value"><p></p></td>
+  </tr>
+  <tr class="woocommerce-product-attributes-item woocommerce-product-attributes-item--attribute_hole-size">
+    <th>Hole size</th>
+    <td class="woocommerce-product-attributes-item__value"><p>0.8mm</p></td>
+  </tr>
+  <tr class="woocommerce-product-attributes-item woocommerce-product-attributes-item--weight">
+    <th>Weight</th>
+    <td class="woocommerce-product-attributes-item__value">5 g</td>
+  </tr>
+</table>
+"""
+
+STORE_API_PRODUCT = {
+    'attributes': [
+        {'taxonomy': 'pa_color-group', 'name': 'Color group', 'terms': [{'name': 'Black'}, {'name': 'Gray'}]},
+        {'taxonomy': 'pa_finish', 'name': 'Finish', 'terms': [{'name': 'Opaque Matte'}]},
+        {'taxonomy': 'pa_dyed', 'name': 'Dyed', 'terms': []},
+        {'taxonomy': None, 'name': 'Hole Size', 'terms': [{'name': '0.8mm'}]},
+        {'taxonomy': 'pa_finish-detail', 'name': 'Finish detail', 'terms': [{'name': 'Ceylon &amp; Luster'}]},
+    ]
+}
+
+
+def test_product_page_attributes():
+    response = HtmlResponse('https://example.com/product/db-0001/', body=PRODUCT_PAGE.encode())
+    fields, extra = extract_product_attributes(response)
+
+    assert fields.keys() == set(ATTRIBUTE_FIELDS.values())
+    assert fields['color'] == 'Black, Gray'
+    assert fields['finish'] == 'Opaque Matte'
+    assert fields['dyed'] is None
+    # Unmapped attribute rows are kept; rows that are not attributes (weight) are not
+    assert extra == {'hole-size': '0.8mm'}
+
+
+def test_store_api_attributes_match_the_product_page():
+    response = HtmlResponse('https://example.com/product/db-0001/', body=PRODUCT_PAGE.encode())
+    fields, extra = store_api_attributes(STORE_API_PRODUCT)
+
+    assert fields == extract_product_attributes(response)[0]
+    assert extra == {'hole-size': '0.8mm', 'finish-detail': 'Ceylon & Luster'}
+
+
+def test_product_without_attributes():
+    fields, extra = store_api_attributes({})
+    assert set(fields.values()) == {None}
+    assert extra == {}